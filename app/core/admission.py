@@ -0,0 +1,213 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.core.llm_gateway import percentile
+
+# Lower numbers are admitted first
+PRIORITY_BOOKING = 0
+PRIORITY_ACTIVE = 1
+PRIORITY_NEW = 2
+
+ADMISSION_TURN_CONCURRENCY = int(os.getenv("ADMISSION_TURN_CONCURRENCY", "8"))
+ADMISSION_TURN_QUEUE = int(os.getenv("ADMISSION_TURN_QUEUE", "32"))
+ADMISSION_SEND_CONCURRENCY = int(os.getenv("ADMISSION_SEND_CONCURRENCY", "16"))
+ADMISSION_SEND_QUEUE = int(os.getenv("ADMISSION_SEND_QUEUE", "64"))
+# Longest a request may queue before it is shed
+ADMISSION_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "5"))
+
+QUEUE_TIME_WINDOW = 1000
+
+
+class Overloaded(Exception):
+    """Raised when a stage sheds a request instead of queueing it."""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"{stage} overloaded: {reason}")
+        self.stage = stage
+        self.reason = reason
+
+
+class _Waiter:
+    def __init__(self, notify: Callable[[], None]):
+        self.notify = notify
+        self.admitted = False
+        self.rejected: Optional[str] = None
+
+
+class AdmissionGate:
+    """
+    Concurrency limit for one stage with a bounded priority wait queue.
+
+    At most ``limit`` holders run at once and at most ``max_queue`` wait;
+    waiters are admitted by priority, then arrival. When the queue is full a
+    newcomer with better priority than the worst waiter takes its place (that
+    waiter is shed), otherwise the newcomer is shed. Waiting longer than
+    ``max_wait`` also sheds. Usable from threads (``admit``) and from the
+    event loop (``admit_async``).
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float = ADMISSION_MAX_QUEUE_WAIT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue: List = []
+        self._sequence = itertools.count()
+        self._queue_times = deque(maxlen=QUEUE_TIME_WINDOW)
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "timeout": 0, "preempted": 0}
+
+    def _enqueue(self, priority: int, notify: Callable[[], None]) -> Optional[_Waiter]:
+        """Admits immediately (returns None) or queues a waiter; raises Overloaded if shed."""
+        with self._lock:
+            if self._active < self.limit and not self._queue:
+                self._active += 1
+                self.admitted += 1
+                self._queue_times.append(0.0)
+                return None
+
+            waiter = _Waiter(notify)
+            entry = (priority, next(self._sequence), waiter)
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue) if self._queue else None
+                if worst is None or worst[0] <= priority:
+                    self.shed["queue_full"] += 1
+                    raise Overloaded(self.name, "queue full")
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst[2].rejected = "preempted"
+                self.shed["preempted"] += 1
+                worst[2].notify()
+            heapq.heappush(self._queue, entry)
+            return waiter
+
+    def _grant_next(self):
+        # Called with the lock held after a slot frees up
+        while self._queue and self._active < self.limit:
+            _, _, waiter = heapq.heappop(self._queue)
+            waiter.admitted = True
+            self._active += 1
+            self.admitted += 1
+            waiter.notify()
+
+    def _abandon(self, waiter: _Waiter, queued_at: float):
+        """Settles a waiter whose wait ended; raises Overloaded unless it was admitted."""
+        with self._lock:
+            if waiter.admitted:
+                self._queue_times.append(time.monotonic() - queued_at)
+                return
+            if waiter.rejected is None:
+                waiter.rejected = "timeout"
+                self.shed["timeout"] += 1
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+        raise Overloaded(self.name, waiter.rejected)
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            self._grant_next()
+
+    def acquire(self, priority: int = PRIORITY_NEW):
+        event = threading.Event()
+        queued_at = time.monotonic()
+        waiter = self._enqueue(priority, event.set)
+        if waiter is not None:
+            event.wait(self.max_wait)
+            self._abandon(waiter, queued_at)
+
+    async def acquire_async(self, priority: int = PRIORITY_NEW):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        queued_at = time.monotonic()
+        waiter = self._enqueue(priority, notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+        self._abandon(waiter, queued_at)
+
+    def _cancel(self, waiter: _Waiter):
+        with self._lock:
+            if waiter.admitted:
+                self._active -= 1
+                self._grant_next()
+            else:
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+
+    @contextlib.contextmanager
+    def admit(self, priority: int = PRIORITY_NEW) -> Iterator[None]:
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def admit_async(self, priority: int = PRIORITY_NEW):
+        await self.acquire_async(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            queue_times = sorted(self._queue_times)
+            shed = sum(self.shed.values())
+            total = self.admitted + shed
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "queued": len(self._queue),
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "shed_rate": shed / total if total else 0.0,
+                "queue_time_p50": percentile(queue_times, 0.50),
+                "queue_time_p95": percentile(queue_times, 0.95),
+                "queue_time_max": queue_times[-1] if queue_times else 0.0,
+            }
+
+
+class AdmissionController:
+    """The webhook's stages: ``turn`` (processing a message) and ``send`` (Twilio replies)."""
+
+    def __init__(self, gates: Optional[Dict[str, AdmissionGate]] = None):
+        self.gates = gates or {
+            "turn": AdmissionGate("turn", ADMISSION_TURN_CONCURRENCY, ADMISSION_TURN_QUEUE),
+            "send": AdmissionGate("send", ADMISSION_SEND_CONCURRENCY, ADMISSION_SEND_QUEUE),
+        }
+
+    def __getitem__(self, stage: str) -> AdmissionGate:
+        return self.gates[stage]
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: gate.stats() for name, gate in self.gates.items()}
+
+
+def session_priority(context: Optional[Dict]) -> int:
+    """Users mid-booking first, then users with a conversation, then new sessions."""
+    if not context:
+        return PRIORITY_NEW
+    if context.get("booking_state") and context["booking_state"] != "confirmed":
+        return PRIORITY_BOOKING
+    return PRIORITY_ACTIVE
@@ -0,0 +1,466 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from mysql.connector import Error
+from app.config.db_config import get_db_connection
+from app.core.bulk_search import CompiledRequirement, listing_location_keys
+from app.core.gazetteer import LocationGazetteer, get_gazetteer
+from app.core.geo import GeoIndex, GridIndex, TransitStop, get_geo_index
+from app.core.twilio_handler import send_whatsapp_message
+
+logger = logging.getLogger(__name__)
+
+SAVED_SEARCHES_DDL = """
+    CREATE TABLE IF NOT EXISTS saved_searches (
+        user_id VARCHAR(64) PRIMARY KEY,
+        requirements TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+# Alerts go out over WhatsApp; other channels (web chat sessions) have no address to send to
+ALERT_USER_PREFIX = "whatsapp:"
+MAX_LISTINGS_PER_ALERT = 3
+DELIVERY_WORKERS = 8
+# Alerts are opt-in: "alert me", "notify me of new rooms"; "stop alerts" opts out
+ALERT_OPT_IN = re.compile(
+    r"\b(alert|notify) me\b|\b(set up|turn on|start|get|want|send me)\s+(an?\s+|new[- ]listing\s+)?(alerts?|notifications?)\b"
+    r"|\blet me know when\b.*\b(new|listed|available)\b|\bsubscribe\b",
+    re.IGNORECASE,
+)
+ALERT_OPT_OUT = re.compile(
+    r"\b(stop|cancel|turn off|no more|don'?t send)\b.*\b(alerts?|notifications?)\b|\bunsubscribe\b",
+    re.IGNORECASE,
+)
+# (user, room) pairs remembered as already announced; the oldest are forgotten first
+ALERTS_NOTIFIED_MAX_ENTRIES = int(os.getenv("ALERTS_NOTIFIED_MAX_ENTRIES", "200000"))
+
+
+class IntervalTree:
+    """
+    Static centered interval tree answering "which intervals contain x".
+
+    Stabbing queries cost O(log n + k). The tree is immutable; see
+    ``IntervalIndex`` for the updatable wrapper.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[float, float, Hashable]]):
+        intervals = list(intervals)
+        self.center = None
+        self.left = self.right = None
+        self.by_start: List[Tuple[float, float, Hashable]] = []
+        self.by_end: List[Tuple[float, float, Hashable]] = []
+        if not intervals:
+            return
+
+        endpoints = sorted(point for low, high, _ in intervals for point in (low, high) if math.isfinite(point))
+        self.center = endpoints[len(endpoints) // 2] if endpoints else 0.0
+
+        left, right, here = [], [], []
+        for interval in intervals:
+            low, high, _ = interval
+            if high < self.center:
+                left.append(interval)
+            elif low > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        self.by_start = sorted(here, key=lambda interval: interval[0])
+        self.by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def stab(self, x: float) -> List[Hashable]:
+        found = []
+        node = self
+        while node is not None and node.center is not None:
+            if x < node.center:
+                for low, _, key in node.by_start:
+                    if low > x:
+                        break
+                    found.append(key)
+                node = node.left
+            else:
+                for _, high, key in node.by_end:
+                    if high < x:
+                        break
+                    found.append(key)
+                node = node.right
+        return found
+
+
+class IntervalIndex:
+    """
+    Updatable interval set backed by ``IntervalTree``.
+
+    Changes since the last build are kept in a small pending buffer that is
+    scanned linearly; the tree is rebuilt once the buffer grows past a
+    quarter of the indexed intervals, keeping updates amortized O(log n).
+    """
+
+    def __init__(self):
+        self._intervals: Dict[Hashable, Tuple[float, float]] = {}
+        self._tree = IntervalTree([])
+        self._pending: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, key: Hashable, low: float, high: float):
+        self._intervals[key] = (low, high)
+        self._pending.add(key)
+        self._maybe_rebuild()
+
+    def remove(self, key: Hashable):
+        if self._intervals.pop(key, None) is not None:
+            self._pending.add(key)
+            self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        if len(self._pending) > max(64, len(self._intervals) // 4):
+            self.rebuild()
+
+    def rebuild(self):
+        self._tree = IntervalTree((low, high, key) for key, (low, high) in self._intervals.items())
+        self._pending.clear()
+
+    def stab(self, x: float) -> Set[Hashable]:
+        found = {key for key in self._tree.stab(x) if key not in self._pending}
+        for key in self._pending:
+            interval = self._intervals.get(key)
+            if interval is not None and interval[0] <= x <= interval[1]:
+                found.add(key)
+        return found
+
+
+def room_key(row: Dict) -> Hashable:
+    """Identifies a room row for de-duplicating alerts."""
+    for column in ("roomid", "room_id", "id"):
+        if row.get(column) is not None:
+            return row[column]
+    return (row.get("propertyid"), row.get("roomtype"), row.get("rentmonth"))
+
+
+def format_alert_message(rows: List[Dict]) -> str:
+    """Short WhatsApp text announcing new listings for a saved search."""
+    lines = ["🔔 New rooms matching your search:\n"]
+    for idx, row in enumerate(rows[:MAX_LISTINGS_PER_ALERT], 1):
+        parts = [part for part in (row.get("roomtype"), row.get("propertytype")) if part]
+        location = ", ".join(str(part) for part in (row.get("add1"), row.get("zone")) if part)
+        line = f"{idx}. {' in a '.join(parts) or 'Room'}"
+        if location:
+            line += f" at {location}"
+        if row.get("rentmonth"):
+            line += f" - S${float(row['rentmonth']):,.2f}/month"
+        lines.append(line)
+    if len(rows) > MAX_LISTINGS_PER_ALERT:
+        lines.append(f"...and {len(rows) - MAX_LISTINGS_PER_ALERT} more.")
+    lines.append("\nReply to see details or schedule a viewing.")
+    return "\n".join(lines)
+
+
+class AlertsEngine:
+    """
+    Matches new or changed listings against every saved search.
+
+    Saved searches are indexed by resolved location id, and each location's
+    postings are an interval index over [0, budget], so a listing only
+    reaches the searches whose location and budget it can satisfy without
+    scanning every budget; the remaining predicates run on that short
+    candidate list. "Near X" searches are indexed by anchor stop instead,
+    with an interval index over [0, radius] per anchor, and a listing is
+    matched by its distance to the anchors around it, so properties added
+    after the search was saved are found too. Announced (user, room) pairs
+    are kept in a bounded LRU.
+    """
+
+    def __init__(
+        self,
+        gazetteer: Optional[LocationGazetteer] = None,
+        geo_index: Optional[GeoIndex] = None,
+        sender=send_whatsapp_message,
+        max_notified: int = ALERTS_NOTIFIED_MAX_ENTRIES,
+    ):
+        self.gazetteer = gazetteer
+        self.geo_index = geo_index
+        self.sender = sender
+        self.max_notified = max_notified
+        self._searches: Dict[str, CompiledRequirement] = {}
+        self._requirements: Dict[str, Dict] = {}
+        self._by_location: Dict[str, IntervalIndex] = {}
+        self._unlocated = IntervalIndex()
+        self._by_anchor: Dict[str, Tuple[TransitStop, IntervalIndex]] = {}
+        self._anchors = GridIndex()
+        self._max_radius = 0.0
+        self._notified: "OrderedDict[Tuple[str, Hashable], None]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._searches)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._searches
+
+    def upsert(self, user_id: str, requirements: Dict) -> bool:
+        """Adds or replaces a user's saved search; False if it was already saved unchanged."""
+        with self._lock:
+            if self._requirements.get(user_id) == requirements:
+                return False
+        compiled = CompiledRequirement(user_id, requirements, self.gazetteer, self.geo_index)
+        budget = compiled.budget if compiled.budget is not None else math.inf
+        with self._lock:
+            self.remove(user_id)
+            self._searches[user_id] = compiled
+            self._requirements[user_id] = dict(requirements)
+            if compiled.proximity is not None:
+                anchor = compiled.proximity.anchor
+                if anchor.name not in self._by_anchor:
+                    self._by_anchor[anchor.name] = (anchor, IntervalIndex())
+                    self._anchors.insert(anchor.name, anchor.latitude, anchor.longitude)
+                self._by_anchor[anchor.name][1].add(user_id, 0.0, compiled.proximity.radius_m)
+                self._max_radius = max(self._max_radius, compiled.proximity.radius_m)
+            elif compiled.location_keys is None:
+                self._unlocated.add(user_id, 0.0, budget)
+            else:
+                for location_key in compiled.location_keys:
+                    self._by_location.setdefault(location_key, IntervalIndex()).add(user_id, 0.0, budget)
+        return True
+
+    def remove(self, user_id: str):
+        with self._lock:
+            compiled = self._searches.pop(user_id, None)
+            if compiled is None:
+                return
+            del self._requirements[user_id]
+            if compiled.proximity is not None:
+                name = compiled.proximity.anchor.name
+                _, postings = self._by_anchor[name]
+                postings.remove(user_id)
+                if not len(postings):
+                    del self._by_anchor[name]
+                    self._anchors.remove(name)
+                return
+            self._unlocated.remove(user_id)
+            for location_key in compiled.location_keys or ():
+                postings = self._by_location.get(location_key)
+                if postings is not None:
+                    postings.remove(user_id)
+                    if not len(postings):
+                        del self._by_location[location_key]
+
+    def match(self, row: Dict) -> List[str]:
+        """User ids whose saved search the listing satisfies."""
+        rent = float(row.get("rentmonth") or 0)
+        with self._lock:
+            candidates = self._unlocated.stab(rent)
+            for location_key in listing_location_keys(row):
+                postings = self._by_location.get(location_key)
+                if postings is not None:
+                    candidates |= postings.stab(rent)
+            position = self.geo_index.listing_position(row) if self._by_anchor and self.geo_index is not None else None
+            if position is not None:
+                for distance, name in self._anchors.within(*position, self._max_radius):
+                    candidates |= self._by_anchor[name][1].stab(distance)
+            return [user_id for user_id in candidates if self._searches[user_id].matches(row)]
+
+    def collect_alerts(self, rows: Iterable[Dict]) -> Dict[str, List[Dict]]:
+        """Groups newly matched listings per user, skipping ones already announced."""
+        alerts: Dict[str, List[Dict]] = {}
+        for row in rows:
+            if str(row.get("status", "")).lower() in ("i", "inactive"):
+                continue
+            key = room_key(row)
+            for user_id in self.match(row):
+                if self._already_notified((user_id, key)):
+                    continue
+                alerts.setdefault(user_id, []).append(row)
+        return alerts
+
+    def _already_notified(self, pair: Tuple[str, Hashable]) -> bool:
+        """Records the pair as announced; True if it already was."""
+        with self._lock:
+            if pair in self._notified:
+                self._notified.move_to_end(pair)
+                return True
+            self._notified[pair] = None
+            while len(self._notified) > self.max_notified:
+                self._notified.popitem(last=False)
+            return False
+
+    def notify(self, rows: Iterable[Dict]) -> Dict[str, str]:
+        """
+        Matches listings and sends one WhatsApp message per user.
+
+        Deliveries run concurrently on a small pool; returns the sender's
+        result (message SID or error) per user.
+        """
+        alerts = self.collect_alerts(rows)
+        if not alerts:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(DELIVERY_WORKERS, len(alerts))) as pool:
+            futures = {
+                user_id: pool.submit(self.sender, user_id, format_alert_message(matched))
+                for user_id, matched in alerts.items()
+            }
+            results = {user_id: future.result() for user_id, future in futures.items()}
+
+        logger.info(f"🔔 Sent {len(results)} saved-search alerts")
+        return results
+
+
+_table_ready = False
+
+
+def ensure_saved_searches_table() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    connection = get_db_connection()
+    if not connection:
+        return False
+    cursor = connection.cursor()
+    try:
+        cursor.execute(SAVED_SEARCHES_DDL)
+        connection.commit()
+        _table_ready = True
+        return True
+    except Error as e:
+        print(f"❌ Error creating saved_searches table: {e}")
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _write(user_id: str, query: str, params: Tuple) -> bool:
+    if not ensure_saved_searches_table():
+        return False
+    connection = get_db_connection()
+    if not connection:
+        return False
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query, params)
+        connection.commit()
+        return True
+    except Error as e:
+        print(f"❌ Error updating saved search for {user_id}: {e}")
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def save_search(user_id: str, requirements: Dict) -> bool:
+    """Persists a user's requirements as their saved search."""
+    return _write(
+        user_id,
+        """
+        INSERT INTO saved_searches (user_id, requirements) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE requirements = VALUES(requirements)
+        """,
+        (user_id, json.dumps(requirements)),
+    )
+
+
+def delete_search(user_id: str) -> bool:
+    return _write(user_id, "DELETE FROM saved_searches WHERE user_id = %s", (user_id,))
+
+
+def load_saved_searches() -> Dict[str, Dict]:
+    connection = get_db_connection()
+    if not connection:
+        return {}
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT user_id, requirements FROM saved_searches")
+        return {user_id: json.loads(requirements) for user_id, requirements in cursor.fetchall()}
+    except Error as e:
+        print(f"❌ Error loading saved searches: {e}")
+        return {}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+_alerts_engine: Optional[AlertsEngine] = None
+_alerts_engine_lock = threading.Lock()
+_saved_searches_loaded = False
+# Saved-search writes run here, off the message path, in the order they were made
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="saved-searches")
+
+
+def get_alerts_engine() -> AlertsEngine:
+    """Returns the shared alerts engine; persisted searches arrive through ``load_saved_searches_once``."""
+    global _alerts_engine
+    if _alerts_engine is not None:
+        return _alerts_engine
+
+    with _alerts_engine_lock:
+        if _alerts_engine is None:
+            _alerts_engine = AlertsEngine(get_gazetteer(), get_geo_index())
+    return _alerts_engine
+
+
+def load_saved_searches_once() -> bool:
+    """
+    Creates the saved_searches table and indexes its searches. Runs at
+    startup and from the change feed, never on a user's message; retried
+    until the database answers.
+    """
+    global _saved_searches_loaded
+    if _saved_searches_loaded:
+        return True
+    engine = get_alerts_engine()
+    with _alerts_engine_lock:
+        if _saved_searches_loaded:
+            return True
+        if not ensure_saved_searches_table():
+            return False
+        loaded = 0
+        for user_id, requirements in load_saved_searches().items():
+            # A search saved since startup is newer than its stored copy
+            if can_alert(user_id) and user_id not in engine:
+                engine.upsert(user_id, requirements)
+                loaded += 1
+        _saved_searches_loaded = True
+    logger.info(f"🔔 Loaded {loaded} saved searches")
+    return True
+
+
+def can_alert(user_id: str) -> bool:
+    return user_id.startswith(ALERT_USER_PREFIX)
+
+
+def has_saved_search(user_id: str) -> bool:
+    return can_alert(user_id) and user_id in get_alerts_engine()
+
+
+def register_saved_search(user_id: str, requirements: Dict) -> Optional[Future]:
+    """
+    Indexes a user's requirements for alerts once they opted in. The write
+    to saved_searches is queued, and only made when the search changed;
+    returns its future (None when nothing is written).
+    """
+    if not can_alert(user_id):
+        return None
+    if get_alerts_engine().upsert(user_id, dict(requirements)):
+        return _writer.submit(save_search, user_id, dict(requirements))
+    return None
+
+
+def unregister_saved_search(user_id: str) -> Optional[Future]:
+    """Stops alerts for the user; the row is deleted in the background."""
+    if not can_alert(user_id):
+        return None
+    get_alerts_engine().remove(user_id)
+    return _writer.submit(delete_search, user_id)
@@ -0,0 +1,176 @@
+import heapq
+import re
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+
+from app.core.db_connector import execute_query
+from app.core.gazetteer import STOPWORDS, LocationGazetteer, get_gazetteer, normalize_location
+from app.core.geo import GeoIndex, ProximityQuery, get_geo_index
+
+ACTIVE_LISTINGS_QUERY = """
+    SELECT r.*, p.*
+    FROM rooms r
+    JOIN properties p ON r.propertyid = p.propertyid
+    WHERE r.rentmonth > 0
+    AND r.status NOT IN ('i', 'I', 'inactive', 'INACTIVE')
+"""
+
+# Location kinds compared by equality against the canonical gazetteer values
+EXACT_LOCATION_KINDS = ("zone", "city", "buildingname", "nearestmrt")
+
+
+def fetch_active_listings() -> List[Dict]:
+    """Loads every active, priced listing with a single query."""
+    results = execute_query(ACTIVE_LISTINGS_QUERY)
+    if isinstance(results, dict):
+        print(f"❌ Failed to load active listings: {results.get('error')}")
+        return []
+    return results
+
+
+def listing_location_keys(row: Dict) -> Set[str]:
+    """Location ids a listing can be found under (``kind:value``, ``add1:token``, ``propertyid:id``)."""
+    keys = {f"{kind}:{row[kind]}" for kind in EXACT_LOCATION_KINDS if row.get(kind)}
+    keys.update(f"add1:{token}" for token in normalize_location(row.get("add1")).split())
+    if row.get("propertyid") is not None:
+        keys.add(f"propertyid:{row['propertyid']}")
+    return keys
+
+
+class CompiledRequirement:
+    """
+    A saved set of requirements turned into cheap per-row predicates.
+
+    Locations are resolved once up front into the ids of
+    ``listing_location_keys``; ``location_keys`` is None when the
+    requirement places no location constraint. For "near X" requirements
+    ``proximity`` is kept too, since the ``propertyid:`` keys only cover the
+    properties indexed when the requirement was compiled.
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        requirements: Dict,
+        gazetteer: Optional[LocationGazetteer] = None,
+        geo_index: Optional[GeoIndex] = None,
+    ):
+        self.key = key
+        self.budget = float(requirements["budget"]) if requirements.get("budget") else None
+        self.property_type = (requirements.get("property_type") or "").lower() or None
+        self.location_keys: Optional[Set[str]] = None
+        self.location_terms: List[str] = []
+        self.proximity: Optional[ProximityQuery] = None
+
+        location = requirements.get("location")
+        if location:
+            self._compile_location(location, gazetteer, geo_index)
+
+    def _compile_location(self, location: str, gazetteer: Optional[LocationGazetteer], geo_index: Optional[GeoIndex]):
+        if geo_index is not None:
+            proximity = geo_index.parse_proximity(location)
+            if proximity is not None:
+                self.proximity = proximity
+                self.location_keys = {
+                    f"propertyid:{property_id}" for _, property_id in geo_index.properties_within(proximity)
+                }
+                return
+
+        matches = gazetteer.resolve(location) if gazetteer is not None else []
+        if matches:
+            self.location_keys = {match.location_id for match in matches}
+            return
+
+        # Unknown place: keep the old substring behaviour on the non-stopword terms
+        self.location_terms = [
+            term for term in re.findall(r"[a-z0-9]+", location.lower()) if term not in STOPWORDS
+        ]
+
+    def matches(self, row: Dict) -> bool:
+        """Checks every predicate except the indexed location keys."""
+        rent = float(row.get("rentmonth") or 0)
+        if self.budget is not None and rent > self.budget:
+            return False
+
+        if self.property_type:
+            room_type = (row.get("roomtype") or "").lower()
+            property_type = (row.get("propertytype") or "").lower()
+            if self.property_type not in room_type and self.property_type not in property_type:
+                return False
+
+        if self.location_terms:
+            haystack = " ".join(str(row.get(field) or "") for field in ("add1", "city", "zone")).lower()
+            if not any(term in haystack for term in self.location_terms):
+                return False
+
+        return True
+
+
+def bulk_search(
+    requirement_sets: Dict[Hashable, Dict],
+    listings: Optional[Iterable[Dict]] = None,
+    limit: int = 5,
+    gazetteer: Optional[LocationGazetteer] = None,
+    geo_index: Optional[GeoIndex] = None,
+) -> Dict[Hashable, List[Dict]]:
+    """
+    Matches many requirement sets against the active listings in one pass.
+
+    Requirements are bucketed by location id, so each listing is only checked
+    against the requirements for the places it is in (plus those without a
+    location). Each requirement keeps its ``limit`` cheapest matches, the same
+    ordering ``generate_sql_query`` uses.
+
+    Returns results keyed like ``requirement_sets``.
+    """
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    if geo_index is None:
+        geo_index = get_geo_index()
+    if listings is None:
+        listings = fetch_active_listings()
+
+    compiled = [
+        CompiledRequirement(key, requirements or {}, gazetteer, geo_index)
+        for key, requirements in requirement_sets.items()
+    ]
+
+    by_location: Dict[str, List[CompiledRequirement]] = {}
+    unlocated: List[CompiledRequirement] = []
+    for requirement in compiled:
+        if requirement.location_keys is None:
+            unlocated.append(requirement)
+        else:
+            for location_key in requirement.location_keys:
+                by_location.setdefault(location_key, []).append(requirement)
+
+    # Max-heaps (negated rent) holding each requirement's cheapest matches
+    heaps: Dict[Hashable, List] = {requirement.key: [] for requirement in compiled}
+    rows: List[Dict] = []
+
+    for row in listings:
+        index = len(rows)
+        rows.append(row)
+
+        candidates = list(unlocated)
+        seen = set()
+        for location_key in listing_location_keys(row):
+            for requirement in by_location.get(location_key, ()):
+                if id(requirement) not in seen:
+                    seen.add(id(requirement))
+                    candidates.append(requirement)
+
+        rent = float(row.get("rentmonth") or 0)
+        for requirement in candidates:
+            if not requirement.matches(row):
+                continue
+            heap = heaps[requirement.key]
+            entry = (-rent, -index)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    return {
+        key: [rows[-negated_index] for _, negated_index in sorted(heap, reverse=True)]
+        for key, heap in heaps.items()
+    }
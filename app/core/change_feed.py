@@ -0,0 +1,310 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.config.db_config import get_db_connection
+from app.core.alerts import get_alerts_engine, load_saved_searches_once
+from app.core.gazetteer import get_gazetteer
+from app.core.geo import get_geo_index
+from app.core.room_search import ROOMS_KEY_COLUMN, refresh_from_events as refresh_room_search
+from app.core.vector_search import refresh_from_events as refresh_vector_index
+
+logger = logging.getLogger(__name__)
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+@dataclass
+class ChangeEvent:
+    table: str
+    kind: str
+    key: Hashable
+    row: Optional[Dict] = None
+
+
+@dataclass
+class TableWatch:
+    """
+    How to follow one table.
+
+    ``key_column`` is the primary key; with ``updated_column`` set the feed
+    follows (updated, key) so inserts and updates are both seen, otherwise it
+    follows the auto-increment key and sees inserts only. ``select`` may be a
+    custom base SELECT (e.g. joining in property columns) without a WHERE.
+    """
+    table: str
+    key_column: str
+    updated_column: Optional[str] = None
+    select: Optional[str] = None
+
+    @property
+    def key_field(self) -> str:
+        return self.key_column.split(".")[-1]
+
+    @property
+    def updated_field(self) -> Optional[str]:
+        return self.updated_column.split(".")[-1] if self.updated_column else None
+
+    @property
+    def base_query(self) -> str:
+        return self.select or f"SELECT * FROM {self.table}"
+
+
+@dataclass
+class _WatchState:
+    high_water: Optional[Tuple] = None
+    known_keys: Set[Hashable] = field(default_factory=set)
+    primed: bool = False
+    disabled: bool = False
+
+
+Subscriber = Callable[[List[ChangeEvent]], None]
+
+
+class ChangeFeed:
+    """
+    Incremental change tracking by polling high-water marks.
+
+    Each poll reads only rows past the last seen (updated, key) or key, and
+    every ``delete_scan_every`` polls the key set is diffed to detect
+    deletes. Events are delivered per poll as one batch per subscriber.
+
+    Works with any DB-API connection factory; ``placeholder`` is the driver's
+    parameter marker ("%s" for MySQL, "?" for SQLite).
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any] = get_db_connection,
+        watches: Optional[List[TableWatch]] = None,
+        placeholder: str = "%s",
+        batch_size: int = 500,
+        delete_scan_every: int = 12,
+    ):
+        self.connect = connect
+        self.watches = list(watches or [])
+        self.placeholder = placeholder
+        self.batch_size = batch_size
+        self.delete_scan_every = delete_scan_every
+        self._state: Dict[str, _WatchState] = {watch.table: _WatchState() for watch in self.watches}
+        self._subscribers: List[Tuple[Subscriber, Optional[Set[str]]]] = []
+        self._polls = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, callback: Subscriber, tables: Optional[List[str]] = None):
+        """Registers a callback receiving each poll's events (optionally for some tables only)."""
+        self._subscribers.append((callback, set(tables) if tables else None))
+
+    @staticmethod
+    def _rows(cursor) -> List[Dict]:
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _missing_columns(cursor, watch: TableWatch) -> List[str]:
+        cursor.execute(f"SELECT * FROM {watch.table} LIMIT 0")
+        columns = {column[0].lower() for column in cursor.description}
+        cursor.fetchall()
+        wanted = [watch.key_field] + ([watch.updated_field] if watch.updated_field else [])
+        return [column for column in wanted if column.lower() not in columns]
+
+    def _prime(self, cursor, watch: TableWatch, state: _WatchState):
+        """
+        Records the current high-water mark and key set without emitting events.
+
+        A watch whose key or updated column is not in the table is disabled
+        for good with a single warning, rather than failing every poll.
+        """
+        missing = self._missing_columns(cursor, watch)
+        if missing:
+            state.disabled = True
+            logger.warning(
+                f"⚠️ Change feed not following {watch.table}: no column {', '.join(missing)} "
+                f"(set ROOMS_KEY_COLUMN / *_UPDATED_COLUMN to match the schema)"
+            )
+            return
+        cursor.execute(f"SELECT {watch.key_field} FROM {watch.table}")
+        state.known_keys = {row[0] for row in cursor.fetchall()}
+
+        if watch.updated_column:
+            cursor.execute(
+                f"SELECT {watch.updated_field}, {watch.key_field} FROM {watch.table} "
+                f"ORDER BY {watch.updated_field} DESC, {watch.key_field} DESC LIMIT 1"
+            )
+            row = cursor.fetchone()
+            state.high_water = tuple(row) if row else None
+        else:
+            state.high_water = (max(state.known_keys),) if state.known_keys else None
+        state.primed = True
+
+    def _poll_changes(self, cursor, watch: TableWatch, state: _WatchState) -> List[ChangeEvent]:
+        events = []
+        p = self.placeholder
+        while True:
+            if watch.updated_column:
+                order = f"ORDER BY {watch.updated_column}, {watch.key_column}"
+                if state.high_water is None:
+                    query, params = f"{watch.base_query} {order}", ()
+                else:
+                    query = (
+                        f"{watch.base_query} WHERE {watch.updated_column} > {p} "
+                        f"OR ({watch.updated_column} = {p} AND {watch.key_column} > {p}) {order}"
+                    )
+                    updated, key = state.high_water
+                    params = (updated, updated, key)
+            else:
+                order = f"ORDER BY {watch.key_column}"
+                if state.high_water is None:
+                    query, params = f"{watch.base_query} {order}", ()
+                else:
+                    query = f"{watch.base_query} WHERE {watch.key_column} > {p} {order}"
+                    params = state.high_water
+
+            cursor.execute(f"{query} LIMIT {self.batch_size}", params)
+            rows = self._rows(cursor)
+            for row in rows:
+                key = row[watch.key_field]
+                kind = UPDATE if key in state.known_keys else INSERT
+                state.known_keys.add(key)
+                events.append(ChangeEvent(watch.table, kind, key, row))
+
+            if rows:
+                last = rows[-1]
+                if watch.updated_column:
+                    state.high_water = (last[watch.updated_field], last[watch.key_field])
+                else:
+                    state.high_water = (last[watch.key_field],)
+            if len(rows) < self.batch_size:
+                return events
+
+    def _scan_deletes(self, cursor, watch: TableWatch, state: _WatchState) -> List[ChangeEvent]:
+        cursor.execute(f"SELECT {watch.key_field} FROM {watch.table}")
+        current = {row[0] for row in cursor.fetchall()}
+        deleted = state.known_keys - current
+        state.known_keys &= current
+        return [ChangeEvent(watch.table, DELETE, key) for key in deleted]
+
+    def poll_once(self) -> List[ChangeEvent]:
+        """Reads every change since the previous poll and dispatches it."""
+        connection = self.connect()
+        if not connection:
+            logger.error("❌ Change feed could not connect to the database")
+            return []
+
+        self._polls += 1
+        scan_deletes = self.delete_scan_every and self._polls % self.delete_scan_every == 0
+        events: List[ChangeEvent] = []
+        cursor = connection.cursor()
+        try:
+            for watch in self.watches:
+                state = self._state[watch.table]
+                if state.disabled:
+                    continue
+                try:
+                    if not state.primed:
+                        self._prime(cursor, watch, state)
+                        continue
+                    events.extend(self._poll_changes(cursor, watch, state))
+                    if scan_deletes:
+                        events.extend(self._scan_deletes(cursor, watch, state))
+                except Exception as e:
+                    logger.error(f"❌ Change feed failed polling {watch.table}: {e}")
+        finally:
+            cursor.close()
+            connection.close()
+
+        self._dispatch(events)
+        return events
+
+    def _dispatch(self, events: List[ChangeEvent]):
+        if not events:
+            return
+        for callback, tables in self._subscribers:
+            selected = [event for event in events if tables is None or event.table in tables]
+            if not selected:
+                continue
+            try:
+                callback(selected)
+            except Exception as e:
+                logger.error(f"❌ Change feed subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+    def start(self, interval: float):
+        """Polls every ``interval`` seconds on a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.poll_once()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+# Listing tables as configured for this deployment. Leave *_UPDATED_COLUMN
+# empty to follow the auto-increment key (inserts only). The defaults are
+# checked against the schema on the first poll; a table missing them is
+# not followed (one warning is logged).
+ROOMS_UPDATED_COLUMN = os.getenv("ROOMS_UPDATED_COLUMN", "updated_at")
+PROPERTIES_UPDATED_COLUMN = os.getenv("PROPERTIES_UPDATED_COLUMN", "updated_at")
+CHANGE_FEED_INTERVAL = float(os.getenv("CHANGE_FEED_INTERVAL", "10"))
+
+
+def _refresh_location_indexes(events: List[ChangeEvent]):
+    geo_index = get_geo_index()
+    for event in events:
+        if event.table == "properties" and event.kind == DELETE:
+            geo_index.remove_property(event.key)
+
+    rows = [event.row for event in events if event.row]
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        gazetteer.add_values({
+            kind: [row.get(kind) for row in rows if row.get(kind)]
+            for kind in ("zone", "city", "buildingname", "nearestmrt", "add1")
+        })
+    for row in rows:
+        geo_index.add_listing(row)
+
+
+def _notify_saved_searches(events: List[ChangeEvent]):
+    rows = [event.row for event in events if event.kind in (INSERT, UPDATE) and event.row]
+    if rows:
+        # Startup normally loaded them already; with warm-up off this is the first chance
+        load_saved_searches_once()
+        get_alerts_engine().notify(rows)
+
+
+def create_listing_feed() -> ChangeFeed:
+    """Feed over rooms (joined with their property's location columns) and properties."""
+    rooms_updated = f"r.{ROOMS_UPDATED_COLUMN}" if ROOMS_UPDATED_COLUMN else None
+    feed = ChangeFeed(watches=[
+        TableWatch(
+            "rooms",
+            key_column=f"r.{ROOMS_KEY_COLUMN}",
+            updated_column=rooms_updated,
+            select="""
+                SELECT r.*, p.zone, p.city, p.add1, p.buildingname
+                FROM rooms r
+                JOIN properties p ON r.propertyid = p.propertyid
+            """,
+        ),
+        TableWatch("properties", key_column="propertyid", updated_column=PROPERTIES_UPDATED_COLUMN or None),
+    ])
+    feed.subscribe(_refresh_location_indexes)
+    feed.subscribe(_notify_saved_searches, tables=["rooms"])
+    feed.subscribe(refresh_room_search)
+    feed.subscribe(refresh_vector_index, tables=["rooms"])
+    return feed
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.core.llm_resilience import Deadline
+
+# A burst ends after this much silence from the user...
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "1.5"))
+# ...or once its first message has waited this long
+COALESCE_MAX_WAIT_SECONDS = float(os.getenv("COALESCE_MAX_WAIT_SECONDS", "4"))
+# Upper bound for processing one turn; cancelling the turn exhausts it early
+TURN_BUDGET_SECONDS = 60.0
+
+
+@dataclass
+class Turn:
+    """One coalesced burst of messages, processed as a single chat turn."""
+    user_id: str
+    messages: List[str]
+    deadline: Deadline = field(default_factory=lambda: Deadline(TURN_BUDGET_SECONDS))
+    committed: bool = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.messages)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.deadline.cancelled
+
+    def commit(self) -> bool:
+        """Marks the reply as going out; False if the turn was superseded first."""
+        if self.cancelled:
+            return False
+        self.committed = True
+        return True
+
+
+@dataclass
+class _Burst:
+    messages: List[str]
+    first_at: float
+    last_at: float
+    generation: int = 0
+
+
+class MessageCoalescer:
+    """
+    Per-user debounce for bursts of short messages.
+
+    Every message of a burst waits in ``collect``; once the user has been
+    quiet for ``window`` seconds (or the burst is ``max_wait`` old) the
+    request carrying the latest message gets one ``Turn`` with all texts and
+    the others get None. A message arriving while the user's previous turn
+    is still being processed cancels that turn (its deadline is exhausted,
+    so it stops calling the LLM) and is merged with its messages.
+    ``turn_lock`` serializes turns per user.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, window: float = COALESCE_WINDOW_SECONDS, max_wait: float = COALESCE_MAX_WAIT_SECONDS):
+        self.window = window
+        self.max_wait = max_wait
+        self._bursts: Dict[str, _Burst] = {}
+        self._in_flight: Dict[str, Turn] = {}
+        # Dropped once no request holds or waits for a user's lock
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.messages_received = 0
+        self.turns = 0
+        self.messages_merged = 0
+        self.turns_cancelled = 0
+
+    def turn_lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _take_superseded(self, user_id: str) -> List[str]:
+        """Cancels the user's uncommitted in-flight turn and returns its messages."""
+        turn = self._in_flight.get(user_id)
+        if turn is None or turn.committed or turn.cancelled:
+            return []
+        turn.deadline.cancel()
+        self._in_flight.pop(user_id, None)
+        self.turns_cancelled += 1
+        return list(turn.messages)
+
+    async def collect(self, user_id: str, text: str) -> Optional[Turn]:
+        """Waits out the burst; returns the Turn for the caller to process, or None if merged."""
+        self.messages_received += 1
+        now = time.monotonic()
+        burst = self._bursts.get(user_id)
+        if burst is None:
+            burst = _Burst(self._take_superseded(user_id), first_at=now, last_at=now)
+            self._bursts[user_id] = burst
+        burst.messages.append(text)
+        burst.last_at = now
+        burst.generation += 1
+        generation = burst.generation
+
+        while True:
+            flush_at = min(burst.last_at + self.window, burst.first_at + self.max_wait)
+            delay = flush_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if burst.generation != generation or self._bursts.get(user_id) is not burst:
+                # A later message carries the burst (or it was already flushed)
+                self.messages_merged += 1
+                return None
+            if time.monotonic() >= min(burst.last_at + self.window, burst.first_at + self.max_wait):
+                break
+
+        del self._bursts[user_id]
+        turn = Turn(user_id, burst.messages)
+        self._in_flight[user_id] = turn
+        self.turns += 1
+        return turn
+
+    def finish(self, turn: Turn):
+        if self._in_flight.get(turn.user_id) is turn:
+            del self._in_flight[turn.user_id]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "messages_received": self.messages_received,
+            "turns": self.turns,
+            "messages_merged": self.messages_merged,
+            "turns_cancelled": self.turns_cancelled,
+            "messages_per_turn": self.messages_received / self.turns if self.turns else 0.0,
+            "window_seconds": self.window,
+            "max_wait_seconds": self.max_wait,
+        }
@@ -1,37 +1,19 @@
 from mysql.connector import Error, connect
 from app.config.db_config import get_db_connection
-import re
+from app.core.replica_router import get_read_connection
+from app.core.query_profiler import get_query_profiler
+from app.core.sql_validator import get_sql_validator
+import time
+from typing import Optional, Sequence
 
 def validate_read_query(query: str) -> bool:
-    """Ensures only safe SELECT queries are executed."""
-    query = query.strip().lower()
-    
-    # Basic validation
-    if not query.startswith("select"):
-        print("❌ Query must start with SELECT")
-        return False
-        
-    # Prevent any modifications
-    dangerous_keywords = ["insert", "update", "delete", "drop", "truncate", "alter"]
-    if any(keyword in query for keyword in dangerous_keywords):
-        print("❌ Query contains dangerous keywords")
-        return False
-        
-    # Update valid tables to match your actual schema
-    valid_tables = {"properties", "rooms"}
-    
-    # Update table validation to handle JOINs
-    table_matches = re.findall(r'from\s+(\w+)|join\s+(\w+)', query.lower())
-    tables_in_query = {match[0] or match[1] for match in table_matches}
-    
-    if not all(table in valid_tables for table in tables_in_query):
-        print(f"❌ Invalid tables in query. Valid tables are: {valid_tables}")
-        print(f"Tables found in query: {tables_in_query}")
-        return False
-        
-    return True
+    """Ensures only safe SELECT queries are executed (see app.core.sql_validator)."""
+    verdict = get_sql_validator().validate(query)
+    if not verdict.ok:
+        print(f"❌ Query rejected: {verdict.reason}")
+    return verdict.ok
 
-def execute_query(query: str):
+def execute_query(query: str, params: Optional[Sequence] = None):
     """Executes a safe read-only SQL query and returns results as a list of dictionaries."""
     print(f"🔍 Executing query: {query}")  # Debug log
     
@@ -39,16 +21,24 @@ def execute_query(query: str):
         print("❌ Query validation failed")  # Debug log
         return {"error": "Only safe SELECT queries are allowed."}
 
-    connection = get_db_connection()
+    # A replica when one is healthy and has this session's writes (see app.core.replica_router)
+    connection = get_read_connection()
     if not connection:
         print("❌ Database connection failed")  # Debug log
         return {"error": "Database connection failed."}
 
     cursor = connection.cursor(dictionary=True)
     
+    profiler = get_query_profiler()
+    started = time.perf_counter()
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
+        try:
+            cursor.execute(query, params or ())
+            results = cursor.fetchall()
+        except Error:
+            profiler.record(query, params, time.perf_counter() - started, error=True)
+            raise
+        profiler.record(query, params, time.perf_counter() - started, rows=len(results))
         print(f"✅ Query executed successfully. Found {len(results)} results")  # Debug count
         
         if len(results) == 0:
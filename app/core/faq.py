@@ -0,0 +1,240 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.core.llm_gateway import percentile
+
+FAQ_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "faq.json")
+
+# faq.json is only used once the business has signed off on it: its answers
+# are then sent verbatim or given to the LLM as context. Until then the
+# unreviewed policy text is not used at all and every lookup misses
+FAQ_DIRECT_ANSWERS = os.getenv("FAQ_DIRECT_ANSWERS", "0") == "1"
+# Confidence (0-1) above which the curated answer is sent as is (with FAQ_DIRECT_ANSWERS)...
+FAQ_ANSWER_CONFIDENCE = float(os.getenv("FAQ_ANSWER_CONFIDENCE", "0.6"))
+# ...and above which the top passages are handed to the LLM as context
+FAQ_CONTEXT_CONFIDENCE = float(os.getenv("FAQ_CONTEXT_CONFIDENCE", "0.25"))
+FAQ_CONTEXT_PASSAGES = 3
+# With FAQ_DIRECT_ANSWERS, a match this close to the answer threshold is
+# sent when the LLM can't phrase a reply; weaker ones get the generic fallback
+FAQ_FALLBACK_CONFIDENCE = float(os.getenv("FAQ_FALLBACK_CONFIDENCE", "0.5"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+ANSWERED = "answered"
+ASSISTED = "assisted"
+MISSED = "missed"
+
+STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "we", "you", "your", "it", "is", "are", "am", "be", "do", "does", "did",
+    "to", "of", "in", "on", "for", "with", "and", "or", "if", "at", "by", "this", "that", "there", "any",
+    "can", "could", "will", "would", "should", "how", "what", "when", "which", "who", "please", "pls",
+    "much", "many", "need", "get", "have", "has", "want", "like", "know", "tell", "about",
+}
+
+_WORDS = re.compile(r"[a-z0-9]+")
+# "that room", "this unit": a question about one listing, which no FAQ entry answers
+_LISTING_REFERENCE = re.compile(r"\b(this|that|these|those)\s+(room|unit|flat|apartment|condo|place|property|house|listing)s?\b")
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so "deposits"/"deposit", "viewing"/"view" and "negotiated"/"negotiate" meet."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    if len(word) > 4 and word.endswith("e"):
+        return word[:-1]
+    return word
+
+
+def analyze(text: str) -> List[str]:
+    return [stem(word) for word in _WORDS.findall(text.lower()) if word not in STOPWORDS]
+
+
+@dataclass
+class FAQEntry:
+    id: str
+    question: str
+    answer: str
+    alternates: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+
+    @property
+    def search_text(self) -> str:
+        return " ".join([self.question, *self.alternates, *self.tags])
+
+
+@dataclass
+class FAQResult:
+    kind: str
+    confidence: float
+    entry: Optional[FAQEntry] = None
+    passages: List[FAQEntry] = field(default_factory=list)
+    # The entry may stand in for an LLM reply that can't be produced
+    usable_as_fallback: bool = False
+
+    @property
+    def answer(self) -> Optional[str]:
+        return self.entry.answer if self.kind == ANSWERED and self.entry else None
+
+    @property
+    def fallback_answer(self) -> Optional[str]:
+        return self.entry.answer if self.usable_as_fallback and self.entry else None
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of term -> [(doc, term frequency)]."""
+
+    def __init__(self, documents: List[List[str]], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / self.size if self.size else 0.0
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_terms = [set(document) for document in documents]
+        for doc, terms in enumerate(documents):
+            counts: Dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                self.postings.setdefault(term, []).append((doc, count))
+        self.max_idf = self._idf(0)
+
+    def _idf(self, document_frequency: int) -> float:
+        return math.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def idf(self, term: str) -> float:
+        return self._idf(len(self.postings.get(term, ())))
+
+    def scores(self, terms: List[str]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(len(postings))
+            for doc, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / self.average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+        return scores
+
+    def coverage(self, terms: List[str], doc: int) -> float:
+        """
+        Share of the query's idf weight found in the document (0-1); unknown
+        terms weigh the highest idf, so questions about things the FAQ never
+        mentions get low coverage. Repeats in the document don't count, so a
+        single tag hit can't pass for a full match.
+        """
+        weights = {term: self.idf(term) if term in self.postings else self.max_idf for term in set(terms)}
+        total = sum(weights.values())
+        if not total:
+            return 0.0
+        return sum(weight for term, weight in weights.items() if term in self.doc_terms[doc]) / total
+
+
+class FAQRetriever:
+    """
+    Curated FAQ answers looked up with BM25 over questions, paraphrases and tags.
+
+    ``lookup`` grades the best match: at ``answer_confidence`` or above
+    the curated answer is used directly; above ``context_confidence`` the
+    top entries are returned as passages for the LLM; below, it's a miss.
+    Questions about a specific listing are never answered directly, and
+    without ``direct_answers`` (no sign-off) every lookup is a miss.
+    """
+
+    def __init__(
+        self,
+        entries: List[FAQEntry],
+        answer_confidence: float = FAQ_ANSWER_CONFIDENCE,
+        context_confidence: float = FAQ_CONTEXT_CONFIDENCE,
+        direct_answers: bool = FAQ_DIRECT_ANSWERS,
+        fallback_confidence: float = FAQ_FALLBACK_CONFIDENCE,
+    ):
+        self.entries = entries
+        self.answer_confidence = answer_confidence
+        self.context_confidence = context_confidence
+        self.direct_answers = direct_answers
+        self.fallback_confidence = fallback_confidence
+        self.index = BM25Index([analyze(entry.search_text) for entry in entries])
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.outcomes = {ANSWERED: 0, ASSISTED: 0, MISSED: 0}
+
+    def search(self, query: str, k: int = FAQ_CONTEXT_PASSAGES) -> List[Tuple[float, FAQEntry]]:
+        """Top ``k`` entries by BM25 with their confidence (query coverage)."""
+        terms = analyze(query)
+        ranked = sorted(self.index.scores(terms).items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.index.coverage(terms, doc), self.entries[doc]) for doc, _ in ranked]
+
+    def lookup(self, query: str) -> FAQResult:
+        started = time.perf_counter()
+        matches = self.search(query)
+        confidence = matches[0][0] if matches else 0.0
+        direct = not _LISTING_REFERENCE.search(query.lower())
+        if not self.direct_answers:
+            result = FAQResult(MISSED, confidence)
+        elif confidence >= self.answer_confidence and direct:
+            result = FAQResult(ANSWERED, confidence, matches[0][1], [entry for _, entry in matches], True)
+        elif confidence >= self.context_confidence:
+            result = FAQResult(
+                ASSISTED, confidence, matches[0][1],
+                [entry for score, entry in matches if score >= self.context_confidence],
+                direct and confidence >= self.fallback_confidence,
+            )
+        else:
+            result = FAQResult(MISSED, confidence)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+            self.outcomes[result.kind] += 1
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            total = sum(self.outcomes.values())
+            return {
+                "entries": len(self.entries),
+                "lookups": total,
+                **self.outcomes,
+                "hit_rate": self.outcomes[ANSWERED] / total if total else 0.0,
+                "assisted_rate": self.outcomes[ASSISTED] / total if total else 0.0,
+                "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+                "latency_p95_ms": percentile(latencies, 0.95) * 1000,
+            }
+
+
+def format_passages(entries: List[FAQEntry]) -> str:
+    """FAQ entries as compact prompt context."""
+    return "\n\n".join(f"Q: {entry.question}\nA: {entry.answer}" for entry in entries)
+
+
+def load_faq_entries(path: str = FAQ_FILE) -> List[FAQEntry]:
+    with open(path, encoding="utf-8") as handle:
+        return [FAQEntry(**entry) for entry in json.load(handle)]
+
+
+_retriever: Optional[FAQRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_faq_retriever() -> FAQRetriever:
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = FAQRetriever(load_faq_entries())
+    return _retriever
@@ -0,0 +1,380 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from mysql.connector import Error
+from app.config.db_config import get_db_connection
+
+# Location columns the gazetteer is built from, keyed by location kind.
+LOCATION_COLUMNS = {
+    "zone": "p.zone",
+    "city": "p.city",
+    "buildingname": "p.buildingname",
+    "nearestmrt": "r.nearestmrt",
+    "add1": "p.add1",
+}
+
+# Words that never identify a location on their own ("near the", "in", ...)
+STOPWORDS = {
+    "a", "an", "and", "any", "area", "around", "at", "below", "budget", "by",
+    "close", "find", "for", "from", "i", "in", "is", "looking", "me", "min",
+    "mins", "minutes", "my", "near", "nearby", "need", "of", "or", "please",
+    "room", "rooms", "show", "the", "to", "under", "walk", "want", "with",
+    "within", "flat", "flats", "apartment", "condo", "house", "studio",
+}
+
+# Generic suffixes stripped to build an extra alias ("Tampines MRT" -> "tampines")
+GENERIC_SUFFIXES = ("mrt station", "mrt", "station", "interchange", "lrt")
+
+# Street words that are too generic to be useful as add1 tokens
+STREET_WORDS = {
+    "ave", "avenue", "blk", "block", "road", "rd", "street", "st", "drive",
+    "dr", "lane", "ln", "crescent", "cres", "close", "way", "walk", "place",
+    "singapore", "unit", "level",
+}
+
+MAX_PHRASE_WORDS = 4
+MIN_FUZZY_LENGTH = 4
+
+
+@dataclass(frozen=True)
+class LocationMatch:
+    """A piece of user text resolved to a canonical location value."""
+    kind: str
+    value: str
+    matched_text: str
+    distance: int = 0
+
+    @property
+    def location_id(self) -> str:
+        """Stable identifier of the canonical location, e.g. ``zone:East``."""
+        return f"{self.kind}:{self.value}"
+
+
+def normalize_location(text: str) -> str:
+    """Lowercases text and collapses everything but letters and digits to single spaces."""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Edit distance between two strings, with an optional early cut-off."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class NGramIndex:
+    """
+    Bigram index for typo-tolerant lookups.
+
+    A word within edit distance k of the query shares at least
+    ``len(grams(query)) - 2k`` of its bigrams, so only keys passing that count
+    (and the length filter) are checked with ``levenshtein``.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}
+        self._by_length: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(words) for words in self._by_length.values())
+
+    @staticmethod
+    def _grams(word: str) -> Set[str]:
+        padded = f"#{word}#"
+        return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+    def add(self, word: str):
+        if word in self._by_length.get(len(word), ()):
+            return
+        self._by_length.setdefault(len(word), set()).add(word)
+        for gram in self._grams(word):
+            self._postings.setdefault(gram, set()).add(word)
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Returns (distance, word) pairs within ``max_distance``, closest first."""
+        grams = self._grams(word)
+        min_shared = len(grams) - 2 * max_distance
+        lengths = range(len(word) - max_distance, len(word) + max_distance + 1)
+
+        if min_shared <= 0:
+            candidates = set().union(*(self._by_length.get(length, set()) for length in lengths))
+        else:
+            counts: Dict[str, int] = {}
+            for gram in grams:
+                for candidate in self._postings.get(gram, ()):
+                    counts[candidate] = counts.get(candidate, 0) + 1
+            candidates = {
+                candidate for candidate, count in counts.items()
+                if count >= min_shared and len(candidate) in lengths
+            }
+
+        results = []
+        for candidate in candidates:
+            distance = levenshtein(word, candidate, max_distance)
+            if distance <= max_distance:
+                results.append((distance, candidate))
+        return sorted(results)
+
+
+def _allowed_distance(key: str) -> int:
+    """Typo budget for a phrase: none for short words, more for long names."""
+    length = len(key.replace(" ", ""))
+    if length < MIN_FUZZY_LENGTH:
+        return 0
+    if length < 9:
+        return 1
+    return 2
+
+
+class LocationGazetteer:
+    """
+    In-memory index of every known location value.
+
+    Phrases from user text are resolved with an exact hash lookup first and a
+    bigram-index search second, so "tampines", "Tampnies" and "near tampines mrt"
+    all land on the canonical values stored in the database.
+    """
+
+    def __init__(self, vocabulary: Dict[str, Iterable[str]]):
+        self._entries: Dict[str, Set[Tuple[str, str]]] = {}
+        self._fuzzy = NGramIndex()
+        self._lock = threading.Lock()
+        self.add_values(vocabulary)
+
+    def add_values(self, vocabulary: Dict[str, Iterable[str]]):
+        """Indexes more location values, e.g. from newly inserted listings."""
+        with self._lock:
+            self._add_vocabulary(vocabulary)
+
+    def _add_vocabulary(self, vocabulary: Dict[str, Iterable[str]]):
+        for kind, values in vocabulary.items():
+            for value in values:
+                if value is None:
+                    continue
+                value = str(value).strip()
+                if not value:
+                    continue
+                if kind == "add1":
+                    for token in self._address_tokens(value):
+                        self._add_key(token, kind, token)
+                else:
+                    for key in self._aliases(value):
+                        self._add_key(key, kind, value)
+
+    @staticmethod
+    def _aliases(value: str) -> Set[str]:
+        key = normalize_location(value)
+        aliases = {key} if key else set()
+        for suffix in GENERIC_SUFFIXES:
+            if key.endswith(" " + suffix):
+                aliases.add(key[: -len(suffix) - 1].strip())
+        return {alias for alias in aliases if alias and alias not in STOPWORDS}
+
+    @staticmethod
+    def _address_tokens(value: str) -> Set[str]:
+        return {
+            token for token in normalize_location(value).split()
+            if len(token) >= 3
+            and not token.isdigit()
+            and not any(char.isdigit() for char in token)
+            and token not in STOPWORDS
+            and token not in STREET_WORDS
+        }
+
+    def _add_key(self, key: str, kind: str, value: str):
+        if key not in self._entries:
+            self._entries[key] = set()
+            self._fuzzy.add(key)
+        self._entries[key].add((kind, value))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, phrase: str) -> Tuple[int, List[Tuple[str, str]]]:
+        """Resolves a single phrase; returns (distance, [(kind, value), ...])."""
+        key = normalize_location(phrase)
+        if not key:
+            return 0, []
+        # add_values runs on the change-feed thread; the sets below must not change mid-read
+        with self._lock:
+            if key in self._entries:
+                return 0, sorted(self._entries[key])
+
+            max_distance = _allowed_distance(key)
+            if max_distance == 0:
+                return 0, []
+
+            hits = self._fuzzy.search(key, max_distance)
+            if not hits:
+                return 0, []
+            best_distance = hits[0][0]
+            entries = set()
+            for distance, candidate in hits:
+                if distance == best_distance:
+                    entries.update(self._entries[candidate])
+        return best_distance, sorted(entries)
+
+    def resolve(self, text: str) -> List[LocationMatch]:
+        """
+        Finds every location mentioned in free text.
+
+        Word n-grams are tried longest first so "tampines mrt" wins over
+        "tampines"; spans made only of stopwords are never looked up.
+        """
+        words = normalize_location(text).split()
+        consumed = [False] * len(words)
+        matches: List[LocationMatch] = []
+
+        for size in range(min(MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                end = start + size
+                if any(consumed[start:end]):
+                    continue
+                span = words[start:end]
+                if span[0] in STOPWORDS or span[-1] in STOPWORDS or span[0].isdigit():
+                    continue
+
+                phrase = " ".join(span)
+                distance, entries = self.lookup(phrase)
+                if not entries:
+                    continue
+
+                for kind, value in entries:
+                    matches.append(LocationMatch(kind, value, phrase, distance))
+                for index in range(start, end):
+                    consumed[index] = True
+
+        return matches
+
+
+def location_sql_condition(
+    matches: List[LocationMatch],
+    columns: Dict[str, str] = LOCATION_COLUMNS,
+    lowercase: bool = False,
+) -> Tuple[Optional[str], List[str]]:
+    """
+    Builds a parameterized WHERE fragment for resolved locations.
+
+    Canonical values use IN predicates on the raw columns so MySQL can use
+    their indexes; address tokens fall back to LIKE since add1 is free text.
+    ``columns`` maps location kinds to columns; with ``lowercase`` the values
+    are compared lowercased (for the normalized ``room_search`` columns).
+    Returns the fragment (with %s placeholders) and its parameters.
+    """
+    by_kind: Dict[str, List[str]] = {}
+    for match in matches:
+        value = match.value.strip().lower() if lowercase else match.value
+        by_kind.setdefault(match.kind, [])
+        if value not in by_kind[match.kind]:
+            by_kind[match.kind].append(value)
+
+    conditions = []
+    params: List[str] = []
+    for kind, values in by_kind.items():
+        column = columns[kind]
+        if kind == "add1":
+            for value in values:
+                conditions.append(f"{column} LIKE %s")
+                params.append(f"%{value}%")
+        else:
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+
+    if not conditions:
+        return None, []
+    return "(" + " OR ".join(conditions) + ")", params
+
+
+def sql_literal(value) -> str:
+    """Quotes a value for inclusion in a generated MySQL statement."""
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def load_location_vocabulary() -> Optional[Dict[str, List[str]]]:
+    """Reads the distinct location values the gazetteer is built from."""
+    connection = get_db_connection()
+    if not connection:
+        return None
+
+    cursor = connection.cursor()
+    queries = {
+        "zone": "SELECT DISTINCT zone FROM properties WHERE zone IS NOT NULL AND zone <> ''",
+        "city": "SELECT DISTINCT city FROM properties WHERE city IS NOT NULL AND city <> ''",
+        "buildingname": "SELECT DISTINCT buildingname FROM properties WHERE buildingname IS NOT NULL AND buildingname <> ''",
+        "add1": "SELECT DISTINCT add1 FROM properties WHERE add1 IS NOT NULL AND add1 <> ''",
+        "nearestmrt": "SELECT DISTINCT nearestmrt FROM rooms WHERE nearestmrt IS NOT NULL AND nearestmrt <> ''",
+    }
+
+    try:
+        vocabulary = {}
+        for kind, query in queries.items():
+            cursor.execute(query)
+            vocabulary[kind] = [row[0] for row in cursor.fetchall()]
+        return vocabulary
+    except Error as e:
+        print(f"❌ Error loading location vocabulary: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+_gazetteer: Optional[LocationGazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[LocationGazetteer]:
+    """Returns the shared gazetteer, building it from the database on first use."""
+    global _gazetteer
+    if _gazetteer is not None:
+        return _gazetteer
+
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            vocabulary = load_location_vocabulary()
+            if vocabulary is None:
+                return None
+            _gazetteer = LocationGazetteer(vocabulary)
+            print(f"📍 Location gazetteer built with {len(_gazetteer)} keys")
+    return _gazetteer
+
+
+def refresh_gazetteer() -> Optional[LocationGazetteer]:
+    """Rebuilds the shared gazetteer from the current database contents."""
+    global _gazetteer
+    vocabulary = load_location_vocabulary()
+    if vocabulary is None:
+        return _gazetteer
+    rebuilt = LocationGazetteer(vocabulary)
+    with _gazetteer_lock:
+        _gazetteer = rebuilt
+    return _gazetteer
+
+
+def resolve_locations(text: str) -> List[LocationMatch]:
+    """Resolves locations in text with the shared gazetteer (empty if unavailable)."""
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return []
+    return gazetteer.resolve(text)
@@ -0,0 +1,367 @@
+import csv
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from mysql.connector import Error
+from app.config.db_config import get_db_connection
+from app.core.gazetteer import LocationGazetteer
+
+TRANSIT_STOPS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "transit_stops.csv")
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE_LAT = 110_574
+METERS_PER_DEGREE_LON = 111_320
+
+WALKING_METERS_PER_MINUTE = 80
+DEFAULT_NEAR_RADIUS_M = 1000
+WALKING_DISTANCE_RADIUS_M = 800
+
+# Backoff between attempts to load property coordinates while none have loaded
+GEO_RELOAD_BACKOFF_SECONDS = float(os.getenv("GEO_RELOAD_BACKOFF_SECONDS", "30"))
+GEO_RELOAD_MAX_BACKOFF_SECONDS = float(os.getenv("GEO_RELOAD_MAX_BACKOFF_SECONDS", "600"))
+
+# Phrases that turn a place name into a proximity search ("near Bishan MRT")
+PROXIMITY_TRIGGERS = re.compile(r"\b(near|nearby|close to|next to|walking distance|within)\b", re.IGNORECASE)
+MINUTES_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(?:min|mins|minute|minutes)\b", re.IGNORECASE)
+DISTANCE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(km|kilometers?|kilometres?|m|meters?|metres?)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class TransitStop:
+    kind: str
+    name: str
+    latitude: float
+    longitude: float
+
+
+@dataclass(frozen=True)
+class ProximityQuery:
+    anchor: TransitStop
+    radius_m: float
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid for radius and k-nearest queries.
+
+    Points are bucketed into square-ish cells of ``cell_size_m``; a query only
+    visits the cells overlapping its search area, so lookups stay independent
+    of the total number of points. The change feed updates the index while
+    request threads query it, so every method holds the index's lock.
+    """
+
+    def __init__(self, cell_size_m: float = 500):
+        self.cell_size_m = cell_size_m
+        self._cell_deg = cell_size_m / METERS_PER_DEGREE_LON
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self._points: Dict[Hashable, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg)
+
+    def insert(self, item_id: Hashable, lat: float, lon: float):
+        with self._lock:
+            self._discard(item_id)
+            self._points[item_id] = (lat, lon)
+            self._cells.setdefault(self._cell(lat, lon), {})[item_id] = (lat, lon)
+
+    def position(self, item_id: Hashable) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self._points.get(item_id)
+
+    def remove(self, item_id: Hashable):
+        with self._lock:
+            self._discard(item_id)
+
+    def _discard(self, item_id: Hashable):
+        """Removes a point; the caller holds the lock."""
+        point = self._points.pop(item_id, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(item_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[Tuple[float, Hashable]]:
+        """All points within ``radius_m`` as (distance, id), nearest first."""
+        d_lat = radius_m / METERS_PER_DEGREE_LAT
+        d_lon = radius_m / (METERS_PER_DEGREE_LON * max(math.cos(math.radians(lat)), 1e-6))
+        min_row, min_col = self._cell(lat - d_lat, lon - d_lon)
+        max_row, max_col = self._cell(lat + d_lat, lon + d_lon)
+
+        results = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    for item_id, (item_lat, item_lon) in self._cells.get((row, col), {}).items():
+                        distance = haversine_m(lat, lon, item_lat, item_lon)
+                        if distance <= radius_m:
+                            results.append((distance, item_id))
+
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[Tuple[float, Hashable]]:
+        """The ``k`` nearest points as (distance, id), searching outward ring by ring."""
+        with self._lock:
+            return self._nearest(lat, lon, k)
+
+    def _nearest(self, lat: float, lon: float, k: int) -> List[Tuple[float, Hashable]]:
+        if not self._points or k <= 0:
+            return []
+
+        center_row, center_col = self._cell(lat, lon)
+        rows = [cell[0] for cell in self._cells]
+        cols = [cell[1] for cell in self._cells]
+        max_ring = max(
+            abs(center_row - min(rows)), abs(center_row - max(rows)),
+            abs(center_col - min(cols)), abs(center_col - max(cols)),
+        )
+
+        # Narrowest cell side in meters, used to bound the distance of unvisited rings.
+        cell_side_m = self.cell_size_m * min(
+            METERS_PER_DEGREE_LAT / METERS_PER_DEGREE_LON, math.cos(math.radians(lat))
+        )
+        found: List[Tuple[float, Hashable]] = []
+        for ring in range(max_ring + 1):
+            for row in range(center_row - ring, center_row + ring + 1):
+                for col in range(center_col - ring, center_col + ring + 1):
+                    if max(abs(row - center_row), abs(col - center_col)) != ring:
+                        continue
+                    for item_id, (item_lat, item_lon) in self._cells.get((row, col), {}).items():
+                        found.append((haversine_m(lat, lon, item_lat, item_lon), item_id))
+
+            found.sort(key=lambda result: result[0])
+            # Anything in a further ring is at least ``ring`` whole cells away.
+            if len(found) >= k and found[k - 1][0] <= ring * cell_side_m:
+                break
+
+        return found[:k]
+
+
+def load_transit_stops(path: str = TRANSIT_STOPS_FILE) -> List[TransitStop]:
+    """Reads the bundled MRT station / bus stop coordinate table."""
+    with open(path, newline="", encoding="utf-8") as handle:
+        rows = csv.DictReader(line for line in handle if not line.startswith("#"))
+        return [
+            TransitStop(row["kind"], row["name"], float(row["latitude"]), float(row["longitude"]))
+            for row in rows
+        ]
+
+
+def parse_radius_m(text: str) -> Optional[float]:
+    """Reads an explicit walking time or distance ("10 minutes", "500m", "1.5 km")."""
+    minutes = MINUTES_PATTERN.search(text)
+    if minutes:
+        return float(minutes.group(1)) * WALKING_METERS_PER_MINUTE
+
+    distance = DISTANCE_PATTERN.search(text)
+    if distance:
+        value = float(distance.group(1))
+        return value * 1000 if distance.group(2).lower().startswith("k") else value
+
+    if "walking distance" in text.lower():
+        return WALKING_DISTANCE_RADIUS_M
+    return None
+
+
+class GeoIndex:
+    """Transit stops plus property coordinates behind a single spatial index."""
+
+    def __init__(self, stops: Iterable[TransitStop]):
+        self.stops = list(stops)
+        self._stops_by_name = {stop.name: stop for stop in self.stops}
+        vocabulary: Dict[str, List[str]] = {}
+        for stop in self.stops:
+            vocabulary.setdefault(stop.kind, []).append(stop.name)
+        self._stop_names = LocationGazetteer(vocabulary)
+        self.properties = GridIndex()
+
+    def find_stop(self, text: str) -> Optional[TransitStop]:
+        """Resolves a station or bus stop mentioned in text, preferring MRT stations."""
+        matches = self._stop_names.resolve(text)
+        if not matches:
+            return None
+        best = min(matches, key=lambda match: (match.distance, match.kind != "mrt", -len(match.matched_text)))
+        return self._stops_by_name[best.value]
+
+    def parse_proximity(self, text: str) -> Optional[ProximityQuery]:
+        """Detects "near X" / "within N minutes of X" style requests."""
+        if not text or not (PROXIMITY_TRIGGERS.search(text) or MINUTES_PATTERN.search(text)):
+            return None
+        anchor = self.find_stop(text)
+        if anchor is None:
+            return None
+        return ProximityQuery(anchor, parse_radius_m(text) or DEFAULT_NEAR_RADIUS_M)
+
+    def add_property(self, property_id: Hashable, lat: float, lon: float):
+        self.properties.insert(property_id, lat, lon)
+
+    def remove_property(self, property_id: Hashable):
+        self.properties.remove(property_id)
+
+    def _row_position(self, row: Dict) -> Optional[Tuple[float, float]]:
+        lat = next((row[c] for c in ("latitude", "lat") if row.get(c) is not None), None)
+        lon = next((row[c] for c in ("longitude", "lng", "lon") if row.get(c) is not None), None)
+        if lat is not None and lon is not None:
+            return float(lat), float(lon)
+        stop = self.find_stop(row["nearestmrt"]) if row.get("nearestmrt") else None
+        return (stop.latitude, stop.longitude) if stop else None
+
+    def add_listing(self, row: Dict) -> bool:
+        """Indexes a listing row by its own coordinates or, failing that, its nearest MRT."""
+        property_id = row.get("propertyid")
+        if property_id is None:
+            return False
+        position = self._row_position(row)
+        if position is None:
+            return False
+        self.add_property(property_id, *position)
+        return True
+
+    def listing_position(self, row: Dict) -> Optional[Tuple[float, float]]:
+        """Where a listing is: its own coordinates, its indexed property, or its nearest MRT."""
+        lat = next((row[c] for c in ("latitude", "lat") if row.get(c) is not None), None)
+        lon = next((row[c] for c in ("longitude", "lng", "lon") if row.get(c) is not None), None)
+        if lat is not None and lon is not None:
+            return float(lat), float(lon)
+        indexed = self.properties.position(row.get("propertyid"))
+        return indexed if indexed is not None else self._row_position(row)
+
+    def properties_within(self, query: ProximityQuery) -> List[Tuple[float, Hashable]]:
+        return self.properties.within(query.anchor.latitude, query.anchor.longitude, query.radius_m)
+
+    def nearest_properties(self, stop: TransitStop, k: int) -> List[Tuple[float, Hashable]]:
+        return self.properties.nearest(stop.latitude, stop.longitude, k)
+
+
+def load_property_coordinates(geo_index: GeoIndex) -> int:
+    """
+    Loads property coordinates into the index.
+
+    Uses latitude/longitude columns on ``properties`` when the schema has them;
+    otherwise a property is placed at its room's nearest MRT station.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return 0
+
+    cursor = connection.cursor()
+    loaded = 0
+    try:
+        cursor.execute("SHOW COLUMNS FROM properties")
+        columns = {row[0].lower(): row[0] for row in cursor.fetchall()}
+        lat_column = next((columns[c] for c in ("latitude", "lat") if c in columns), None)
+        lon_column = next((columns[c] for c in ("longitude", "lng", "lon") if c in columns), None)
+
+        if lat_column and lon_column:
+            cursor.execute(
+                f"SELECT propertyid, {lat_column}, {lon_column} FROM properties "
+                f"WHERE {lat_column} IS NOT NULL AND {lon_column} IS NOT NULL"
+            )
+            for property_id, lat, lon in cursor.fetchall():
+                geo_index.add_property(property_id, float(lat), float(lon))
+                loaded += 1
+        else:
+            cursor.execute("""
+                SELECT propertyid, MAX(nearestmrt)
+                FROM rooms
+                WHERE nearestmrt IS NOT NULL AND nearestmrt <> ''
+                GROUP BY propertyid
+            """)
+            for property_id, nearest_mrt in cursor.fetchall():
+                stop = geo_index.find_stop(nearest_mrt)
+                if stop:
+                    geo_index.add_property(property_id, stop.latitude, stop.longitude)
+                    loaded += 1
+    except Error as e:
+        print(f"❌ Error loading property coordinates: {e}")
+    finally:
+        cursor.close()
+        connection.close()
+
+    return loaded
+
+
+_geo_index: Optional[GeoIndex] = None
+_geo_index_lock = threading.Lock()
+_geo_retry_at = 0.0
+_geo_backoff = GEO_RELOAD_BACKOFF_SECONDS
+
+
+def _load_properties_with_backoff(geo_index: GeoIndex) -> int:
+    """Loads property coordinates, pushing the next attempt back while none load. Caller holds the lock."""
+    global _geo_retry_at, _geo_backoff
+    loaded = load_property_coordinates(geo_index)
+    if loaded:
+        _geo_backoff = GEO_RELOAD_BACKOFF_SECONDS
+    else:
+        _geo_retry_at = time.monotonic() + _geo_backoff
+        print(f"⚠️ No property coordinates loaded; retrying in {_geo_backoff:.0f}s")
+        _geo_backoff = min(_geo_backoff * 2, GEO_RELOAD_MAX_BACKOFF_SECONDS)
+    return loaded
+
+
+def get_geo_index() -> GeoIndex:
+    """
+    Returns the shared geo index, loading stops and property coordinates on first use.
+
+    An index that came up without properties (database down, empty table) is
+    kept for its stops and reloaded with backoff until properties arrive.
+    """
+    global _geo_index
+    geo_index = _geo_index
+    if geo_index is not None:
+        if len(geo_index.properties) == 0 and time.monotonic() >= _geo_retry_at:
+            with _geo_index_lock:
+                if len(geo_index.properties) == 0 and time.monotonic() >= _geo_retry_at:
+                    loaded = _load_properties_with_backoff(geo_index)
+                    if loaded:
+                        print(f"🗺️ Geo index reloaded with {loaded} properties")
+        return geo_index
+
+    with _geo_index_lock:
+        if _geo_index is None:
+            geo_index = GeoIndex(load_transit_stops())
+            loaded = _load_properties_with_backoff(geo_index)
+            print(f"🗺️ Geo index built with {len(geo_index.stops)} stops and {loaded} properties")
+            _geo_index = geo_index
+    return _geo_index
+
+
+def find_nearby_properties(text: str, limit: int = 200) -> Optional[List[Tuple[float, Hashable]]]:
+    """
+    Property ids within the radius the user asked for, nearest first.
+
+    Returns None when the text is not a proximity request, or when no
+    property coordinates have loaded yet, so callers can fall back to plain
+    location matching instead of filtering everything out.
+    """
+    geo_index = get_geo_index()
+    if len(geo_index.properties) == 0:
+        return None
+    query = geo_index.parse_proximity(text)
+    if query is None:
+        return None
+    return geo_index.properties_within(query)[:limit]
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from app.config.db_config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Twilio retries within minutes; a day covers manual replays as well
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A claim still processing after this long belongs to a worker that died mid-turn;
+# about three times a turn (MESSAGE_LATENCY_BUDGET_SECONDS plus coalescing), after which a retry takes over
+IDEMPOTENCY_PROCESSING_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_PROCESSING_LEASE_SECONDS", "30"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "50000"))
+# "mysql" shares the seen-set between workers through the processed_messages table
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+
+PROCESSING = "processing"
+DONE = "done"
+
+PROCESSED_MESSAGES_DDL = """
+    CREATE TABLE IF NOT EXISTS processed_messages (
+        message_sid VARCHAR(64) PRIMARY KEY,
+        response TEXT,
+        created_at DOUBLE NOT NULL
+    )
+"""
+
+
+@dataclass
+class SeenMessage:
+    state: str
+    response: Any = None
+    expires_at: float = 0.0
+    lease_until: float = 0.0
+
+
+class SQLSeenStore:
+    """
+    Seen-set shared between workers through a DB table.
+
+    Claiming is an INSERT on the primary key, so exactly one worker wins a
+    MessageSid. If the database is unreachable the claim succeeds (fail
+    open): answering twice beats not answering. A row without a response
+    older than ``lease_seconds`` was left by a worker that died and can be
+    taken over; answered rows are kept for ``ttl_seconds``. Expired rows are
+    purged every ``purge_every`` claims.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any] = get_db_connection,
+        placeholder: str = "%s",
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        lease_seconds: float = IDEMPOTENCY_PROCESSING_LEASE_SECONDS,
+        purge_every: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.connect = connect
+        self.placeholder = placeholder
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.purge_every = purge_every
+        self._clock = clock
+        self._claims = 0
+        self._table_ready = False
+
+    def _execute(self, query: str, params=(), fetch: bool = False):
+        connection = self.connect()
+        if not connection:
+            raise ConnectionError("No database connection")
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            row = cursor.fetchone() if fetch else cursor.rowcount
+            connection.commit()
+            return row
+        finally:
+            cursor.close()
+            connection.close()
+
+    def ensure_table(self):
+        if not self._table_ready:
+            self._execute(PROCESSED_MESSAGES_DDL)
+            self._table_ready = True
+
+    def claim(self, key: str) -> Optional[SeenMessage]:
+        """Returns None when this worker owns ``key``, else what is known about it."""
+        p = self.placeholder
+        now = self._clock()
+        self._claims += 1
+        try:
+            self.ensure_table()
+            if self._claims % self.purge_every == 0:
+                self._execute(f"DELETE FROM processed_messages WHERE created_at < {p}", (now - self.ttl_seconds,))
+            try:
+                self._execute(
+                    f"INSERT INTO processed_messages (message_sid, response, created_at) VALUES ({p}, NULL, {p})",
+                    (key, now),
+                )
+                return None
+            except ConnectionError:
+                raise
+            except Exception:
+                # Most likely a duplicate key; confirm before treating it as one
+                row = self._execute(
+                    f"SELECT response, created_at FROM processed_messages WHERE message_sid = {p}", (key,), fetch=True
+                )
+                if row is None:
+                    raise
+                response, created_at = row
+                lapsed = created_at < now - (self.lease_seconds if response is None else self.ttl_seconds)
+                if lapsed:
+                    # Compare-and-set on created_at so only one retry takes over
+                    updated = self._execute(
+                        f"UPDATE processed_messages SET response = NULL, created_at = {p} "
+                        f"WHERE message_sid = {p} AND created_at = {p}",
+                        (now, key, created_at),
+                    )
+                    if updated:
+                        return None
+                    return SeenMessage(PROCESSING)
+                if response is None:
+                    return SeenMessage(PROCESSING)
+                return SeenMessage(DONE, json.loads(response))
+        except Exception as e:
+            logger.error(f"❌ Shared idempotency store unavailable, processing {key}: {e}")
+            return None
+
+    def complete(self, key: str, response: Any):
+        try:
+            p = self.placeholder
+            # The day-long TTL of an answered message runs from when it was answered
+            self._execute(
+                f"UPDATE processed_messages SET response = {p}, created_at = {p} WHERE message_sid = {p}",
+                (json.dumps(response), self._clock(), key),
+            )
+        except Exception as e:
+            logger.error(f"❌ Could not store response for {key}: {e}")
+
+    def release(self, key: str):
+        try:
+            self._execute(f"DELETE FROM processed_messages WHERE message_sid = {self.placeholder}", (key,))
+        except Exception as e:
+            logger.error(f"❌ Could not release {key}: {e}")
+
+
+class MessageDeduplicator:
+    """
+    Idempotency layer for inbound webhooks keyed on the provider's message id.
+
+    An in-memory seen-set bounded by ``max_entries`` and evicting after
+    ``ttl_seconds`` answers most retries locally; with a ``shared`` store the
+    claim also goes through it so retries landing on another worker are
+    caught. A claimed message is either completed (its response is cached
+    for duplicates) or released on failure so the provider's retry is
+    processed again. A claim still processing after ``lease_seconds`` is
+    treated as abandoned and the next retry processes the message.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+        shared: Optional[SQLSeenStore] = None,
+        clock: Callable[[], float] = time.monotonic,
+        lease_seconds: float = IDEMPOTENCY_PROCESSING_LEASE_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.max_entries = max_entries
+        self.shared = shared
+        self._clock = clock
+        self._seen: "OrderedDict[str, SeenMessage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates_suppressed = 0
+        self.duplicates_in_flight = 0
+        self.leases_expired = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _evict(self, now: float):
+        # Entries share one TTL and are moved to the end when renewed, so insertion order is expiry order
+        while self._seen:
+            key, entry = next(iter(self._seen.items()))
+            if entry.expires_at > now and len(self._seen) <= self.max_entries:
+                break
+            del self._seen[key]
+
+    def _count_duplicate(self, entry: SeenMessage) -> SeenMessage:
+        self.duplicates_suppressed += 1
+        if entry.state == PROCESSING:
+            self.duplicates_in_flight += 1
+        return entry
+
+    def claim(self, key: str) -> Optional[SeenMessage]:
+        """
+        Returns None if the caller should process ``key``; otherwise the
+        message was seen before and the entry says whether it is still being
+        processed or which response it produced.
+        """
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            entry = self._seen.get(key)
+            if entry is not None:
+                if entry.state == DONE or now < entry.lease_until:
+                    return self._count_duplicate(entry)
+                # Whoever claimed it never finished; this retry takes over
+                self.leases_expired += 1
+                del self._seen[key]
+            self._seen[key] = SeenMessage(PROCESSING, expires_at=now + self.ttl_seconds, lease_until=now + self.lease_seconds)
+            self._evict(now)
+
+        if self.shared is not None:
+            existing = self.shared.claim(key)
+            if existing is not None:
+                with self._lock:
+                    self._seen[key] = SeenMessage(
+                        existing.state, existing.response, now + self.ttl_seconds, now + self.lease_seconds
+                    )
+                    return self._count_duplicate(existing)
+        return None
+
+    def complete(self, key: str, response: Any):
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None:
+                entry.state, entry.response = DONE, response
+                entry.expires_at = self._clock() + self.ttl_seconds
+                self._seen.move_to_end(key)
+        if self.shared is not None:
+            self.shared.complete(key, response)
+
+    def release(self, key: str):
+        with self._lock:
+            self._seen.pop(key, None)
+        if self.shared is not None:
+            self.shared.release(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked": len(self._seen),
+                "duplicates_suppressed": self.duplicates_suppressed,
+                "duplicates_in_flight": self.duplicates_in_flight,
+                "leases_expired": self.leases_expired,
+                "backend": "memory+shared" if self.shared is not None else "memory",
+            }
+
+
+def create_message_deduplicator() -> MessageDeduplicator:
+    """Deduplicator configured from IDEMPOTENCY_* settings; the shared table is created on first claim."""
+    shared = SQLSeenStore() if IDEMPOTENCY_BACKEND == "mysql" else None
+    return MessageDeduplicator(shared=shared)
@@ -1,15 +1,18 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize the LLM
-llm = ChatOpenAI(model="gpt-4", temperature=0, openai_api_key=OPENAI_API_KEY)
+import re
+from app.utils.prompts import LazyPromptTemplate as PromptTemplate
+from app.core.gazetteer import resolve_locations
+from app.core.model_router import INTENT, route
+from app.core.llm_resilience import LLMUnavailable
+
+# Rule-based fallback used when the LLM is unavailable or answers off-script
+SEARCH_PATTERN = re.compile(
+    r"(\b(rooms?|rent|rental|budget|condo|hdb|studio|apartment|flat|bedrooms?|br|bhk|listings?|"
+    r"available|near|mrt|under|below|furnished|unit|landed|looking for)\b|s?\$|\bsgd\b|\d{3,})"
+)
+GENERAL_PATTERN = re.compile(
+    r"^\s*(how|what|why|when|can i|do i|is it|should i)\b|\b(process|documents?|deposit|lease|contract|"
+    r"tenancy|agreement|policy|stamp duty|agent fee)\b"
+)
 
 # Define intent classification prompt
 intent_prompt = PromptTemplate(
@@ -27,22 +30,27 @@ Return only the intent name ("DB Specific Query" or "General Query") with no exp
 """
 )
 
+def classify_intent_by_rules(user_query):
+    """Keyword-based intent used when the LLM can't be relied on."""
+    text = user_query.lower()
+    has_amount = re.search(r"\d{3,}", text) is not None
+    if GENERAL_PATTERN.search(text) and not has_amount:
+        return "General Query"
+    if SEARCH_PATTERN.search(text) or resolve_locations(user_query):
+        return "DB Specific Query"
+    return "General Query"
+
 def classify_intent(user_query):
-    """Classifies the user's intent."""
+    """Classifies the user's intent, falling back to rules if the LLM fails."""
     try:
         # Ensure the correct prompt formatting
         formatted_prompt = intent_prompt.format_prompt(user_query=user_query).to_string()
 
-        # Get response from LLM
-        response = llm.predict(formatted_prompt).strip()
-
-        # Validate response
-        valid_intents = {"DB Specific Query", "General Query"}
-        if response not in valid_intents:
-            print(f"Unexpected response: {response}")  # Log unexpected output
-            return "Error"
-
-        return response
+        # Cheap model first; an off-script label escalates to the stronger model
+        return route(INTENT, formatted_prompt, temperature=0)
+    except LLMUnavailable as e:
+        print(f"LLM unavailable, classifying intent by rules: {e}")
+        return classify_intent_by_rules(user_query)
     except Exception as e:
         print(f"Error classifying intent: {e}")
-        return "Error"
+        return classify_intent_by_rules(user_query)
@@ -0,0 +1,503 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.core.llm_resilience import (
+    CircuitBreaker,
+    Deadline,
+    LLMUnavailable,
+    acall_with_hedge,
+    call_with_hedge,
+    current_deadline,
+)
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gpt-4")
+
+# Connection pool and limits; defaults match an OpenAI usage tier 1 GPT-4 quota.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "10000"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# Resilience: a duplicate request is sent once a call outlives the model's p95
+LLM_HEDGING = os.getenv("LLM_HEDGING", "1") == "1"
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.5
+LLM_SLOW_CALL_SECONDS = float(os.getenv("LLM_SLOW_CALL_SECONDS", "10"))
+
+# Rough prompt size estimate used before the real usage is known
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS = 256
+LATENCY_WINDOW = 500
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter.
+
+    Callers reserve capacity up front and sleep off any deficit, so waiting
+    callers are served roughly in arrival order. ``refund`` returns capacity
+    when the real cost turns out lower than the reservation. A caller whose
+    wait would outlast its turn's deadline gets its reservation back and
+    LLMUnavailable instead of sleeping.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes ``amount`` and returns how many seconds the caller must wait."""
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self, amount: float):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def _reserve_within(self, amount: float, deadline: Optional[Deadline]) -> float:
+        wait = self.reserve(amount)
+        if deadline is not None and wait > deadline.remaining():
+            self.refund(min(amount, self.capacity))
+            raise LLMUnavailable(f"Rate limit wait of {wait:.2f}s exceeds the latency budget")
+        return wait
+
+    def acquire(self, amount: float = 1, deadline: Optional[Deadline] = None):
+        wait = self._reserve_within(amount, deadline)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1, deadline: Optional[Deadline] = None):
+        wait = self._reserve_within(amount, deadline)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class LLMStats:
+    """Per-model call, latency and token accounting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict] = {}
+
+    def record(self, model: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+        with self._lock:
+            stats = self._models.setdefault(model, {
+                "calls": 0,
+                "errors": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_latency": 0.0,
+                "latencies": deque(maxlen=LATENCY_WINDOW),
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["total_latency"] += latency
+            stats["latencies"].append(latency)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            report = {}
+            for model, stats in self._models.items():
+                latencies = sorted(stats["latencies"])
+                report[model] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "avg_latency": stats["total_latency"] / stats["calls"] if stats["calls"] else 0.0,
+                    "p50_latency": percentile(latencies, 0.50),
+                    "p95_latency": percentile(latencies, 0.95),
+                }
+            return report
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _estimate_tokens(messages: List[Dict], max_tokens: Optional[int]) -> int:
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class LLMGateway:
+    """
+    Single entry point for every LLM call in the app.
+
+    Sync and async calls share one keep-alive HTTP pool each, one global
+    concurrency limit, request- and token-per-minute buckets, and per-model
+    latency/token accounting. ``client``/``async_client`` can be replaced with
+    any object exposing ``chat.completions.create`` (used by the tests).
+    """
+
+    def __init__(
+        self,
+        client=None,
+        async_client=None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+    ):
+        self._client = client
+        self._async_client = async_client
+        self._client_lock = threading.Lock()
+        # One limit for sync and async calls alike; async callers wait for it off the event loop
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.stats = LLMStats()
+        self.hedging = LLM_HEDGING
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="llm")
+
+    @property
+    def client(self) -> "OpenAI":
+        # openai and httpx are imported on first use to keep app startup fast
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                        timeout=LLM_TIMEOUT_SECONDS,
+                    )
+                    self._client = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+        return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    import httpx
+                    from openai import AsyncOpenAI
+
+                    http_client = httpx.AsyncClient(
+                        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                        timeout=LLM_TIMEOUT_SECONDS,
+                    )
+                    self._async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+        return self._async_client
+
+    def warm_up(self):
+        """Creates both clients (importing openai) so the first chat turn doesn't pay for it."""
+        self.client
+        self.async_client
+
+    def _record(self, model: str, started: float, estimated_tokens: int, response=None, error: bool = False):
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        if usage is not None and prompt_tokens + completion_tokens < estimated_tokens:
+            self.token_bucket.refund(estimated_tokens - prompt_tokens - completion_tokens)
+        self.stats.record(model, time.monotonic() - started, prompt_tokens, completion_tokens, error)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._client_lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(slow_call_seconds=LLM_SLOW_CALL_SECONDS)
+            return self._breakers[model]
+
+    def hedge_after(self, model: str) -> Optional[float]:
+        """Seconds before a duplicate request is sent: the model's recent p95 latency."""
+        if not self.hedging:
+            return None
+        stats = self.stats.snapshot().get(model)
+        if not stats or stats["calls"] < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, stats["p95_latency"])
+
+    @staticmethod
+    def call_timeout() -> float:
+        """Per-call timeout: what is left of the turn's deadline, capped by LLM_TIMEOUT_SECONDS."""
+        deadline = current_deadline()
+        if deadline is None:
+            return LLM_TIMEOUT_SECONDS
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise LLMUnavailable("Message latency budget exhausted")
+        return min(remaining, LLM_TIMEOUT_SECONDS)
+
+    def _acquire_rate(self, estimated_tokens: int, deadline: Optional[Deadline]):
+        """Waits for request and token capacity, giving up (LLMUnavailable) if the deadline would pass first."""
+        self.request_bucket.acquire(1, deadline)
+        try:
+            self.token_bucket.acquire(estimated_tokens, deadline)
+        except LLMUnavailable:
+            self.request_bucket.refund(1)
+            raise
+
+    def _ensure_wanted(self, estimated_tokens: int, deadline: Optional[Deadline]):
+        """
+        Last check before a request is sent: an attempt whose caller already
+        returned or timed out (a queued hedge, say) gives its capacity back.
+        """
+        if deadline is not None and deadline.expired:
+            self.request_bucket.refund(1)
+            self.token_bucket.refund(estimated_tokens)
+            raise LLMUnavailable("Caller stopped waiting before the request was sent")
+
+    async def _acquire_rate_async(self, estimated_tokens: int, deadline: Optional[Deadline]):
+        await self.request_bucket.acquire_async(1, deadline)
+        try:
+            await self.token_bucket.acquire_async(estimated_tokens, deadline)
+        except LLMUnavailable:
+            self.request_bucket.refund(1)
+            raise
+
+    def _complete(self, messages: List[Dict], model: str, temperature: float, max_tokens: Optional[int], timeout: float,
+                  deadline: Optional[Deadline] = None) -> str:
+        estimated_tokens = _estimate_tokens(messages, max_tokens)
+        self._acquire_rate(estimated_tokens, deadline)
+
+        with self._semaphore:
+            self._ensure_wanted(estimated_tokens, deadline)
+            started = time.monotonic()
+            try:
+                response = self.client.chat.completions.create(
+                    **_request_params(messages, model, temperature, max_tokens), timeout=timeout
+                )
+            except Exception:
+                self._record(model, started, estimated_tokens, error=True)
+                raise
+        self._record(model, started, estimated_tokens, response)
+        return response.choices[0].message.content or ""
+
+    def _complete_streaming(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: float,
+        on_token: Callable[[str], None],
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        """Like ``_complete`` with ``stream=True``, passing each content delta to ``on_token``."""
+        estimated_tokens = _estimate_tokens(messages, max_tokens)
+        self._acquire_rate(estimated_tokens, deadline)
+
+        with self._semaphore:
+            self._ensure_wanted(estimated_tokens, deadline)
+            started = time.monotonic()
+            parts = []
+            last_chunk = None
+            try:
+                stream = self.client.chat.completions.create(
+                    **_request_params(messages, model, temperature, max_tokens),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=timeout,
+                )
+                try:
+                    for chunk in stream:
+                        last_chunk = chunk
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            on_token(delta)
+                        if time.monotonic() - started > timeout:
+                            raise TimeoutError(f"LLM stream exceeded {timeout:.2f}s")
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+            except Exception:
+                self._record(model, started, estimated_tokens, error=True)
+                raise
+        # With include_usage the last chunk carries the token counts
+        self._record(model, started, estimated_tokens, last_chunk)
+        return "".join(parts)
+
+    async def _acquire_slot(self):
+        """Takes a concurrency slot without blocking the event loop."""
+        if self._semaphore.acquire(blocking=False):
+            return
+        waiting = asyncio.get_running_loop().run_in_executor(None, self._semaphore.acquire)
+        try:
+            await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # The waiting thread still gets the slot eventually; hand it straight back
+            waiting.add_done_callback(lambda _: self._semaphore.release())
+            raise
+
+    async def _acomplete(self, messages: List[Dict], model: str, temperature: float, max_tokens: Optional[int], timeout: float,
+                         deadline: Optional[Deadline] = None) -> str:
+        estimated_tokens = _estimate_tokens(messages, max_tokens)
+        await self._acquire_rate_async(estimated_tokens, deadline)
+
+        await self._acquire_slot()
+        try:
+            self._ensure_wanted(estimated_tokens, deadline)
+            started = time.monotonic()
+            try:
+                response = await self.async_client.chat.completions.create(
+                    **_request_params(messages, model, temperature, max_tokens), timeout=timeout
+                )
+            except Exception:
+                self._record(model, started, estimated_tokens, error=True)
+                raise
+        finally:
+            self._semaphore.release()
+        self._record(model, started, estimated_tokens, response)
+        return response.choices[0].message.content or ""
+
+    def chat(
+        self,
+        messages: List[Dict],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0,
+        max_tokens: Optional[int] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Runs a chat completion and returns the reply text.
+
+        With ``on_token`` the reply is streamed and each delta passed to it
+        as it arrives; streamed calls are not hedged, since a duplicate
+        would stream a second copy.
+
+        Raises LLMUnavailable when the model's circuit is open, the turn's
+        deadline has passed, or every (hedged) attempt failed.
+        """
+        timeout = self.call_timeout()
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise LLMUnavailable(f"Circuit open for {model}")
+
+        # Hedged attempts run on executor threads, outside this context; the
+        # call's own deadline is cancelled on return so none sends afterwards
+        deadline = Deadline(timeout, parent=current_deadline())
+        started = time.monotonic()
+        try:
+            if on_token is not None:
+                content = self._complete_streaming(messages, model, temperature, max_tokens, timeout, on_token, deadline)
+            else:
+                content = call_with_hedge(
+                    self._executor,
+                    lambda: self._complete(messages, model, temperature, max_tokens, timeout, deadline),
+                    self.hedge_after(model),
+                    timeout,
+                )
+        except Exception as e:
+            breaker.record_failure()
+            raise LLMUnavailable(f"{model} call failed: {e}") from e
+        finally:
+            deadline.cancel()
+        breaker.record_success(time.monotonic() - started)
+        return content
+
+    async def achat(
+        self,
+        messages: List[Dict],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Async variant of ``chat`` sharing the same limits, breakers and accounting."""
+        timeout = self.call_timeout()
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise LLMUnavailable(f"Circuit open for {model}")
+
+        deadline = Deadline(timeout, parent=current_deadline())
+        started = time.monotonic()
+        try:
+            content = await acall_with_hedge(
+                lambda: self._acomplete(messages, model, temperature, max_tokens, timeout, deadline),
+                self.hedge_after(model),
+                timeout,
+            )
+        except Exception as e:
+            breaker.record_failure()
+            raise LLMUnavailable(f"{model} call failed: {e}") from e
+        finally:
+            deadline.cancel()
+        breaker.record_success(time.monotonic() - started)
+        return content
+
+
+def _request_params(messages: List[Dict], model: str, temperature: float, max_tokens: Optional[int]) -> Dict:
+    params = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens:
+        params["max_tokens"] = max_tokens
+    return params
+
+
+def _prompt_messages(prompt: str, system: Optional[str]) -> List[Dict]:
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+
+def predict(prompt: str, system: Optional[str] = None, **kwargs) -> str:
+    """Sends a single prompt through the shared gateway."""
+    return get_llm_gateway().chat(_prompt_messages(prompt, system), **kwargs)
+
+
+async def apredict(prompt: str, system: Optional[str] = None, **kwargs) -> str:
+    return await get_llm_gateway().achat(_prompt_messages(prompt, system), **kwargs)
+
+
+def chat(messages: List[Dict], **kwargs) -> str:
+    return get_llm_gateway().chat(messages, **kwargs)
+
+
+async def achat(messages: List[Dict], **kwargs) -> str:
+    return await get_llm_gateway().achat(messages, **kwargs)
+
+
+def get_llm_stats() -> Dict[str, Dict]:
+    """Per-model call counts, token usage, latency percentiles and circuit state."""
+    gateway = get_llm_gateway()
+    report = gateway.stats.snapshot()
+    for model, stats in report.items():
+        stats["circuit"] = gateway.breaker(model).state
+    return report
@@ -1,10 +1,5 @@
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from app.core.model_router import LISTING_RESPONSE, route_chat
+from app.core.llm_resilience import LLMUnavailable
 
 def generate_llm_response(user_input, db_results=None, context=None):
     """
@@ -56,15 +51,20 @@ def generate_llm_response(user_input, db_results=None, context=None):
         in budget, location, or preferences.
         """
 
-    response = client.chat.completions.create(
-    model="gpt-4",
-    messages=[
-        {"role": "system", "content": "You assist users in finding rental properties."},
-        {"role": "user", "content": user_prompt}
-    ],
-    max_tokens=300
-)
-
+    try:
+        response = route_chat(
+            LISTING_RESPONSE,
+            messages=[
+                {"role": "system", "content": "You assist users in finding rental properties."},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=300
+        )
+    except LLMUnavailable as e:
+        print(f"LLM unavailable, using templated response: {e}")
+        if db_results:
+            return "Here are some properties that match your search:\n\n" + "\n".join(property_details)
+        return "Sorry, I couldn't find an exact match. Try adjusting your budget, location or preferences."
 
-    return response.choices[0].message.content.strip()
+    return response.strip()
 
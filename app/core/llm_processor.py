@@ -1,22 +1,75 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from app.utils.prompts import LazyPromptTemplate as PromptTemplate
 from dotenv import load_dotenv
 import os
+import copy
 import json
 from typing import Dict, List, Optional, Tuple
 import re
 
-from app.core.intent_classifier import classify_intent
+from app.core.intent_classifier import classify_intent, classify_intent_by_rules
 from app.core.query_generator import generate_sql_query
 from app.core.db_connector import execute_query
 from app.core.similarity import find_similar_properties
+from app.core.vector_search import semantic_search
+from app.core.faq import ANSWERED, ASSISTED, format_passages, get_faq_retriever
+from app.core.alerts import (
+    ALERT_OPT_IN, ALERT_OPT_OUT, can_alert, has_saved_search,
+    register_saved_search, unregister_saved_search,
+)
+from app.core.model_router import (
+    EXTRACTION,
+    FOLLOW_UP_CLASSIFIER,
+    FOLLOW_UP_RESPONSE,
+    GENERAL_RESPONSE,
+    INTENT,
+    parse_json_object,
+    route,
+)
+from app.core.llm_resilience import LLMUnavailable, deadline_scope
+from app.core.replica_router import get_replica_router, read_session
+from app.core.sampling_profiler import profile_scope
+from app.core.turn_planner import SIMILARITY, current_plan, plan_scope
+from app.core.reply_stream import publish_listings, publish_status
+from app.core.viewing_scheduler import (
+    HELD,
+    VIEWING_HOLD_SECONDS,
+    format_slot,
+    get_viewing_scheduler,
+    is_time_reply,
+    listing_property_id,
+    parse_contact,
+    parse_viewing_time,
+)
+from app.core.requirement_extractor import extract_requirements, fields_needing_llm
 
 # Load environment variables
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4", temperature=0.2, openai_api_key=OPENAI_API_KEY)
+# Sampling temperature for conversational replies
+TEMPERATURE = 0.2
+
+# Latency budget shared by every LLM call made while answering one message
+MESSAGE_LATENCY_BUDGET_SECONDS = float(os.getenv("MESSAGE_LATENCY_BUDGET_SECONDS", "8"))
+
+# Reply used for general questions while the LLM is unavailable
+GENERAL_FALLBACK_REPLY = (
+    "I'm having a little trouble answering that right now. "
+    "In the meantime I can search rooms for you - just tell me your budget and preferred area!"
+)
+
+# Words that start a viewing booking
+BOOKING_WORDS = ('book', 'schedule', 'viewing', 'visit')
+# Asking to move a held or offered viewing ("how about sat 3pm instead?")
+RESCHEDULE_PATTERN = re.compile(
+    r"\b(how about|what about|instead|reschedule|change (it|the time|the day)|another (day|time)"
+    r"|can (we|i) (do|come|make it))\b"
+)
+
+
+def _listing_label(listing: Optional[Dict]) -> str:
+    listing = listing or {}
+    return listing.get('add1') or listing.get('buildingname') or listing.get('propertyname') or 'the property'
+
 
 # Define prompts for different purposes
 follow_up_classifier_prompt = PromptTemplate(
@@ -35,11 +88,11 @@ Determine:
 3. Can this question be answered with the available property data? (true/false)
 
 Return a JSON object with these fields:
-{
+{{
     "is_follow_up": boolean,
     "aspect": string,
     "can_answer": boolean
-}
+}}
 
 Return only the JSON object, no explanations.
 """
@@ -78,6 +131,23 @@ Respond in a friendly, conversational manner while staying professional. Include
 """
 )
 
+faq_response_prompt = PromptTemplate(
+    input_variables=["user_query", "chat_context", "passages"],
+    template="""
+You are a friendly and helpful real estate assistant. Answer using the FAQ entries below.
+Previous context: {chat_context}
+
+FAQ entries:
+{passages}
+
+User Query: {user_query}
+
+Rules:
+1. Base the answer on the FAQ entries; if they don't cover the question, say so and offer to help with a room search
+2. Keep it short and conversational
+"""
+)
+
 extract_info_prompt = PromptTemplate(
     input_variables=["user_query"],
     template="""
@@ -122,7 +192,9 @@ class PropertyChatbot:
             'last_properties_shown': None,
             'current_property': None,
             'chat_history': [],
-            'booking_state': None
+            'booking_state': None,
+            'booking_hold': None,
+            'alerts_requested': False
         }
 
     def _update_chat_history(self, user_id: str, message: str, is_user: bool = True):
@@ -136,13 +208,35 @@ class PropertyChatbot:
         })
 
     def _extract_property_info(self, user_query: str) -> Dict:
-        """Extract property requirements from user query."""
+        """
+        Extract property requirements from user query.
+
+        Rules handle the common phrasings locally; the LLM is only asked when
+        some field is uncertain or the message has words the rules can't place,
+        and only those fields are taken from its answer.
+        """
+        info, confidence, has_unexplained_words = extract_requirements(user_query)
+        llm_fields = fields_needing_llm(info, confidence, has_unexplained_words)
+        if not llm_fields or not current_plan().allow(EXTRACTION):
+            return info
+
         try:
-            response = llm.predict(extract_info_prompt.format(user_query=user_query))
-            return json.loads(response)
+            # A cheap-model answer that fills none of the fields we asked for is escalated
+            with current_plan().run(EXTRACTION):
+                llm_info = route(
+                    EXTRACTION,
+                    extract_info_prompt.format(user_query=user_query),
+                    temperature=TEMPERATURE,
+                    accept=lambda parsed: any(parsed.get(field) is not None for field in llm_fields),
+                )
         except Exception as e:
             print(f"Error extracting property info: {e}")
-            return {}
+            return info
+
+        for field in llm_fields:
+            if llm_info.get(field) is not None:
+                info[field] = llm_info[field]
+        return info
 
     def _validate_requirements(self, requirements: Dict) -> Tuple[bool, List[str]]:
         """Check if all necessary requirements are present."""
@@ -167,6 +261,31 @@ class PropertyChatbot:
         
         return field_prompts.get(missing_fields[0], "Could you provide more details about your requirements?")
 
+    def _handle_alert_request(self, user_id: str, user_query: str) -> Optional[str]:
+        """Turns new-listing alerts on or off when the user asks to."""
+        context = self.conversation_context[user_id]
+        if ALERT_OPT_OUT.search(user_query):
+            context['alerts_requested'] = False
+            unregister_saved_search(user_id)
+            return "Okay, I've stopped new-listing alerts. Just say \"alert me\" if you'd like them back."
+        if not ALERT_OPT_IN.search(user_query):
+            return None
+        if not can_alert(user_id):
+            return "New-listing alerts are sent over WhatsApp. Message us there and say \"alert me\" to get them."
+
+        # "Alert me about rooms in Bishan under 1500" carries the search too
+        new_info = self._extract_property_info(user_query)
+        context['requirements'].update({k: v for k, v in new_info.items() if v is not None})
+        context['alerts_requested'] = True
+        requirements = context['requirements']
+        is_complete, missing_fields = self._validate_requirements(requirements)
+        if not is_complete:
+            return f"Sure, I'll alert you when a matching room is listed. {self._generate_missing_info_prompt(missing_fields)}"
+
+        register_saved_search(user_id, requirements)
+        return (f"Done! I'll message you when a new room in {requirements['location']} within your "
+                f"budget of {requirements['budget']} is listed. Reply \"stop alerts\" any time.")
+
     def _format_property_response(self, properties: List[Dict]) -> str:
         """Format property listings in a more natural way."""
         if not properties or isinstance(properties, dict) and 'error' in properties:
@@ -256,41 +375,124 @@ class PropertyChatbot:
         details.append("\nWould you like to schedule a viewing of this property?")
         return "\n".join(details)
 
-    def _handle_booking_request(self, user_id: str, user_query: str) -> str:
-        """Handle property booking requests."""
+    def _handle_booking_request(self, user_id: str, user_query: str) -> Optional[str]:
+        """
+        Books a viewing against the agent and property calendars: offers free
+        slots, holds the one the user picks (or the nearest free one) and
+        confirms it once the user gives a contact number. Returns None when
+        a message sent mid-booking is about something else.
+        """
         context = self.conversation_context[user_id]
-        
-        if not context.get('last_properties_shown'):
+        query = user_query.lower()
+        asked_to_book = any(word in query for word in BOOKING_WORDS)
+        scheduler = get_viewing_scheduler()
+        hold = scheduler.get(context.get('booking_hold'))
+        # Only a message about the viewing names its time; "good morning" or
+        # "move in on 1/12" must not replace a held slot
+        about_time = asked_to_book or RESCHEDULE_PATTERN.search(query) or is_time_reply(query)
+        requested = parse_viewing_time(user_query, scheduler.now()) if about_time else None
+
+        if hold is not None and hold.status == HELD and requested is None:
+            if 'cancel' in query:
+                scheduler.cancel(hold.id)
+                context['booking_state'], context['booking_hold'] = None, None
+                return "No problem, I've released that slot. Let me know if you'd like to pick another time."
+            contact = parse_contact(user_query) or (
+                user_id.split(':', 1)[-1] if user_id.startswith('whatsapp:') and re.search(r"\b(yes|ok|okay|sure|confirm)\b", query) else None
+            )
+            if contact:
+                if scheduler.confirm(hold.id, contact):
+                    context['booking_state'], context['booking_hold'] = 'confirmed', None
+                    # The user's next searches must reflect the booking, not a lagging replica
+                    get_replica_router().note_write(user_id)
+                    return (
+                        f"Perfect! Your viewing of {_listing_label(context.get('booking_property'))} is confirmed for "
+                        f"{format_slot(hold.start)}. Our agent will contact you at {contact} before the visit. "
+                        "Is there anything else you'd like to know?"
+                    )
+                # The hold lapsed and someone took the slot; offer the nearest one instead
+                return self._hold_viewing(user_id, hold.start, lost=True)
+        lapsed = hold is None and context.get('booking_state') == 'contact'
+
+        listing = context.get('current_property') or (context.get('last_properties_shown') or [None])[0]
+        if not listing:
+            if not asked_to_book:
+                context['booking_state'] = None
+                return None
             return "I don't see any specific property being discussed. Could you tell me which property you're interested in booking?"
-        
-        if not context.get('booking_state'):
-            context['booking_state'] = 'initial'
-            return "I'll help you schedule a viewing. What would be your preferred date and time to view the property?"
-        
-        # Handle different booking states
-        if 'date' in user_query.lower() or 'time' in user_query.lower():
-            context['booking_state'] = 'contact'
-            return "Great! Could you please provide your contact number so we can confirm the viewing?"
-        
-        if context['booking_state'] == 'contact':
-            context['booking_state'] = 'confirmed'
-            return "Perfect! I've scheduled your viewing. Our agent will contact you shortly to confirm the details. Is there anything else you'd like to know?"
+        if listing != context.get('booking_property'):
+            context['booking_property'], context['booking_offers'] = listing, None
+
+        offers = context.get('booking_offers') or []
+        choice = re.fullmatch(r"\s*(?:option\s*)?(\d)\s*\.?\s*", query)
+        if requested is None and choice and 1 <= int(choice.group(1)) <= len(offers):
+            requested = offers[int(choice.group(1)) - 1]
+        if requested is not None:
+            return self._hold_viewing(user_id, requested)
+
+        if hold is not None and hold.status == HELD:
+            if not asked_to_book:
+                # A question in between (wifi, rent...) is answered as usual; the hold stays
+                return None
+            return (
+                f"I'm holding {format_slot(hold.start)} for you. Please share your contact number to confirm, "
+                "tell me another day and time, or say 'cancel' to release it."
+            )
+        if context.get('booking_state') == 'time' and not asked_to_book and not lapsed:
+            # Moved on without picking a time
+            context['booking_state'] = None
+            return None
+
+        offers = scheduler.next_slots(listing_property_id(listing))
+        if not offers:
+            return "I couldn't find a free viewing slot in the next two weeks. Our agent will contact you to arrange a time."
+        context['booking_state'], context['booking_offers'] = 'time', offers
+        intro = "Sorry, your held slot lapsed before it was confirmed." if lapsed else f"I'll help you schedule a viewing of {_listing_label(listing)}."
+        lines = [f"{intro} The earliest available slots are:"]
+        lines += [f"{index}. {format_slot(start)}" for index, start in enumerate(offers, 1)]
+        lines.append("\nReply with a number, or tell me another day and time that suits you.")
+        return "\n".join(lines)
+
+    def _hold_viewing(self, user_id: str, requested: float, lost: bool = False) -> str:
+        """Holds the requested slot, or the nearest free one after it, and asks for a contact number."""
+        context = self.conversation_context[user_id]
+        listing = context.get('booking_property')
+        booking = get_viewing_scheduler().hold(user_id, listing_property_id(listing), requested)
+        if booking is None:
+            context['booking_state'], context['booking_hold'] = None, None
+            return "I couldn't reserve a viewing slot right now. Our agent will contact you to arrange a time."
+        context['booking_state'], context['booking_hold'] = 'contact', booking.id
+
+        if lost:
+            opening = f"Sorry, that slot was taken while your hold lapsed. The nearest free one is {format_slot(booking.start)}, and I've held it for you."
+        elif booking.start > requested:
+            opening = f"{format_slot(requested)} isn't available. The nearest free slot is {format_slot(booking.start)}, and I've held it for you."
+        else:
+            opening = f"I've held {format_slot(booking.start)} for your viewing of {_listing_label(listing)}."
+        ask = "Could you share your contact number to confirm?"
+        if user_id.startswith('whatsapp:'):
+            ask = "Reply 'yes' to confirm with this WhatsApp number, or share another contact number."
+        return f"{opening} {ask} The hold lasts {int(VIEWING_HOLD_SECONDS // 60)} minutes."
 
     def _handle_follow_up_question(self, user_query: str, current_property: Dict) -> str:
         """Handle follow-up questions about a specific property using LLM."""
+        plan = current_plan()
+        if not plan.allow(FOLLOW_UP_CLASSIFIER):
+            return None
         try:
             # Format property context for the classifier
             property_context = json.dumps(current_property, indent=2)
             
             # Classify the follow-up question
-            classifier_response = llm.predict(
-                follow_up_classifier_prompt.format(
-                    user_query=user_query,
-                    property_context=property_context
+            with plan.run(FOLLOW_UP_CLASSIFIER):
+                classification = route(
+                    FOLLOW_UP_CLASSIFIER,
+                    follow_up_classifier_prompt.format(
+                        user_query=user_query,
+                        property_context=property_context
+                    ),
+                    temperature=TEMPERATURE
                 )
-            )
-            
-            classification = json.loads(classifier_response)
             
             if not classification['is_follow_up']:
                 return None
@@ -326,31 +528,71 @@ class PropertyChatbot:
                 'rentmonth': current_property.get('rentmonth')
             })
 
+            if not plan.allow(FOLLOW_UP_RESPONSE):
+                return self._format_follow_up_facts(classification['aspect'], focused_data)
+
             # Generate response using only the available database information
-            response = llm.predict(
-                follow_up_response_prompt.format(
-                    user_query=user_query,
-                    property_data=json.dumps(focused_data, indent=2),
-                    aspect=classification['aspect']
+            with plan.run(FOLLOW_UP_RESPONSE):
+                response = route(
+                    FOLLOW_UP_RESPONSE,
+                    follow_up_response_prompt.format(
+                        user_query=user_query,
+                        property_data=json.dumps(focused_data, indent=2),
+                        aspect=classification['aspect']
+                    ),
+                    temperature=TEMPERATURE
                 )
-            )
             
-            return response.strip()
+            return response
             
         except Exception as e:
             print(f"Error handling follow-up question: {e}")
             return None
 
+    def _format_follow_up_facts(self, aspect: str, focused_data: Dict) -> str:
+        """Templated answer to a follow-up, used when there is no time for LLM phrasing."""
+        address = focused_data.get('address', 'the property')
+        lines = [f"Here's what I have on the {aspect} for {address}:"]
+        for field, value in focused_data.items():
+            if field != 'address' and value is not None:
+                lines.append(f"- {field.replace('_', ' ').title()}: {value}")
+        return "\n".join(lines)
+
+    def snapshot_context(self, user_id: str) -> Optional[Dict]:
+        """Copy of the user's context, to undo a turn whose reply is discarded."""
+        context = self.conversation_context.get(user_id)
+        return copy.deepcopy(context) if context is not None else None
+
+    def restore_context(self, user_id: str, snapshot: Optional[Dict]):
+        if snapshot is None:
+            self.conversation_context.pop(user_id, None)
+        else:
+            self.conversation_context[user_id] = snapshot
+
     def process_message(self, user_id: str, user_query: str) -> str:
         """Enhanced message processing with LLM-based follow-up handling."""
+        with deadline_scope(MESSAGE_LATENCY_BUDGET_SECONDS), read_session(user_id), profile_scope("process_message"):
+            # Optional LLM stages give way to local substitutes as the budget drains
+            with plan_scope():
+                return self._process_message(user_id, user_query)
+
+    def _process_message(self, user_id: str, user_query: str) -> str:
         if user_id not in self.conversation_context:
             self._initialize_user_context(user_id)
         
         self._update_chat_history(user_id, user_query)
         
-        # Check for booking-related queries
-        if any(word in user_query.lower() for word in ['book', 'schedule', 'viewing', 'visit']):
+        # Check for booking-related queries, and replies to a booking in progress
+        booking_state = self.conversation_context[user_id].get('booking_state')
+        if booking_state in ('time', 'contact') or any(word in user_query.lower() for word in BOOKING_WORDS):
             response = self._handle_booking_request(user_id, user_query)
+            if response:
+                self._update_chat_history(user_id, response, is_user=False)
+                return response
+
+        # Turning new-listing alerts on or off
+        response = self._handle_alert_request(user_id, user_query)
+        if response:
             self._update_chat_history(user_id, response, is_user=False)
             return response
 
@@ -392,16 +634,41 @@ class PropertyChatbot:
                         return self._format_detailed_property_response(last_properties[index])
 
         # Regular intent classification and processing
-        intent = classify_intent(user_query)
+        plan = current_plan()
+        if plan.allow(INTENT):
+            with plan.run(INTENT):
+                intent = classify_intent(user_query)
+        else:
+            intent = classify_intent_by_rules(user_query)
         
         if intent == "General Query":
             chat_context = "\n".join([f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['message']}" 
                                     for msg in self.conversation_context[user_id]['chat_history'][-3:]])
             
-            response = llm.predict(general_response_prompt.format(
-                user_query=user_query,
-                chat_context=chat_context
-            )).strip()
+            faq = get_faq_retriever().lookup(user_query)
+            # A close, signed-off curated answer beats a generic apology
+            fallback_reply = faq.fallback_answer or GENERAL_FALLBACK_REPLY
+            try:
+                if faq.kind == ANSWERED:
+                    response = faq.answer
+                elif not plan.allow(GENERAL_RESPONSE):
+                    response = fallback_reply
+                elif faq.kind == ASSISTED:
+                    with plan.run(GENERAL_RESPONSE):
+                        response = route(GENERAL_RESPONSE, faq_response_prompt.format(
+                            user_query=user_query,
+                            chat_context=chat_context,
+                            passages=format_passages(faq.passages)
+                        ), temperature=TEMPERATURE)
+                else:
+                    with plan.run(GENERAL_RESPONSE):
+                        response = route(GENERAL_RESPONSE, general_response_prompt.format(
+                            user_query=user_query,
+                            chat_context=chat_context
+                        ), temperature=TEMPERATURE)
+            except LLMUnavailable as e:
+                print(f"LLM unavailable, using fallback reply: {e}")
+                response = fallback_reply
             
             self._update_chat_history(user_id, response, is_user=False)
             return response
@@ -420,18 +687,33 @@ class PropertyChatbot:
             self._update_chat_history(user_id, response, is_user=False)
             return response
 
+        # Users who asked for new-listing alerts get them for their latest search
+        if self.conversation_context[user_id].get('alerts_requested') or has_saved_search(user_id):
+            try:
+                register_saved_search(user_id, requirements)
+            except Exception as e:
+                print(f"Error saving search: {e}")
+
         # Generate and execute query
         sql_query = generate_sql_query(user_query, requirements)
         if sql_query:
+            publish_status("searching")
             print(f"Executing query: {sql_query}")  # Debug log
             results = execute_query(sql_query)
             print(f"Query results: {results}")  # Debug log
             
             if not results or (isinstance(results, list) and len(results) == 0):
-                print("No exact matches, trying similarity search")  # Debug log
-                results = find_similar_properties(sql_query, user_query)
+                print("No exact matches, trying semantic search")  # Debug log
+                results = semantic_search(user_query, requirements)
+
+            if not results and plan.allow(SIMILARITY):
+                print("No semantic matches, trying similarity search")  # Debug log
+                with plan.run(SIMILARITY):
+                    results = find_similar_properties(sql_query, user_query)
             
             self.conversation_context[user_id]['last_properties_shown'] = results
+            # Web chat shows the cards right away; the text reply follows
+            publish_listings(results)
             response = self._format_property_response(results)
         else:
             response = "I'm having trouble understanding your requirements. Could you please be more specific about what you're looking for?"
@@ -447,5 +729,7 @@ class PropertyChatbot:
             'last_properties_shown': None,
             'current_property': None,
             'chat_history': [],
-            'booking_state': None
+            'booking_state': None,
+            'booking_hold': None,
+            'alerts_requested': False
         }
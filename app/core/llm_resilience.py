@@ -0,0 +1,233 @@
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMUnavailable(Exception):
+    """Raised when an LLM call is refused or fails; callers switch to local behaviour."""
+
+
+class Deadline:
+    """
+    A point in time by which the current chat turn must be answered.
+
+    A deadline nested in another never outlives it, and cancelling one
+    (e.g. when a newer message supersedes the turn) exhausts it and every
+    deadline nested inside.
+    """
+
+    def __init__(self, seconds: float, parent: Optional["Deadline"] = None):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.parent = parent
+        self.cancelled = False
+
+    def remaining(self) -> float:
+        if self.cancelled:
+            return 0.0
+        remaining = max(0.0, self.expires_at - time.monotonic())
+        if self.parent is not None:
+            remaining = min(remaining, self.parent.remaining())
+        return remaining
+
+    def elapsed(self) -> float:
+        return self.budget - (self.expires_at - time.monotonic())
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float] = None, deadline: Optional[Deadline] = None) -> Iterator[Deadline]:
+    """
+    Gives every LLM call made inside the block a share of one latency budget.
+
+    Pass ``seconds`` for a new deadline nested in the current one, or an
+    existing ``deadline`` to make it current (e.g. in a worker thread).
+    """
+    if deadline is None:
+        deadline = Deadline(seconds, parent=current_deadline())
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a backend that keeps failing or is too slow.
+
+    Outcomes of the last ``window`` calls are kept; once at least
+    ``min_calls`` are recorded and the failure ratio (slow calls count as
+    failures) reaches ``failure_ratio`` the breaker opens for
+    ``open_seconds``. After that one trial call is let through: success
+    closes the breaker, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        min_calls: int = 5,
+        window: int = 20,
+        slow_call_seconds: float = 10.0,
+        open_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._opened_at < self.open_seconds:
+                return False
+            if self._trial_in_flight:
+                return False
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self, latency: float):
+        if latency > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._trial_in_flight = False
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_ratio:
+                self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._trial_in_flight = False
+        self._outcomes.clear()
+
+
+def call_with_hedge(
+    executor: Executor,
+    call: Callable[[], T],
+    hedge_after: Optional[float],
+    timeout: float,
+) -> T:
+    """
+    Runs ``call`` and, if it has not finished after ``hedge_after`` seconds,
+    a duplicate; the first successful result wins.
+
+    Raises the last error if every attempt fails, or TimeoutError once
+    ``timeout`` passes. Attempts still queued on the executor are then
+    cancelled; one already running is left to finish in the background,
+    so ``call`` should check its own deadline before doing real work.
+    """
+    started = time.monotonic()
+    pending = {executor.submit(call)}
+    hedged = hedge_after is None
+    last_error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call exceeded {timeout:.2f}s")
+            wait_for = remaining if hedged else min(remaining, max(0.0, hedge_after - (time.monotonic() - started)))
+
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+
+            if not hedged and (not done or not pending):
+                # Either the hedge delay passed or the first attempt already failed
+                pending.add(executor.submit(call))
+                hedged = True
+
+        raise last_error
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def acall_with_hedge(
+    call: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    timeout: float,
+) -> T:
+    """Async ``call_with_hedge``; the losing attempt is cancelled."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending = {asyncio.ensure_future(call())}
+    hedged = hedge_after is None
+    last_error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            remaining = timeout - (loop.time() - started)
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call exceeded {timeout:.2f}s")
+            wait_for = remaining if hedged else min(remaining, max(0.0, hedge_after - (loop.time() - started)))
+
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+
+            if not hedged and (not done or not pending):
+                pending.add(asyncio.ensure_future(call()))
+                hedged = True
+
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,279 @@
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.llm_gateway import DEFAULT_MODEL, LLMGateway, _prompt_messages, get_llm_gateway
+from app.core.llm_resilience import LLMUnavailable
+from app.core.reply_stream import current_stream
+
+# Task types; every LLM call site declares one
+INTENT = "intent"
+EXTRACTION = "extraction"
+FOLLOW_UP_CLASSIFIER = "follow_up_classifier"
+FOLLOW_UP_RESPONSE = "follow_up_response"
+GENERAL_RESPONSE = "general_response"
+LISTING_RESPONSE = "listing_response"
+
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1") == "1"
+CHEAP_MODEL = os.getenv("LLM_CHEAP_MODEL", "gpt-4o-mini")
+STRONG_MODEL = DEFAULT_MODEL
+
+INTENT_LABELS = ("DB Specific Query", "General Query")
+# Model boilerplate no customer should see; short or apologetic replies
+# ("You're welcome!", "Sorry, that isn't in the listing") are legitimate
+REFUSAL_PATTERN = re.compile(r"\bas an ai\b|\bai language model\b", re.IGNORECASE)
+
+
+def parse_json_object(text: str) -> Dict:
+    """Parses the first JSON object in an LLM reply, tolerating prose or code fences around it."""
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        pass
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        raise ValueError(f"No JSON object in response: {text!r}")
+    return json.loads(match.group(0))
+
+
+def validate_intent(text: str) -> str:
+    label = text.strip().strip("\"'.").strip()
+    for intent in INTENT_LABELS:
+        if label.lower() == intent.lower():
+            return intent
+    raise ValueError(f"Unexpected intent label: {text!r}")
+
+
+def validate_requirements(text: str) -> Dict:
+    info = parse_json_object(text)
+    if not isinstance(info, dict):
+        raise ValueError("Requirements are not a JSON object")
+    for field in ("budget", "bedrooms"):
+        value = info.get(field)
+        if value is not None and not isinstance(value, (int, float)):
+            try:
+                info[field] = float(str(value).replace(",", "").lstrip("S$"))
+            except ValueError:
+                raise ValueError(f"{field} is not a number: {value!r}")
+    if info.get("furnished") is not None and not isinstance(info["furnished"], bool):
+        raise ValueError(f"furnished is not a boolean: {info['furnished']!r}")
+    return info
+
+
+def validate_follow_up(text: str) -> Dict:
+    classification = parse_json_object(text)
+    if not isinstance(classification.get("is_follow_up"), bool):
+        raise ValueError("is_follow_up missing or not a boolean")
+    if classification["is_follow_up"] and not isinstance(classification.get("aspect"), str):
+        raise ValueError("aspect missing")
+    return classification
+
+
+def validate_reply(text: str) -> str:
+    reply = text.strip()
+    if not reply:
+        raise ValueError("Empty reply")
+    if REFUSAL_PATTERN.search(reply):
+        raise ValueError("Reply looks like a refusal")
+    return reply
+
+
+@dataclass
+class TaskRoute:
+    """
+    How one task type is served: ``models`` are tried in order and
+    ``validate`` turns raw text into the task's result or raises ValueError.
+    ``streams`` marks user-facing replies, streamed to the turn's
+    ReplyStream when the channel has one.
+    """
+    task: str
+    models: List[str]
+    validate: Callable[[str], Any]
+    streams: bool = False
+
+
+def _cascade(task: str) -> List[str]:
+    """Models for a task; LLM_CASCADE_<TASK> (comma separated) overrides the default."""
+    override = os.getenv(f"LLM_CASCADE_{task.upper()}")
+    if override:
+        return [model.strip() for model in override.split(",") if model.strip()]
+    if not LLM_ROUTING or CHEAP_MODEL == STRONG_MODEL:
+        return [STRONG_MODEL]
+    return [CHEAP_MODEL, STRONG_MODEL]
+
+
+def default_routes() -> Dict[str, TaskRoute]:
+    validators = {
+        INTENT: validate_intent,
+        EXTRACTION: validate_requirements,
+        FOLLOW_UP_CLASSIFIER: validate_follow_up,
+        FOLLOW_UP_RESPONSE: validate_reply,
+        GENERAL_RESPONSE: validate_reply,
+        LISTING_RESPONSE: validate_reply,
+    }
+    replies = (FOLLOW_UP_RESPONSE, GENERAL_RESPONSE, LISTING_RESPONSE)
+    return {task: TaskRoute(task, _cascade(task), validate, task in replies) for task, validate in validators.items()}
+
+
+class RouterStats:
+    """Per-task counts of which model served the call, escalations and latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, Dict] = {}
+
+    def record(self, task: str, served_by: Optional[str], attempts: List[tuple], latency: float):
+        with self._lock:
+            stats = self._tasks.setdefault(task, {
+                "calls": 0,
+                "escalations": 0,
+                "failures": 0,
+                "total_latency": 0.0,
+                "served_by": {},
+                "model_latency": {},
+            })
+            stats["calls"] += 1
+            stats["escalations"] += int(len(attempts) > 1)
+            stats["failures"] += int(served_by is None)
+            stats["total_latency"] += latency
+            if served_by is not None:
+                stats["served_by"][served_by] = stats["served_by"].get(served_by, 0) + 1
+            for model, model_latency, ok in attempts:
+                if ok:
+                    total, count = stats["model_latency"].get(model, (0.0, 0))
+                    stats["model_latency"][model] = (total + model_latency, count + 1)
+
+    def snapshot(self, routes: Dict[str, TaskRoute]) -> Dict[str, Dict]:
+        """
+        ``latency_saved`` estimates the time saved by calls the first model
+        answered: their count times the gap between the last (strongest)
+        model's and the first model's average successful latency.
+        """
+        with self._lock:
+            report = {}
+            for task, stats in self._tasks.items():
+                averages = {model: total / count for model, (total, count) in stats["model_latency"].items()}
+                models = routes[task].models if task in routes else []
+                latency_saved = 0.0
+                if len(models) > 1 and models[0] in averages and models[-1] in averages:
+                    cheap_served = stats["served_by"].get(models[0], 0)
+                    latency_saved = cheap_served * (averages[models[-1]] - averages[models[0]])
+                report[task] = {
+                    "calls": stats["calls"],
+                    "escalations": stats["escalations"],
+                    "escalation_rate": stats["escalations"] / stats["calls"],
+                    "failures": stats["failures"],
+                    "avg_latency": stats["total_latency"] / stats["calls"],
+                    "served_by": dict(stats["served_by"]),
+                    "model_avg_latency": averages,
+                    "latency_saved": latency_saved,
+                }
+            return report
+
+
+class ModelRouter:
+    """
+    Cascades each task from the cheapest model to the strongest.
+
+    The output of every attempt is validated; the next model is only asked
+    when the call failed (circuit open, timeout, API error), the output is
+    invalid, or ``accept`` judges the result not confident enough.
+    """
+
+    def __init__(self, gateway: Optional[LLMGateway] = None, routes: Optional[Dict[str, TaskRoute]] = None):
+        self._gateway = gateway
+        self.routes = routes or default_routes()
+        self.stats = RouterStats()
+
+    @property
+    def gateway(self) -> LLMGateway:
+        return self._gateway or get_llm_gateway()
+
+    def run(
+        self,
+        task: str,
+        messages: List[Dict],
+        temperature: float = 0,
+        max_tokens: Optional[int] = None,
+        accept: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Returns the first validated (and accepted) result.
+
+        If only the last model's result is rejected by ``accept`` it is still
+        returned, since nothing better is available. Raises LLMUnavailable
+        when no model produced valid output.
+        """
+        route = self.routes[task]
+        started = time.monotonic()
+        attempts = []
+        fallback = None
+        served_by = None
+        last_error: Optional[Exception] = None
+        stream = current_stream() if route.streams else None
+        streamed = []
+
+        def on_token(text: str):
+            streamed.append(text)
+            stream.token(text)
+
+        extra = {"on_token": on_token} if stream is not None else {}
+        for position, model in enumerate(route.models):
+            attempt_started = time.monotonic()
+            try:
+                result = route.validate(self.gateway.chat(messages, model=model, temperature=temperature, max_tokens=max_tokens, **extra))
+            except (LLMUnavailable, ValueError) as e:
+                attempts.append((model, time.monotonic() - attempt_started, False))
+                last_error = e
+                print(f"⚠️ {task} on {model} failed ({e}), escalating")
+                if streamed:
+                    # The client drops what this attempt streamed
+                    streamed.clear()
+                    stream.reset()
+                continue
+
+            attempts.append((model, time.monotonic() - attempt_started, True))
+            is_last = position == len(route.models) - 1
+            if accept is None or accept(result) or is_last:
+                served_by, fallback = model, result
+                break
+            if fallback is None:
+                served_by, fallback = model, result
+            print(f"⚠️ {task} on {model} not confident, escalating")
+
+        self.stats.record(task, served_by, attempts, time.monotonic() - started)
+        if served_by is None:
+            raise LLMUnavailable(f"No valid {task} output: {last_error}")
+        return fallback
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def route(task: str, prompt: str, system: Optional[str] = None, **kwargs) -> Any:
+    """Runs a single-prompt task through the shared router."""
+    return get_model_router().run(task, _prompt_messages(prompt, system), **kwargs)
+
+
+def route_chat(task: str, messages: List[Dict], **kwargs) -> Any:
+    return get_model_router().run(task, messages, **kwargs)
+
+
+def get_router_stats() -> Dict[str, Dict]:
+    """Per-task escalation rate, model mix and estimated latency saved."""
+    router = get_model_router()
+    return router.stats.snapshot(router.routes)
@@ -1,16 +1,16 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from app.utils.prompts import LazyPromptTemplate as PromptTemplate
 from dotenv import load_dotenv
 import os
+import re
+import threading
 from app.core.intent_classifier import classify_intent 
 from app.config.db_config import get_db_schema 
+from app.core.gazetteer import STOPWORDS, location_sql_condition, resolve_locations, sql_literal
+from app.core.geo import find_nearby_properties
+from app.core.room_search import search_columns
 
 # Load environment variables
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4", temperature=0, openai_api_key=OPENAI_API_KEY)
 
 # Fetch and validate schema
 def get_validated_schema():
@@ -32,16 +32,29 @@ def get_validated_schema():
     
     return schema
 
-# Fetch the schema once at module load
-try:
-    DB_SCHEMA = get_validated_schema()
-    # Convert schema dictionary into formatted text
-    formatted_schema = "\n".join(
-        [f"Table: {table}\nColumns: {', '.join(columns)}" for table, columns in DB_SCHEMA.items()]
+_schema_cache = None
+_schema_lock = threading.Lock()
+
+def get_schema():
+    """Validated schema, fetched on first use (or by the app's startup) rather than at import."""
+    global _schema_cache
+    if _schema_cache is None:
+        with _schema_lock:
+            if _schema_cache is None:
+                _schema_cache = get_validated_schema()
+    return _schema_cache
+
+def reset_schema():
+    """Forgets the cached schema, e.g. after a table was added while running."""
+    global _schema_cache
+    with _schema_lock:
+        _schema_cache = None
+
+def get_formatted_schema():
+    """Schema as prompt text for ``generate_sql_prompt``."""
+    return "\n".join(
+        [f"Table: {table}\nColumns: {', '.join(columns)}" for table, columns in get_schema().items()]
     )
-except Exception as e:
-    print(f"Error initializing schema: {e}")
-    raise
 
 # Define SQL Query Generation Prompt with explicit schema information
 generate_sql_prompt = PromptTemplate(
@@ -99,46 +112,84 @@ Return only the SQL query, no explanations.
 """
 )
 
-def generate_sql_query(user_query, requirements=None):
-    """Generates a read-only SQL query based on the user's input and requirements."""
+def build_location_condition(location, columns=None):
+    """
+    Turns a free-text location into a WHERE fragment.
+
+    Known places are resolved through the gazetteer to equality/IN predicates;
+    only when nothing resolves do we fall back to LIKE on the non-stopword terms.
+    """
+    columns = columns or search_columns()
+    condition, params = location_sql_condition(
+        resolve_locations(location), columns.location_columns, columns.lowercase_locations
+    )
+    if condition:
+        return condition % tuple(sql_literal(param) for param in params)
+
+    location_terms = [
+        term for term in re.findall(r"[a-z0-9]+", location.lower())
+        if term not in STOPWORDS
+    ]
+    location_conditions = [
+        f"{column} LIKE '%{term}%'"
+        for term in location_terms
+        for column in columns.fallback_columns
+    ]
+    if not location_conditions:
+        return None
+    return f"({' OR '.join(location_conditions)})"
+
+def generate_sql_query(user_query, requirements=None, columns=None):
+    """
+    Generates a read-only SQL query based on the user's input and requirements.
+
+    Filters run against ``room_search`` once it is migrated (see
+    app/core/room_search.py) and against the rooms/properties join otherwise.
+    """
     try:
-        sql_query = """
+        columns = columns or search_columns()
+        rent = columns.rent
+        sql_query = f"""
         SELECT r.*, p.*
-        FROM rooms r
-        JOIN properties p ON r.propertyid = p.propertyid
-        WHERE 1=1
+        {columns.source}
+        WHERE {columns.active}
         """
 
+        # Proximity requests ("near Bishan MRT") are answered from the geo index
+        nearby = find_nearby_properties(user_query or "")
+        if nearby is None and requirements and requirements.get('location'):
+            nearby = find_nearby_properties(requirements['location'])
+        nearby_ids = [property_id for _, property_id in nearby or []]
+
+        if nearby is not None:
+            if nearby_ids:
+                sql_query += f"\nAND {columns.propertyid} IN ({', '.join(sql_literal(i) for i in nearby_ids)})"
+            else:
+                sql_query += "\nAND 1=0  -- Nothing within the requested distance"
+
         # Add conditions based on requirements
         if requirements:
             if requirements.get('budget'):
-                sql_query += f"\nAND r.rentmonth > 0"  # Ensure rent is set
-                sql_query += f"\nAND r.rentmonth <= {float(requirements['budget'])}"
-
-            if requirements.get('location'):
-                location_terms = requirements['location'].lower().split()
-                location_conditions = []
-                for term in location_terms:
-                    location_conditions.extend([
-                        f"LOWER(p.add1) LIKE '%{term}%'",
-                        f"LOWER(p.city) LIKE '%{term}%'",
-                        f"LOWER(p.zone) LIKE '%{term}%'"
-                    ])
-                sql_query += f"\nAND ({' OR '.join(location_conditions)})"
+                sql_query += f"\nAND {rent} <= {float(requirements['budget'])}"
+
+            if requirements.get('location') and nearby is None:
+                location_condition = build_location_condition(requirements['location'], columns)
+                if location_condition:
+                    sql_query += f"\nAND {location_condition}"
 
             if requirements.get('property_type'):
                 prop_type = requirements['property_type'].lower()
-                sql_query += f"\nAND (LOWER(r.roomtype) LIKE '%{prop_type}%' OR LOWER(r.propertytype) LIKE '%{prop_type}%')"
+                sql_query += f"\nAND ({columns.roomtype} LIKE '%{prop_type}%' OR {columns.propertytype} LIKE '%{prop_type}%')"
 
-        # Status condition - active/available rooms
-        sql_query += """
-        AND r.rentmonth > 0  -- Only rooms with set rental prices
-        AND r.status NOT IN ('i', 'I', 'inactive', 'INACTIVE')  -- Exclude inactive rooms
+        # Add ordering and limit, nearest first for proximity searches
+        if nearby_ids:
+            sql_query += f"""
+        ORDER BY FIELD({columns.propertyid}, {', '.join(sql_literal(i) for i in nearby_ids)}), {rent} ASC
+        LIMIT 5
         """
-
-        # Add ordering and limit
-        sql_query += """
-        ORDER BY r.rentmonth ASC
+        else:
+            sql_query += f"""
+        ORDER BY {rent} ASC
         LIMIT 5
         """
 
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.config.db_config import get_db_connection
+from app.core.llm_gateway import percentile
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged and get their plan captured
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_TOP_N = int(os.getenv("SLOW_QUERY_TOP_N", "20"))
+# Distinct shapes tracked; the least recently seen is dropped beyond this
+QUERY_PROFILE_MAX_SHAPES = int(os.getenv("QUERY_PROFILE_MAX_SHAPES", "500"))
+# A shape's plan is re-captured at most this often (plans change as data grows)
+EXPLAIN_REFRESH_SECONDS = float(os.getenv("EXPLAIN_REFRESH_SECONDS", "600"))
+
+DURATION_WINDOW = 200
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduces a statement to its shape: literals and placeholders become ``?``,
+    IN lists collapse to ``in (?)`` and whitespace/case are folded, so the
+    same search with different values is counted once.
+    """
+    shape = _COMMENT.sub(" ", query)
+    shape = _STRING.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = " ".join(shape.lower().split())
+    return _IN_LIST.sub("in (?)", shape)
+
+
+class QueryShape:
+    """Timings of one normalized statement."""
+
+    def __init__(self, shape: str):
+        self.shape = shape
+        self.count = 0
+        self.errors = 0
+        self.slow_count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.durations = deque(maxlen=DURATION_WINDOW)
+        self.last_seen = 0.0
+        self.explain: Optional[Any] = None
+        self.explained_at: Optional[float] = None
+        self.explain_pending = False
+
+    def report(self) -> Dict[str, Any]:
+        durations = sorted(self.durations)
+        return {
+            "shape": self.shape,
+            "count": self.count,
+            "errors": self.errors,
+            "slow_count": self.slow_count,
+            "total_ms": round(self.total_seconds * 1000, 2),
+            "mean_ms": round(self.total_seconds / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(percentile(durations, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(durations, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "mean_rows": round(self.rows / self.count, 1) if self.count else 0.0,
+            "explain": self.explain,
+            "explained_at": self.explained_at,
+        }
+
+
+class QueryProfiler:
+    """
+    Per-shape statement timings with plan capture for slow statements.
+
+    ``record`` is cheap (a normalization and a dict update under a lock). A
+    statement over ``threshold_ms`` is logged and, if its shape has no
+    recent plan, ``EXPLAIN FORMAT=JSON`` for it runs on a background thread
+    with its own connection, so the request that was slow is not made slower.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        max_shapes: int = QUERY_PROFILE_MAX_SHAPES,
+        explain_refresh_seconds: float = EXPLAIN_REFRESH_SECONDS,
+        connect: Callable[[], Any] = get_db_connection,
+        explain_prefix: str = "EXPLAIN FORMAT=JSON ",
+        clock: Callable[[], float] = time.time,
+    ):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self.explain_refresh_seconds = explain_refresh_seconds
+        self.connect = connect
+        self.explain_prefix = explain_prefix
+        self._clock = clock
+        self._shapes: "OrderedDict[str, QueryShape]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.statements = 0
+        self.slow_statements = 0
+        self.explains_captured = 0
+        self.explain_failures = 0
+
+    def record(
+        self,
+        query: str,
+        params: Optional[Sequence],
+        seconds: float,
+        rows: int = 0,
+        error: bool = False,
+    ):
+        shape_key = normalize_query(query)
+        slow = seconds * 1000 >= self.threshold_ms
+        now = self._clock()
+        with self._lock:
+            self.statements += 1
+            shape = self._shapes.get(shape_key)
+            if shape is None:
+                shape = self._shapes[shape_key] = QueryShape(shape_key)
+                while len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            else:
+                self._shapes.move_to_end(shape_key)
+            shape.count += 1
+            shape.errors += int(error)
+            shape.total_seconds += seconds
+            shape.max_seconds = max(shape.max_seconds, seconds)
+            shape.rows += rows
+            shape.durations.append(seconds)
+            shape.last_seen = now
+            explain = False
+            if slow:
+                self.slow_statements += 1
+                shape.slow_count += 1
+                explain = (
+                    not error
+                    and not shape.explain_pending
+                    and shape_key.startswith("select")
+                    and (shape.explained_at is None or now - shape.explained_at >= self.explain_refresh_seconds)
+                )
+                if explain:
+                    shape.explain_pending = True
+
+        if slow:
+            logger.warning(f"🐢 Slow query ({seconds * 1000:.0f} ms, {rows} rows): {shape_key}")
+        if explain:
+            self._explain_executor().submit(self._capture_explain, shape, query, params)
+
+    def _explain_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # One worker: plans are captured one at a time, off the request path
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+            return self._executor
+
+    def _capture_explain(self, shape: QueryShape, query: str, params: Optional[Sequence]):
+        plan = None
+        try:
+            connection = self.connect()
+            if not connection:
+                raise ConnectionError("No database connection")
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.explain_prefix + query, params or ())
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+                connection.close()
+            plan = [self._parse_plan(row) for row in rows]
+            plan = plan[0] if len(plan) == 1 else plan
+        except Exception as e:
+            logger.error(f"❌ EXPLAIN failed for {shape.shape}: {e}")
+        with self._lock:
+            shape.explain_pending = False
+            if plan is None:
+                self.explain_failures += 1
+            else:
+                shape.explain = plan
+                shape.explained_at = self._clock()
+                self.explains_captured += 1
+
+    @staticmethod
+    def _parse_plan(row) -> Any:
+        if len(row) == 1 and isinstance(row[0], (str, bytes)):
+            try:
+                return json.loads(row[0])
+            except ValueError:
+                return row[0]
+        return list(row)
+
+    def flush(self):
+        """Waits for pending plan captures (tests and shutdown)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def top(self, n: int = SLOW_QUERY_TOP_N, order_by: str = "p95_ms") -> List[Dict[str, Any]]:
+        with self._lock:
+            reports = [shape.report() for shape in self._shapes.values()]
+        return sorted(reports, key=lambda report: report[order_by], reverse=True)[:n]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "statements": self.statements,
+                "slow_statements": self.slow_statements,
+                "shapes": len(self._shapes),
+                "threshold_ms": self.threshold_ms,
+                "explains_captured": self.explains_captured,
+                "explain_failures": self.explain_failures,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+            self.statements = self.slow_statements = 0
+
+
+_profiler: Optional[QueryProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_query_profiler() -> QueryProfiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = QueryProfiler()
+    return _profiler
@@ -0,0 +1,344 @@
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config.db_config import READ_REPLICA_URLS, get_db_connection, get_replica_connection
+
+logger = logging.getLogger(__name__)
+
+# Replicas further behind than this are skipped until they catch up
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "2"))
+# "least_loaded" (fewest reads in flight) or "round_robin"
+READ_REPLICA_STRATEGY = os.getenv("READ_REPLICA_STRATEGY", "least_loaded")
+# "status" reads SHOW REPLICA STATUS; "heartbeat" reads the newest timestamp
+# of REPLICA_HEARTBEAT_TABLE, kept current on the primary by a heartbeat job
+REPLICA_LAG_PROBE = os.getenv("REPLICA_LAG_PROBE", "status")
+REPLICA_HEARTBEAT_TABLE = os.getenv("REPLICA_HEARTBEAT_TABLE", "replica_heartbeat")
+# How long a session's reads stay pinned after it writes, at most
+STICKY_READ_SECONDS = float(os.getenv("STICKY_READ_SECONDS", "30"))
+STICKY_MAX_SESSIONS = 10000
+
+LEAST_LOADED = "least_loaded"
+ROUND_ROBIN = "round_robin"
+
+_read_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("read_session", default=None)
+
+
+@contextlib.contextmanager
+def read_session(session_id: Optional[str]) -> Iterator[None]:
+    """Reads made inside the block see the writes ``session_id`` made (see ``ReplicaRouter.note_write``)."""
+    token = _read_session.set(session_id)
+    try:
+        yield
+    finally:
+        _read_session.reset(token)
+
+
+def current_read_session() -> Optional[str]:
+    return _read_session.get()
+
+
+def _fetch_row(connection, query: str) -> Optional[Dict[str, Any]]:
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {column[0]: value for column, value in zip(cursor.description, row)}
+    finally:
+        cursor.close()
+
+
+def replica_status_lag(connection) -> Optional[float]:
+    """
+    Seconds_Behind_Source from SHOW REPLICA STATUS (SHOW SLAVE STATUS before
+    MySQL 8.0.22). None when replication is stopped or not configured.
+    """
+    try:
+        row = _fetch_row(connection, "SHOW REPLICA STATUS")
+    except Exception:
+        row = _fetch_row(connection, "SHOW SLAVE STATUS")
+    if not row:
+        return None
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return float(lag) if lag is not None else None
+
+
+def heartbeat_lag(table: str = REPLICA_HEARTBEAT_TABLE, clock: Callable[[], float] = time.time) -> Callable[[Any], Optional[float]]:
+    """
+    Lag probe comparing the newest ``ts`` (epoch seconds) in ``table`` with
+    the local clock. Works on any engine and without replication privileges.
+    """
+    def probe(connection) -> Optional[float]:
+        row = _fetch_row(connection, f"SELECT MAX(ts) AS ts FROM {table}")
+        if not row or row.get("ts") is None:
+            return None
+        return max(0.0, clock() - float(row["ts"]))
+    return probe
+
+
+class Replica:
+    """Health and load of one read replica."""
+
+    def __init__(self, name: str, connect: Callable[[], Any]):
+        self.name = name
+        self.connect = connect
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.in_flight = 0
+        self.reads = 0
+        self.failures = 0
+
+    def caught_up_to(self) -> Optional[float]:
+        """Wall-clock time up to which the replica had applied writes when last checked."""
+        if self.checked_at is None or self.lag is None:
+            return None
+        return self.checked_at - self.lag
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "in_flight": self.in_flight,
+            "reads": self.reads,
+            "failures": self.failures,
+        }
+
+
+class _TrackedConnection:
+    """Passes everything through to the connection; ``close`` also ends the replica's in-flight read."""
+
+    def __init__(self, connection, release: Callable[[], None]):
+        self._connection = connection
+        self._release = release
+        self._released = False
+
+    def close(self):
+        try:
+            self._connection.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class ReplicaRouter:
+    """
+    Sends read-only queries to replicas, writes and fallbacks to the primary.
+
+    A replica takes reads while its last health check (run by ``check``, on
+    the ``start`` thread in the app) found it reachable and at most
+    ``max_lag_seconds`` behind. Health older than a few check intervals
+    counts as unknown, so a stalled checker sends reads to the primary.
+
+    Read-your-writes: after ``note_write(session)``, reads in that session's
+    ``read_session`` scope only go to a replica whose last check shows it had
+    already applied everything up to the write, for at most ``sticky_seconds``.
+    """
+
+    def __init__(
+        self,
+        primary_connect: Callable[[], Any],
+        replicas: Dict[str, Callable[[], Any]],
+        max_lag_seconds: float = REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = REPLICA_CHECK_INTERVAL,
+        strategy: str = READ_REPLICA_STRATEGY,
+        lag_probe: Callable[[Any], Optional[float]] = replica_status_lag,
+        sticky_seconds: float = STICKY_READ_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        if strategy not in (LEAST_LOADED, ROUND_ROBIN):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.primary_connect = primary_connect
+        self.replicas = [Replica(name, connect) for name, connect in replicas.items()]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.strategy = strategy
+        self.lag_probe = lag_probe
+        self.sticky_seconds = sticky_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes: "OrderedDict[str, float]" = OrderedDict()
+        self._next = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.primary_reads = 0
+        self.fallbacks = {"no_replica": 0, "sticky": 0, "connect_failed": 0}
+
+    def check(self):
+        """Probes every replica's reachability and lag once."""
+        for replica in self.replicas:
+            lag, error = None, None
+            try:
+                connection = replica.connect()
+                if not connection:
+                    raise ConnectionError("no connection")
+                try:
+                    lag = self.lag_probe(connection)
+                finally:
+                    connection.close()
+                if lag is None:
+                    error = "replication not running"
+            except Exception as e:
+                error = str(e)
+            healthy = error is None and lag <= self.max_lag_seconds
+            with self._lock:
+                if replica.healthy and not healthy:
+                    logger.warning(f"⚠️ Replica {replica.name} out of rotation: {error or f'{lag:.1f}s behind'}")
+                elif healthy and not replica.healthy and replica.checked_at is not None:
+                    logger.info(f"✅ Replica {replica.name} back in rotation ({lag:.1f}s behind)")
+                replica.healthy = healthy
+                replica.lag = lag
+                replica.error = error
+                replica.checked_at = self._clock()
+
+    def start(self, interval: Optional[float] = None):
+        """Checks replica health every ``interval`` seconds on a daemon thread."""
+        if not self.replicas or (self._thread and self._thread.is_alive()):
+            return
+        interval = interval or self.check_interval
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.check()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def note_write(self, session_id: Optional[str]):
+        """Records that ``session_id`` just wrote, so its next reads see the write."""
+        if not session_id or not self.replicas:
+            return
+        with self._lock:
+            self._writes[session_id] = self._clock()
+            self._writes.move_to_end(session_id)
+            while len(self._writes) > STICKY_MAX_SESSIONS:
+                self._writes.popitem(last=False)
+
+    def _last_write(self, session_id: Optional[str], now: float) -> Optional[float]:
+        written_at = self._writes.get(session_id) if session_id else None
+        if written_at is not None and now - written_at > self.sticky_seconds:
+            del self._writes[session_id]
+            return None
+        return written_at
+
+    def _candidates(self, session_id: Optional[str]) -> Tuple[List[Replica], Optional[str]]:
+        """Eligible replicas in the order to try them, or why there are none. Caller holds the lock."""
+        now = self._clock()
+        stale_after = 3 * self.check_interval
+        eligible = [
+            replica for replica in self.replicas
+            if replica.healthy and replica.checked_at is not None and now - replica.checked_at <= stale_after
+        ]
+        if not eligible:
+            return [], "no_replica"
+        written_at = self._last_write(session_id, now)
+        if written_at is not None:
+            eligible = [replica for replica in eligible if replica.caught_up_to() >= written_at]
+            if not eligible:
+                return [], "sticky"
+        start = self._next % len(eligible)
+        self._next += 1
+        rotated = eligible[start:] + eligible[:start]
+        if self.strategy == LEAST_LOADED:
+            rotated.sort(key=lambda replica: replica.in_flight)  # stable: ties keep round-robin order
+        return rotated, None
+
+    def read_connection(self, session_id: Optional[str] = None):
+        """
+        A connection for a read-only query: an eligible replica, or the primary
+        when none is (or none can be reached). Always ``close()`` it.
+        """
+        if not self.replicas:
+            return self.primary_connect()
+        session_id = session_id if session_id is not None else current_read_session()
+        with self._lock:
+            candidates, reason = self._candidates(session_id)
+            if reason:
+                self.fallbacks[reason] += 1
+        for replica in candidates:
+            try:
+                connection = replica.connect()
+            except Exception as e:
+                connection, error = None, str(e)
+            else:
+                error = "no connection"
+            if connection:
+                with self._lock:
+                    replica.in_flight += 1
+                    replica.reads += 1
+                return _TrackedConnection(connection, lambda replica=replica: self._release(replica))
+            with self._lock:
+                # Out of rotation until the next health check says otherwise
+                replica.healthy = False
+                replica.error = error
+                replica.failures += 1
+                self.fallbacks["connect_failed"] += 1
+            logger.warning(f"⚠️ Replica {replica.name} unreachable, trying the next one: {error}")
+        with self._lock:
+            self.primary_reads += 1
+        return self.primary_connect()
+
+    def _release(self, replica: Replica):
+        with self._lock:
+            replica.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "replicas": {replica.name: replica.report() for replica in self.replicas},
+                "primary_reads": self.primary_reads,
+                "replica_reads": sum(replica.reads for replica in self.replicas),
+                "fallbacks": dict(self.fallbacks),
+                "sticky_sessions": len(self._writes),
+                "strategy": self.strategy,
+                "max_lag_seconds": self.max_lag_seconds,
+            }
+
+
+def _configured_lag_probe() -> Callable[[Any], Optional[float]]:
+    return heartbeat_lag() if REPLICA_LAG_PROBE == "heartbeat" else replica_status_lag
+
+
+_router: Optional[ReplicaRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Router over DATABASE_URL and READ_REPLICA_URLS; with no replicas every read goes to the primary."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                replicas = {
+                    f"replica-{index}": (lambda index=index: get_replica_connection(index))
+                    for index in range(len(READ_REPLICA_URLS))
+                }
+                _router = ReplicaRouter(get_db_connection, replicas, lag_probe=_configured_lag_probe())
+    return _router
+
+
+def get_read_connection():
+    """Connection for a read-only query in the current ``read_session``."""
+    return get_replica_router().read_connection()
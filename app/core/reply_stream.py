@@ -0,0 +1,68 @@
+import contextlib
+import contextvars
+from typing import Dict, Iterator, List, Optional
+
+# Listing fields sent to web clients as cards
+CARD_FIELDS = ("roomid", "propertyid", "roomtype", "propertytype", "rentmonth", "add1", "zone", "nearestmrt")
+
+
+class ReplyStream:
+    """
+    Receives a turn's output while it is produced: reply tokens, listing
+    cards and progress. Channels that can show partial output (the web
+    chat) subclass it; WhatsApp has none and only sends the final reply.
+
+    ``reset`` tells the client to discard the tokens streamed so far (an
+    attempt was rejected and another model is answering).
+    """
+
+    def emit(self, event: Dict):
+        raise NotImplementedError
+
+    def token(self, text: str):
+        self.emit({"type": "token", "text": text})
+
+    def reset(self):
+        self.emit({"type": "reset"})
+
+    def listings(self, cards: List[Dict]):
+        self.emit({"type": "listings", "items": cards})
+
+    def status(self, stage: str):
+        self.emit({"type": "status", "stage": stage})
+
+
+_current_stream: contextvars.ContextVar[Optional[ReplyStream]] = contextvars.ContextVar("reply_stream", default=None)
+
+
+def current_stream() -> Optional[ReplyStream]:
+    return _current_stream.get()
+
+
+@contextlib.contextmanager
+def stream_scope(stream: Optional[ReplyStream]) -> Iterator[None]:
+    token = _current_stream.set(stream)
+    try:
+        yield
+    finally:
+        _current_stream.reset(token)
+
+
+def listing_card(row: Dict) -> Dict:
+    card = {field: row.get(field) for field in CARD_FIELDS if row.get(field) is not None}
+    if "rentmonth" in card:
+        card["rentmonth"] = float(card["rentmonth"])
+    return card
+
+
+def publish_listings(rows) -> None:
+    """Sends listing cards to the current stream, if any, before the reply text is ready."""
+    stream = current_stream()
+    if stream is not None and isinstance(rows, list) and rows:
+        stream.listings([listing_card(row) for row in rows[:3]])
+
+
+def publish_status(stage: str) -> None:
+    stream = current_stream()
+    if stream is not None:
+        stream.status(stage)
@@ -0,0 +1,223 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.core.gazetteer import STOPWORDS, LocationGazetteer, get_gazetteer
+from app.core.geo import GeoIndex, get_geo_index
+
+REQUIREMENT_FIELDS = ("budget", "location", "property_type", "bedrooms", "furnished")
+
+# Below this confidence a field is treated as unfilled and left to the LLM
+CONFIDENCE_THRESHOLD = 0.75
+
+MIN_BUDGET = 200
+MAX_BUDGET = 50_000
+
+AMOUNT_PATTERN = re.compile(
+    r"(?P<currency>s\$|sgd|\$)?\s*"
+    r"(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"(?:\s*(?P<suffix>k\b|sgd\b|dollars?\b|bucks\b))?",
+    re.IGNORECASE,
+)
+BUDGET_CONTEXT = re.compile(
+    r"(under|below|less than|max(?:imum)?|budget(?: of| is)?|up ?to|within|around|about|"
+    r"approx(?:imately)?|not more than|no more than|at most|afford|pay|rent(?: of| is)?|<)\s*$",
+    re.IGNORECASE,
+)
+# Units that mean a number is not money ("2 bedroom", "10 mins", "500m")
+NON_BUDGET_UNITS = re.compile(
+    r"^\s*(?:-\s*)?(bed(?:room)?s?|br|bhk|rooms?\b|min(?:ute)?s?|m\b|km|meters?|metres?|sq ?ft|sqm|"
+    r"pax|people|persons?|years?|yrs?|months?|mths?|%|th\b|st\b|nd\b|rd\b)",
+    re.IGNORECASE,
+)
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "single": 1}
+BEDROOMS_PATTERN = re.compile(
+    r"\b(\d|one|two|three|four|five|single)\s*(?:-\s*)?(?:bed(?:room)?s?|br|bhk|bdr|room flat|rm flat)\b",
+    re.IGNORECASE,
+)
+
+FURNISHED_PATTERNS = [
+    (re.compile(r"\b(unfurnished|not furnished|no furniture|without furniture|empty unit)\b", re.I), False, 0.95),
+    (re.compile(r"\b(partially|partly|semi)[- ]furnished\b", re.I), True, 0.7),
+    (re.compile(r"\b(fully furnished|furnished|with furniture)\b", re.I), True, 0.95),
+]
+
+# Longest synonyms first so "master room" wins over "room"
+PROPERTY_TYPE_SYNONYMS: List[Tuple[str, str, float]] = [
+    (r"master (?:room|bedroom)", "master", 0.95),
+    (r"common (?:room|bedroom)", "common", 0.95),
+    (r"(?:whole|entire) (?:unit|flat|apartment|house)", "whole unit", 0.9),
+    (r"condo(?:minium)?s?|executive condo|\bec\b", "condo", 0.95),
+    (r"hdb(?: flat)?s?|public housing", "hdb", 0.95),
+    (r"landed|terrace(?: house)?|bungalow|semi[- ]d(?:etached)?", "landed", 0.9),
+    (r"studios?", "studio", 0.95),
+    (r"apartments?|\bapt\b", "apartment", 0.85),
+    (r"rooms?", "room", 0.8),
+]
+PROPERTY_TYPE_PATTERNS = [
+    (re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE), value, confidence)
+    for pattern, value, confidence in PROPERTY_TYPE_SYNONYMS
+]
+
+# Words that carry no requirement on their own; anything else left over after
+# extraction hints at something the rules did not understand.
+FILLER_WORDS = STOPWORDS | {
+    "hi", "hello", "hey", "can", "you", "help", "get", "am", "we", "our", "us",
+    "something", "place", "unit", "rent", "rental", "renting", "lease", "month",
+    "monthly", "per", "pm", "mth", "sgd", "s", "dollars", "k", "max", "maximum",
+    "less", "than", "up", "upto", "about", "approx", "cheap", "cheaper", "nice",
+    "good", "available", "bed", "bedroom", "bedrooms", "br", "furnished",
+    "unfurnished", "fully", "partially", "with", "without", "furniture", "mrt",
+    "station", "it", "be", "should", "would", "like", "have", "has", "also",
+    "only", "just", "but", "not", "no", "more", "one", "two", "three", "four",
+    "five", "mins", "minute", "m", "km", "of", "anything", "ok", "thanks",
+}
+
+
+def _extract_budget(text: str) -> Tuple[Optional[float], float]:
+    best_amount, best_confidence = None, 0.0
+    for match in AMOUNT_PATTERN.finditer(text):
+        after = text[match.end():]
+        if not match.group("suffix") and NON_BUDGET_UNITS.match(after):
+            continue
+        # MRT codes / unit numbers such as "EW2" or "#05"
+        if match.start("number") > 0 and text[match.start("number") - 1].isalnum() and not match.group("currency"):
+            continue
+
+        amount = float(match.group("number").replace(",", ""))
+        suffix = (match.group("suffix") or "").lower()
+        if suffix == "k":
+            amount *= 1000
+        if not MIN_BUDGET <= amount <= MAX_BUDGET:
+            continue
+
+        if match.group("currency") or suffix:
+            confidence = 0.95
+        elif BUDGET_CONTEXT.search(text[:match.start()]):
+            confidence = 0.9
+        else:
+            confidence = 0.6
+
+        # Ranges ("1200-1500", "between 1200 and 1500") keep the upper bound
+        if confidence > best_confidence or (confidence == best_confidence and amount > (best_amount or 0)):
+            best_amount, best_confidence = amount, confidence
+
+    return best_amount, best_confidence
+
+
+def _extract_bedrooms(text: str) -> Tuple[Optional[int], float]:
+    match = BEDROOMS_PATTERN.search(text)
+    if not match:
+        return None, 0.0
+    count = match.group(1).lower()
+    return (int(count) if count.isdigit() else NUMBER_WORDS[count]), 0.95
+
+
+def _extract_furnished(text: str) -> Tuple[Optional[bool], float]:
+    for pattern, value, confidence in FURNISHED_PATTERNS:
+        if pattern.search(text):
+            return value, confidence
+    return None, 0.0
+
+
+def _extract_property_type(text: str) -> Tuple[Optional[str], float]:
+    for pattern, value, confidence in PROPERTY_TYPE_PATTERNS:
+        if pattern.search(text):
+            return value, confidence
+    return None, 0.0
+
+
+def _extract_location(
+    text: str, gazetteer: Optional[LocationGazetteer], geo_index: Optional[GeoIndex]
+) -> Tuple[Optional[str], float, List[str]]:
+    """Returns the location phrase, its confidence and the words it consumed."""
+    if geo_index is not None:
+        proximity = geo_index.parse_proximity(text)
+        if proximity is not None:
+            phrase = f"within {int(proximity.radius_m)}m of {proximity.anchor.name}"
+            consumed = proximity.anchor.name.lower().split()
+            return phrase, 0.9, consumed
+
+    if gazetteer is None:
+        return None, 0.0, []
+
+    matches = gazetteer.resolve(text)
+    if not matches:
+        return None, 0.0, []
+
+    phrases = []
+    for match in matches:
+        if match.matched_text not in phrases:
+            phrases.append(match.matched_text)
+    confidence = 0.9 if all(match.distance == 0 for match in matches) else 0.75
+    consumed = [word for phrase in phrases for word in phrase.split()]
+    return " or ".join(phrases), confidence, consumed
+
+
+def extract_requirements(
+    text: str,
+    gazetteer: Optional[LocationGazetteer] = None,
+    geo_index: Optional[GeoIndex] = None,
+) -> Tuple[Dict, Dict[str, float], bool]:
+    """
+    Extracts search requirements without calling the LLM.
+
+    Returns the same fields as ``extract_info_prompt`` (None when absent),
+    a confidence per filled field, and whether the message contains words the
+    rules could not account for (a hint that the LLM might find more).
+    """
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    if geo_index is None:
+        geo_index = get_geo_index()
+
+    budget, budget_confidence = _extract_budget(text)
+    bedrooms, bedrooms_confidence = _extract_bedrooms(text)
+    furnished, furnished_confidence = _extract_furnished(text)
+    property_type, property_type_confidence = _extract_property_type(text)
+    location, location_confidence, location_words = _extract_location(text, gazetteer, geo_index)
+
+    fields = {
+        "budget": budget,
+        "location": location,
+        "property_type": property_type,
+        "bedrooms": bedrooms,
+        "furnished": furnished,
+    }
+    confidence = {
+        name: value
+        for name, value in (
+            ("budget", budget_confidence),
+            ("location", location_confidence),
+            ("property_type", property_type_confidence),
+            ("bedrooms", bedrooms_confidence),
+            ("furnished", furnished_confidence),
+        )
+        if fields[name] is not None
+    }
+
+    leftover = [
+        word for word in re.findall(r"[a-z]+", text.lower())
+        if word not in FILLER_WORDS
+        and word not in location_words
+        and not any(pattern.fullmatch(word) for pattern, _, _ in PROPERTY_TYPE_PATTERNS)
+    ]
+    return fields, confidence, bool(leftover)
+
+
+def fields_needing_llm(fields: Dict, confidence: Dict[str, float], has_unexplained_words: bool) -> List[str]:
+    """
+    Fields worth asking the LLM about.
+
+    Low-confidence fields always qualify; missing fields only when the
+    message has words the rules could not explain, since most turns only
+    mention one or two requirements.
+    """
+    low_confidence = [
+        name for name in REQUIREMENT_FIELDS
+        if fields.get(name) is not None and confidence.get(name, 0.0) < CONFIDENCE_THRESHOLD
+    ]
+    if not has_unexplained_words:
+        return low_confidence
+    missing = [name for name in REQUIREMENT_FIELDS if fields.get(name) is None]
+    return low_confidence + missing
@@ -0,0 +1,399 @@
+"""
+Denormalized ``room_search`` table for listing searches.
+
+One row per room with the property's location columns copied in,
+lowercased and trimmed, an ``is_active`` flag, rent and 0/1 amenity flags,
+so searches filter a single table through composite indexes instead of
+joining rooms to properties under ``LOWER(...)`` and ``NOT IN``.
+
+    python -m app.core.room_search migrate [--batch-size 5000] [--triggers] [--rebuild]
+    python -m app.core.room_search backfill
+    python -m app.core.room_search status
+
+Rows are refreshed either by MySQL triggers (``--triggers``) or by the
+listing change feed (the default, ROOM_SEARCH_REFRESH=job).
+
+Amenity columns on ``rooms`` hold 'Y'/'N' (as the listing formatter reads
+them); 'yes', 'true' and 1 count as set too, so 0/1 and boolean columns
+map to the same flags.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.config.db_config import get_db_connection
+from app.core.gazetteer import LOCATION_COLUMNS
+
+ROOM_SEARCH_ENABLED = os.getenv("ROOM_SEARCH_ENABLED", "1") == "1"
+# "job": the change feed refreshes rows; "trigger": MySQL triggers do
+ROOM_SEARCH_REFRESH = os.getenv("ROOM_SEARCH_REFRESH", "job")
+ROOMS_KEY_COLUMN = os.getenv("ROOMS_KEY_COLUMN", "roomid")
+# How long a missing room_search table is trusted before checking again (e.g. after a migrate)
+ROOM_SEARCH_RECHECK_SECONDS = float(os.getenv("ROOM_SEARCH_RECHECK_SECONDS", "300"))
+
+AMENITY_COLUMNS = ("airconditioned", "wifi", "tv", "fridge", "washer", "gym", "swimming")
+INACTIVE_STATUSES = "('i', 'I', 'inactive', 'INACTIVE')"
+# Stored amenity values meaning "has it", compared uppercased and trimmed
+AMENITY_SET_VALUES = ("Y", "YES", "TRUE", "1")
+
+
+def amenity_flag(value: Any) -> bool:
+    """Python twin of the amenity CASE in ROOM_SEARCH_SELECT."""
+    return value is not None and str(value).strip().upper() in AMENITY_SET_VALUES
+
+
+def _amenity_sql(column: str) -> str:
+    values = ", ".join(f"'{value}'" for value in AMENITY_SET_VALUES)
+    return f"CASE WHEN UPPER(TRIM(r.{column})) IN ({values}) THEN 1 ELSE 0 END AS {column}"
+
+
+# The denormalized row computed in SQL; shared by the migration, the
+# backfill, the refresh job and the triggers so they can't drift apart.
+ROOM_SEARCH_SELECT = f"""
+    SELECT
+        r.{ROOMS_KEY_COLUMN} AS roomid,
+        r.propertyid AS propertyid,
+        CASE WHEN r.rentmonth > 0 AND r.status NOT IN {INACTIVE_STATUSES} THEN 1 ELSE 0 END AS is_active,
+        r.rentmonth AS rentmonth,
+        LOWER(TRIM(r.roomtype)) AS roomtype_lc,
+        LOWER(TRIM(r.propertytype)) AS propertytype_lc,
+        LOWER(TRIM(p.zone)) AS zone_lc,
+        LOWER(TRIM(p.city)) AS city_lc,
+        LOWER(TRIM(p.buildingname)) AS buildingname_lc,
+        LOWER(TRIM(r.nearestmrt)) AS nearestmrt_lc,
+        LOWER(TRIM(p.add1)) AS add1_lc,
+        {", ".join(_amenity_sql(column) for column in AMENITY_COLUMNS)}
+    FROM rooms r
+    JOIN properties p ON r.propertyid = p.propertyid
+"""
+
+# One index per query shape: equality on the location column, range/sort on rent
+ROOM_SEARCH_INDEXES = {
+    "ux_room_search_roomid": "UNIQUE INDEX ux_room_search_roomid ON room_search (roomid)",
+    "ix_room_search_rent": "INDEX ix_room_search_rent ON room_search (is_active, rentmonth)",
+    "ix_room_search_zone": "INDEX ix_room_search_zone ON room_search (is_active, zone_lc, rentmonth)",
+    "ix_room_search_city": "INDEX ix_room_search_city ON room_search (is_active, city_lc, rentmonth)",
+    "ix_room_search_mrt": "INDEX ix_room_search_mrt ON room_search (is_active, nearestmrt_lc, rentmonth)",
+    "ix_room_search_building": "INDEX ix_room_search_building ON room_search (is_active, buildingname_lc, rentmonth)",
+    "ix_room_search_property": "INDEX ix_room_search_property ON room_search (propertyid, is_active, rentmonth)",
+}
+
+TRIGGERS = {
+    "room_search_rooms_ai": f"""
+        CREATE TRIGGER room_search_rooms_ai AFTER INSERT ON rooms FOR EACH ROW
+        REPLACE INTO room_search {ROOM_SEARCH_SELECT} WHERE r.{ROOMS_KEY_COLUMN} = NEW.{ROOMS_KEY_COLUMN}
+    """,
+    "room_search_rooms_au": f"""
+        CREATE TRIGGER room_search_rooms_au AFTER UPDATE ON rooms FOR EACH ROW
+        REPLACE INTO room_search {ROOM_SEARCH_SELECT} WHERE r.{ROOMS_KEY_COLUMN} = NEW.{ROOMS_KEY_COLUMN}
+    """,
+    "room_search_rooms_ad": f"""
+        CREATE TRIGGER room_search_rooms_ad AFTER DELETE ON rooms FOR EACH ROW
+        DELETE FROM room_search WHERE roomid = OLD.{ROOMS_KEY_COLUMN}
+    """,
+    "room_search_properties_au": f"""
+        CREATE TRIGGER room_search_properties_au AFTER UPDATE ON properties FOR EACH ROW
+        REPLACE INTO room_search {ROOM_SEARCH_SELECT} WHERE r.propertyid = NEW.propertyid
+    """,
+    "room_search_properties_ad": """
+        CREATE TRIGGER room_search_properties_ad AFTER DELETE ON properties FOR EACH ROW
+        DELETE FROM room_search WHERE propertyid = OLD.propertyid
+    """,
+}
+
+
+@dataclass(frozen=True)
+class SearchColumns:
+    """Where each search predicate points: the raw joined tables or room_search."""
+    source: str
+    rent: str
+    active: str
+    propertyid: str
+    roomtype: str
+    propertytype: str
+    location_columns: Dict[str, str]
+    lowercase_locations: bool
+    fallback_columns: tuple
+
+
+LEGACY_COLUMNS = SearchColumns(
+    source="FROM rooms r\n        JOIN properties p ON r.propertyid = p.propertyid",
+    rent="r.rentmonth",
+    active=f"r.rentmonth > 0 AND r.status NOT IN {INACTIVE_STATUSES}",
+    propertyid="p.propertyid",
+    roomtype="LOWER(r.roomtype)",
+    propertytype="LOWER(r.propertytype)",
+    location_columns=LOCATION_COLUMNS,
+    lowercase_locations=False,
+    fallback_columns=("LOWER(p.add1)", "LOWER(p.city)", "LOWER(p.zone)"),
+)
+
+ROOM_SEARCH_COLUMNS = SearchColumns(
+    source=(
+        "FROM room_search s\n"
+        f"        JOIN rooms r ON r.{ROOMS_KEY_COLUMN} = s.roomid\n"
+        "        JOIN properties p ON p.propertyid = s.propertyid"
+    ),
+    rent="s.rentmonth",
+    active="s.is_active = 1",
+    propertyid="s.propertyid",
+    roomtype="s.roomtype_lc",
+    propertytype="s.propertytype_lc",
+    location_columns={
+        "zone": "s.zone_lc",
+        "city": "s.city_lc",
+        "buildingname": "s.buildingname_lc",
+        "nearestmrt": "s.nearestmrt_lc",
+        "add1": "s.add1_lc",
+    },
+    lowercase_locations=True,
+    fallback_columns=("s.add1_lc", "s.city_lc", "s.zone_lc"),
+)
+
+
+def _execute(connection, query: str, params=()):
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def table_exists(connection) -> bool:
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM room_search LIMIT 1")
+        cursor.fetchall()
+        return True
+    except Exception:
+        return False
+    finally:
+        cursor.close()
+
+
+_available: Optional[bool] = None
+_checked_at = 0.0
+_available_lock = threading.Lock()
+
+
+def _needs_check() -> bool:
+    return _available is None or (not _available and time.monotonic() - _checked_at >= ROOM_SEARCH_RECHECK_SECONDS)
+
+
+def use_room_search() -> bool:
+    """
+    Whether searches should target room_search (enabled and migrated).
+
+    Once found the table is trusted for good; a missing table is checked
+    again every ROOM_SEARCH_RECHECK_SECONDS so a migration run while the
+    app is up gets picked up.
+    """
+    global _available, _checked_at
+    if not ROOM_SEARCH_ENABLED:
+        return False
+    if _needs_check():
+        with _available_lock:
+            if _needs_check():
+                connection = get_db_connection()
+                if not connection:
+                    return bool(_available)  # Undecided; ask again on the next search
+                try:
+                    found = table_exists(connection)
+                finally:
+                    connection.close()
+                if not found and _available is None:
+                    print("⚠️ room_search table missing, searching rooms/properties directly "
+                          "(run: python -m app.core.room_search migrate)")
+                elif found and _available is False:
+                    print("✅ room_search table found, searches now use it")
+                if found and not _available:
+                    _forget_schema()
+                _available, _checked_at = found, time.monotonic()
+    return _available
+
+
+def _forget_schema():
+    """The cached schema may predate the migration; without this the validator rejects room_search."""
+    from app.core.query_generator import reset_schema
+    from app.core.sql_validator import get_sql_validator
+
+    reset_schema()
+    get_sql_validator().reload_schema()
+
+
+def search_columns() -> SearchColumns:
+    return ROOM_SEARCH_COLUMNS if use_room_search() else LEGACY_COLUMNS
+
+
+def create_table(connection, rebuild: bool = False) -> bool:
+    """
+    Creates room_search and its indexes; returns False if it already existed.
+
+    Column types are copied from rooms/properties through CREATE TABLE ...
+    AS SELECT, so ids keep whatever type the source tables use.
+    """
+    if table_exists(connection):
+        if not rebuild:
+            return False
+        _execute(connection, "DROP TABLE room_search")
+    _execute(connection, f"CREATE TABLE room_search AS {ROOM_SEARCH_SELECT} WHERE 1 = 0")
+    for definition in ROOM_SEARCH_INDEXES.values():
+        _execute(connection, f"CREATE {definition}")
+    connection.commit()
+    return True
+
+
+def backfill(
+    connection,
+    batch_size: int = 5000,
+    placeholder: str = "%s",
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Copies every room into room_search in key-ordered batches.
+
+    Each batch is its own transaction, so a long backfill neither locks the
+    source tables for its whole duration nor loses work if interrupted;
+    re-running it is safe (REPLACE). Returns the number of rooms copied.
+    """
+    key = f"r.{ROOMS_KEY_COLUMN}"
+    cursor = connection.cursor()
+    copied = 0
+    last_key = None
+    try:
+        while True:
+            if last_key is None:
+                cursor.execute(f"SELECT {ROOMS_KEY_COLUMN} FROM rooms ORDER BY {ROOMS_KEY_COLUMN} LIMIT {batch_size}")
+            else:
+                cursor.execute(
+                    f"SELECT {ROOMS_KEY_COLUMN} FROM rooms WHERE {ROOMS_KEY_COLUMN} > {placeholder} "
+                    f"ORDER BY {ROOMS_KEY_COLUMN} LIMIT {batch_size}",
+                    (last_key,),
+                )
+            keys = [row[0] for row in cursor.fetchall()]
+            if not keys:
+                return copied
+            cursor.execute(
+                f"REPLACE INTO room_search {ROOM_SEARCH_SELECT} WHERE {key} >= {placeholder} AND {key} <= {placeholder}",
+                (keys[0], keys[-1]),
+            )
+            connection.commit()
+            copied += len(keys)
+            last_key = keys[-1]
+            if progress:
+                progress(copied)
+    finally:
+        cursor.close()
+
+
+def install_triggers(connection):
+    """Keeps room_search current from inside MySQL (replaces the refresh job)."""
+    for name, definition in TRIGGERS.items():
+        _execute(connection, f"DROP TRIGGER IF EXISTS {name}")
+        _execute(connection, definition)
+    connection.commit()
+
+
+def drop_triggers(connection):
+    for name in TRIGGERS:
+        _execute(connection, f"DROP TRIGGER IF EXISTS {name}")
+    connection.commit()
+
+
+def refresh_rows(
+    connection,
+    room_keys: Iterable[Any] = (),
+    property_ids: Iterable[Any] = (),
+    deleted_room_keys: Iterable[Any] = (),
+    placeholder: str = "%s",
+) -> int:
+    """Re-derives room_search rows for changed rooms/properties and drops deleted rooms."""
+    changed = 0
+    for column, values in ((f"r.{ROOMS_KEY_COLUMN}", list(room_keys)), ("r.propertyid", list(property_ids))):
+        if values:
+            marks = ", ".join([placeholder] * len(values))
+            changed += _execute(connection, f"REPLACE INTO room_search {ROOM_SEARCH_SELECT} WHERE {column} IN ({marks})", values)
+    deleted = list(deleted_room_keys)
+    if deleted:
+        marks = ", ".join([placeholder] * len(deleted))
+        changed += _execute(connection, f"DELETE FROM room_search WHERE roomid IN ({marks})", deleted)
+    connection.commit()
+    return changed
+
+
+def refresh_from_events(events, connect: Callable[[], Any] = get_db_connection, placeholder: str = "%s"):
+    """Change-feed subscriber applying room/property changes to room_search."""
+    if ROOM_SEARCH_REFRESH != "job" or not use_room_search():
+        return
+    room_keys, property_ids, deleted = [], [], []
+    for event in events:
+        if event.table == "rooms":
+            (deleted if event.kind == "delete" else room_keys).append(event.key)
+        elif event.table == "properties" and event.kind != "delete":
+            property_ids.append(event.key)
+    # Deleted properties take their rooms with them; those deletes arrive as room events
+
+    connection = connect()
+    if not connection:
+        print("❌ room_search refresh skipped: no database connection")
+        return
+    try:
+        refresh_rows(connection, room_keys, property_ids, deleted, placeholder)
+    except Exception as e:
+        print(f"❌ room_search refresh failed: {e}")
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("migrate", "backfill", "status", "drop-triggers"))
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--triggers", action="store_true", help="install MySQL triggers to keep the table current")
+    parser.add_argument("--rebuild", action="store_true", help="drop and recreate the table first")
+    args = parser.parse_args(argv)
+
+    connection = get_db_connection()
+    if not connection:
+        return 1
+    try:
+        if args.command == "status":
+            if not table_exists(connection):
+                print("room_search: not migrated")
+                return 1
+            cursor = connection.cursor()
+            cursor.execute("SELECT COUNT(*), SUM(is_active) FROM room_search")
+            rows, active = cursor.fetchone()
+            cursor.execute("SELECT COUNT(*) FROM rooms")
+            (source_rows,) = cursor.fetchone()
+            cursor.close()
+            print(f"room_search: {rows} rows ({active or 0} active), rooms: {source_rows}")
+            return 0
+        if args.command == "drop-triggers":
+            drop_triggers(connection)
+            return 0
+
+        if args.command == "migrate":
+            created = create_table(connection, rebuild=args.rebuild)
+            print("✅ room_search created" if created else "room_search already exists")
+        started = time.monotonic()
+        copied = backfill(
+            connection, args.batch_size,
+            progress=lambda count: print(f"  backfilled {count} rooms ({time.monotonic() - started:.0f}s)"),
+        )
+        print(f"✅ Backfilled {copied} rooms in {time.monotonic() - started:.1f}s")
+        if args.triggers:
+            install_triggers(connection)
+            print("✅ Triggers installed; set ROOM_SEARCH_REFRESH=trigger")
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import contextlib
+import contextvars
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sampling period; 10 ms (100 Hz) costs well under 1% of one core
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Fraction of process_message calls profiled without being asked (0 disables)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Leaf frames of threads parked waiting for work; left out of whole-process
+# profiles so the flame graph shows what the process was busy with
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+_labels: Dict[object, str] = {}
+_profile_ids = itertools.count(1)
+
+
+def frame_label(code) -> str:
+    """``function (path:line)`` like py-spy; paths inside the repo are relative to it."""
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        if filename.startswith(_ROOT):
+            filename = os.path.relpath(filename, _ROOT)
+        elif "site-packages" in filename:
+            filename = filename.split("site-packages" + os.sep, 1)[1]
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+
+
+class Profile:
+    """Stack sample counts in flame graph "collapsed" form (``root;...;leaf count``)."""
+
+    def __init__(self, interval: float, label: str = "", reason: str = ""):
+        self.id = next(_profile_ids)
+        self.label = label
+        self.reason = reason
+        self.interval = interval
+        self.started_at = time.time()
+        self.seconds = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_frames(self, n: int = 5) -> List[Tuple[str, int]]:
+        """Leaf frames with the most samples ("self" time)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        return leaves.most_common(n)
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "seconds": round(self.seconds, 3),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "top_frames": self.top_frames(),
+        }
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler: a daemon thread reads every thread's stack
+    from ``sys._current_frames()`` each ``interval`` and counts it. Nothing
+    is hooked into the profiled code, so it runs at full speed; the cost is
+    the sampling thread's share of the GIL.
+
+    ``thread_ids`` restricts sampling to those threads (one request);
+    otherwise all threads but idle ones are sampled, rooted at their name.
+    """
+
+    def __init__(
+        self,
+        interval: float = PROFILE_INTERVAL_MS / 1000,
+        thread_ids: Optional[Set[int]] = None,
+        include_idle: bool = False,
+        label: str = "",
+        reason: str = "",
+    ):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.include_idle = include_idle or thread_ids is not None
+        self.profile = Profile(interval, label, reason)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def sample(self):
+        """Takes one sample of the selected threads."""
+        own = threading.get_ident()
+        names = None if self.thread_ids is not None else {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            if not self.include_idle and _is_idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if names is not None:
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            stack.reverse()
+            self.profile.stacks[tuple(stack)] += 1
+        self.profile.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.sample()
+
+        self._thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.profile.seconds = time.perf_counter() - self._started
+        return self.profile
+
+
+class ProfileStore:
+    """The most recent per-request profiles, for /admin/profiles."""
+
+    def __init__(self, keep: int = PROFILE_KEEP):
+        self._profiles = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def summaries(self) -> List[Dict]:
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles)]
+
+
+request_profiles = ProfileStore()
+
+_profile_requested: contextvars.ContextVar[bool] = contextvars.ContextVar("profile_requested", default=False)
+
+
+@contextlib.contextmanager
+def request_profiling(requested: bool = True) -> Iterator[None]:
+    """Asks the ``profile_scope`` blocks run inside (including in ``asyncio.to_thread``) to profile."""
+    token = _profile_requested.set(requested)
+    try:
+        yield
+    finally:
+        _profile_requested.reset(token)
+
+
+@contextlib.contextmanager
+def profile_scope(label: str, sample_rate: Optional[float] = None) -> Iterator[Optional[SamplingProfiler]]:
+    """
+    Profiles the current thread for the duration of the block when asked
+    via ``request_profiling`` or picked by ``sample_rate`` (default
+    PROFILE_SAMPLE_RATE), storing the result in ``request_profiles``.
+    Otherwise it costs a context variable lookup.
+    """
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if _profile_requested.get():
+        reason = "requested"
+    elif rate > 0 and random.random() < rate:
+        reason = "sampled"
+    else:
+        yield None
+        return
+    profiler = SamplingProfiler(thread_ids={threading.get_ident()}, label=label, reason=reason).start()
+    try:
+        yield profiler
+    finally:
+        profile = profiler.stop()
+        request_profiles.add(profile)
+        logger.info(f"🔬 Profiled {label} ({reason}): {profile.samples} samples over {profile.seconds * 1000:.0f} ms, id {profile.id}")
+
+
+_exclusive = threading.Lock()
+
+
+def start_process_profile(interval: float = PROFILE_INTERVAL_MS / 1000) -> Optional[SamplingProfiler]:
+    """Starts a whole-process profile; None while another one is running."""
+    if not _exclusive.acquire(blocking=False):
+        return None
+    try:
+        return SamplingProfiler(interval=interval, label="process", reason="admin").start()
+    except Exception:
+        _exclusive.release()
+        raise
+
+
+def finish_process_profile(profiler: SamplingProfiler) -> Profile:
+    try:
+        return profiler.stop()
+    finally:
+        _exclusive.release()
@@ -1,7 +1,13 @@
 import re
 from app.core.db_connector import execute_query
+from app.core.gazetteer import location_sql_condition, resolve_locations
+from app.core.geo import get_geo_index
+from app.core.room_search import search_columns
 from typing import Dict, List, Optional
 
+# How many of the nearest properties a proximity fallback considers
+NEAREST_PROPERTIES_K = 25
+
 def extract_price(user_query: str) -> Optional[float]:
     """Extracts price from user query using regex."""
     price_match = re.search(r'₹?\s?(\d{1,3}(?:,\d{3})*(?:\.\d+)?)', user_query)
@@ -27,12 +33,13 @@ def find_similar_properties(original_query: str, user_query: str) -> List[Dict]:
     """
     price = extract_price(user_query)
     property_type = extract_property_type(user_query)
+    columns = search_columns()
+    rent = columns.rent
     
     # Base query parts
-    select_clause = """
+    select_clause = f"""
     SELECT DISTINCT p.*, r.*
-    FROM properties p
-    JOIN rooms r ON p.property_id = r.property_id
+    {columns.source}
     WHERE 1=1
     """
     
@@ -44,19 +51,36 @@ def find_similar_properties(original_query: str, user_query: str) -> List[Dict]:
         percentage = 0.10 if price < 25000 else 0.05
         lower_bound = price * (1 - percentage)
         upper_bound = price * (1 + percentage)
-        conditions.append("r.rentmonth BETWEEN %s AND %s")
+        conditions.append(f"{rent} BETWEEN %s AND %s")
         params.extend([lower_bound, upper_bound])
 
-    # Location matching
-    location_match = re.search(r'in\s+([a-zA-Z\s]+)', user_query, re.IGNORECASE)
-    if location_match:
-        location = location_match.group(1).strip()
-        conditions.append("(p.add1 LIKE %s OR p.zone LIKE %s)")
-        params.extend([f"%{location}%", f"%{location}%"])
+    # Location matching: k-nearest properties around a named station, else
+    # canonical gazetteer values
+    nearest_ids = []
+    try:
+        geo_index = get_geo_index()
+        proximity = geo_index.parse_proximity(user_query)
+        if proximity:
+            nearest = geo_index.nearest_properties(proximity.anchor, NEAREST_PROPERTIES_K)
+            nearest_ids = [property_id for _, property_id in nearest]
+    except Exception as e:
+        # Fall back to the place-name match below
+        print(f"Error in proximity lookup: {e}")
+
+    if nearest_ids:
+        conditions.append(f"{columns.propertyid} IN ({', '.join(['%s'] * len(nearest_ids))})")
+        params.extend(nearest_ids)
+    else:
+        location_condition, location_params = location_sql_condition(
+            resolve_locations(user_query), columns.location_columns, columns.lowercase_locations
+        )
+        if location_condition:
+            conditions.append(location_condition)
+            params.extend(location_params)
 
     # Property type matching
     if property_type:
-        conditions.append("(LOWER(r.roomtype) LIKE %s OR LOWER(r.propertytype) LIKE %s)")
+        conditions.append(f"({columns.roomtype} LIKE %s OR {columns.propertytype} LIKE %s)")
         params.extend([f"%{property_type}%", f"%{property_type}%"])
 
     # Combine conditions
@@ -72,16 +96,22 @@ def find_similar_properties(original_query: str, user_query: str) -> List[Dict]:
         END,
     """
     
+    if nearest_ids:
+        order_clause += f"""
+        FIELD({columns.propertyid}, {', '.join(['%s'] * len(nearest_ids))}),
+        """
+        params.extend(nearest_ids)
+
     if price is not None:
         order_clause += f"""
         CASE 
-            WHEN ABS(r.rentmonth - {price}) <= 1000 THEN 0
+            WHEN ABS({rent} - {price}) <= 1000 THEN 0
             ELSE 1
         END,
-        ABS(r.rentmonth - {price}),
+        ABS({rent} - {price}),
         """
 
-    order_clause += "r.rentmonth ASC LIMIT 5"
+    order_clause += f"{rent} ASC LIMIT 5"
 
     # Complete query
     query = select_clause + order_clause
@@ -0,0 +1,419 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+# Tables execute_query may read
+READABLE_TABLES = frozenset({"properties", "rooms", "room_search"})
+
+# Never allowed anywhere in a read query (as whole tokens, so `updated_at` is fine)
+FORBIDDEN_KEYWORDS = frozenset({
+    "INSERT", "UPDATE", "DELETE", "DROP", "TRUNCATE", "ALTER", "CREATE", "RENAME", "GRANT", "REVOKE",
+    "CALL", "HANDLER", "LOAD", "LOCK", "UNLOCK", "SET", "INTO", "OUTFILE", "DUMPFILE", "PREPARE",
+    "EXECUTE", "DEALLOCATE", "SHUTDOWN", "KILL",
+})
+FORBIDDEN_FUNCTIONS = frozenset({"SLEEP", "BENCHMARK", "LOAD_FILE", "GET_LOCK", "RELEASE_LOCK", "SYSTEM_USER"})
+
+# Words that are not column references
+KEYWORDS = frozenset({
+    "SELECT", "DISTINCT", "DISTINCTROW", "ALL", "FROM", "WHERE", "AND", "OR", "NOT", "XOR", "IN", "IS",
+    "NULL", "LIKE", "BETWEEN", "EXISTS", "JOIN", "INNER", "LEFT", "RIGHT", "OUTER", "CROSS", "NATURAL",
+    "STRAIGHT_JOIN", "ON", "USING", "AS", "GROUP", "BY", "ORDER", "ASC", "DESC", "HAVING", "LIMIT",
+    "OFFSET", "UNION", "EXCEPT", "INTERSECT", "CASE", "WHEN", "THEN", "ELSE", "END", "TRUE", "FALSE",
+    "UNKNOWN", "INTERVAL", "MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH",
+    "QUARTER", "YEAR", "REGEXP", "RLIKE", "SOUNDS", "DIV", "MOD", "ESCAPE", "COLLATE", "BINARY",
+    "WITH", "ROLLUP", "ANY", "SOME", "FORCE", "USE", "IGNORE", "INDEX", "KEY", "FOR", "LEADING",
+    "TRAILING", "BOTH", "SEPARATOR", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "SIGNED",
+    "UNSIGNED", "CHAR", "DECIMAL", "DATE", "DATETIME", "TIME", "INTEGER", "JSON", "OVER", "PARTITION",
+    "ROWS", "RANGE", "PRECEDING", "FOLLOWING", "UNBOUNDED", "CURRENT", "ROW", "WINDOW",
+    "SQL_NO_CACHE", "SQL_CALC_FOUND_ROWS", "HIGH_PRIORITY",
+})
+# A "(" after one of these opens a subquery or a group, not a function call
+_NON_FUNCTION_WORDS = KEYWORDS - {"LEFT", "RIGHT", "CHAR", "DATE", "TIME", "YEAR", "MONTH", "DAY", "HOUR",
+                                  "MINUTE", "SECOND", "WEEK", "QUARTER", "MICROSECOND", "MOD", "INTERVAL"}
+_TABLE_INTRODUCERS = frozenset({"FROM", "JOIN", "STRAIGHT_JOIN"})
+
+# Statements and shapes whose verdicts are remembered
+VALIDATOR_EXACT_CACHE_SIZE = 2048
+VALIDATOR_SHAPE_CACHE_SIZE = 4096
+# How long to wait before retrying a schema fetch that failed
+SCHEMA_RETRY_SECONDS = 30.0
+
+_TOKEN = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    | (?P<quoted>`(?:[^`]|``)+`)
+    | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?)
+    | (?P<param>%s|%\(\w+\)s|\?)
+    | (?P<name>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<op><=>|<=|>=|<>|!=|\|\||&&|[-+*/%=<>!(),.;~^&|])
+""", re.X | re.S)
+
+_LITERAL_KINDS = ("string", "number", "param")
+_VALUE_END = frozenset({"name", "quoted", "string", "number", "param"})
+
+
+class SQLSyntaxError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    value: str
+
+    @property
+    def upper(self) -> str:
+        return self.value.upper() if self.kind == "name" else ""
+
+    @property
+    def identifier(self) -> str:
+        """Identifier text with backticks removed, lowercased (MySQL names are case-insensitive here)."""
+        if self.kind == "quoted":
+            return self.value[1:-1].replace("``", "`").lower()
+        return self.value.lower()
+
+
+def tokenize(query: str) -> List[Token]:
+    """Splits SQL into tokens, dropping whitespace and comments."""
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None:
+            raise SQLSyntaxError(f"unexpected character {query[position]!r} at {position}")
+        kind = match.lastgroup
+        value = match.group()
+        position = match.end()
+        if kind == "comment":
+            if value.startswith(("/*!", "/*+")):
+                # MySQL executes the body of /*! ... */ comments
+                raise SQLSyntaxError("executable comment")
+            continue
+        if kind != "ws":
+            tokens.append(Token(kind, value))
+    return tokens
+
+
+def statement_shape(tokens: List[Token]) -> str:
+    """The statement with literals replaced by ``?`` and IN lists collapsed; the verdict cache key."""
+    parts = ["?" if token.kind in _LITERAL_KINDS else (token.upper or token.value) for token in tokens]
+    return re.sub(r"\( \?(?: , \?)* \)", "( ? )", " ".join(parts))
+
+
+@dataclass(frozen=True)
+class Verdict:
+    ok: bool
+    reason: str = ""
+    tables: FrozenSet[str] = field(default_factory=frozenset)
+
+
+def _is_table_name(token: Token) -> bool:
+    return token.kind == "quoted" or (token.kind == "name" and token.upper not in KEYWORDS)
+
+
+class _Analysis:
+    """One pass over a tokenized statement; ``run`` returns a Verdict."""
+
+    def __init__(self, tokens: List[Token], schema: Optional[Dict[str, Set[str]]], readable: FrozenSet[str]):
+        self.tokens = tokens
+        self.schema = schema
+        self.readable = readable
+        self.aliases: Dict[str, Optional[str]] = {}  # alias -> table (None for derived tables)
+        self.tables: Set[str] = set()
+        self.output_aliases: Set[str] = set()
+        self.alias_positions: Set[int] = set()
+
+    def token(self, index: int) -> Optional[Token]:
+        return self.tokens[index] if 0 <= index < len(self.tokens) else None
+
+    def run(self) -> Verdict:
+        tokens = self.tokens
+        if not tokens:
+            return Verdict(False, "empty query")
+        for index, token in enumerate(tokens):
+            if token.value == ";" and index != len(tokens) - 1:
+                return Verdict(False, "multiple statements")
+        if tokens[-1].value == ";":
+            tokens = self.tokens = tokens[:-1]
+        if not tokens or tokens[0].upper != "SELECT":
+            return Verdict(False, "only SELECT statements are allowed")
+
+        function_parens = self._match_parens()
+        if isinstance(function_parens, Verdict):
+            return function_parens
+
+        for index, token in enumerate(tokens):
+            if token.upper in FORBIDDEN_KEYWORDS:
+                return Verdict(False, f"forbidden keyword {token.upper}")
+            following = self.token(index + 1)
+            if token.upper in FORBIDDEN_FUNCTIONS and following is not None and following.value == "(":
+                return Verdict(False, f"forbidden function {token.upper}")
+
+        for index, token in enumerate(tokens):
+            if token.upper in _TABLE_INTRODUCERS and not function_parens[index]:
+                error = self._read_table_refs(index + 1, allow_list=token.upper == "FROM")
+                if error:
+                    return Verdict(False, error)
+        if not self.tables and not self.aliases:
+            return Verdict(False, "no table referenced")
+
+        self._collect_output_aliases()
+        error = self._check_columns()
+        if error:
+            return Verdict(False, error)
+        return Verdict(True, tables=frozenset(self.tables))
+
+    def _match_parens(self):
+        """For each token, whether its innermost enclosing parenthesis is a function call."""
+        inside_function: List[bool] = []
+        stack: List[Tuple[int, bool]] = []
+        self.closing: Dict[int, int] = {}
+        for index, token in enumerate(self.tokens):
+            inside_function.append(bool(stack) and stack[-1][1])
+            if token.value == "(":
+                previous = self.token(index - 1)
+                is_function = previous is not None and previous.kind == "name" and previous.upper not in _NON_FUNCTION_WORDS
+                stack.append((index, is_function))
+            elif token.value == ")":
+                if not stack:
+                    return Verdict(False, "unbalanced parentheses")
+                opened, _ = stack.pop()
+                self.closing[opened] = index
+        if stack:
+            return Verdict(False, "unbalanced parentheses")
+        return inside_function
+
+    def _read_alias(self, index: int) -> Tuple[Optional[str], int]:
+        token = self.token(index)
+        if token is not None and token.upper == "AS":
+            index += 1
+            token = self.token(index)
+            if token is None or token.kind not in ("name", "quoted"):
+                return None, index
+        elif token is None or not _is_table_name(token):
+            return None, index
+        self.alias_positions.add(index)
+        return token.identifier, index + 1
+
+    def _read_table_refs(self, index: int, allow_list: bool) -> Optional[str]:
+        while True:
+            token = self.token(index)
+            if token is None:
+                return "missing table name"
+            if token.value == "(":
+                # Derived table: its own FROM is checked when the scan reaches it
+                alias, index = self._read_alias(self.closing[index] + 1)
+                if alias:
+                    self.aliases[alias] = None
+            elif _is_table_name(token):
+                following = self.token(index + 1)
+                if following is not None and following.value == ".":
+                    return "schema-qualified tables are not allowed"
+                table = token.identifier
+                if table not in self.readable:
+                    return f"table {table} is not readable"
+                if self.schema is not None and table not in self.schema:
+                    return f"unknown table {table}"
+                self.tables.add(table)
+                self.aliases[table] = table
+                alias, index = self._read_alias(index + 1)
+                if alias:
+                    self.aliases[alias] = table
+            else:
+                return f"unexpected {token.value!r} after FROM/JOIN"
+            following = self.token(index)
+            if allow_list and following is not None and following.value == ",":
+                index += 1
+                continue
+            return None
+
+    def _collect_output_aliases(self):
+        # `expr AS name` and `expr name`: a name right after a value ends an expression
+        for index, token in enumerate(self.tokens):
+            if token.kind not in ("name", "quoted") or token.upper in KEYWORDS:
+                continue
+            previous = self.token(index - 1)
+            if previous is None:
+                continue
+            if previous.upper == "AS" or previous.value == ")" or (previous.kind in _VALUE_END and previous.upper not in KEYWORDS):
+                following = self.token(index + 1)
+                if following is None or following.value not in (".", "("):
+                    self.output_aliases.add(token.identifier)
+                    self.alias_positions.add(index)
+
+    def _check_columns(self) -> Optional[str]:
+        schema = self.schema
+        known_columns: Optional[Set[str]] = None
+        if schema is not None and all(table is not None for table in self.aliases.values()):
+            known_columns = set()
+            for table in self.tables:
+                known_columns |= schema.get(table, set())
+
+        for index, token in enumerate(self.tokens):
+            if token.kind not in ("name", "quoted") or index in self.alias_positions:
+                continue
+            if token.kind == "name" and token.upper in KEYWORDS:
+                continue
+            following = self.token(index + 1)
+            previous = self.token(index - 1)
+            if following is not None and following.value == "(":
+                continue  # function call
+            if following is not None and following.value == ".":
+                qualifier = token.identifier
+                if qualifier not in self.aliases:
+                    return f"unknown table or alias {qualifier}"
+                column_token = self.token(index + 2)
+                table = self.aliases[qualifier]
+                if column_token is None:
+                    return "dangling qualifier"
+                if column_token.value == "*" or table is None or schema is None:
+                    continue
+                if column_token.identifier not in schema.get(table, set()):
+                    return f"unknown column {qualifier}.{column_token.identifier}"
+                continue
+            if previous is not None and previous.value == ".":
+                continue  # checked with its qualifier
+            name = token.identifier
+            if name in self.aliases or name in self.output_aliases:
+                continue
+            if known_columns is not None and name not in known_columns:
+                return f"unknown column {name}"
+        return None
+
+
+class SQLValidator:
+    """
+    Validates that a statement is a single SELECT over readable tables and
+    known columns.
+
+    Statements are tokenized (so keywords inside string literals or column
+    names such as ``updated_at`` are not mistaken for writes), and verdicts
+    are cached first by exact text and then by statement shape, so a query
+    generated again with different values skips the analysis. Without a
+    schema only statement type and tables are checked; verdicts cached then
+    are dropped once the schema loads.
+    """
+
+    def __init__(
+        self,
+        schema_loader: Optional[Callable[[], Optional[Dict]]] = None,
+        readable_tables: FrozenSet[str] = READABLE_TABLES,
+        exact_cache_size: int = VALIDATOR_EXACT_CACHE_SIZE,
+        shape_cache_size: int = VALIDATOR_SHAPE_CACHE_SIZE,
+        schema_retry_seconds: float = SCHEMA_RETRY_SECONDS,
+    ):
+        self.schema_loader = schema_loader if schema_loader is not None else _load_app_schema
+        self.readable_tables = frozenset(table.lower() for table in readable_tables)
+        self.exact_cache_size = exact_cache_size
+        self.shape_cache_size = shape_cache_size
+        self.schema_retry_seconds = schema_retry_seconds
+        self._schema: Optional[Dict[str, Set[str]]] = None
+        self._schema_failed_at: Optional[float] = None
+        self._exact: "OrderedDict[str, Verdict]" = OrderedDict()
+        self._shapes: "OrderedDict[str, Verdict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.validations = 0
+        self.exact_hits = 0
+        self.shape_hits = 0
+        self.rejections = 0
+
+    def schema(self) -> Optional[Dict[str, Set[str]]]:
+        if self._schema is not None:
+            return self._schema
+        if self._schema_failed_at is not None and time.monotonic() - self._schema_failed_at < self.schema_retry_seconds:
+            return None
+        try:
+            raw = self.schema_loader()
+        except Exception as e:
+            print(f"⚠️ SQL validator running without schema: {e}")
+            raw = None
+        if not raw:
+            self._schema_failed_at = time.monotonic()
+            return None
+        schema = {table.lower(): {column.lower() for column in columns} for table, columns in raw.items()}
+        with self._lock:
+            self._schema = schema
+            # Verdicts reached without column checks no longer apply
+            self._exact.clear()
+            self._shapes.clear()
+        return schema
+
+    def reload_schema(self):
+        """Drops the schema (and verdicts reached with it) so the next validation fetches it again."""
+        with self._lock:
+            self._schema = None
+            self._schema_failed_at = None
+            self._exact.clear()
+            self._shapes.clear()
+
+    @staticmethod
+    def _remember(cache: "OrderedDict[str, Verdict]", key: str, verdict: Verdict, size: int):
+        cache[key] = verdict
+        if len(cache) > size:
+            cache.popitem(last=False)
+
+    def validate(self, query: str) -> Verdict:
+        schema = self.schema()
+        with self._lock:
+            self.validations += 1
+            verdict = self._exact.get(query)
+            if verdict is not None:
+                self.exact_hits += 1
+                self._exact.move_to_end(query)
+                self.rejections += not verdict.ok
+                return verdict
+
+        try:
+            tokens = tokenize(query)
+        except SQLSyntaxError as e:
+            with self._lock:
+                self.rejections += 1
+            return Verdict(False, str(e))
+        shape = statement_shape(tokens)
+
+        with self._lock:
+            verdict = self._shapes.get(shape)
+            if verdict is not None:
+                self.shape_hits += 1
+                self._shapes.move_to_end(shape)
+        if verdict is None:
+            verdict = _Analysis(tokens, schema, self.readable_tables).run()
+            with self._lock:
+                self._remember(self._shapes, shape, verdict, self.shape_cache_size)
+        with self._lock:
+            self._remember(self._exact, query, verdict, self.exact_cache_size)
+            self.rejections += not verdict.ok
+        return verdict
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "validations": self.validations,
+                "exact_hits": self.exact_hits,
+                "shape_hits": self.shape_hits,
+                "rejections": self.rejections,
+                "cached_shapes": len(self._shapes),
+                "schema_loaded": self._schema is not None,
+            }
+
+
+def _load_app_schema() -> Optional[Dict]:
+    from app.core.query_generator import get_schema
+    return get_schema()
+
+
+_validator: Optional[SQLValidator] = None
+_validator_lock = threading.Lock()
+
+
+def get_sql_validator() -> SQLValidator:
+    global _validator
+    if _validator is None:
+        with _validator_lock:
+            if _validator is None:
+                _validator = SQLValidator()
+    return _validator
@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "blocking" finishes warm-up before serving, "background" serves immediately
+# and warms up alongside, "off" leaves every resource to first use.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+STARTUP_PARALLEL = os.getenv("STARTUP_PARALLEL", "1") == "1"
+
+
+def _init_db_pool():
+    from app.config.db_config import init_db_pool
+    init_db_pool()
+
+
+def _load_schema():
+    from app.core.query_generator import get_schema
+    get_schema()
+
+
+def _init_llm_clients():
+    from app.core.llm_gateway import get_llm_gateway
+    get_llm_gateway().warm_up()
+
+
+def _import_prompt_library():
+    from app.core.intent_classifier import intent_prompt
+    intent_prompt.format(user_query="")
+
+
+def _load_location_indexes():
+    from app.core.gazetteer import get_gazetteer
+    from app.core.geo import get_geo_index
+    get_gazetteer()
+    get_geo_index()
+
+
+def _build_vector_index():
+    from app.core.vector_search import get_vector_index
+    get_vector_index()
+
+
+def _load_faq():
+    from app.core.faq import get_faq_retriever
+    get_faq_retriever()
+
+
+def _load_saved_searches():
+    from app.core.alerts import load_saved_searches_once
+    load_saved_searches_once()
+
+
+def _load_viewing_calendars():
+    from app.core.viewing_scheduler import get_viewing_scheduler
+    get_viewing_scheduler()
+
+
+def _import_twilio():
+    import twilio.rest  # noqa: F401
+
+
+# The DB pool goes first so the loaders after it reuse its connections
+STARTUP_TASKS: List[Tuple[str, Callable[[], None]]] = [
+    ("db_pool", _init_db_pool),
+    ("schema", _load_schema),
+    ("llm_clients", _init_llm_clients),
+    ("prompts", _import_prompt_library),
+    ("location_indexes", _load_location_indexes),
+    ("saved_searches", _load_saved_searches),
+    ("vector_index", _build_vector_index),
+    ("faq", _load_faq),
+    ("viewing_calendars", _load_viewing_calendars),
+    ("twilio", _import_twilio),
+]
+
+
+def _timed(name: str, task: Callable[[], None]) -> Tuple[str, object]:
+    started = time.perf_counter()
+    try:
+        task()
+    except Exception as e:
+        logger.error(f"❌ Startup task {name} failed: {e}")
+        return name, f"error: {e}"
+    return name, round(time.perf_counter() - started, 3)
+
+
+def warm_up_resources(parallel: bool = STARTUP_PARALLEL) -> Dict[str, object]:
+    """
+    Initializes the DB pool, schema, LLM clients and in-memory indexes.
+
+    Failures are logged and reported but never raised, so the app still
+    starts with MySQL or OpenAI down; anything that failed is retried
+    lazily on first use. Returns seconds taken (or the error) per task.
+    """
+    started = time.perf_counter()
+    name, result = _timed(*STARTUP_TASKS[0])
+    results = {name: result}
+    remaining = STARTUP_TASKS[1:]
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(remaining), thread_name_prefix="startup") as pool:
+            results.update(pool.map(lambda task: _timed(*task), remaining))
+    else:
+        results.update(_timed(*task) for task in remaining)
+
+    logger.info(f"🚀 Warm-up finished in {time.perf_counter() - started:.2f}s: {results}")
+    return results
+
+
+def start_warm_up(mode: str = STARTUP_WARMUP) -> Optional[threading.Thread]:
+    """Runs ``warm_up_resources`` according to ``mode``; returns the thread when it runs in the background."""
+    if mode == "off":
+        return None
+    if mode == "blocking":
+        warm_up_resources()
+        return None
+    thread = threading.Thread(target=warm_up_resources, name="warm-up", daemon=True)
+    thread.start()
+    return thread
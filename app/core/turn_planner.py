@@ -0,0 +1,207 @@
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.core.llm_gateway import percentile
+from app.core.llm_resilience import Deadline, current_deadline
+from app.core.model_router import EXTRACTION, FOLLOW_UP_CLASSIFIER, FOLLOW_UP_RESPONSE, GENERAL_RESPONSE, INTENT
+
+logger = logging.getLogger(__name__)
+
+# Non-LLM stage that is skipped when time runs short
+SIMILARITY = "similarity"
+
+# Expected duration of each stage until enough recent timings exist
+DEFAULT_STAGE_SECONDS = {
+    INTENT: 1.0,
+    EXTRACTION: 1.5,
+    FOLLOW_UP_CLASSIFIER: 1.5,
+    FOLLOW_UP_RESPONSE: 2.5,
+    GENERAL_RESPONSE: 2.5,
+    SIMILARITY: 0.5,
+}
+# What runs instead when a stage is skipped, as reported in the metrics
+SUBSTITUTES = {
+    INTENT: "rule-based intent",
+    EXTRACTION: "rule-based extraction only",
+    FOLLOW_UP_CLASSIFIER: "follow-up handling skipped",
+    FOLLOW_UP_RESPONSE: "templated follow-up answer",
+    GENERAL_RESPONSE: "curated/templated general reply",
+    SIMILARITY: "similarity fallback skipped",
+}
+
+# Time kept back for everything after the last stage (formatting, sending)
+TURN_RESERVE_SECONDS = float(os.getenv("TURN_RESERVE_SECONDS", "0.3"))
+# Stages are estimated at this percentile of their recent durations...
+STAGE_ESTIMATE_PERCENTILE = 0.9
+STAGE_MIN_SAMPLES = 5
+STAGE_WINDOW = 50
+# ...and timings older than this are forgotten, so a stage skipped during an
+# outage is tried again at its default estimate once the outage is over
+STAGE_SAMPLE_TTL_SECONDS = float(os.getenv("STAGE_SAMPLE_TTL_SECONDS", "300"))
+RECENT_DEGRADED_TURNS = 20
+
+
+class StageEstimator:
+    """Recent durations per stage, turned into a pessimistic estimate."""
+
+    def __init__(
+        self,
+        defaults: Dict[str, float] = DEFAULT_STAGE_SECONDS,
+        ttl_seconds: float = STAGE_SAMPLE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.defaults = dict(defaults)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=STAGE_WINDOW)).append((self._clock(), seconds))
+
+    def estimate(self, stage: str) -> float:
+        cutoff = self._clock() - self.ttl_seconds
+        with self._lock:
+            samples = self._samples.get(stage)
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            if not samples or len(samples) < STAGE_MIN_SAMPLES:
+                return self.defaults.get(stage, 0.0)
+            durations = sorted(seconds for _, seconds in samples)
+        return percentile(durations, STAGE_ESTIMATE_PERCENTILE)
+
+    def snapshot(self) -> Dict[str, float]:
+        stages = set(self.defaults) | set(self._samples)
+        return {stage: round(self.estimate(stage), 3) for stage in sorted(stages)}
+
+
+class TurnPlan:
+    """
+    Stage-by-stage decisions for one chat turn against its deadline.
+
+    ``allow(stage)`` is asked before each optional or replaceable stage: it
+    says yes while the deadline leaves room for the stage's estimated
+    duration plus the reserve, and otherwise records the degradation so the
+    caller takes the cheaper path. With no deadline everything is allowed.
+    """
+
+    def __init__(self, planner: Optional["TurnPlanner"], deadline: Optional[Deadline]):
+        self.planner = planner
+        self.deadline = deadline
+        self.degradations: List[str] = []
+        self.started = time.monotonic()
+
+    def remaining(self) -> float:
+        return self.deadline.remaining() if self.deadline is not None else float("inf")
+
+    def allow(self, stage: str) -> bool:
+        if self.planner is None or self.deadline is None:
+            return True
+        needed = self.planner.estimator.estimate(stage) + self.planner.reserve_seconds
+        remaining = self.remaining()
+        if remaining >= needed:
+            return True
+        self.degradations.append(stage)
+        logger.info(f"⏱️ Skipping {stage} ({remaining:.2f}s left, needs ~{needed:.2f}s): {SUBSTITUTES.get(stage, 'skipped')}")
+        return False
+
+    @contextlib.contextmanager
+    def run(self, stage: str) -> Iterator[None]:
+        """Times a stage that was allowed, to refine its estimate."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.planner is not None:
+                self.planner.estimator.record(stage, time.monotonic() - started)
+
+    def finish(self):
+        if self.planner is not None:
+            self.planner.finish(self)
+
+
+class TurnPlanner:
+    """Creates turn plans and aggregates what they did, for /admin/metrics."""
+
+    def __init__(self, estimator: Optional[StageEstimator] = None, reserve_seconds: float = TURN_RESERVE_SECONDS):
+        self.estimator = estimator or StageEstimator()
+        self.reserve_seconds = reserve_seconds
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.degraded_turns = 0
+        self.over_budget_turns = 0
+        self.degradations: Counter = Counter()
+        self._durations = deque(maxlen=1000)
+        self._recent = deque(maxlen=RECENT_DEGRADED_TURNS)
+
+    def begin(self, deadline: Optional[Deadline] = None) -> TurnPlan:
+        return TurnPlan(self, deadline if deadline is not None else current_deadline())
+
+    def finish(self, plan: TurnPlan):
+        seconds = time.monotonic() - plan.started
+        over_budget = plan.deadline is not None and plan.deadline.expired and not plan.deadline.cancelled
+        with self._lock:
+            self.turns += 1
+            self._durations.append(seconds)
+            self.over_budget_turns += int(over_budget)
+            if plan.degradations:
+                self.degraded_turns += 1
+                self.degradations.update(plan.degradations)
+                self._recent.append({"at": time.time(), "seconds": round(seconds, 3), "degradations": list(plan.degradations)})
+        if plan.degradations:
+            logger.warning(f"⏱️ Turn degraded ({seconds:.2f}s): {', '.join(plan.degradations)}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            durations = sorted(self._durations)
+            return {
+                "turns": self.turns,
+                "degraded_turns": self.degraded_turns,
+                "over_budget_turns": self.over_budget_turns,
+                "degradations": dict(self.degradations),
+                "turn_p50_s": round(percentile(durations, 0.50), 3),
+                "turn_p95_s": round(percentile(durations, 0.95), 3),
+                "stage_estimates_s": self.estimator.snapshot(),
+                "recent_degraded_turns": list(self._recent),
+            }
+
+
+_current_plan: contextvars.ContextVar[Optional[TurnPlan]] = contextvars.ContextVar("turn_plan", default=None)
+# Used outside a turn (scripts, tests): no deadline, every stage allowed
+_UNPLANNED = TurnPlan(None, None)
+
+
+def current_plan() -> TurnPlan:
+    return _current_plan.get() or _UNPLANNED
+
+
+@contextlib.contextmanager
+def plan_scope(planner: Optional[TurnPlanner] = None) -> Iterator[TurnPlan]:
+    """Plans the block's stages against the current deadline (enter it inside ``deadline_scope``)."""
+    plan = (planner or get_turn_planner()).begin()
+    token = _current_plan.set(plan)
+    try:
+        yield plan
+    finally:
+        _current_plan.reset(token)
+        plan.finish()
+
+
+_planner: Optional[TurnPlanner] = None
+_planner_lock = threading.Lock()
+
+
+def get_turn_planner() -> TurnPlanner:
+    global _planner
+    if _planner is None:
+        with _planner_lock:
+            if _planner is None:
+                _planner = TurnPlanner()
+    return _planner
@@ -1,4 +1,3 @@
-from twilio.rest import Client
 import os
 import logging
 from dotenv import load_dotenv
@@ -21,6 +20,8 @@ def send_whatsapp_message(to_number: str, body: str, media_url: str = None) -> s
         str: Message SID if sent successfully, or error message if failed.
     """
     try:
+        from twilio.rest import Client  # imported on first send to keep startup fast
+
         account_sid = os.getenv("TWILIO_ACCOUNT_SID")
         auth_token = os.getenv("TWILIO_AUTH_TOKEN")
         twilio_whatsapp_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
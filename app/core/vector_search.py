@@ -0,0 +1,445 @@
+import atexit
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.alerts import room_key
+from app.core.bulk_search import CompiledRequirement, fetch_active_listings, listing_location_keys
+from app.core.db_connector import execute_query
+from app.core.gazetteer import STOPWORDS, LocationGazetteer, get_gazetteer
+from app.core.geo import GeoIndex, get_geo_index
+from app.core.room_search import AMENITY_COLUMNS, ROOMS_KEY_COLUMN, amenity_flag
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "512"))
+# Where the memory-mapped embedding matrix lives (rebuilt from the DB at startup)
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(tempfile.gettempdir(), "chatbot_vectors"))
+# Rows scored per matrix multiply; bounds the temporary score buffer
+SEARCH_BLOCK_ROWS = 65536
+# Listings re-read per query when the change feed reports updates
+REFRESH_BATCH_KEYS = 500
+# Weight of text similarity vs structured predicates in hybrid ranking
+HYBRID_TEXT_WEIGHT = float(os.getenv("HYBRID_TEXT_WEIGHT", "0.6"))
+# How long to wait before rebuilding after listings could not be loaded
+VECTOR_INDEX_RETRY_SECONDS = float(os.getenv("VECTOR_INDEX_RETRY_SECONDS", "30"))
+
+# Free-text columns used when present in the schema
+TEXT_COLUMNS = ("roomtype", "propertytype", "propertyname", "buildingname", "add1", "add2", "zone", "city",
+                "nearestmrt", "nearestbusstop", "description", "remarks")
+AMENITY_WORDS = {
+    "airconditioned": "airconditioned aircon",
+    "wifi": "wifi internet",
+    "tv": "tv television",
+    "fridge": "fridge refrigerator",
+    "washer": "washer washing machine laundry",
+    "gym": "gym fitness",
+    "swimming": "swimming pool",
+}
+# Query words mapped onto the vocabulary listings are described with
+SYNONYMS = {
+    "ac": "aircon", "air": "aircon", "conditioning": "aircon", "internet": "wifi", "laundry": "washer",
+    "pool": "swimming", "fitness": "gym", "train": "mrt", "station": "mrt", "flat": "hdb",
+    "apartment": "condo", "condominium": "condo", "refrigerator": "fridge",
+}
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.25
+
+_WORDS = re.compile(r"[a-z0-9]+")
+
+
+def listing_text(row: Dict) -> str:
+    """The words a listing is embedded from: types, address, MRT and amenities."""
+    parts = [str(row[column]) for column in TEXT_COLUMNS if row.get(column)]
+    parts.extend(AMENITY_WORDS[column] for column in AMENITY_COLUMNS if amenity_flag(row.get(column)))
+    return " ".join(parts)
+
+
+class HashingVectorizer:
+    """
+    Stateless text embedding by feature hashing.
+
+    Words (with synonyms folded), word bigrams and character trigrams are
+    hashed into ``dim`` signed buckets and the vector is L2-normalized, so
+    cosine similarity is a dot product. Needs no model download or fitting
+    and gives every process the same vectors for the same text.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+
+    def features(self, text: str) -> List[Tuple[str, float]]:
+        words = [SYNONYMS.get(word, word) for word in _WORDS.findall(text.lower()) if word not in STOPWORDS]
+        features = [(word, WORD_WEIGHT) for word in words]
+        features.extend((f"{a} {b}", BIGRAM_WEIGHT) for a, b in zip(words, words[1:]))
+        for word in words:
+            if len(word) > 3:
+                padded = f"<{word}>"
+                features.extend((padded[i:i + 3], TRIGRAM_WEIGHT) for i in range(len(padded) - 2))
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self.features(text)
+        if features:
+            digests = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature, _ in features),
+                                  dtype=np.uint32, count=len(features))
+            weights = np.fromiter((weight for _, weight in features), dtype=np.float32, count=len(features))
+            weights[(digests & 0x80000000) == 0] *= -1
+            np.add.at(vector, digests % self.dim, weights)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class VectorIndex:
+    """
+    Listing embeddings in a memory-mapped float32 matrix with blocked top-k.
+
+    Rows are addressed by room key; removed rows are marked dead and reused.
+    The matrix grows by doubling into a new file, so its pages live in the
+    OS page cache rather than the Python heap. Alongside the vectors it
+    keeps rent, type text and location postings per row so structured
+    requirements can be scored in bulk for hybrid ranking. ``path=None``
+    keeps the matrix in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, dim: int = VECTOR_DIM, capacity: int = 1024,
+                 vectorizer: Optional[HashingVectorizer] = None):
+        self.path = path
+        self.dim = dim
+        self.vectorizer = vectorizer or HashingVectorizer(dim)
+        self._lock = threading.RLock()
+        self._keys: List[Optional[Hashable]] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._free: List[int] = []
+        self._generation = 0
+        self._matrix = self._allocate(max(capacity, 1))
+        self._alive = np.zeros(len(self._matrix), dtype=bool)
+        self._rent = np.zeros(len(self._matrix), dtype=np.float32)
+        self._type_text: List[str] = []
+        self._type_rows: Dict[str, Set[int]] = {}
+        self._location_keys: List[Set[str]] = []
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if self.path is None:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._generation += 1
+        # Per process, so workers sharing VECTOR_INDEX_DIR never map the same file
+        filename = f"{self.path}.{os.getpid()}.{self._generation}.f32"
+        return np.memmap(filename, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+
+    def _grow(self):
+        old = self._matrix
+        capacity = len(old) * 2
+        matrix = self._allocate(capacity)
+        matrix[:len(old)] = old
+        self._matrix = matrix
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(old), dtype=bool)])
+        self._rent = np.concatenate([self._rent, np.zeros(capacity - len(old), dtype=np.float32)])
+        if isinstance(old, np.memmap):
+            filename = old.filename
+            del old
+            os.remove(filename)
+
+    def upsert(self, row: Dict):
+        key = room_key(row)
+        vector = self.vectorizer.transform(listing_text(row))
+        with self._lock:
+            index = self._rows.get(key)
+            if index is None:
+                if self._free:
+                    index = self._free.pop()
+                else:
+                    index = len(self._keys)
+                    if index >= len(self._matrix):
+                        self._grow()
+                    self._keys.append(None)
+                    self._type_text.append("")
+                    self._location_keys.append(set())
+                self._rows[key] = index
+                self._keys[index] = key
+            else:
+                self._unpost(index)
+            self._matrix[index] = vector
+            self._alive[index] = True
+            self._rent[index] = float(row.get("rentmonth") or 0)
+            type_text = f"{row.get('roomtype') or ''} {row.get('propertytype') or ''}".lower()
+            self._type_text[index] = type_text
+            self._type_rows.setdefault(type_text, set()).add(index)
+            location_keys = listing_location_keys(row)
+            self._location_keys[index] = location_keys
+            for location_key in location_keys:
+                self._postings.setdefault(location_key, set()).add(index)
+
+    def _unpost(self, index: int):
+        rows = self._type_rows.get(self._type_text[index])
+        if rows is not None:
+            rows.discard(index)
+            if not rows:
+                del self._type_rows[self._type_text[index]]
+        self._type_text[index] = ""
+        for location_key in self._location_keys[index]:
+            postings = self._postings.get(location_key)
+            if postings is not None:
+                postings.discard(index)
+                if not postings:
+                    del self._postings[location_key]
+        self._location_keys[index] = set()
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            index = self._rows.pop(key, None)
+            if index is None:
+                return
+            self._unpost(index)
+            self._alive[index] = False
+            self._matrix[index] = 0.0
+            self._keys[index] = None
+            self._free.append(index)
+
+    def apply(self, rows: Iterable[Dict]):
+        """Upserts active listings and removes inactive ones."""
+        for row in rows:
+            active = float(row.get("rentmonth") or 0) > 0 and str(row.get("status", "")).lower() not in ("i", "inactive")
+            if active:
+                self.upsert(row)
+            else:
+                self.remove(room_key(row))
+
+    def _location_rows(self, compiled: CompiledRequirement) -> Optional[Set[int]]:
+        """Rows in the requirement's location (None without a location); caller holds the lock."""
+        location_keys = compiled.location_keys
+        if location_keys is None and compiled.location_terms:
+            location_keys = {f"add1:{term}" for term in compiled.location_terms}
+        if location_keys is None:
+            return None
+        rows = set()
+        for location_key in location_keys:
+            rows.update(self._postings.get(location_key, ()))
+        return rows
+
+    def structured_scores(self, compiled: CompiledRequirement) -> Optional[np.ndarray]:
+        """Fraction of the requirement's predicates each row satisfies (None without predicates)."""
+        with self._lock:
+            size = len(self._keys)
+            satisfied = np.zeros(size, dtype=np.float32)
+            predicates = 0
+            if compiled.budget is not None:
+                predicates += 1
+                satisfied += self._rent[:size] <= compiled.budget
+            rows = self._location_rows(compiled)
+            if rows is not None:
+                predicates += 1
+                if rows:
+                    satisfied[np.fromiter(rows, dtype=np.int64, count=len(rows))] += 1
+            if compiled.property_type:
+                predicates += 1
+                rows = set()
+                for text, postings in self._type_rows.items():
+                    if compiled.property_type in text:
+                        rows.update(postings)
+                if rows:
+                    satisfied[np.fromiter(rows, dtype=np.int64, count=len(rows))] += 1
+        if not predicates:
+            return None
+        return satisfied / predicates
+
+    def allowed_rows(self, compiled: CompiledRequirement) -> Optional[np.ndarray]:
+        """
+        Rows meeting the requirement's hard predicates: within budget and,
+        when the location resolved to known places, in one of them. Unknown
+        place names stay a soft, ranking-only predicate.
+        """
+        with self._lock:
+            size = len(self._keys)
+            allowed = None
+            if compiled.budget is not None:
+                allowed = self._rent[:size] <= compiled.budget
+            if compiled.location_keys is not None:
+                in_location = np.zeros(size, dtype=bool)
+                rows = self._location_rows(compiled)
+                if rows:
+                    in_location[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+                allowed = in_location if allowed is None else allowed & in_location
+        return allowed
+
+    def search(self, query: str, k: int = 5, boost: Optional[np.ndarray] = None,
+               text_weight: float = 1.0, block_rows: int = SEARCH_BLOCK_ROWS,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[float, Hashable]]:
+        """
+        Top ``k`` (score, key) by cosine similarity to ``query``, blended
+        with a per-row ``boost`` in [0, 1] as ``text_weight * cosine +
+        (1 - text_weight) * boost``. Rows outside ``allowed`` are never
+        returned. Scored block by block, keeping only each block's top k,
+        so memory stays O(block + k).
+        """
+        vector = self.vectorizer.transform(query)
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        with self._lock:
+            size = len(self._keys)
+            for start in range(0, size, block_rows):
+                end = min(start + block_rows, size)
+                scores = self._matrix[start:end] @ vector
+                if boost is not None:
+                    scores = text_weight * scores + (1 - text_weight) * boost[start:end]
+                scores[~self._alive[start:end]] = -np.inf
+                if allowed is not None:
+                    # Rows added since ``allowed`` was computed were not checked
+                    blocked = np.ones(end - start, dtype=bool)
+                    checked = allowed[start:end]
+                    blocked[:len(checked)] = ~checked
+                    scores[blocked] = -np.inf
+                if end - start > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                else:
+                    top = np.arange(end - start)
+                best_scores = np.concatenate([best_scores, scores[top]])
+                best_rows = np.concatenate([best_rows, top + start])
+                if len(best_scores) > k:
+                    keep = np.argpartition(-best_scores, k - 1)[:k]
+                    best_scores, best_rows = best_scores[keep], best_rows[keep]
+            order = np.argsort(-best_scores, kind="stable")
+            return [
+                (float(best_scores[i]), self._keys[best_rows[i]])
+                for i in order if np.isfinite(best_scores[i])
+            ]
+
+    def hybrid_search(self, query: str, requirements: Optional[Dict] = None, k: int = 5,
+                      text_weight: float = HYBRID_TEXT_WEIGHT,
+                      gazetteer: Optional[LocationGazetteer] = None,
+                      geo_index: Optional[GeoIndex] = None) -> List[Tuple[float, Hashable]]:
+        """
+        Ranks by text similarity and by how many of ``requirements`` each
+        listing meets; listings over budget or outside a known location are
+        dropped rather than ranked low.
+        """
+        if not requirements:
+            return self.search(query, k)
+        compiled = CompiledRequirement(None, requirements, gazetteer, geo_index)
+        boost = self.structured_scores(compiled)
+        allowed = self.allowed_rows(compiled)
+        if boost is None:
+            return self.search(query, k, allowed=allowed)
+        return self.search(query, k, boost=boost, text_weight=text_weight, allowed=allowed)
+
+    def close(self):
+        """Deletes the backing file of a memory-mapped index."""
+        with self._lock:
+            if isinstance(self._matrix, np.memmap):
+                filename = self._matrix.filename
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+                os.remove(filename)
+
+
+def build_vector_index(rows: Iterable[Dict], path: Optional[str] = None, dim: int = VECTOR_DIM) -> VectorIndex:
+    index = VectorIndex(path=path, dim=dim)
+    index.apply(rows)
+    return index
+
+
+_vector_index: Optional[VectorIndex] = None
+_vector_index_lock = threading.Lock()
+_vector_index_failed_at: Optional[float] = None
+_EMPTY_INDEX = VectorIndex(capacity=1)
+
+
+def get_vector_index() -> VectorIndex:
+    """
+    Returns the shared index, built from the active listings on first use.
+
+    When no listings load, an empty index is returned and the build is not
+    retried for VECTOR_INDEX_RETRY_SECONDS.
+    """
+    global _vector_index, _vector_index_failed_at
+    if _vector_index is not None:
+        return _vector_index
+    if _vector_index_failed_at is not None and time.monotonic() - _vector_index_failed_at < VECTOR_INDEX_RETRY_SECONDS:
+        return _EMPTY_INDEX
+
+    with _vector_index_lock:
+        if _vector_index is None:
+            if _vector_index_failed_at is not None and time.monotonic() - _vector_index_failed_at < VECTOR_INDEX_RETRY_SECONDS:
+                return _EMPTY_INDEX
+            rows = fetch_active_listings()
+            if not rows:
+                _vector_index_failed_at = time.monotonic()
+                logger.warning(f"⚠️ No listings for the vector index; retrying in {VECTOR_INDEX_RETRY_SECONDS:.0f}s")
+                return _EMPTY_INDEX
+            path = os.path.join(VECTOR_INDEX_DIR, "listings") if VECTOR_INDEX_DIR else None
+            index = build_vector_index(rows, path=path)
+            if not len(index):
+                index.close()
+                _vector_index_failed_at = time.monotonic()
+                return _EMPTY_INDEX
+            _vector_index_failed_at = None
+            atexit.register(index.close)
+            logger.info(f"🧭 Vector index built with {len(index)} listings")
+            _vector_index = index
+    return _vector_index
+
+
+def fetch_listings_by_key(keys: List[Hashable]) -> List[Dict]:
+    if not keys:
+        return []
+    placeholders = ", ".join(["%s"] * len(keys))
+    results = execute_query(
+        f"""
+        SELECT r.*, p.*
+        FROM rooms r
+        JOIN properties p ON r.propertyid = p.propertyid
+        WHERE r.{ROOMS_KEY_COLUMN} IN ({placeholders})
+        """,
+        keys,
+    )
+    if isinstance(results, dict):
+        print(f"❌ Failed to load listings: {results.get('error')}")
+        return []
+    by_key = {room_key(row): row for row in results}
+    return [by_key[key] for key in keys if key in by_key]
+
+
+def semantic_search(query: str, requirements: Optional[Dict] = None, k: int = 5) -> List[Dict]:
+    """Listings ranked by hybrid text + requirement score, as full rows in rank order."""
+    index = get_vector_index()
+    if not len(index):
+        return []
+    ranked = index.hybrid_search(query, requirements, k, gazetteer=get_gazetteer(), geo_index=get_geo_index())
+    return fetch_listings_by_key([key for _, key in ranked])
+
+
+def refresh_from_events(events):
+    """
+    Change-feed subscriber keeping the index in step with rooms.
+
+    Feed rows carry only a few property columns, so changed listings are
+    re-read with the same columns as the initial build before embedding;
+    otherwise a listing's vector would depend on how it was loaded.
+    """
+    if _vector_index is None:
+        return  # Not built yet; the first build reads current listings
+    changed = []
+    for event in events:
+        if event.table != "rooms":
+            continue
+        if event.kind == "delete":
+            _vector_index.remove(event.key)
+        elif event.key not in changed:
+            changed.append(event.key)
+    for start in range(0, len(changed), REFRESH_BATCH_KEYS):
+        _vector_index.apply(fetch_listings_by_key(changed[start:start + REFRESH_BATCH_KEYS]))
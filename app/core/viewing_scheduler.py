@@ -0,0 +1,890 @@
+import logging
+import math
+import os
+import re
+import secrets
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from datetime import time as clock_time
+from datetime import timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.config.db_config import get_db_connection
+from app.core.llm_gateway import percentile
+
+logger = logging.getLogger(__name__)
+
+# Viewings start on this grid and last a whole number of slots
+VIEWING_SLOT_MINUTES = int(os.getenv("VIEWING_SLOT_MINUTES", "30"))
+VIEWING_MINUTES = int(os.getenv("VIEWING_MINUTES", "30"))
+# A held slot is released unless the user confirms within this time
+VIEWING_HOLD_SECONDS = float(os.getenv("VIEWING_HOLD_SECONDS", "600"))
+VIEWING_MIN_NOTICE_MINUTES = int(os.getenv("VIEWING_MIN_NOTICE_MINUTES", "60"))
+VIEWING_SEARCH_DAYS = int(os.getenv("VIEWING_SEARCH_DAYS", "14"))
+# Opening hours for agents and properties with no availability rows
+VIEWING_OPEN_HOUR = int(os.getenv("VIEWING_OPEN_HOUR", "10"))
+VIEWING_CLOSE_HOUR = int(os.getenv("VIEWING_CLOSE_HOUR", "19"))
+# Comma-separated agents covering properties with no viewing_agents rows;
+# empty books those against the property's calendar alone
+VIEWING_DEFAULT_AGENTS = [agent.strip() for agent in os.getenv("VIEWING_DEFAULT_AGENTS", "").split(",") if agent.strip()]
+VIEWING_TIMEZONE = os.getenv("VIEWING_TIMEZONE", "Asia/Singapore")
+
+try:
+    from zoneinfo import ZoneInfo
+
+    LOCAL_TZ = ZoneInfo(VIEWING_TIMEZONE)
+except Exception:
+    logger.warning(f"⚠️ Unknown VIEWING_TIMEZONE {VIEWING_TIMEZONE}; using UTC+8")
+    LOCAL_TZ = timezone(timedelta(hours=8))
+
+HELD = "held"
+CONFIRMED = "confirmed"
+CANCELLED = "cancelled"
+
+# Rounds of "claim in the DB, learn what another worker booked, search again"
+HOLD_ATTEMPTS = 3
+# Finished viewings are dropped from memory every this many holds
+PRUNE_EVERY_HOLDS = 1000
+
+VIEWING_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS viewing_availability (
+        resource VARCHAR(64) NOT NULL,
+        starts_at DOUBLE NOT NULL,
+        ends_at DOUBLE NOT NULL,
+        PRIMARY KEY (resource, starts_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS viewing_agents (
+        propertyid VARCHAR(64) NOT NULL,
+        agent_id VARCHAR(64) NOT NULL,
+        PRIMARY KEY (propertyid, agent_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS viewing_bookings (
+        id VARCHAR(32) PRIMARY KEY,
+        user_id VARCHAR(64) NOT NULL,
+        propertyid VARCHAR(64) NOT NULL,
+        agent_id VARCHAR(64),
+        starts_at DOUBLE NOT NULL,
+        ends_at DOUBLE NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        expires_at DOUBLE,
+        contact VARCHAR(64),
+        created_at DOUBLE NOT NULL
+    )
+    """,
+    # One row per slot per agent/property; the primary key is what makes a
+    # hold atomic across workers
+    """
+    CREATE TABLE IF NOT EXISTS viewing_slot_claims (
+        resource VARCHAR(64) NOT NULL,
+        slot_start DOUBLE NOT NULL,
+        booking_id VARCHAR(32) NOT NULL,
+        expires_at DOUBLE,
+        PRIMARY KEY (resource, slot_start)
+    )
+    """,
+)
+
+
+def agent_resource(agent_id: str) -> str:
+    return f"agent:{agent_id}"
+
+
+def property_resource(propertyid: str) -> str:
+    return f"property:{propertyid}"
+
+
+def listing_property_id(row: Dict) -> Optional[str]:
+    """Calendar key of a listing: its property, since rooms in one flat are viewed together."""
+    for column in ("propertyid", "roomid", "add1"):
+        if row.get(column) is not None:
+            return str(row[column])
+    return None
+
+
+@dataclass
+class Booking:
+    id: str
+    user_id: str
+    propertyid: str
+    agent_id: Optional[str]
+    start: float
+    end: float
+    status: str = HELD
+    expires_at: Optional[float] = None
+    contact: Optional[str] = None
+
+    @property
+    def resources(self) -> List[str]:
+        resources = [property_resource(self.propertyid)]
+        if self.agent_id is not None:
+            resources.append(agent_resource(self.agent_id))
+        return resources
+
+
+@lru_cache(maxsize=1024)
+def _day_window(day: date, open_hour: int, close_hour: int) -> Tuple[float, float]:
+    return (
+        datetime.combine(day, clock_time(open_hour), LOCAL_TZ).timestamp(),
+        datetime.combine(day, clock_time(close_hour), LOCAL_TZ).timestamp(),
+    )
+
+
+def opening_hours(t: float, open_hour: int = VIEWING_OPEN_HOUR, close_hour: int = VIEWING_CLOSE_HOUR) -> Tuple[float, float]:
+    """The day's opening-hours window containing ``t``, or the next one."""
+    day = datetime.fromtimestamp(t, LOCAL_TZ).date()
+    while True:
+        opens, closes = _day_window(day, open_hour, close_hour)
+        if closes > t:
+            return opens, closes
+        day += timedelta(days=1)
+
+
+class Calendar:
+    """
+    Availability windows and bookings of one agent or property.
+
+    Bookings on one calendar never overlap, so they are kept as parallel
+    lists sorted by start (and therefore by end): a conflict check or a
+    search for the next gap is a bisect plus a walk over the bookings that
+    are actually in the way, O(log n + k). Bookings ``alive`` rejects
+    (lapsed holds) are dropped when a walk reaches them.
+    """
+
+    def __init__(
+        self,
+        resource: str,
+        alive: Callable[[Hashable], bool] = lambda key: True,
+        default_window: Callable[[float], Tuple[float, float]] = opening_hours,
+    ):
+        self.resource = resource
+        self.alive = alive
+        self.default_window = default_window
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._keys: List[Hashable] = []
+        self._window_starts: List[float] = []
+        self._window_ends: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set_windows(self, windows: Iterable[Tuple[float, float]]):
+        """Replaces the availability windows, merging overlapping ones."""
+        merged: List[List[float]] = []
+        for start, end in sorted(windows):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            elif end > start:
+                merged.append([start, end])
+        self._window_starts = [start for start, _ in merged]
+        self._window_ends = [end for _, end in merged]
+
+    def add_window(self, start: float, end: float):
+        self.set_windows(list(zip(self._window_starts, self._window_ends)) + [(start, end)])
+
+    def window_at(self, t: float) -> Optional[Tuple[float, float]]:
+        """The availability window containing ``t``, or the next one; None past the last."""
+        if not self._window_starts:
+            return self.default_window(t)
+        index = bisect_right(self._window_ends, t)
+        if index == len(self._window_ends):
+            return None
+        return self._window_starts[index], self._window_ends[index]
+
+    def _delete(self, index: int):
+        del self._starts[index], self._ends[index], self._keys[index]
+
+    def conflicts(self, start: float, end: float) -> List[Hashable]:
+        """Live bookings overlapping [start, end)."""
+        found = []
+        index = max(0, bisect_right(self._starts, start) - 1)
+        while index < len(self._starts) and self._starts[index] < end:
+            if not self.alive(self._keys[index]):
+                self._delete(index)
+                continue
+            if self._ends[index] > start:
+                found.append(self._keys[index])
+            index += 1
+        return found
+
+    def add(self, key: Hashable, start: float, end: float):
+        """Inserts a booking; the caller has checked ``conflicts`` first."""
+        index = bisect_right(self._starts, start)
+        self._starts.insert(index, start)
+        self._ends.insert(index, end)
+        self._keys.insert(index, key)
+
+    def remove(self, key: Hashable, start: float) -> bool:
+        index = bisect_left(self._starts, start)
+        while index < len(self._starts) and self._starts[index] == start:
+            if self._keys[index] == key:
+                self._delete(index)
+                return True
+            index += 1
+        return False
+
+    def prune(self, before: float) -> List[Hashable]:
+        """Forgets bookings that ended before ``before``."""
+        index = bisect_right(self._ends, before)
+        removed = self._keys[:index]
+        del self._starts[:index], self._ends[:index], self._keys[:index]
+        return removed
+
+    def next_gap(self, t: float, duration: float) -> float:
+        """Earliest start at or after ``t`` clear of bookings for ``duration`` (windows aside)."""
+        index = max(0, bisect_right(self._starts, t) - 1)
+        while index < len(self._starts) and self._starts[index] < t + duration:
+            if not self.alive(self._keys[index]):
+                self._delete(index)
+                continue
+            t = max(t, self._ends[index])
+            index += 1
+        return t
+
+    def next_free(self, t: float, duration: float, until: float) -> Optional[float]:
+        """Earliest start at or after ``t`` inside a window and clear of bookings, before ``until``."""
+        while t + duration <= until:
+            window = self.window_at(t)
+            if window is None:
+                return None
+            window_start, window_end = window
+            t = max(t, window_start)
+            if t + duration > window_end:
+                t = window_end
+                continue
+            gap = self.next_gap(t, duration)
+            if gap + duration <= window_end:
+                return gap if gap + duration <= until else None
+            t = gap
+        return None
+
+
+class ViewingStore:
+    """
+    Availability, agent assignments and bookings in the DB.
+
+    A hold inserts one viewing_slot_claims row per slot for the property and
+    the agent in one transaction, so of two workers holding the same slot
+    exactly one commits. Claims of lapsed holds are taken over by the next
+    claim that runs into them; confirming clears the claim's expiry.
+    """
+
+    def __init__(self, connect: Callable[[], Any] = get_db_connection, placeholder: str = "%s"):
+        self.connect = connect
+        self.placeholder = placeholder
+        self._tables_ready = False
+
+    def _connection(self):
+        connection = self.connect()
+        if not connection:
+            raise ConnectionError("No database connection")
+        return connection
+
+    def _fetch(self, query: str, params=()) -> List[Tuple]:
+        connection = self._connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def ensure_tables(self):
+        if self._tables_ready:
+            return
+        connection = self._connection()
+        cursor = connection.cursor()
+        try:
+            for ddl in VIEWING_DDL:
+                cursor.execute(ddl)
+            connection.commit()
+            self._tables_ready = True
+        finally:
+            cursor.close()
+            connection.close()
+
+    def load_windows(self, now: float) -> Dict[str, List[Tuple[float, float]]]:
+        windows: Dict[str, List[Tuple[float, float]]] = {}
+        rows = self._fetch(f"SELECT resource, starts_at, ends_at FROM viewing_availability WHERE ends_at > {self.placeholder}", (now,))
+        for resource, start, end in rows:
+            windows.setdefault(resource, []).append((float(start), float(end)))
+        return windows
+
+    def load_agents(self) -> Dict[str, List[str]]:
+        agents: Dict[str, List[str]] = {}
+        for propertyid, agent_id in self._fetch("SELECT propertyid, agent_id FROM viewing_agents ORDER BY propertyid, agent_id"):
+            agents.setdefault(str(propertyid), []).append(str(agent_id))
+        return agents
+
+    def load_bookings(self, now: float, resources: Optional[List[str]] = None) -> List[Booking]:
+        """Upcoming confirmed bookings and live holds, optionally only those on ``resources``."""
+        p = self.placeholder
+        query = f"""
+            SELECT id, user_id, propertyid, agent_id, starts_at, ends_at, status, expires_at, contact
+            FROM viewing_bookings
+            WHERE ends_at > {p} AND (status = '{CONFIRMED}' OR (status = '{HELD}' AND expires_at > {p}))
+        """
+        params: List[Any] = [now, now]
+        if resources:
+            query += f" AND id IN (SELECT booking_id FROM viewing_slot_claims WHERE resource IN ({', '.join([p] * len(resources))}))"
+            params.extend(resources)
+        return [
+            Booking(str(id_), user_id, str(propertyid), agent_id, float(start), float(end), status,
+                    float(expires_at) if expires_at is not None else None, contact)
+            for id_, user_id, propertyid, agent_id, start, end, status, expires_at, contact in self._fetch(query, params)
+        ]
+
+    @staticmethod
+    def _is_conflict(error: Exception) -> bool:
+        # mysql.connector and sqlite3 both raise a class with this name on a duplicate key
+        return type(error).__name__ == "IntegrityError"
+
+    def claim(self, booking: Booking, slot_seconds: float, now: float) -> bool:
+        """Inserts the booking and its slot claims; False if a slot is taken by a live hold or booking."""
+        p = self.placeholder
+        slots = [booking.start + i * slot_seconds for i in range(max(1, math.ceil((booking.end - booking.start) / slot_seconds)))]
+        claims = [(resource, slot, booking.id, booking.expires_at) for resource in booking.resources for slot in slots]
+        connection = self._connection()
+        cursor = connection.cursor()
+        try:
+            for attempt in range(2):
+                try:
+                    cursor.executemany(
+                        f"INSERT INTO viewing_slot_claims (resource, slot_start, booking_id, expires_at) VALUES ({p}, {p}, {p}, {p})",
+                        claims,
+                    )
+                    cursor.execute(
+                        f"""
+                        INSERT INTO viewing_bookings
+                            (id, user_id, propertyid, agent_id, starts_at, ends_at, status, expires_at, contact, created_at)
+                        VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p})
+                        """,
+                        (booking.id, booking.user_id, booking.propertyid, booking.agent_id, booking.start, booking.end,
+                         booking.status, booking.expires_at, booking.contact, now),
+                    )
+                    connection.commit()
+                    return True
+                except Exception as e:
+                    connection.rollback()
+                    if not self._is_conflict(e):
+                        raise
+                    if attempt:
+                        return False
+                # Take over slots whose holds lapsed, then try once more
+                cursor.executemany(
+                    f"""
+                    DELETE FROM viewing_slot_claims
+                    WHERE resource = {p} AND slot_start = {p} AND expires_at IS NOT NULL AND expires_at < {p}
+                    """,
+                    [(resource, slot, now) for resource, slot, _, _ in claims],
+                )
+                taken_over = cursor.rowcount
+                connection.commit()
+                if taken_over <= 0:
+                    return False
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+
+    def confirm(self, booking: Booking, contact: Optional[str], slot_seconds: float) -> bool:
+        """Makes a hold permanent; False if its slots were taken over after it lapsed."""
+        p = self.placeholder
+        slot_count = len(booking.resources) * max(1, math.ceil((booking.end - booking.start) / slot_seconds))
+        connection = self._connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"UPDATE viewing_slot_claims SET expires_at = NULL WHERE booking_id = {p}", (booking.id,))
+            if cursor.rowcount < slot_count:
+                connection.rollback()
+                return False
+            cursor.execute(
+                f"UPDATE viewing_bookings SET status = '{CONFIRMED}', expires_at = NULL, contact = {p} WHERE id = {p}",
+                (contact, booking.id),
+            )
+            connection.commit()
+            return True
+        finally:
+            cursor.close()
+            connection.close()
+
+    def release(self, booking: Booking):
+        p = self.placeholder
+        connection = self._connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"DELETE FROM viewing_slot_claims WHERE booking_id = {p}", (booking.id,))
+            cursor.execute(f"UPDATE viewing_bookings SET status = '{CANCELLED}' WHERE id = {p}", (booking.id,))
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+
+class ViewingScheduler:
+    """
+    Finds and books viewing slots that suit both a property and one of its
+    agents.
+
+    Every agent and property has a ``Calendar`` in memory, so slot searches
+    never touch the DB. A hold is reserved in memory under the lock (so
+    concurrent users of this worker cannot pick the same slot) and then
+    claimed in the ``store``; if another worker claimed it first, the
+    bookings on those calendars are reloaded and the search runs again.
+    Without a store bookings live in memory only.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ViewingStore] = None,
+        slot_minutes: int = VIEWING_SLOT_MINUTES,
+        viewing_minutes: int = VIEWING_MINUTES,
+        hold_seconds: float = VIEWING_HOLD_SECONDS,
+        min_notice_minutes: int = VIEWING_MIN_NOTICE_MINUTES,
+        search_days: int = VIEWING_SEARCH_DAYS,
+        default_agents: Optional[List[str]] = None,
+        default_window: Callable[[float], Tuple[float, float]] = opening_hours,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.slot_seconds = slot_minutes * 60
+        self.viewing_seconds = max(1, math.ceil(viewing_minutes / slot_minutes)) * self.slot_seconds
+        self.hold_seconds = hold_seconds
+        self.min_notice_seconds = min_notice_minutes * 60
+        self.search_seconds = search_days * 86400
+        self.default_agents = list(VIEWING_DEFAULT_AGENTS if default_agents is None else default_agents)
+        self.default_window = default_window
+        self._clock = clock
+        self._calendars: Dict[str, Calendar] = {}
+        self._bookings: Dict[str, Booking] = {}
+        self._property_agents: Dict[str, List[str]] = {}
+        self._user_holds: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._search_seconds = deque(maxlen=1000)
+        self.holds = 0
+        self.confirmations = 0
+        self.cancellations = 0
+        self.expired_holds = 0
+        self.no_slot = 0
+        self.db_conflicts = 0
+        self.store_errors = 0
+
+    # --- memory (call with the lock held) ---
+
+    def _alive(self, booking_id: Hashable) -> bool:
+        booking = self._bookings.get(booking_id)
+        if booking is None:
+            return False
+        if booking.status == HELD and booking.expires_at is not None and booking.expires_at <= self._clock():
+            self._forget(booking)
+            self.expired_holds += 1
+            return False
+        return True
+
+    def _forget(self, booking: Booking):
+        self._bookings.pop(booking.id, None)
+        if self._user_holds.get(booking.user_id) == booking.id:
+            del self._user_holds[booking.user_id]
+
+    def _calendar(self, resource: str) -> Calendar:
+        calendar = self._calendars.get(resource)
+        if calendar is None:
+            calendar = self._calendars[resource] = Calendar(resource, self._alive, self.default_window)
+        return calendar
+
+    def _insert(self, booking: Booking):
+        self._bookings[booking.id] = booking
+        for resource in booking.resources:
+            self._calendar(resource).add(booking.id, booking.start, booking.end)
+        if booking.status == HELD:
+            self._user_holds[booking.user_id] = booking.id
+
+    def _discard(self, booking: Booking):
+        self._forget(booking)
+        for resource in booking.resources:
+            calendar = self._calendars.get(resource)
+            if calendar is not None:
+                calendar.remove(booking.id, booking.start)
+
+    def _learn(self, booking: Booking):
+        """Adds a booking made elsewhere, displacing whatever this worker had in its way."""
+        if booking.id in self._bookings:
+            return
+        for resource in booking.resources:
+            for key in self._calendar(resource).conflicts(booking.start, booking.end):
+                self._discard(self._bookings[key])
+        self._insert(booking)
+
+    def _align(self, t: float) -> float:
+        return math.ceil(t / self.slot_seconds) * self.slot_seconds
+
+    def _agents_for(self, propertyid: str) -> List[Optional[str]]:
+        return list(self._property_agents.get(propertyid) or self.default_agents) or [None]
+
+    def _earliest(self, propertyid: str, after: float, duration: float) -> Optional[Tuple[float, Optional[str]]]:
+        """Earliest slot at or after ``after`` free for the property and one of its agents."""
+        until = self._clock() + self.search_seconds
+        property_calendar = self._calendar(property_resource(propertyid))
+        best: Optional[Tuple[float, Optional[str]]] = None
+        for agent in self._agents_for(propertyid):
+            calendars = [property_calendar] + ([self._calendar(agent_resource(agent))] if agent is not None else [])
+            t = self._align(after)
+            found = None
+            # Each calendar pushes t to its next free slot until all agree;
+            # later agents only matter if they beat the best so far
+            while t + duration <= until and (best is None or t < best[0]):
+                for calendar in calendars:
+                    free = calendar.next_free(t, duration, until)
+                    if free is None:
+                        t = math.inf
+                        break
+                    free = self._align(free)
+                    if free != t:
+                        t = free
+                        break
+                else:
+                    found = t
+                    break
+            if found is not None and (best is None or found < best[0]):
+                best = (found, agent)
+        return best
+
+    # --- public ---
+
+    def load(self):
+        """Reads availability, agent assignments and upcoming bookings from the store."""
+        if self.store is None:
+            return
+        now = self._clock()
+        self.store.ensure_tables()
+        windows = self.store.load_windows(now)
+        agents = self.store.load_agents()
+        bookings = self.store.load_bookings(now)
+        with self._lock:
+            for resource, resource_windows in windows.items():
+                self._calendar(resource).set_windows(resource_windows)
+            self._property_agents = agents
+            for booking in bookings:
+                self._learn(booking)
+        logger.info(f"📅 Viewing scheduler loaded {len(bookings)} bookings, {len(windows)} calendars with hours, {len(agents)} assigned properties")
+
+    def set_availability(self, resource: str, windows: Iterable[Tuple[float, float]]):
+        with self._lock:
+            self._calendar(resource).set_windows(windows)
+
+    def assign_agents(self, propertyid: str, agents: List[str]):
+        with self._lock:
+            self._property_agents[str(propertyid)] = list(agents)
+
+    def now(self) -> float:
+        return self._clock()
+
+    def earliest_start(self) -> float:
+        return self._clock() + self.min_notice_seconds
+
+    def next_slots(self, propertyid: str, after: Optional[float] = None, count: int = 3) -> List[float]:
+        """Up to ``count`` distinct start times a viewing of the property could be held at."""
+        t = max(after or 0.0, self.earliest_start())
+        starts: List[float] = []
+        started = time.perf_counter()
+        with self._lock:
+            while len(starts) < count:
+                found = self._earliest(str(propertyid), t, self.viewing_seconds)
+                if found is None:
+                    break
+                starts.append(found[0])
+                t = found[0] + self.slot_seconds
+            self._search_seconds.append(time.perf_counter() - started)
+        return starts
+
+    def get(self, booking_id: Optional[str]) -> Optional[Booking]:
+        """The booking if it is confirmed or a hold that has not lapsed."""
+        with self._lock:
+            return self._bookings.get(booking_id) if booking_id and self._alive(booking_id) else None
+
+    def hold(self, user_id: str, propertyid: str, start: Optional[float] = None) -> Optional[Booking]:
+        """
+        Holds the earliest slot at or after ``start`` for ``hold_seconds``,
+        replacing the user's previous hold. None if nothing is free within
+        the search window or the store could not be reached.
+        """
+        propertyid = str(propertyid)
+        with self._lock:
+            previous_id = self._user_holds.get(user_id)
+            previous = self._bookings.get(previous_id) if previous_id and self._alive(previous_id) else None
+        if previous is not None and previous.status == HELD:
+            self.cancel(previous.id)
+        after = max(start or 0.0, self.earliest_start())
+        for _ in range(HOLD_ATTEMPTS):
+            started = time.perf_counter()
+            with self._lock:
+                found = self._earliest(propertyid, after, self.viewing_seconds)
+                self._search_seconds.append(time.perf_counter() - started)
+                if found is None:
+                    self.no_slot += 1
+                    return None
+                slot, agent = found
+                booking = Booking(
+                    secrets.token_hex(8), user_id, propertyid, agent, slot, slot + self.viewing_seconds,
+                    HELD, self._clock() + self.hold_seconds,
+                )
+                self._insert(booking)
+            if self.store is None:
+                return self._held(booking)
+            try:
+                claimed = self.store.claim(booking, self.slot_seconds, self._clock())
+            except Exception as e:
+                logger.error(f"❌ Could not hold viewing slot for {user_id}: {e}")
+                with self._lock:
+                    self._discard(booking)
+                    self.store_errors += 1
+                return None
+            if claimed:
+                return self._held(booking)
+            # Another worker has it: learn what is booked there and search again
+            with self._lock:
+                self._discard(booking)
+                self.db_conflicts += 1
+            self.refresh(booking.resources)
+        self.no_slot += 1
+        return None
+
+    def _held(self, booking: Booking) -> Booking:
+        self.holds += 1
+        if self.holds % PRUNE_EVERY_HOLDS == 0:
+            self.prune()
+        return booking
+
+    def refresh(self, resources: List[str]):
+        """Loads bookings made by other workers on these calendars."""
+        if self.store is None:
+            return
+        try:
+            bookings = self.store.load_bookings(self._clock(), resources)
+        except Exception as e:
+            logger.error(f"❌ Could not refresh viewing calendars: {e}")
+            return
+        with self._lock:
+            for booking in bookings:
+                self._learn(booking)
+
+    def confirm(self, booking_id: str, contact: Optional[str] = None) -> bool:
+        """Turns a live hold into a booking; False if the hold lapsed and its slot was lost."""
+        with self._lock:
+            booking = self._bookings.get(booking_id) if self._alive(booking_id) else None
+            if booking is None:
+                return False
+            if booking.status == CONFIRMED:
+                return True
+            booking.status, booking.contact = CONFIRMED, contact
+            self._user_holds.pop(booking.user_id, None)
+        try:
+            confirmed = self.store is None or self.store.confirm(booking, contact, self.slot_seconds)
+        except Exception as e:
+            logger.error(f"❌ Could not confirm viewing {booking_id}: {e}")
+            self.store_errors += 1
+            confirmed = False
+        with self._lock:
+            if not confirmed:
+                self._discard(booking)
+                return False
+            booking.expires_at = None
+            self.confirmations += 1
+        return True
+
+    def cancel(self, booking_id: str):
+        with self._lock:
+            booking = self._bookings.get(booking_id)
+            if booking is None:
+                return
+            self._discard(booking)
+            self.cancellations += 1
+        if self.store is not None:
+            try:
+                self.store.release(booking)
+            except Exception as e:
+                logger.error(f"❌ Could not release viewing {booking_id}: {e}")
+
+    def prune(self):
+        """Forgets viewings that are over."""
+        now = self._clock()
+        with self._lock:
+            for calendar in self._calendars.values():
+                for key in calendar.prune(now):
+                    booking = self._bookings.get(key)
+                    if booking is not None and booking.end <= now:
+                        self._forget(booking)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            held = sum(1 for booking in self._bookings.values() if booking.status == HELD)
+            searches = sorted(self._search_seconds)
+            return {
+                "calendars": len(self._calendars),
+                "held": held,
+                "confirmed": len(self._bookings) - held,
+                "holds": self.holds,
+                "confirmations": self.confirmations,
+                "cancellations": self.cancellations,
+                "expired_holds": self.expired_holds,
+                "no_slot": self.no_slot,
+                "db_conflicts": self.db_conflicts,
+                "store_errors": self.store_errors,
+                "search_p50_ms": round(percentile(searches, 0.50) * 1000, 3),
+                "search_p95_ms": round(percentile(searches, 0.95) * 1000, 3),
+            }
+
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+_PARTS_OF_DAY = {"morning": 10, "noon": 12, "afternoon": 14, "evening": 17}
+_MONTH_NAMES = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+# Words a reply that only names a time is made of ("sat 3pm", "tomorrow at 11:30 then")
+_TIME_REPLY_WORDS = (
+    {day for name in _WEEKDAYS for day in (name, name[:3])}
+    | {month for month in _MONTHS}
+    | {"january", "february", "march", "april", "june", "july", "august", "september", "october",
+       "november", "december", "sept", "tues", "thur", "thurs"}
+    | set(_PARTS_OF_DAY)
+    | {"today", "tonight", "tomorrow", "tmr", "day", "after", "next", "this", "at", "on", "of", "the", "in",
+       "am", "pm", "a", "p", "m", "st", "nd", "rd", "th", "or", "maybe", "then", "please", "pls", "ok", "okay",
+       "works", "better", "is", "fine"}
+)
+
+
+def _parse_date(text: str, today: date) -> Optional[date]:
+    if "day after tomorrow" in text:
+        return today + timedelta(days=2)
+    if re.search(r"\b(tomorrow|tmr)\b", text):
+        return today + timedelta(days=1)
+    if re.search(r"\b(today|tonight)\b", text):
+        return today
+    match = re.search(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b", text)
+    if match:
+        year, month, day = (int(group) for group in match.groups())
+        return _valid_date(year, month, day)
+    match = re.search(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH_NAMES}\b", text)
+    if match:
+        return _upcoming(today, _MONTHS.index(match.group(2)) + 1, int(match.group(1)))
+    match = re.search(rf"\b{_MONTH_NAMES}\s+(\d{{1,2}})(?:st|nd|rd|th)?\b", text)
+    if match:
+        return _upcoming(today, _MONTHS.index(match.group(1)) + 1, int(match.group(2)))
+    match = re.search(r"\b(\d{1,2})/(\d{1,2})\b", text)
+    if match:
+        # Day first, as written in Singapore
+        return _upcoming(today, int(match.group(2)), int(match.group(1)))
+    for index, name in enumerate(_WEEKDAYS):
+        if re.search(rf"\b{name[:3]}(?:{name[3:]})?\b", text):
+            ahead = (index - today.weekday()) % 7
+            if ahead == 0 and "next" in text:
+                ahead = 7
+            return today + timedelta(days=ahead)
+    return None
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _upcoming(today: date, month: int, day: int) -> Optional[date]:
+    """The next occurrence of day/month, this year or next."""
+    candidate = _valid_date(today.year, month, day)
+    if candidate is not None and candidate < today:
+        candidate = _valid_date(today.year + 1, month, day)
+    return candidate
+
+
+def _parse_clock(text: str) -> Optional[Tuple[int, int]]:
+    match = re.search(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)", text)
+    if match:
+        hour, minute = int(match.group(1)) % 12, int(match.group(2) or 0)
+        if match.group(3).startswith("p"):
+            hour += 12
+        return (hour, minute) if hour < 24 and minute < 60 else None
+    match = re.search(r"\b(\d{1,2})[:.](\d{2})\b", text)
+    if match and int(match.group(1)) < 24 and int(match.group(2)) < 60:
+        return int(match.group(1)), int(match.group(2))
+    match = re.search(r"\bat\s+(\d{1,2})\b", text)
+    if match and 1 <= int(match.group(1)) <= 12:
+        hour = int(match.group(1))
+        # "at 3" means the afternoon during viewing hours
+        return (hour + 12 if hour < 8 else hour), 0
+    for part, hour in _PARTS_OF_DAY.items():
+        if re.search(rf"\b{part}\b", text):
+            return hour, 0
+    return None
+
+
+def parse_viewing_time(text: str, now: Optional[float] = None) -> Optional[float]:
+    """
+    Start time the user asked for ("tomorrow 3pm", "sat morning",
+    "21 Oct at 11:30"), as a timestamp; a day alone means its opening time
+    and a time alone means today (or tomorrow once it has passed).
+    """
+    text = text.lower()
+    current = datetime.fromtimestamp(time.time() if now is None else now, LOCAL_TZ)
+    day = _parse_date(text, current.date())
+    hour_minute = _parse_clock(text)
+    if day is None and hour_minute is None:
+        return None
+    if hour_minute is None:
+        hour_minute = (VIEWING_OPEN_HOUR, 0)
+    if day is None:
+        day = current.date()
+        if datetime.combine(day, clock_time(*hour_minute), LOCAL_TZ) <= current:
+            day += timedelta(days=1)
+    return datetime.combine(day, clock_time(*hour_minute), LOCAL_TZ).timestamp()
+
+
+def is_time_reply(text: str) -> bool:
+    """True when the message is nothing but a day and/or time, e.g. "sat 3pm" or "21 Oct 11:30"."""
+    words = re.findall(r"[a-z]+|\d+", text.lower())
+    return bool(words) and all(word.isdigit() or word in _TIME_REPLY_WORDS for word in words)
+
+
+def parse_contact(text: str) -> Optional[str]:
+    """A phone number in the message, digits only (with a leading + if given)."""
+    match = re.search(r"\+?\d[\d\s-]{6,}\d", text)
+    if not match:
+        return None
+    digits = re.sub(r"[^\d+]", "", match.group(0))
+    return digits if len(digits.lstrip("+")) >= 8 else None
+
+
+def format_slot(t: float) -> str:
+    """e.g. "Sat 24 Oct, 3:30 PM"."""
+    moment = datetime.fromtimestamp(t, LOCAL_TZ)
+    return f"{moment:%a} {moment.day} {moment:%b}, {moment.hour % 12 or 12}:{moment:%M %p}"
+
+
+_scheduler: Optional[ViewingScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_viewing_scheduler() -> ViewingScheduler:
+    """Returns the shared scheduler, loading calendars and bookings from the DB on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                scheduler = ViewingScheduler(store=ViewingStore())
+                try:
+                    scheduler.load()
+                except Exception as e:
+                    logger.error(f"❌ Could not load viewing calendars: {e}")
+                _scheduler = scheduler
+    return _scheduler
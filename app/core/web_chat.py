@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.llm_resilience import Deadline
+from app.core.reply_stream import ReplyStream
+
+logger = logging.getLogger(__name__)
+
+# Open web-chat sockets per worker; more are refused with close code 1013
+WEBCHAT_MAX_CONNECTIONS = int(os.getenv("WEBCHAT_MAX_CONNECTIONS", "10000"))
+# Connections quiet for this long get a ping...
+WEBCHAT_HEARTBEAT_SECONDS = float(os.getenv("WEBCHAT_HEARTBEAT_SECONDS", "25"))
+# ...and are closed once nothing (not even a pong) has arrived for this long
+WEBCHAT_IDLE_TIMEOUT_SECONDS = float(os.getenv("WEBCHAT_IDLE_TIMEOUT_SECONDS", "75"))
+# Events waiting for a client that stopped reading before it is dropped;
+# tokens are merged while they wait, so this only counts other events
+WEBCHAT_MAX_PENDING_EVENTS = int(os.getenv("WEBCHAT_MAX_PENDING_EVENTS", "32"))
+WEBCHAT_SEND_TIMEOUT_SECONDS = float(os.getenv("WEBCHAT_SEND_TIMEOUT_SECONDS", "10"))
+WEBCHAT_MAX_MESSAGE_CHARS = int(os.getenv("WEBCHAT_MAX_MESSAGE_CHARS", "2000"))
+# A disconnected session's conversation is kept this long for the browser to reconnect...
+WEBCHAT_SESSION_TTL_SECONDS = float(os.getenv("WEBCHAT_SESSION_TTL_SECONDS", "1800"))
+# ...and at most this many such sessions are kept, oldest forgotten first
+WEBCHAT_MAX_DETACHED_SESSIONS = int(os.getenv("WEBCHAT_MAX_DETACHED_SESSIONS", "10000"))
+# Comma-separated Origins allowed to connect (the website embedding the chat); empty allows any
+WEBCHAT_ALLOWED_ORIGINS = {origin.strip() for origin in os.getenv("WEBCHAT_ALLOWED_ORIGINS", "").split(",") if origin.strip()}
+
+# WebSocket close codes
+CLOSE_NORMAL = 1000
+CLOSE_POLICY = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+SESSION_BYTES = 16
+_SESSION_CHARS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    """Only ids this server could have issued are resumed."""
+    return bool(session_id) and len(session_id) == 22 and set(session_id) <= _SESSION_CHARS
+
+
+def session_user_id(session_id: str) -> str:
+    """The chatbot user id a web-chat session talks as."""
+    return f"web:{session_id}"
+
+
+class WebChatConnection:
+    """
+    One browser socket. Outgoing events wait in a queue drained by a writer
+    task that exists only while there is something to send, so an idle
+    connection costs its receive loop and nothing else.
+    """
+
+    __slots__ = ("websocket", "session_id", "hub", "last_seen", "closed", "deadline", "_pending", "_writer")
+
+    def __init__(self, websocket, session_id: str, hub: "WebChatHub"):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.hub = hub
+        self.last_seen = time.monotonic()
+        self.closed = False
+        # Exhausted when the socket closes, so an orphaned turn stops calling the LLM
+        self.deadline: Optional[Deadline] = None
+        self._pending: deque = deque()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def user_id(self) -> str:
+        return session_user_id(self.session_id)
+
+    def offer(self, event: Dict):
+        """
+        Queues an event (event-loop thread only). A token joins a token still
+        waiting in the queue, so a slow reader gets fewer, larger chunks; a
+        reader that falls WEBCHAT_MAX_PENDING_EVENTS behind is disconnected.
+        """
+        if self.closed:
+            return
+        if event["type"] == "token" and self._pending and self._pending[-1]["type"] == "token":
+            self._pending[-1]["text"] += event["text"]
+            self.hub.tokens_merged += 1
+            return
+        self._pending.append(dict(event))
+        if len(self._pending) > self.hub.max_pending_events:
+            self.hub.slow_consumer_closes += 1
+            logger.warning(f"Web chat {self.session_id[:6]} stopped reading; disconnecting")
+            self.close(CLOSE_TRY_AGAIN_LATER)
+            return
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            while self._pending and not self.closed:
+                event = self._pending.popleft()
+                await asyncio.wait_for(self.websocket.send_text(json.dumps(event)), self.hub.send_timeout)
+                self.hub.events_sent += 1
+        except Exception as e:
+            if not self.closed:
+                logger.info(f"Web chat {self.session_id[:6]} send failed: {e!r}")
+                self.close(CLOSE_TRY_AGAIN_LATER)
+        finally:
+            self._writer = None
+
+    def close(self, code: int = CLOSE_NORMAL):
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.clear()
+        if self.deadline is not None:
+            self.deadline.cancel()
+        asyncio.get_running_loop().create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.hub.send_timeout)
+        except Exception:
+            pass
+
+    def stream(self) -> "WebReplyStream":
+        return WebReplyStream(self, asyncio.get_running_loop())
+
+
+class WebReplyStream(ReplyStream):
+    """Hands events from the worker thread running the turn to the connection's event loop."""
+
+    def __init__(self, connection: WebChatConnection, loop: asyncio.AbstractEventLoop):
+        self.connection = connection
+        self.loop = loop
+
+    def emit(self, event: Dict):
+        if not self.connection.closed:
+            self.loop.call_soon_threadsafe(self.connection.offer, event)
+
+
+class WebChatHub:
+    """
+    Registry of web-chat connections for one worker: admission by count
+    and Origin, one heartbeat sweep for all of them, and counters.
+
+    Sessions with no open socket are remembered in release order; once one
+    has been gone for ``session_ttl_seconds`` (or more than
+    ``max_detached_sessions`` are waiting) ``on_session_expired`` is called
+    with its user id so the caller can drop the conversation.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = WEBCHAT_MAX_CONNECTIONS,
+        heartbeat_seconds: float = WEBCHAT_HEARTBEAT_SECONDS,
+        idle_timeout_seconds: float = WEBCHAT_IDLE_TIMEOUT_SECONDS,
+        max_pending_events: int = WEBCHAT_MAX_PENDING_EVENTS,
+        send_timeout: float = WEBCHAT_SEND_TIMEOUT_SECONDS,
+        allowed_origins=WEBCHAT_ALLOWED_ORIGINS,
+        session_ttl_seconds: float = WEBCHAT_SESSION_TTL_SECONDS,
+        max_detached_sessions: int = WEBCHAT_MAX_DETACHED_SESSIONS,
+        on_session_expired: Optional[Callable[[str], None]] = None,
+    ):
+        self.max_connections = max_connections
+        self.heartbeat_seconds = heartbeat_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.max_pending_events = max_pending_events
+        self.send_timeout = send_timeout
+        self.allowed_origins = set(allowed_origins)
+        self.session_ttl_seconds = session_ttl_seconds
+        self.max_detached_sessions = max_detached_sessions
+        self.on_session_expired = on_session_expired
+        self.connections = set()
+        self._detached: "OrderedDict[str, float]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.peak_connections = 0
+        self.accepted = 0
+        self.refused = 0
+        self.idle_closes = 0
+        self.slow_consumer_closes = 0
+        self.events_sent = 0
+        self.tokens_merged = 0
+        self.turns = 0
+        self.sessions_expired = 0
+
+    def origin_allowed(self, origin: Optional[str]) -> bool:
+        return not self.allowed_origins or origin in self.allowed_origins
+
+    async def accept(self, websocket, session_id: Optional[str] = None) -> Optional[WebChatConnection]:
+        """Completes the handshake and registers the socket; None (socket closed) if refused."""
+        if not self.origin_allowed(websocket.headers.get("origin")):
+            self.refused += 1
+            await websocket.close(code=CLOSE_POLICY)
+            return None
+        await websocket.accept()
+        if len(self.connections) >= self.max_connections:
+            self.refused += 1
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            return None
+        if not valid_session_id(session_id):
+            session_id = secrets.token_urlsafe(SESSION_BYTES)
+        self._detached.pop(session_id, None)
+        connection = WebChatConnection(websocket, session_id, self)
+        self.connections.add(connection)
+        self.accepted += 1
+        self.peak_connections = max(self.peak_connections, len(self.connections))
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+        connection.offer({"type": "session", "session": session_id})
+        return connection
+
+    def release(self, connection: WebChatConnection):
+        self.connections.discard(connection)
+        if connection.deadline is not None:
+            connection.deadline.cancel()
+        connection.closed = True
+        if not any(other.session_id == connection.session_id for other in self.connections):
+            self._detached[connection.session_id] = time.monotonic()
+            self._detached.move_to_end(connection.session_id)
+        self.expire_sessions()
+
+    def expire_sessions(self, now: Optional[float] = None):
+        """Forgets sessions disconnected past the TTL, or beyond the cap."""
+        now = time.monotonic() if now is None else now
+        while self._detached:
+            session_id, released_at = next(iter(self._detached.items()))
+            if now - released_at < self.session_ttl_seconds and len(self._detached) <= self.max_detached_sessions:
+                break
+            del self._detached[session_id]
+            self.sessions_expired += 1
+            if self.on_session_expired is not None:
+                try:
+                    self.on_session_expired(session_user_id(session_id))
+                except Exception as e:
+                    logger.error(f"❌ Could not drop web chat session {session_id[:6]}: {e}")
+
+    def sweep(self):
+        """Pings quiet connections and closes those past the idle timeout."""
+        now = time.monotonic()
+        self.expire_sessions(now)
+        for connection in list(self.connections):
+            quiet = now - connection.last_seen
+            if quiet >= self.idle_timeout_seconds:
+                self.idle_closes += 1
+                self.connections.discard(connection)
+                connection.close(CLOSE_NORMAL)
+            elif quiet >= self.heartbeat_seconds:
+                connection.offer({"type": "ping"})
+
+    async def _sweep_forever(self):
+        while self.connections:
+            await asyncio.sleep(self.heartbeat_seconds / 2)
+            self.sweep()
+
+    async def receive(self, connection: WebChatConnection) -> Optional[Dict]:
+        """
+        The next chat message from the client, answering pings and skipping
+        pongs on the way; None once the socket is gone.
+        """
+        while not connection.closed:
+            try:
+                raw = await connection.websocket.receive_text()
+            except (WebSocketDisconnect, RuntimeError):
+                return None
+            connection.last_seen = time.monotonic()
+            try:
+                message = json.loads(raw)
+                kind = message.get("type")
+            except (ValueError, AttributeError):
+                connection.offer({"type": "error", "error": "Messages must be JSON objects"})
+                continue
+            if kind == "pong":
+                continue
+            if kind == "ping":
+                connection.offer({"type": "pong"})
+                continue
+            text = message.get("text")
+            if kind != "message" or not isinstance(text, str) or not text.strip():
+                connection.offer({"type": "error", "error": "Expected {\"type\": \"message\", \"text\": ...}"})
+                continue
+            if len(text) > WEBCHAT_MAX_MESSAGE_CHARS:
+                connection.offer({"type": "error", "error": f"Messages are limited to {WEBCHAT_MAX_MESSAGE_CHARS} characters"})
+                continue
+            return message
+        return None
+
+    def stats(self) -> Dict:
+        return {
+            "connections": len(self.connections),
+            "peak_connections": self.peak_connections,
+            "accepted": self.accepted,
+            "refused": self.refused,
+            "idle_closes": self.idle_closes,
+            "slow_consumer_closes": self.slow_consumer_closes,
+            "events_sent": self.events_sent,
+            "tokens_merged": self.tokens_merged,
+            "turns": self.turns,
+            "detached_sessions": len(self._detached),
+            "sessions_expired": self.sessions_expired,
+        }
@@ -0,0 +1,103 @@
+import asyncio
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.core.query_profiler import get_query_profiler
+from app.core.sampling_profiler import (
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_SECONDS,
+    finish_process_profile,
+    request_profiles,
+    start_process_profile,
+)
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    # Constant-time comparison, so response timing doesn't leak the token
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+# Sections of /admin/metrics; other modules register theirs with add_metrics_source
+_metrics_sources = {}
+
+
+def add_metrics_source(name: str, source):
+    """Registers a zero-argument callable whose dict result is reported under ``name``."""
+    _metrics_sources[name] = source
+
+
+@router.get("/metrics")
+async def metrics():
+    report = {}
+    for name, source in _metrics_sources.items():
+        try:
+            report[name] = source()
+        except Exception as e:
+            report[name] = {"error": str(e)}
+    return report
+
+
+@router.get("/slow-queries")
+async def slow_queries(limit: int = 20, order_by: str = "p95_ms"):
+    """Slowest SQL shapes seen by execute_query, with captured plans."""
+    if order_by not in ("p95_ms", "p99_ms", "max_ms", "total_ms", "count", "slow_count"):
+        raise HTTPException(status_code=400, detail="Unsupported order_by")
+    profiler = get_query_profiler()
+    return {"summary": profiler.stats(), "queries": profiler.top(limit, order_by)}
+
+
+def _collapsed_response(profile) -> PlainTextResponse:
+    return PlainTextResponse(profile.collapsed(), headers={
+        "X-Profile-Samples": str(profile.samples),
+        "X-Profile-Seconds": f"{profile.seconds:.3f}",
+    })
+
+
+@router.post("/profile")
+async def profile_process(seconds: float = 10, interval_ms: float = PROFILE_INTERVAL_MS):
+    """
+    Samples every thread for ``seconds`` and returns collapsed stacks, ready
+    for flamegraph.pl or speedscope. One profile runs at a time.
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    profiler = start_process_profile(interval_ms / 1000)
+    if profiler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile = await asyncio.to_thread(finish_process_profile, profiler)
+    return _collapsed_response(profile)
+
+
+@router.get("/profiles")
+async def recent_profiles():
+    """Per-request profiles of process_message (X-Profile header or PROFILE_SAMPLE_RATE)."""
+    return {"profiles": request_profiles.summaries()}
+
+
+@router.get("/profiles/{profile_id}")
+async def request_profile(profile_id: int):
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _collapsed_response(profile)
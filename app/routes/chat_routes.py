@@ -1,10 +1,28 @@
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+from contextlib import asynccontextmanager
+from xml.sax.saxutils import escape
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
 from app.core.twilio_handler import send_whatsapp_message
 from app.core.llm_processor import PropertyChatbot
+from app.core.change_feed import CHANGE_FEED_INTERVAL, create_listing_feed
+from app.core.startup import start_warm_up
+from app.core.idempotency import DONE, create_message_deduplicator
+from app.core.coalescer import TURN_BUDGET_SECONDS, MessageCoalescer, Turn
+from app.core.llm_resilience import Deadline, deadline_scope
+from app.core.reply_stream import stream_scope
+from app.core.web_chat import WebChatConnection, WebChatHub
+from app.core.admission import PRIORITY_BOOKING, AdmissionController, Overloaded, session_priority
+from app.core.llm_gateway import get_llm_stats
+from app.core.model_router import get_router_stats
+from app.core.query_profiler import get_query_profiler
+from app.core.faq import get_faq_retriever
+from app.core.replica_router import get_replica_router
+from app.core.sampling_profiler import request_profiling
+from app.core.turn_planner import get_turn_planner
+from app.core.viewing_scheduler import get_viewing_scheduler
+from app.routes.admin_routes import add_metrics_source, is_admin_token, router as admin_router
 import logging
-import uvicorn
-
-app = FastAPI()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -13,8 +31,106 @@ logger = logging.getLogger(__name__)
 # Initialize the chatbot
 chatbot = PropertyChatbot()
 
+# Keeps location indexes and saved-search alerts in step with the listings
+listing_feed = create_listing_feed()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Nothing touches the network at import; resources are set up here (see app.core.startup)."""
+    await asyncio.to_thread(start_warm_up)
+    if CHANGE_FEED_INTERVAL > 0:
+        listing_feed.start(CHANGE_FEED_INTERVAL)
+    get_replica_router().start()
+    yield
+    get_replica_router().stop()
+    listing_feed.stop()
+
+# Twilio retries slow webhooks; each MessageSid is processed once
+message_deduplicator = create_message_deduplicator()
+
+# Bursts of short messages from one user are answered as a single turn
+message_coalescer = MessageCoalescer()
+
+# Bounds concurrent turns and Twilio sends; overflow gets BUSY_REPLY straight away
+admission = AdmissionController()
+BUSY_REPLY = (
+    "Thanks for your message! We're very busy right now 🙏 "
+    "Please send it again in a minute and we'll get right back to you."
+)
+
+# Website chat sockets (see web_chat below); a session's conversation is
+# dropped once its browser has been gone for WEBCHAT_SESSION_TTL_SECONDS
+web_chat_hub = WebChatHub(on_session_expired=lambda user_id: chatbot.conversation_context.pop(user_id, None))
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(admin_router)
+add_metrics_source("webhook_dedup", message_deduplicator.stats)
+add_metrics_source("coalescing", message_coalescer.stats)
+add_metrics_source("admission", admission.stats)
+add_metrics_source("llm", get_llm_stats)
+add_metrics_source("llm_routing", get_router_stats)
+add_metrics_source("sql", lambda: get_query_profiler().stats())
+add_metrics_source("faq", lambda: get_faq_retriever().stats())
+add_metrics_source("db_routing", lambda: get_replica_router().stats())
+add_metrics_source("turn_planner", lambda: get_turn_planner().stats())
+add_metrics_source("web_chat", web_chat_hub.stats)
+add_metrics_source("viewings", lambda: get_viewing_scheduler().stats())
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+def _process_turn(turn: Turn) -> str:
+    # Runs in a worker thread; the turn's deadline lets a newer message cancel its LLM calls
+    with deadline_scope(deadline=turn.deadline):
+        return chatbot.process_message(turn.user_id, turn.text)
+
+def _render(result: dict):
+    """JSON for normal results; TwiML when the reply must go back in the webhook response itself."""
+    if result.get("twiml_reply"):
+        twiml = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Response><Message>{escape(result['twiml_reply'])}</Message></Response>"
+        return Response(content=twiml, media_type="application/xml")
+    return result
+
+async def _answer(user_number: str, user_input: str) -> dict:
+    """Coalesces the message into the user's current burst and replies once per burst."""
+    turn = await message_coalescer.collect(user_number, user_input)
+    if turn is None:
+        return {"message": "Merged into a later message", "message_sid": None}
+
+    try:
+        async with message_coalescer.turn_lock(user_number):
+            priority = session_priority(chatbot.conversation_context.get(user_number))
+            try:
+                async with admission["turn"].admit_async(priority):
+                    if turn.cancelled:
+                        return {"message": "Superseded by a later message", "message_sid": None}
+
+                    snapshot = chatbot.snapshot_context(user_number)
+                    response_message = await asyncio.to_thread(_process_turn, turn)
+                    if not turn.commit():
+                        # A newer message arrived mid-turn; it is answered together with this one
+                        chatbot.restore_context(user_number, snapshot)
+                        return {"message": "Superseded by a later message", "message_sid": None}
+            except Overloaded as e:
+                logger.warning(f"Shedding message from {user_number}: {e}")
+                return {"message": "Busy", "message_sid": None, "twiml_reply": BUSY_REPLY}
+
+            logger.info(f"Generated response: {response_message}")
+            try:
+                # Finished answers outrank everything still queued for a turn
+                async with admission["send"].admit_async(PRIORITY_BOOKING):
+                    message_sid = await asyncio.to_thread(send_whatsapp_message, user_number, response_message)
+            except Overloaded as e:
+                logger.warning(f"Replying inline to {user_number}: {e}")
+                return {"message": "Response sent inline", "message_sid": None, "twiml_reply": response_message}
+            return {"message": "Response sent successfully", "message_sid": message_sid}
+    finally:
+        message_coalescer.finish(turn)
+
 @app.post("/webhook/")
 async def whatsapp_webhook(request: Request):
+    message_key = None
     try:
         form_data = await request.form()
         user_input = form_data.get("Body")
@@ -23,22 +139,89 @@ async def whatsapp_webhook(request: Request):
         if not user_input or not user_number:
             logger.error("Invalid request: Missing user input or phone number")
             raise HTTPException(status_code=400, detail="Invalid request data")
+
+        # Retries of a message already handled get the earlier result, not a second reply
+        message_key = form_data.get("MessageSid")
+        if message_key:
+            seen = message_deduplicator.claim(message_key)
+            if seen is not None:
+                message_key = None
+                logger.info(f"Duplicate message {form_data.get('MessageSid')} from {user_number} suppressed")
+                if seen.state == DONE:
+                    return _render(seen.response)
+                return {"message": "Duplicate message, already being processed", "message_sid": None}
         
         logger.info(f"Received message from {user_number}: {user_input}")
-        
-        # Process the message using PropertyChatbot
-        response_message = chatbot.process_message(user_number, user_input)
-        
-        logger.info(f"Generated response: {response_message}")
-        
-        message_sid = send_whatsapp_message(user_number, response_message)
-        
-        return {"message": "Response sent successfully", "message_sid": message_sid}
+
+        # Admins replaying a message can ask for a profile of its turn (see /admin/profiles)
+        profile = bool(request.headers.get("X-Profile")) and is_admin_token(request.headers.get("X-Admin-Token"))
+        with request_profiling(profile):
+            result = await _answer(user_number, user_input)
+        if message_key:
+            message_deduplicator.complete(message_key, result)
+        return _render(result)
     
+    except HTTPException:
+        raise
     except Exception as e:
+        if message_key:
+            message_deduplicator.release(message_key)
         logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+def _process_web_turn(user_id: str, text: str, deadline: Deadline, stream) -> str:
+    # Runs in a worker thread; closing the socket exhausts the deadline
+    with deadline_scope(deadline=deadline), stream_scope(stream):
+        return chatbot.process_message(user_id, text)
+
+async def _answer_web(connection: WebChatConnection, message: dict):
+    """One web-chat turn: same session logic and admission as WhatsApp, with partial output streamed."""
+    reply_to = message.get("id")
+    async with message_coalescer.turn_lock(connection.user_id):
+        priority = session_priority(chatbot.conversation_context.get(connection.user_id))
+        try:
+            async with admission["turn"].admit_async(priority):
+                if connection.closed:
+                    return
+                deadline = connection.deadline = Deadline(TURN_BUDGET_SECONDS)
+                web_chat_hub.turns += 1
+                response_message = await asyncio.to_thread(
+                    _process_web_turn, connection.user_id, message["text"], deadline, connection.stream()
+                )
+        except Overloaded as e:
+            logger.warning(f"Shedding web chat message from {connection.session_id[:6]}: {e}")
+            connection.offer({"type": "busy", "text": BUSY_REPLY, "reply_to": reply_to})
+            return
+        except Exception as e:
+            logger.error(f"Error processing web chat message: {e}")
+            connection.offer({"type": "error", "error": "Something went wrong, please try again.", "reply_to": reply_to})
+            return
+    # The complete reply; clients replace any streamed tokens with it
+    connection.offer({"type": "reply", "text": response_message, "reply_to": reply_to})
+
+@app.websocket("/ws/chat")
+async def web_chat(websocket: WebSocket, session: Optional[str] = None):
+    """
+    Website chat over a WebSocket, one turn at a time per connection.
+
+    Client -> server: {"type": "message", "text": ..., "id": optional}, "ping", "pong".
+    Server -> client: "session" (id to pass back as ?session= on reconnect),
+    "status", "listings", "token", "reset" (drop streamed tokens), "reply",
+    "busy", "error", "ping" (answer with "pong" or be disconnected when idle).
+    """
+    connection = await web_chat_hub.accept(websocket, session)
+    if connection is None:
+        return
+    try:
+        while True:
+            message = await web_chat_hub.receive(connection)
+            if message is None:
+                break
+            await _answer_web(connection, message)
+    finally:
+        web_chat_hub.release(connection)
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
 
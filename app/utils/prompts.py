@@ -0,0 +1,30 @@
+import threading
+from typing import List
+
+
+class LazyPromptTemplate:
+    """
+    Drop-in for langchain's ``PromptTemplate`` that defers importing
+    langchain (~0.5s) until a prompt is first formatted.
+
+    Unknown attributes (``format``, ``format_prompt``, ...) are forwarded to
+    the real template, which is built once on first use.
+    """
+
+    def __init__(self, input_variables: List[str], template: str):
+        self.input_variables = input_variables
+        self.template = template
+        self._prompt = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        if self._prompt is None:
+            with self._lock:
+                if self._prompt is None:
+                    from langchain.prompts import PromptTemplate
+
+                    self._prompt = PromptTemplate(input_variables=self.input_variables, template=self.template)
+        return self._prompt
+
+    def __getattr__(self, name):
+        return getattr(self._build(), name)
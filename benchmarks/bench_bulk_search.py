@@ -0,0 +1,104 @@
+"""
+Throughput of bulk_search against one-search-per-requirement.
+
+    python -m benchmarks.bench_bulk_search [--listings 50000] [--requirements 500] [--live]
+
+With --live the active listings are read from DATABASE_URL instead of
+being generated.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.bulk_search import CompiledRequirement, bulk_search, fetch_active_listings
+from app.core.gazetteer import LocationGazetteer
+from app.core.geo import GeoIndex, load_transit_stops
+
+ZONES = ["North", "South", "East", "West", "Central", "North-East"]
+STATIONS = [stop.name for stop in load_transit_stops() if stop.kind == "mrt"]
+ROOM_TYPES = ["Common Room", "Master Room", "Studio", "Whole Unit"]
+PROPERTY_TYPES = ["HDB", "Condo", "Landed"]
+
+
+def generate_listings(count, rng):
+    return [
+        {
+            "propertyid": i // 3,
+            "rentmonth": rng.randrange(500, 5000, 50),
+            "status": "available",
+            "roomtype": rng.choice(ROOM_TYPES),
+            "propertytype": rng.choice(PROPERTY_TYPES),
+            "nearestmrt": rng.choice(STATIONS),
+            "zone": rng.choice(ZONES),
+            "city": "Singapore",
+            "add1": f"{rng.randrange(1, 999)} {rng.choice(STATIONS).split()[0]} Street {rng.randrange(1, 99)}",
+        }
+        for i in range(count)
+    ]
+
+
+def generate_requirements(count, rng):
+    requirements = {}
+    for i in range(count):
+        requirement = {"budget": rng.randrange(800, 4000, 100)}
+        roll = rng.random()
+        if roll < 0.6:
+            requirement["location"] = rng.choice(STATIONS).replace(" MRT", "")
+        elif roll < 0.8:
+            requirement["location"] = rng.choice(ZONES)
+        if rng.random() < 0.3:
+            requirement["property_type"] = rng.choice(["studio", "condo", "hdb"])
+        requirements[f"user-{i}"] = requirement
+    return requirements
+
+
+def per_requirement_search(requirement_sets, listings, gazetteer, geo_index):
+    """Baseline: one full scan per requirement, like one query per user."""
+    results = {}
+    for key, requirements in requirement_sets.items():
+        results[key] = bulk_search({key: requirements}, listings, gazetteer=gazetteer, geo_index=geo_index)[key]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=50_000)
+    parser.add_argument("--requirements", type=int, default=500)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    listings = fetch_active_listings() if args.live else generate_listings(args.listings, rng)
+    requirement_sets = generate_requirements(args.requirements, rng)
+
+    gazetteer = LocationGazetteer({
+        "zone": {row.get("zone") for row in listings},
+        "city": {row.get("city") for row in listings},
+        "nearestmrt": {row.get("nearestmrt") for row in listings},
+        "add1": {row.get("add1") for row in listings},
+    })
+    geo_index = GeoIndex(load_transit_stops())
+
+    start = time.perf_counter()
+    bulk = bulk_search(requirement_sets, listings, gazetteer=gazetteer, geo_index=geo_index)
+    bulk_seconds = time.perf_counter() - start
+
+    sample = dict(list(requirement_sets.items())[:50])
+    start = time.perf_counter()
+    baseline = per_requirement_search(sample, listings, gazetteer, geo_index)
+    baseline_seconds = (time.perf_counter() - start) * len(requirement_sets) / len(sample)
+
+    assert all(baseline[key] == bulk[key] for key in sample), "bulk and per-requirement results differ"
+
+    print(f"Listings: {len(listings):,}  Requirement sets: {len(requirement_sets):,}")
+    print(f"Bulk search:            {bulk_seconds:8.3f}s  ({len(requirement_sets) / bulk_seconds:,.0f} requirements/s)")
+    print(f"Per-requirement (est.): {baseline_seconds:8.3f}s  ({len(requirement_sets) / baseline_seconds:,.0f} requirements/s)")
+    print(f"Speed-up: {baseline_seconds / bulk_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
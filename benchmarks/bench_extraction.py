@@ -0,0 +1,123 @@
+"""
+Accuracy and latency of the local requirement extractor versus the LLM.
+
+    python -m benchmarks.bench_extraction [--llm]
+
+The local path runs offline against a gazetteer built from the bundled
+transit stops. --llm also runs every case through extract_info_prompt on
+GPT-4 (needs OPENAI_API_KEY and a reachable DATABASE_URL).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.gazetteer import LocationGazetteer
+from app.core.geo import GeoIndex, load_transit_stops
+from app.core.requirement_extractor import REQUIREMENT_FIELDS, extract_requirements
+
+# (message, expected fields); fields left out are expected to be None
+CASES = [
+    ("looking for a room in tampines under 1500", {"budget": 1500, "location": "tampines", "property_type": "room"}),
+    ("budget S$1.2k, bishan", {"budget": 1200, "location": "bishan"}),
+    ("any condo near bishan mrt below $3,000", {"budget": 3000, "location": "within 1000m of Bishan MRT", "property_type": "condo"}),
+    ("master room around 1.1k", {"budget": 1100, "property_type": "master"}),
+    ("2 bedroom hdb in jurong east", {"bedrooms": 2, "property_type": "hdb", "location": "jurong east"}),
+    ("fully furnished studio in orchard max 2500", {"budget": 2500, "property_type": "studio", "furnished": True, "location": "orchard"}),
+    ("unfurnished whole unit in sengkang", {"property_type": "whole unit", "furnished": False, "location": "sengkang"}),
+    ("common room 800 to 1000 in woodlands", {"budget": 1000, "property_type": "common", "location": "woodlands"}),
+    ("within 10 minutes of raffles place, 2k", {"budget": 2000, "location": "within 800m of Raffles Place MRT"}),
+    ("3br condo", {"bedrooms": 3, "property_type": "condo"}),
+    ("something cheap in bedok", {"location": "bedok"}),
+    ("i can pay 1300 per month", {"budget": 1300}),
+    ("clementi", {"location": "clementi"}),
+    ("under 1500", {"budget": 1500}),
+    ("room near serangoon, fully furnished please", {"property_type": "room", "furnished": True, "location": "within 1000m of Serangoon MRT"}),
+    ("one bedroom apartment at novena", {"bedrooms": 1, "property_type": "apartment", "location": "novena"}),
+    ("hi", {}),
+    ("looking for a place at punggol for 1,800 sgd", {"budget": 1800, "location": "punggol"}),
+    ("semi-furnished common room in toa payoh below 1k", {"budget": 1000, "property_type": "common", "furnished": True, "location": "toa payoh"}),
+    ("landed house in bukit timah 5000", {"budget": 5000, "property_type": "landed", "location": "bukit timah"}),
+]
+
+
+def expected_fields(expected):
+    return {field: expected.get(field) for field in REQUIREMENT_FIELDS}
+
+
+def field_matches(field, expected, actual):
+    if expected is None or actual is None:
+        return expected == actual
+    if field == "budget" or field == "bedrooms":
+        try:
+            return float(expected) == float(actual)
+        except (TypeError, ValueError):
+            return False
+    if field == "location":
+        return str(expected).lower() in str(actual).lower() or str(actual).lower() in str(expected).lower()
+    return str(expected).lower() == str(actual).lower()
+
+
+def score(results):
+    correct = {field: 0 for field in REQUIREMENT_FIELDS}
+    for (_, expected), actual in zip(CASES, results):
+        expected = expected_fields(expected)
+        for field in REQUIREMENT_FIELDS:
+            correct[field] += field_matches(field, expected[field], actual.get(field))
+    return {field: count / len(CASES) for field, count in correct.items()}
+
+
+def run_local():
+    stops = load_transit_stops()
+    gazetteer = LocationGazetteer({"nearestmrt": [stop.name for stop in stops if stop.kind == "mrt"]})
+    geo_index = GeoIndex(stops)
+
+    results, latencies = [], []
+    for text, _ in CASES:
+        start = time.perf_counter()
+        fields, _, _ = extract_requirements(text, gazetteer, geo_index)
+        latencies.append(time.perf_counter() - start)
+        results.append(fields)
+    return results, latencies
+
+
+def run_llm():
+    from app.core.llm_gateway import predict
+    from app.core.llm_processor import extract_info_prompt, parse_json_object
+
+    results, latencies = [], []
+    for text, _ in CASES:
+        start = time.perf_counter()
+        try:
+            fields = parse_json_object(predict(extract_info_prompt.format(user_query=text)))
+        except Exception as e:
+            print(f"LLM extraction failed for {text!r}: {e}")
+            fields = {}
+        latencies.append(time.perf_counter() - start)
+        results.append(fields)
+    return results, latencies
+
+
+def report(name, results, latencies):
+    accuracy = score(results)
+    print(f"\n{name}")
+    print("  accuracy: " + ", ".join(f"{field}={value:.0%}" for field, value in accuracy.items()))
+    print(f"  overall:  {sum(accuracy.values()) / len(accuracy):.0%}")
+    print(f"  latency:  p50={statistics.median(latencies) * 1000:.3f}ms  max={max(latencies) * 1000:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true")
+    args = parser.parse_args()
+
+    report("Local extractor", *run_local())
+    if args.llm:
+        report("LLM (extract_info_prompt)", *run_llm())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Hit rate, accuracy and latency of the FAQ retriever on labelled questions.
+
+    python -m benchmarks.bench_faq [--answer 0.6] [--context 0.25] [--verbose]
+
+Each question is labelled with the FAQ id it should resolve to, or None
+for messages the FAQ should leave to the LLM. Reports how many would be
+answered from the FAQ (and how many of those correctly), how many would
+get passages as LLM context, and lookup latency.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.faq import ANSWERED, ASSISTED, FAQRetriever, load_faq_entries
+
+LABELLED = [
+    ("how much deposit do i need to pay?", "deposit"),
+    ("Is the deposit 1 or 2 months?", "deposit"),
+    ("when do I get my deposit back after moving out", "deposit_refund"),
+    ("is the security deposit refundable", "deposit_refund"),
+    ("what's the minimum lease", "lease_length"),
+    ("can i rent for 3 months only", "lease_length"),
+    ("short term stay possible?", "lease_length"),
+    ("what documents are needed", "documents"),
+    ("do I need a work pass to rent", "documents"),
+    ("how do viewings work", "viewing_process"),
+    ("can I see the room first?", "viewing_process"),
+    ("I need to reschedule my viewing", "viewing_reschedule"),
+    ("cancel my appointment please", "viewing_reschedule"),
+    ("is electricity included?", "utilities"),
+    ("does rent include utilities and wifi", "utilities"),
+    ("any agent fees?", "agent_fee"),
+    ("do tenants pay commission", "agent_fee"),
+    ("who pays stamp duty", "stamp_duty"),
+    ("can I pay rent by paynow", "payment_methods"),
+    ("when is the rent due each month", "payment_methods"),
+    ("what if I need to break the lease early", "notice_period"),
+    ("is there a diplomatic clause", "notice_period"),
+    ("can I extend my lease", "renewal"),
+    ("can I cook in the kitchen", "cooking"),
+    ("are overnight guests allowed", "visitors"),
+    ("can my friend stay over", "visitors"),
+    ("are cats allowed", "pets"),
+    ("pet friendly?", "pets"),
+    ("can my girlfriend and I share a room", "couples"),
+    ("when can I move in", "move_in"),
+    ("is the room furnished", "furnishing"),
+    ("the aircon is broken who fixes it", "repairs"),
+    ("can the rent be negotiated", "negotiate_rent"),
+    ("I'm a foreigner, can I rent?", "foreigners"),
+    ("rooms for students near NUS?", "students"),
+    ("what can you do", "about_service"),
+    ("can I speak to a human", None),
+    ("hi", None),
+    ("thanks!", None),
+    ("good morning", None),
+    ("what's the weather like today", None),
+    ("tell me a joke", None),
+    ("is singapore expensive to live in", None),
+    ("what is the best area for families", None),
+    ("is the aircon in that room serviced", None),
+    ("what time does the gym close", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answer", type=float, default=None, help="answer confidence threshold")
+    parser.add_argument("--context", type=float, default=None, help="context confidence threshold")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    entries = load_faq_entries()
+    thresholds = {key: value for key, value in
+                  (("answer_confidence", args.answer), ("context_confidence", args.context)) if value is not None}
+    # Measures what would be answered once FAQ_DIRECT_ANSWERS is switched on
+    retriever = FAQRetriever(entries, direct_answers=True, **thresholds)
+    print(f"loaded {len(entries)} entries and built the index in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    answered = correct = assisted = assisted_relevant = false_answers = 0
+    for question, expected in LABELLED:
+        result = retriever.lookup(question)
+        found = result.entry.id if result.entry else None
+        if result.kind == ANSWERED:
+            answered += 1
+            correct += found == expected
+            false_answers += expected is None or found != expected
+        elif result.kind == ASSISTED:
+            assisted += 1
+            assisted_relevant += expected in [entry.id for entry in result.passages]
+        if args.verbose or (result.kind == ANSWERED and found != expected):
+            print(f"  {result.kind:8s} {result.confidence:.2f} {found or '-':20s} expected {expected or '-':20s} {question!r}")
+
+    timings = []
+    for _ in range(args.repeat):
+        for question, _ in LABELLED:
+            lookup_started = time.perf_counter()
+            retriever.search(question)
+            timings.append(time.perf_counter() - lookup_started)
+    timings.sort()
+
+    faq_questions = sum(1 for _, expected in LABELLED if expected)
+    print(f"\n{len(LABELLED)} questions ({faq_questions} covered by the FAQ)")
+    print(f"  answered from FAQ   {answered:3d} ({answered / len(LABELLED):.0%}), correct {correct}, wrong {false_answers}")
+    print(f"  LLM with passages   {assisted:3d}, relevant passage included in {assisted_relevant}")
+    print(f"  left to the LLM     {len(LABELLED) - answered - assisted:3d}")
+    print(f"  FAQ hit rate on covered questions {correct / faq_questions:.0%}")
+    print(f"  lookup latency p50 {statistics.median(timings) * 1e6:.0f} us, "
+          f"p95 {timings[int(0.95 * (len(timings) - 1))] * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Overhead of the sampling profiler on CPU-bound chat work.
+
+    python -m benchmarks.bench_profiler [--rounds 30]
+
+The workload mimics the CPU side of a reply: json.dumps(indent=2) of
+property rows plus per-row string formatting. It is timed bare, inside an
+inactive profile_scope (the production default), and with the sampler
+running at several rates. Wall-clock differences are usually within
+run-to-run noise, so the cost of a single sample is measured directly too.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.sampling_profiler import SamplingProfiler, profile_scope
+
+ROWS = [
+    {
+        "roomid": index, "rentmonth": 900 + index % 700, "roomtype": "Common Room", "propertytype": "HDB",
+        "add1": f"Blk {index} Bishan Street 22", "nearestmrt": "Bishan", "nearestbusstop": f"Opp Blk {index}",
+        "airconditioned": "Yes", "wifi": "Yes", "cooking": "Light",
+    }
+    for index in range(40)
+]
+
+
+def workload(repeat: int = 200) -> int:
+    size = 0
+    for _ in range(repeat):
+        size += len(json.dumps(ROWS, indent=2))
+        size += sum(len(f"🏠 {row['add1']} - ${row['rentmonth']}/month, near {row['nearestmrt']} MRT") for row in ROWS)
+    return size
+
+
+def timed(wrap) -> float:
+    started = time.perf_counter()
+    with wrap():
+        workload()
+    return time.perf_counter() - started
+
+
+class _Nothing:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Sampler:
+    def __init__(self, interval):
+        self.interval = interval
+
+    def __enter__(self):
+        self.profiler = SamplingProfiler(interval=self.interval).start()
+
+    def __exit__(self, *exc):
+        self.profiler.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=30)
+    args = parser.parse_args()
+
+    workload(20)  # warm up
+    cases = [("bare", _Nothing), ("profile_scope, off", lambda: profile_scope("bench", sample_rate=0))]
+    cases += [(f"sampling every {ms:g} ms", lambda ms=ms: _Sampler(ms / 1000)) for ms in (10, 5, 1)]
+    # Cases are interleaved and the best round kept, so machine noise hits them alike
+    best = {name: timed(wrap) for name, wrap in cases}
+    for _ in range(args.rounds - 1):
+        for name, wrap in cases:
+            best[name] = min(best[name], timed(wrap))
+    base = best["bare"]
+    for name, _ in cases:
+        print(f"{name:28s} {best[name] * 1000:8.1f} ms  ({(best[name] / base - 1) * 100:+.1f}%)")
+
+    profiler = SamplingProfiler()
+    started = time.perf_counter()
+    for _ in range(2000):
+        profiler.sample()
+    per_sample = (time.perf_counter() - started) / 2000
+    print(f"one sample of all threads: {per_sample * 1e6:.1f} us "
+          f"= {per_sample / 0.010 * 100:.2f}% of a core at 10 ms, {per_sample / 0.001 * 100:.2f}% at 1 ms")
+
+    started = time.perf_counter()
+    for _ in range(100000):
+        with profile_scope("bench", sample_rate=0):
+            pass
+    print(f"inactive profile_scope enter/exit: {(time.perf_counter() - started) * 10:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Listing search latency on the rooms/properties join vs the room_search table.
+
+    python -m benchmarks.bench_room_search [--rooms 1000000] [--repeat 20] [--mysql]
+
+Seeds --rooms rooms over rooms/3 properties (SQLite in a temp file by
+default; with --mysql into the DATABASE_URL schema, which must be a scratch
+database), migrates room_search with the real migration code, then times
+the queries generate_sql_query produces for a few typical requirement sets
+in both shapes and prints each query plan.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import query_generator, room_search
+from app.core.gazetteer import LocationGazetteer
+
+ZONES = ["North", "South", "East", "West", "Central", "North-East"]
+CITIES = ["Singapore", "Bedok", "Jurong", "Tampines", "Woodlands", "Clementi"]
+STATIONS = ["Bishan", "Bedok", "Tampines", "Jurong East", "Clementi", "Yishun", "Serangoon", "Outram Park"]
+ROOM_TYPES = ["Common Room", "Master Room", "Studio", "Whole Unit"]
+PROPERTY_TYPES = ["HDB", "Condo", "Landed"]
+
+SEARCHES = {
+    "budget only": {"budget": 1200},
+    "zone + budget": {"location": "east", "budget": 1500},
+    "mrt + budget + type": {"location": "bishan", "budget": 2000, "property_type": "condo"},
+    "city, no budget": {"location": "tampines"},
+}
+
+LEGACY_DDL = [
+    "CREATE TABLE properties (propertyid INTEGER PRIMARY KEY, zone VARCHAR(32), city VARCHAR(32), "
+    "buildingname VARCHAR(64), add1 VARCHAR(128))",
+    "CREATE TABLE rooms (roomid INTEGER PRIMARY KEY, propertyid INTEGER, rentmonth DOUBLE, status VARCHAR(16), "
+    "roomtype VARCHAR(32), propertytype VARCHAR(32), nearestmrt VARCHAR(64), "
+    + ", ".join(f"{column} CHAR(1)" for column in room_search.AMENITY_COLUMNS) + ")",
+    # What the live schema has today: the join key only
+    "CREATE INDEX ix_rooms_property ON rooms (propertyid)",
+]
+
+
+def seed(connection, placeholder, rooms, rng):
+    cursor = connection.cursor()
+    for statement in LEGACY_DDL:
+        cursor.execute(statement)
+    properties = max(1, rooms // 3)
+    marks = ", ".join([placeholder] * 5)
+    cursor.executemany(f"INSERT INTO properties VALUES ({marks})", [
+        (i, rng.choice(ZONES), rng.choice(CITIES), f"Block {i}", f"{rng.randrange(1, 999)} {rng.choice(STATIONS)} Road")
+        for i in range(properties)
+    ])
+    marks = ", ".join([placeholder] * (7 + len(room_search.AMENITY_COLUMNS)))
+    batch = []
+    for i in range(rooms):
+        batch.append((
+            i, rng.randrange(properties), rng.randrange(0, 5000, 50),
+            "inactive" if rng.random() < 0.3 else "available",
+            rng.choice(ROOM_TYPES), rng.choice(PROPERTY_TYPES), rng.choice(STATIONS),
+            *(rng.choice("YN") for _ in room_search.AMENITY_COLUMNS),
+        ))
+        if len(batch) == 20000:
+            cursor.executemany(f"INSERT INTO rooms VALUES ({marks})", batch)
+            batch = []
+    if batch:
+        cursor.executemany(f"INSERT INTO rooms VALUES ({marks})", batch)
+    connection.commit()
+    cursor.close()
+
+
+def explain(connection, query, mysql):
+    cursor = connection.cursor()
+    cursor.execute(("EXPLAIN " if mysql else "EXPLAIN QUERY PLAN ") + query)
+    plan = cursor.fetchall()
+    cursor.close()
+    if mysql:
+        return [f"{row[2]}: type={row[4]} key={row[6]} rows={row[9]} {row[11] or ''}" for row in plan]
+    return [row[-1] for row in plan]
+
+
+def time_query(connection, query, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        cursor.execute(query)
+        cursor.fetchall()
+        cursor.close()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mysql", action="store_true", help="use the DATABASE_URL database (scratch only)")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    if args.mysql:
+        from app.config.db_config import get_db_connection
+        connection, placeholder = get_db_connection(), "%s"
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        connection, placeholder = sqlite3.connect(path), "?"
+
+    started = time.perf_counter()
+    seed(connection, placeholder, args.rooms, rng)
+    print(f"seeded {args.rooms} rooms in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    room_search.create_table(connection)
+    room_search.backfill(connection, batch_size=50000, placeholder=placeholder)
+    print(f"migrated room_search in {time.perf_counter() - started:.1f}s")
+    cursor = connection.cursor()
+    cursor.execute("ANALYZE" if not args.mysql else "ANALYZE TABLE rooms, properties, room_search")
+    cursor.fetchall()
+    cursor.close()
+
+    gazetteer = LocationGazetteer({"zone": ZONES, "city": CITIES, "nearestmrt": STATIONS})
+    query_generator.resolve_locations = gazetteer.resolve
+    query_generator.find_nearby_properties = lambda text: None
+
+    for name, requirements in SEARCHES.items():
+        print(f"\n{name}: {requirements}")
+        for label, columns in (("join", room_search.LEGACY_COLUMNS), ("room_search", room_search.ROOM_SEARCH_COLUMNS)):
+            with contextlib.redirect_stdout(io.StringIO()):  # generate_sql_query prints each query
+                query = query_generator.generate_sql_query("", requirements, columns)
+            median, worst = time_query(connection, query, args.repeat)
+            print(f"  {label:12s} median {median * 1000:8.2f} ms  max {worst * 1000:8.2f} ms")
+            for step in explain(connection, query, args.mysql):
+                print(f"      {step}")
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
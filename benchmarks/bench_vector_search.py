@@ -0,0 +1,93 @@
+"""
+Build time and query latency of the listing vector index.
+
+    python -m benchmarks.bench_vector_search [--listings 200000] [--queries 200] [--dim 512]
+
+Listings are generated; the index is memory-mapped in a temp directory,
+as in production. Reports build throughput, incremental update cost and
+plain vs hybrid top-5 latency.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.gazetteer import LocationGazetteer
+from app.core.room_search import AMENITY_COLUMNS
+from app.core.vector_search import VectorIndex
+
+ZONES = ["North", "South", "East", "West", "Central", "North-East"]
+STATIONS = ["Bishan", "Bedok", "Tampines", "Jurong East", "Clementi", "Yishun", "Serangoon", "Outram Park"]
+ROOM_TYPES = ["Common Room", "Master Room", "Studio", "Whole Unit"]
+PROPERTY_TYPES = ["HDB", "Condo", "Landed"]
+DESCRIPTIONS = ["quiet", "big window", "near park", "newly renovated", "high floor", "corner unit", "cooking allowed",
+                "no agent fee", "female only", "near hawker centre", "sea view", "bright"]
+QUERIES = [
+    ("quiet room with a big window near a park", {"budget": 1500}),
+    ("condo with pool and gym", {"location": "east", "property_type": "condo"}),
+    ("studio near bishan mrt, cooking allowed", {"budget": 2500, "location": "bishan"}),
+    ("bright high floor master room", {}),
+]
+
+
+def generate(count, rng):
+    for i in range(count):
+        station = rng.choice(STATIONS)
+        row = {
+            "roomid": i, "propertyid": i // 3, "rentmonth": rng.randrange(500, 5000, 50), "status": "available",
+            "roomtype": rng.choice(ROOM_TYPES), "propertytype": rng.choice(PROPERTY_TYPES),
+            "zone": rng.choice(ZONES), "nearestmrt": station, "add1": f"{rng.randrange(1, 999)} {station} Street",
+            "description": ", ".join(rng.sample(DESCRIPTIONS, 3)),
+        }
+        row.update({column: rng.choice("YN") for column in AMENITY_COLUMNS})
+        yield row
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(0.95 * (len(timings) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    rows = list(generate(args.listings, rng))
+    index = VectorIndex(path=os.path.join(tempfile.mkdtemp(), "listings"), dim=args.dim)
+    started = time.perf_counter()
+    index.apply(rows)
+    elapsed = time.perf_counter() - started
+    print(f"built {len(index)} listings in {elapsed:.1f}s ({len(index) / elapsed:,.0f}/s), "
+          f"matrix {index._matrix.nbytes / 2**20:.0f} MiB on disk")
+
+    updates = [dict(row, rentmonth=row["rentmonth"] + 50) for row in rng.sample(rows, 1000)]
+    started = time.perf_counter()
+    index.apply(updates)
+    print(f"incremental update: {(time.perf_counter() - started) / len(updates) * 1e6:.0f} us per listing")
+
+    gazetteer = LocationGazetteer({"zone": ZONES, "nearestmrt": STATIONS})
+    repeat = max(1, args.queries // len(QUERIES))
+    for text, requirements in QUERIES:
+        plain = timed(lambda: index.search(text, 5), repeat)
+        hybrid = timed(lambda: index.hybrid_search(text, requirements, 5, gazetteer=gazetteer), repeat)
+        print(f"{text!r}\n  plain  p50 {plain[0]:6.1f} ms  p95 {plain[1]:6.1f} ms"
+              f"\n  hybrid p50 {hybrid[0]:6.1f} ms  p95 {hybrid[1]:6.1f} ms  {requirements}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
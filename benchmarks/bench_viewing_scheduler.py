@@ -0,0 +1,219 @@
+"""
+Slot search and concurrent booking throughput of the viewing scheduler.
+
+    python -m benchmarks.bench_viewing_scheduler [--agents 50] [--properties 2000] [--fill 0.8] [--days 14]
+                                                 [--attempts 5000] [--threads 64]
+
+1. Slot queries: agents' calendars are filled to --fill of their opening
+   hours over the search window, then next_slots() is timed for random
+   properties and compared with a naive search that tests each candidate
+   slot against every booking of the property and agent.
+2. Concurrent holds: --threads threads make --attempts holds between them,
+   all asking for the same Saturday morning on --hot properties. Run once in
+   memory and once through ViewingStore on a shared SQLite file by two
+   scheduler instances (two workers), then every agent and property
+   calendar is checked for overlapping bookings.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.viewing_scheduler import (
+    CONFIRMED,
+    HELD,
+    LOCAL_TZ,
+    ViewingScheduler,
+    ViewingStore,
+    agent_resource,
+    opening_hours,
+    property_resource,
+)
+
+# Monday 08:00; the search window starts here
+START = datetime(2026, 10, 19, 8, 0, tzinfo=LOCAL_TZ).timestamp()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def filled_scheduler(args, rng) -> ViewingScheduler:
+    scheduler = ViewingScheduler(clock=lambda: START, hold_seconds=10**9, search_days=args.days)
+    for index in range(args.properties):
+        scheduler.assign_agents(f"p{index}", [f"a{index % args.agents}"])
+    slots = []
+    day = datetime.fromtimestamp(START, LOCAL_TZ).date()
+    for offset in range(scheduler.search_seconds // 86400):
+        opens, closes = opening_hours(datetime(day.year, day.month, day.day, tzinfo=LOCAL_TZ).timestamp() + offset * 86400)
+        slots.extend(range(int(opens), int(closes), scheduler.slot_seconds))
+    for agent in range(args.agents):
+        properties = [f"p{index}" for index in range(agent, args.properties, args.agents)]
+        for slot in rng.sample(slots, int(len(slots) * args.fill)):
+            scheduler.hold(f"seed-{agent}-{slot}", rng.choice(properties), slot)
+    return scheduler
+
+
+def naive_next_slots(scheduler: ViewingScheduler, bookings_by_resource, propertyid: str, count: int = 3):
+    """Steps through the slot grid testing every booking of the property and agent."""
+    agent = scheduler._agents_for(propertyid)[0]
+    busy = bookings_by_resource.get(property_resource(propertyid), []) + bookings_by_resource.get(agent_resource(agent), [])
+    t = scheduler._align(scheduler.earliest_start())
+    until = START + scheduler.search_seconds
+    found = []
+    while t + scheduler.viewing_seconds <= until and len(found) < count:
+        end = t + scheduler.viewing_seconds
+        opens, closes = opening_hours(t)
+        if opens <= t and end <= closes and not any(start < end and stop > t for start, stop in busy):
+            found.append(t)
+        t += scheduler.slot_seconds
+    return found
+
+
+def bench_queries(args):
+    rng = random.Random(7)
+    started = time.perf_counter()
+    scheduler = filled_scheduler(args, rng)
+    booked = len(scheduler._bookings)
+    print(f"Filled {args.agents} agents / {args.properties} properties with {booked} viewings "
+          f"({args.fill:.0%} of {scheduler.search_seconds // 86400} days of opening hours) in {time.perf_counter() - started:.1f}s")
+
+    bookings_by_resource = {}
+    for booking in scheduler._bookings.values():
+        for resource in booking.resources:
+            bookings_by_resource.setdefault(resource, []).append((booking.start, booking.end))
+
+    properties = [f"p{rng.randrange(args.properties)}" for _ in range(2000)]
+    for name, query in (
+        ("interval index", lambda p: scheduler.next_slots(p)),
+        ("naive scan", lambda p: naive_next_slots(scheduler, bookings_by_resource, p)),
+    ):
+        timings = []
+        for propertyid in properties:
+            started = time.perf_counter()
+            query(propertyid)
+            timings.append(time.perf_counter() - started)
+        print(f"  next 3 slots, {name:<14}: p50 {statistics.median(timings) * 1e6:7.1f} us, "
+              f"p99 {percentile(timings, 0.99) * 1e6:7.1f} us")
+    mismatches = sum(scheduler.next_slots(p) != naive_next_slots(scheduler, bookings_by_resource, p) for p in properties[:200])
+    print(f"  results differ from the naive search for {mismatches} of 200 properties")
+
+
+def overlaps(bookings) -> int:
+    by_resource = {}
+    for start, end, resources in bookings:
+        for resource in resources:
+            by_resource.setdefault(resource, []).append((start, end))
+    count = 0
+    for intervals in by_resource.values():
+        intervals.sort()
+        count += sum(1 for (_, end), (start, _) in zip(intervals, intervals[1:]) if start < end)
+    return count
+
+
+def run_holds(schedulers, args, label):
+    saturday_10am = datetime(2026, 10, 24, 10, 0, tzinfo=LOCAL_TZ).timestamp()
+    barrier = threading.Barrier(args.threads)
+    latencies, results = [], []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(index)
+        scheduler = schedulers[index % len(schedulers)]
+        mine_latencies, mine = [], []
+        barrier.wait()
+        for attempt in range(args.attempts // args.threads):
+            user = f"user-{index}-{attempt}"
+            wanted = saturday_10am + rng.randrange(4) * scheduler.slot_seconds
+            started = time.perf_counter()
+            booking = scheduler.hold(user, f"p{rng.randrange(args.hot)}", wanted)
+            if booking is not None and rng.random() < 0.5:
+                scheduler.confirm(booking.id, "91234567")
+            mine_latencies.append(time.perf_counter() - started)
+            mine.append(booking)
+        with lock:
+            latencies.extend(mine_latencies)
+            results.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    held = [booking for booking in results if booking is not None]
+    stats = [scheduler.stats() for scheduler in schedulers]
+    print(f"  {label}: {len(results)} attempts in {elapsed:.2f}s ({len(results) / elapsed:,.0f}/s), {len(held)} held, "
+          f"{sum(1 for booking in held if booking.start == saturday_10am)} got 10:00 exactly; "
+          f"hold p50 {statistics.median(latencies) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms; "
+          f"DB conflicts {sum(s['db_conflicts'] for s in stats)}, store errors {sum(s['store_errors'] for s in stats)}")
+
+
+def bench_concurrency(args):
+    print(f"{args.attempts} holds from {args.threads} threads on {args.hot} properties / {args.agents} agents, "
+          "all asking for Saturday 10:00-11:30:")
+    assignments = {f"p{index}": [f"a{index % args.agents}", f"a{(index + 1) % args.agents}"] for index in range(args.hot)}
+
+    scheduler = ViewingScheduler(clock=lambda: START)
+    for propertyid, agents in assignments.items():
+        scheduler.assign_agents(propertyid, agents)
+    run_holds([scheduler], args, "memory")
+    bookings = [(b.start, b.end, b.resources) for b in scheduler._bookings.values()]
+    print(f"    overlapping bookings on any calendar: {overlaps(bookings)}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "viewings.db")
+        setup = sqlite3.connect(path)
+        setup.execute("PRAGMA journal_mode=WAL")
+        setup.close()
+
+        def connect():
+            return sqlite3.connect(path, timeout=30, check_same_thread=False)
+
+        workers = []
+        for _ in range(2):
+            worker = ViewingScheduler(ViewingStore(connect, placeholder="?"), clock=lambda: START)
+            worker.load()
+            for propertyid, agents in assignments.items():
+                worker.assign_agents(propertyid, agents)
+            workers.append(worker)
+        run_holds(workers, args, "2 workers + SQLite")
+
+        connection = connect()
+        rows = connection.execute(
+            "SELECT starts_at, ends_at, propertyid, agent_id FROM viewing_bookings WHERE status IN (?, ?)", (HELD, CONFIRMED)
+        ).fetchall()
+        connection.close()
+        bookings = [(start, end, [property_resource(p)] + ([agent_resource(a)] if a else [])) for start, end, p, a in rows]
+        print(f"    {len(rows)} bookings in the DB; overlapping bookings on any calendar: {overlaps(bookings)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--properties", type=int, default=2000)
+    parser.add_argument("--fill", type=float, default=0.8)
+    parser.add_argument("--days", type=int, default=14, help="search window, and how far ahead calendars are filled")
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--hot", type=int, default=40, help="properties the concurrent holds compete for")
+    args = parser.parse_args()
+
+    bench_queries(args)
+    if args.attempts:
+        bench_concurrency(args)
+
+
+if __name__ == "__main__":
+    main()
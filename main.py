@@ -1,5 +1,5 @@
-from app.config.db_config import get_db_connection
+from app.routes.chat_routes import app
 
-conn = get_db_connection()
-if conn:
-    conn.close()
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=8000)
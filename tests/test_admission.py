@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.core.admission import (
+    PRIORITY_ACTIVE,
+    PRIORITY_BOOKING,
+    PRIORITY_NEW,
+    AdmissionController,
+    AdmissionGate,
+    Overloaded,
+    session_priority,
+)
+from app.core.coalescer import MessageCoalescer
+from app.core.idempotency import MessageDeduplicator
+from app.routes import chat_routes
+
+
+def test_waiters_admitted_by_priority():
+    gate = AdmissionGate("turn", limit=1, max_queue=4, max_wait=2)
+    gate.acquire()
+    order = []
+
+    def worker(name, priority):
+        with gate.admit(priority):
+            order.append(name)
+
+    threads = []
+    for name, priority in (("new", PRIORITY_NEW), ("active", PRIORITY_ACTIVE), ("booking", PRIORITY_BOOKING)):
+        thread = threading.Thread(target=worker, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+
+    gate.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["booking", "active", "new"]
+
+
+def test_full_queue_sheds_or_preempts():
+    gate = AdmissionGate("turn", limit=1, max_queue=1, max_wait=1)
+    gate.acquire()
+    results = {}
+
+    def worker(name, priority):
+        try:
+            gate.acquire(priority)
+            results[name] = "admitted"
+            gate.release()
+        except Overloaded as e:
+            results[name] = e.reason
+
+    queued = threading.Thread(target=worker, args=("queued", PRIORITY_NEW))
+    queued.start()
+    time.sleep(0.05)
+
+    with pytest.raises(Overloaded):
+        gate.acquire(PRIORITY_NEW)  # same priority as the waiter: shed
+
+    booking = threading.Thread(target=worker, args=("booking", PRIORITY_BOOKING))
+    booking.start()
+    time.sleep(0.05)
+    gate.release()
+    queued.join()
+    booking.join()
+
+    assert results == {"queued": "preempted", "booking": "admitted"}
+    assert gate.stats()["shed"] == {"queue_full": 1, "timeout": 0, "preempted": 1}
+
+
+def test_queue_wait_is_bounded():
+    gate = AdmissionGate("turn", limit=1, max_queue=10, max_wait=0.1)
+
+    async def run():
+        await gate.acquire_async()
+        started = time.monotonic()
+        with pytest.raises(Overloaded, match="timeout"):
+            await gate.acquire_async()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.5
+    stats = gate.stats()
+    assert stats["queued"] == 0 and stats["shed_rate"] == 0.5
+
+
+def test_async_release_admits_waiter():
+    gate = AdmissionGate("send", limit=1, max_queue=10, max_wait=2)
+
+    async def run():
+        async with gate.admit_async():
+            waiter = asyncio.create_task(gate.acquire_async())
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+        await waiter
+        gate.release()
+
+    asyncio.run(run())
+    assert gate.stats()["admitted"] == 2 and gate.stats()["active"] == 0
+
+
+def test_session_priority():
+    assert session_priority(None) == PRIORITY_NEW
+    assert session_priority({"booking_state": "contact"}) == PRIORITY_BOOKING
+    assert session_priority({"booking_state": None, "chat_history": ["hi"]}) == PRIORITY_ACTIVE
+
+
+def test_webhook_sheds_with_busy_twiml(monkeypatch):
+    monkeypatch.setattr(chat_routes, "message_deduplicator", MessageDeduplicator())
+    monkeypatch.setattr(chat_routes, "message_coalescer", MessageCoalescer(window=0, max_wait=0))
+    monkeypatch.setattr(chat_routes, "admission", AdmissionController({
+        "turn": AdmissionGate("turn", limit=1, max_queue=0, max_wait=1),
+        "send": AdmissionGate("send", limit=4, max_queue=4, max_wait=1),
+    }))
+    monkeypatch.setattr(chat_routes.chatbot, "process_message", lambda user, text: time.sleep(0.2) or "reply")
+    monkeypatch.setattr(chat_routes, "send_whatsapp_message", lambda to, body: "SMout")
+
+    async def run():
+        transport = httpx.ASGITransport(app=chat_routes.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/webhook/", data={"Body": "room", "From": f"whatsapp:+65{i}"}) for i in range(3)
+            ])
+
+    responses = asyncio.run(run())
+    busy = [response for response in responses if response.headers["content-type"].startswith("application/xml")]
+    assert len(busy) == 2
+    assert "very busy" in busy[0].text
+    assert chat_routes.admission.stats()["turn"]["shed"]["queue_full"] == 2
@@ -0,0 +1,138 @@
+import random
+
+from app.core import alerts, llm_processor
+from app.core.alerts import AlertsEngine, IntervalIndex, IntervalTree
+from app.core.gazetteer import LocationGazetteer
+from app.core.geo import GeoIndex, load_transit_stops
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(3)
+    intervals = []
+    for key in range(500):
+        low = rng.uniform(0, 5000)
+        intervals.append((low, low + rng.uniform(0, 2000), key))
+    tree = IntervalTree(intervals)
+    for x in (0, 100, 2500, 4999, 7000):
+        assert sorted(tree.stab(x)) == sorted(k for low, high, k in intervals if low <= x <= high)
+
+
+def test_interval_index_updates():
+    index = IntervalIndex()
+    for key in range(200):
+        index.add(key, 0, key * 10)
+    index.remove(150)
+    index.add(5, 0, 10_000)
+    assert 5 in index.stab(1500)
+    assert 150 not in index.stab(1500)
+    assert sorted(index.stab(1990)) == [5] + [k for k in range(199, 200)]
+
+
+def make_engine(sent):
+    gazetteer = LocationGazetteer({"zone": ["East", "Central"], "nearestmrt": ["Bishan MRT"]})
+    return AlertsEngine(gazetteer, None, sender=lambda to, body: sent.append((to, body)) or "SM1")
+
+
+def test_alerts_match_and_batch_per_user():
+    sent = []
+    engine = make_engine(sent)
+    engine.upsert("whatsapp:+651", {"budget": 1500, "location": "east"})
+    engine.upsert("whatsapp:+652", {"budget": 3000, "location": "bishan", "property_type": "studio"})
+    engine.upsert("whatsapp:+653", {"budget": 1000})
+
+    rows = [
+        {"roomid": 1, "rentmonth": 1200, "zone": "East", "roomtype": "Common Room", "propertytype": "HDB"},
+        {"roomid": 2, "rentmonth": 1400, "zone": "East", "roomtype": "Master Room", "propertytype": "HDB"},
+        {"roomid": 3, "rentmonth": 2800, "zone": "Central", "nearestmrt": "Bishan MRT", "roomtype": "Studio"},
+        {"roomid": 4, "rentmonth": 900, "zone": "Central", "status": "inactive"},
+    ]
+    results = engine.notify(rows)
+
+    assert results == {"whatsapp:+651": "SM1", "whatsapp:+652": "SM1"}
+    assert len(sent) == 2
+    assert engine.notify(rows) == {}
+
+
+def test_alerts_upsert_replaces_previous_search():
+    engine = make_engine([])
+    engine.upsert("u", {"budget": 1000, "location": "east"})
+    engine.upsert("u", {"budget": 2000, "location": "central"})
+    assert engine.match({"rentmonth": 1500, "zone": "Central"}) == ["u"]
+    assert engine.match({"rentmonth": 900, "zone": "East"}) == []
+    engine.remove("u")
+    assert len(engine) == 0
+
+
+def test_alerts_budget_check_per_location_and_bounded_memory():
+    sent = []
+    engine = AlertsEngine(LocationGazetteer({"zone": ["East", "Central"]}), None,
+                          sender=lambda to, body: sent.append(to) or "SM1", max_notified=3)
+    for budget in range(500, 3000, 100):
+        engine.upsert(f"east-{budget}", {"budget": budget, "location": "east"})
+    engine.upsert("central", {"budget": 5000, "location": "central"})
+    assert sorted(engine.match({"rentmonth": 2750, "zone": "East"})) == ["east-2800", "east-2900"]
+
+    engine.notify([{"roomid": room, "rentmonth": 4000, "zone": "Central"} for room in range(5)])
+    assert len(sent) == 1 and len(engine._notified) == 3
+
+
+def test_saved_search_is_written_only_when_it_changes(monkeypatch):
+    engine = make_engine([])
+    writes = []
+    monkeypatch.setattr(alerts, "get_alerts_engine", lambda: engine)
+    monkeypatch.setattr(alerts, "save_search", lambda user_id, requirements: writes.append(dict(requirements)))
+
+    requirements = {"budget": 1500, "location": "east"}
+    alerts.register_saved_search("whatsapp:+651", requirements).result()
+    assert alerts.register_saved_search("whatsapp:+651", requirements) is None
+    requirements["budget"] = 1800
+    alerts.register_saved_search("whatsapp:+651", requirements).result()
+    assert writes == [{"budget": 1500, "location": "east"}, {"budget": 1800, "location": "east"}]
+
+    # Web chat sessions cannot receive WhatsApp alerts
+    assert alerts.register_saved_search("web:" + "a" * 22, requirements) is None
+    assert len(engine) == 1 and len(writes) == 2
+
+
+def test_proximity_search_matches_properties_added_later():
+    engine = AlertsEngine(LocationGazetteer({"zone": ["Central"]}), GeoIndex(load_transit_stops()),
+                          sender=lambda to, body: "SM1")
+    engine.upsert("whatsapp:+651", {"budget": 2000, "location": "within 800m of Bishan MRT"})
+
+    # Neither property existed when the search was saved
+    near = {"roomid": 1, "propertyid": 101, "rentmonth": 1500, "latitude": 1.3520, "longitude": 103.8490}
+    far = {"roomid": 2, "propertyid": 102, "rentmonth": 1500, "latitude": 1.3700, "longitude": 103.8495}
+    by_mrt = {"roomid": 3, "propertyid": 103, "rentmonth": 1500, "nearestmrt": "Bishan MRT"}
+    assert engine.match(near) == ["whatsapp:+651"]
+    assert engine.match(far) == []
+    assert engine.match(by_mrt) == ["whatsapp:+651"]
+    assert engine.match(dict(near, rentmonth=2500)) == []
+
+    engine.remove("whatsapp:+651")
+    assert engine.match(near) == [] and len(engine._anchors) == 0
+
+
+def test_alerts_are_opt_in(monkeypatch):
+    engine = make_engine([])
+    writes, deletes = [], []
+    monkeypatch.setattr(alerts, "get_alerts_engine", lambda: engine)
+    monkeypatch.setattr(alerts, "save_search", lambda user_id, requirements: writes.append(user_id))
+    monkeypatch.setattr(alerts, "delete_search", lambda user_id: deletes.append(user_id))
+    monkeypatch.setattr(llm_processor, "classify_intent", llm_processor.classify_intent_by_rules)
+    monkeypatch.setattr(llm_processor, "generate_sql_query", lambda *args: None)
+    monkeypatch.setattr(llm_processor, "route",
+                        lambda task, prompt, **kwargs: {"location": "Bishan"} if "bishan" in prompt else {})
+    chatbot = llm_processor.PropertyChatbot()
+
+    chatbot.process_message("whatsapp:+651", "rooms in bishan under 1500")
+    assert "whatsapp:+651" not in engine
+
+    reply = chatbot.process_message("whatsapp:+652", "alert me when new rooms are listed")
+    assert reply.startswith("Sure, I'll alert you") and "whatsapp:+652" not in engine
+    chatbot.process_message("whatsapp:+652", "rooms in bishan under 1500")
+    assert "whatsapp:+652" in engine
+
+    reply = chatbot.process_message("whatsapp:+652", "please stop the alerts")
+    assert reply.startswith("Okay, I've stopped") and "whatsapp:+652" not in engine
+    alerts._writer.submit(lambda: None).result()
+    assert writes == ["whatsapp:+652"] and deletes == ["whatsapp:+652"]
@@ -0,0 +1,41 @@
+from app.core.bulk_search import bulk_search
+from app.core.gazetteer import LocationGazetteer
+from app.core.geo import GeoIndex, load_transit_stops
+
+LISTINGS = [
+    {"propertyid": 1, "rentmonth": 1200, "roomtype": "Common Room", "propertytype": "HDB", "zone": "East", "nearestmrt": "Tampines MRT", "add1": "1 Tampines St 81"},
+    {"propertyid": 2, "rentmonth": 900, "roomtype": "Common Room", "propertytype": "HDB", "zone": "East", "nearestmrt": "Bedok MRT", "add1": "5 Bedok North Rd"},
+    {"propertyid": 3, "rentmonth": 2500, "roomtype": "Studio", "propertytype": "Condo", "zone": "Central", "nearestmrt": "Bishan MRT", "add1": "9 Bishan Rd"},
+    {"propertyid": 4, "rentmonth": 1800, "roomtype": "Master Room", "propertytype": "Condo", "zone": "Central", "nearestmrt": "Bishan MRT", "add1": "11 Bishan Rd"},
+]
+
+
+def search(requirement_sets):
+    gazetteer = LocationGazetteer({
+        "zone": ["East", "Central"],
+        "nearestmrt": ["Tampines MRT", "Bedok MRT", "Bishan MRT"],
+        "add1": [row["add1"] for row in LISTINGS],
+    })
+    geo_index = GeoIndex(load_transit_stops())
+    geo_index.add_property(3, 1.3509, 103.8486)
+    geo_index.add_property(4, 1.3700, 103.8495)
+    return bulk_search(requirement_sets, LISTINGS, limit=2, gazetteer=gazetteer, geo_index=geo_index)
+
+
+def ids(rows):
+    return [row["propertyid"] for row in rows]
+
+
+def test_bulk_search_per_requirement_results():
+    results = search({
+        "a": {"budget": 2000, "location": "east"},
+        "b": {"location": "bishan", "property_type": "studio"},
+        "c": {"budget": 1500},
+        "d": {"location": "near bishan mrt"},
+        "e": {"location": "nowhere"},
+    })
+    assert ids(results["a"]) == [2, 1]
+    assert ids(results["b"]) == [3]
+    assert ids(results["c"]) == [2, 1]
+    assert ids(results["d"]) == [3]
+    assert results["e"] == []
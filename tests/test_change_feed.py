@@ -0,0 +1,92 @@
+import logging
+import sqlite3
+
+from app.core import change_feed
+from app.core.change_feed import DELETE, INSERT, UPDATE, ChangeEvent, ChangeFeed, TableWatch
+from app.core.geo import GeoIndex
+
+
+def make_feed(tmp_path, **kwargs):
+    path = str(tmp_path / "listings.db")
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE rooms (roomid INTEGER PRIMARY KEY, rentmonth REAL, updated_at INTEGER);
+        INSERT INTO rooms VALUES (1, 1000, 100), (2, 1500, 100);
+    """)
+    connection.commit()
+
+    feed = ChangeFeed(
+        connect=lambda: sqlite3.connect(path),
+        watches=[TableWatch("rooms", key_column="roomid", **kwargs)],
+        placeholder="?",
+        batch_size=2,
+        delete_scan_every=1,
+    )
+    received = []
+    feed.subscribe(received.extend)
+    return connection, feed, received
+
+
+def test_first_poll_primes_without_events(tmp_path):
+    _, feed, received = make_feed(tmp_path, updated_column="updated_at")
+    assert feed.poll_once() == []
+    assert received == []
+
+
+def test_inserts_updates_and_deletes(tmp_path):
+    connection, feed, received = make_feed(tmp_path, updated_column="updated_at")
+    feed.poll_once()
+
+    connection.executescript("""
+        INSERT INTO rooms VALUES (3, 900, 101), (4, 950, 101), (5, 990, 102);
+        UPDATE rooms SET rentmonth = 1100, updated_at = 103 WHERE roomid = 1;
+        DELETE FROM rooms WHERE roomid = 2;
+    """)
+    connection.commit()
+    events = feed.poll_once()
+
+    assert [(e.kind, e.key) for e in events] == [
+        (INSERT, 3), (INSERT, 4), (INSERT, 5), (UPDATE, 1), (DELETE, 2),
+    ]
+    assert events[3].row["rentmonth"] == 1100
+    assert received == events
+    assert feed.poll_once() == []
+
+
+def test_auto_increment_mode_sees_inserts(tmp_path):
+    connection, feed, _ = make_feed(tmp_path)
+    feed.poll_once()
+    connection.execute("INSERT INTO rooms VALUES (7, 2000, 0)")
+    connection.commit()
+    assert [(e.kind, e.key) for e in feed.poll_once()] == [(INSERT, 7)]
+
+
+def test_subscriber_table_filter_and_errors(tmp_path):
+    connection, feed, received = make_feed(tmp_path, updated_column="updated_at")
+    other = []
+    feed.subscribe(lambda events: 1 / 0)
+    feed.subscribe(other.extend, tables=["properties"])
+    feed.poll_once()
+    connection.execute("INSERT INTO rooms VALUES (8, 2000, 200)")
+    connection.commit()
+    feed.poll_once()
+    assert [e.key for e in received] == [8]
+    assert other == []
+
+
+def test_watch_with_missing_column_is_disabled_once(tmp_path, caplog):
+    connection, feed, received = make_feed(tmp_path, updated_column="modified_on")
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            assert feed.poll_once() == []
+    assert [r.levelno for r in caplog.records] == [logging.WARNING]
+    assert "modified_on" in caplog.records[0].getMessage()
+
+
+def test_deleted_property_leaves_geo_index(monkeypatch):
+    geo_index = GeoIndex([])
+    geo_index.add_property(5, 1.3510, 103.8490)
+    monkeypatch.setattr(change_feed, "get_geo_index", lambda: geo_index)
+    monkeypatch.setattr(change_feed, "get_gazetteer", lambda: None)
+    change_feed._refresh_location_indexes([ChangeEvent("properties", DELETE, 5)])
+    assert len(geo_index.properties) == 0
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import httpx
+
+from app.core.coalescer import MessageCoalescer
+from app.core.llm_resilience import deadline_scope, current_deadline
+from app.routes import chat_routes
+
+
+async def collect_and_reply(coalescer, user, text):
+    turn = await coalescer.collect(user, text)
+    if turn is not None:
+        turn.commit()
+    return turn
+
+
+async def send_burst(coalescer, user, texts, gap):
+    tasks = []
+    for text in texts:
+        tasks.append(asyncio.create_task(collect_and_reply(coalescer, user, text)))
+        await asyncio.sleep(gap)
+    return await asyncio.gather(*tasks)
+
+
+def test_burst_becomes_one_turn():
+    coalescer = MessageCoalescer(window=0.2, max_wait=5)
+    results = asyncio.run(send_burst(coalescer, "u1", ["hi", "looking for room", "tampines", "under 1500"], 0.02))
+    turns = [turn for turn in results if turn is not None]
+    assert len(turns) == 1
+    assert turns[0].text == "hi\nlooking for room\ntampines\nunder 1500"
+    assert coalescer.stats()["messages_merged"] == 3
+
+
+def test_users_are_independent():
+    coalescer = MessageCoalescer(window=0.05, max_wait=1)
+
+    async def run():
+        return await asyncio.gather(coalescer.collect("a", "x"), coalescer.collect("b", "y"))
+
+    assert [turn.text for turn in asyncio.run(run())] == ["x", "y"]
+
+
+def test_max_wait_bounds_latency():
+    coalescer = MessageCoalescer(window=0.2, max_wait=0.3)
+    started = time.monotonic()
+    results = asyncio.run(send_burst(coalescer, "u1", [str(i) for i in range(8)], 0.1))
+    turns = [turn for turn in results if turn is not None]
+    assert len(turns) >= 2  # the chatty user still gets an answer
+    assert sum(len(turn.messages) for turn in turns) == 8
+    assert time.monotonic() - started < 1.5
+
+
+def test_new_message_cancels_in_flight_turn():
+    coalescer = MessageCoalescer(window=0, max_wait=0)
+
+    async def run():
+        first = await coalescer.collect("u1", "rooms in bedok")
+        second = await coalescer.collect("u1", "under 1200")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.cancelled and not first.commit()
+    assert second.messages == ["rooms in bedok", "under 1200"]
+    with deadline_scope(deadline=first.deadline), deadline_scope(8):
+        assert current_deadline().expired
+
+
+def test_committed_turn_is_not_cancelled():
+    coalescer = MessageCoalescer(window=0, max_wait=0)
+
+    async def run():
+        first = await coalescer.collect("u1", "hello")
+        first.commit()
+        second = await coalescer.collect("u1", "bye")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert not first.cancelled and second.messages == ["bye"]
+
+
+def test_webhook_replies_once_per_burst(monkeypatch):
+    processed, sent = [], []
+    monkeypatch.setattr(chat_routes, "message_coalescer", MessageCoalescer(window=0.2, max_wait=2))
+    monkeypatch.setattr(chat_routes.chatbot, "process_message", lambda user, text: processed.append(text) or "reply")
+    monkeypatch.setattr(chat_routes, "send_whatsapp_message", lambda to, body: sent.append(body) or "SMout")
+
+    async def run():
+        transport = httpx.ASGITransport(app=chat_routes.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            tasks = []
+            for text in ("hi", "room in tampines", "under 1500"):
+                tasks.append(asyncio.create_task(client.post("/webhook/", data={"Body": text, "From": "whatsapp:+65"})))
+                await asyncio.sleep(0.02)
+            return [response.json() for response in await asyncio.gather(*tasks)]
+
+    replies = asyncio.run(run())
+    assert processed == ["hi\nroom in tampines\nunder 1500"] and sent == ["reply"]
+    assert sum(reply["message_sid"] == "SMout" for reply in replies) == 1
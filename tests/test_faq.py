@@ -0,0 +1,55 @@
+from app.core.faq import ANSWERED, ASSISTED, MISSED, FAQEntry, FAQRetriever, analyze, load_faq_entries
+
+
+def test_analyze_drops_stopwords_and_stems():
+    assert analyze("How much are the deposits?") == ["deposit"]
+    assert analyze("Viewing rooms") == ["view", "room"]
+
+
+def test_shipped_faq_answers_common_questions():
+    retriever = FAQRetriever(load_faq_entries(), direct_answers=True)
+    result = retriever.lookup("how much deposit do I need to pay?")
+    assert result.kind == ANSWERED and result.entry.id == "deposit"
+    assert result.answer == result.entry.answer
+    assert retriever.lookup("are cats allowed").entry.id == "pets"
+    assert retriever.lookup("who pays stamp duty").entry.id == "stamp_duty"
+
+
+def test_partial_match_is_passed_to_llm_as_context():
+    retriever = FAQRetriever(load_faq_entries(), direct_answers=True)
+    result = retriever.lookup("what's the minimum lease")
+    assert result.kind == ASSISTED and result.answer is None
+    assert "lease_length" in [entry.id for entry in result.passages]
+    # A weak match is context for the LLM, never a reply on its own
+    gym = retriever.lookup("what time does the gym close")
+    assert gym.kind == ASSISTED and gym.fallback_answer is None
+
+
+def test_curated_answers_need_sign_off_and_skip_listing_questions():
+    # Unreviewed policy text is not handed to the LLM either
+    unsigned = FAQRetriever(load_faq_entries())
+    result = unsigned.lookup("how much deposit do I need to pay?")
+    assert result.kind == MISSED and not result.passages and result.fallback_answer is None
+
+    retriever = FAQRetriever(load_faq_entries(), direct_answers=True)
+    listing = retriever.lookup("is the aircon in that room serviced")
+    assert listing.kind == ASSISTED and listing.fallback_answer is None
+
+
+def test_unrelated_messages_miss():
+    retriever = FAQRetriever(load_faq_entries(), direct_answers=True)
+    for message in ("hello there", "tell me a joke", "what's the weather like today"):
+        result = retriever.lookup(message)
+        assert result.kind == MISSED and result.entry is None
+
+
+def test_stats_count_outcomes():
+    retriever = FAQRetriever([
+        FAQEntry("pets", "Are pets allowed?", "Ask the owner.", tags=["pets"]),
+        FAQEntry("wifi", "Is there wifi?", "Usually yes.", tags=["internet"]),
+    ], direct_answers=True)
+    retriever.lookup("pets allowed")
+    retriever.lookup("good morning")
+    stats = retriever.stats()
+    assert stats["lookups"] == 2 and stats[ANSWERED] == 1 and stats[MISSED] == 1
+    assert stats["hit_rate"] == 0.5
@@ -0,0 +1,79 @@
+import threading
+
+from app.core.gazetteer import LocationGazetteer, NGramIndex, levenshtein, location_sql_condition
+
+VOCABULARY = {
+    "zone": ["East", "Central"],
+    "city": ["Singapore"],
+    "buildingname": ["The Tampines Trilliant"],
+    "nearestmrt": ["Tampines MRT", "Bishan MRT Station", "Raffles Place MRT"],
+    "add1": ["12 Tampines Street 81", "200 Bishan Road #05-01"],
+}
+
+
+def test_levenshtein():
+    assert levenshtein("tampines", "tampines") == 0
+    assert levenshtein("tampnies", "tampines") == 2
+    assert levenshtein("bishan", "bishn") == 1
+    assert levenshtein("abc", "abcdef", max_distance=1) == 2
+
+
+def test_ngram_index_search():
+    index = NGramIndex()
+    for word in ["bishan", "bedok", "tampines", "bugis", "tampines east"]:
+        index.add(word)
+    assert index.search("bishn", 1) == [(1, "bishan")]
+    assert index.search("tampnies", 2) == [(2, "tampines")]
+    assert index.search("zzz", 1) == []
+
+
+def test_resolve_ignores_stopwords_and_prefers_longest_phrase():
+    gazetteer = LocationGazetteer(VOCABULARY)
+    matches = gazetteer.resolve("looking for a room near the Tampines MRT")
+    kinds = {(m.kind, m.value) for m in matches}
+    assert ("nearestmrt", "Tampines MRT") in kinds
+    assert all(m.matched_text == "tampines mrt" for m in matches)
+
+
+def test_resolve_typo_and_suffix_alias():
+    gazetteer = LocationGazetteer(VOCABULARY)
+    matches = gazetteer.resolve("something in bishn")
+    assert {(m.kind, m.value) for m in matches} == {("add1", "bishan"), ("nearestmrt", "Bishan MRT Station")}
+    assert all(m.distance == 1 for m in matches)
+
+
+def test_resolve_unknown_location():
+    gazetteer = LocationGazetteer(VOCABULARY)
+    assert gazetteer.resolve("near the park") == []
+
+
+def test_lookup_while_values_are_added():
+    gazetteer = LocationGazetteer(VOCABULARY)
+    errors = []
+
+    def feed():
+        for batch in range(200):
+            gazetteer.add_values({"buildingname": [f"Tampines Court {batch}", f"Bishan Loft {batch}"]})
+
+    def read():
+        try:
+            for _ in range(200):
+                gazetteer.resolve("a room near tampnies court")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=feed)] + [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert gazetteer.lookup("Bishan Loft 199") == (0, [("buildingname", "Bishan Loft 199")])
+
+
+def test_location_sql_condition_uses_in_predicates():
+    gazetteer = LocationGazetteer(VOCABULARY)
+    condition, params = location_sql_condition(gazetteer.resolve("east or central"))
+    assert condition == "(p.zone IN (%s, %s))"
+    assert params == ["East", "Central"]
+    assert location_sql_condition([]) == (None, [])
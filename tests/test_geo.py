@@ -0,0 +1,115 @@
+import random
+import threading
+
+from app.core import geo
+from app.core.geo import GeoIndex, GridIndex, haversine_m, load_transit_stops, parse_radius_m
+
+
+def test_haversine_known_distance():
+    # Bishan MRT to Raffles Place MRT is roughly 7.4 km
+    assert 7000 < haversine_m(1.3508, 103.8485, 1.2840, 103.8515) < 7800
+
+
+def test_grid_index_matches_brute_force():
+    rng = random.Random(7)
+    grid = GridIndex(cell_size_m=300)
+    points = {i: (1.25 + rng.random() * 0.2, 103.65 + rng.random() * 0.35) for i in range(2000)}
+    for item_id, (lat, lon) in points.items():
+        grid.insert(item_id, lat, lon)
+
+    lat, lon = 1.3508, 103.8485
+    expected = sorted((haversine_m(lat, lon, *point), item_id) for item_id, point in points.items())
+
+    assert [i for _, i in grid.within(lat, lon, 1500)] == [i for d, i in expected if d <= 1500]
+    assert [i for _, i in grid.nearest(lat, lon, 10)] == [i for _, i in expected[:10]]
+
+
+def test_grid_index_remove():
+    grid = GridIndex()
+    grid.insert("a", 1.3, 103.8)
+    grid.remove("a")
+    assert len(grid) == 0
+    assert grid.nearest(1.3, 103.8, 1) == []
+
+
+def test_grid_index_queries_while_updated():
+    grid = GridIndex(cell_size_m=300)
+    errors = []
+    done = threading.Event()
+
+    def update():
+        rng = random.Random(1)
+        for step in range(20000):
+            grid.insert(step % 500, 1.35 + rng.random() * 0.01, 103.84 + rng.random() * 0.01)
+            grid.remove(rng.randrange(500))
+        done.set()
+
+    def query():
+        try:
+            while not done.is_set():
+                grid.within(1.355, 103.845, 800)
+                grid.nearest(1.355, 103.845, 5)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=update), threading.Thread(target=query)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_parse_radius():
+    assert parse_radius_m("within 10 minutes of Raffles Place") == 800
+    assert parse_radius_m("1.5 km from bishan") == 1500
+    assert parse_radius_m("500m of orchard") == 500
+    assert parse_radius_m("under 2000 near bishan") is None
+
+
+def test_parse_proximity_and_property_search():
+    geo_index = GeoIndex(load_transit_stops())
+    geo_index.add_property(1, 1.3510, 103.8490)   # next to Bishan MRT
+    geo_index.add_property(2, 1.3600, 103.8500)   # ~1 km north
+    geo_index.add_property(3, 1.2840, 103.8515)   # Raffles Place
+
+    query = geo_index.parse_proximity("room near Bishan MRT")
+    assert query.anchor.name == "Bishan MRT"
+    assert [i for _, i in geo_index.properties_within(query)] == [1]
+
+    query = geo_index.parse_proximity("within 15 minutes of bishan")
+    assert [i for _, i in geo_index.properties_within(query)] == [1, 2]
+
+    assert geo_index.parse_proximity("rooms in bishan") is None
+
+
+def test_empty_index_is_retried_and_skips_proximity(monkeypatch):
+    clock = [1000.0]
+    loads = []
+
+    def fake_load(geo_index):
+        loads.append(clock[0])
+        if len(loads) < 3:
+            return 0
+        geo_index.add_property(1, 1.3510, 103.8490)
+        return 1
+
+    monkeypatch.setattr(geo.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(geo, "load_property_coordinates", fake_load)
+    monkeypatch.setattr(geo, "_geo_index", None)
+    monkeypatch.setattr(geo, "_geo_retry_at", 0.0)
+    monkeypatch.setattr(geo, "_geo_backoff", 30.0)
+
+    # No properties yet: no proximity filter rather than an empty one
+    assert geo.find_nearby_properties("room near Bishan MRT") is None
+    clock[0] += 10
+    assert geo.find_nearby_properties("room near Bishan MRT") is None
+    assert loads == [1000.0]
+
+    clock[0] += 25
+    geo.get_geo_index()
+    clock[0] += 59
+    geo.get_geo_index()
+    clock[0] += 2
+    assert [i for _, i in geo.find_nearby_properties("room near Bishan MRT")] == [1]
+    assert loads == [1000.0, 1035.0, 1096.0]
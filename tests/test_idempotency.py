@@ -0,0 +1,103 @@
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from app.core.coalescer import MessageCoalescer
+from app.core.idempotency import DONE, PROCESSING, MessageDeduplicator, SQLSeenStore
+from app.routes import chat_routes
+
+
+def test_duplicates_get_cached_response():
+    dedup = MessageDeduplicator()
+    assert dedup.claim("SM1") is None
+    assert dedup.claim("SM1").state == PROCESSING
+
+    dedup.complete("SM1", {"message_sid": "out-1"})
+    seen = dedup.claim("SM1")
+    assert seen.state == DONE and seen.response == {"message_sid": "out-1"}
+    assert dedup.stats()["duplicates_suppressed"] == 2
+    assert dedup.stats()["duplicates_in_flight"] == 1
+
+
+def test_release_allows_retry():
+    dedup = MessageDeduplicator()
+    dedup.claim("SM1")
+    dedup.release("SM1")
+    assert dedup.claim("SM1") is None
+
+
+def test_ttl_and_size_bound():
+    now = [0.0]
+    dedup = MessageDeduplicator(ttl_seconds=10, max_entries=3, clock=lambda: now[0])
+    for key in ("a", "b", "c", "d"):
+        dedup.claim(key)
+    dedup.claim("e")
+    assert len(dedup) <= 3
+    assert dedup.claim("a") is None  # evicted by size
+
+    now[0] = 11
+    assert dedup.claim("e") is None  # expired
+    assert len(dedup) == 1
+
+
+def test_shared_store_deduplicates_across_workers(tmp_path):
+    path = str(tmp_path / "seen.db")
+    store = lambda: SQLSeenStore(connect=lambda: sqlite3.connect(path), placeholder="?")
+    worker_a = MessageDeduplicator(shared=store())
+    worker_b = MessageDeduplicator(shared=store())
+
+    assert worker_a.claim("SM9") is None
+    assert worker_b.claim("SM9").state == PROCESSING
+    worker_a.complete("SM9", {"message_sid": "out-9"})
+
+    worker_c = MessageDeduplicator(shared=store())
+    assert worker_c.claim("SM9").response == {"message_sid": "out-9"}
+
+
+def test_abandoned_claim_can_be_retaken(tmp_path):
+    now = [0.0]
+    dedup = MessageDeduplicator(ttl_seconds=1000, lease_seconds=30, clock=lambda: now[0])
+    assert dedup.claim("SM1") is None
+    now[0] = 20
+    assert dedup.claim("SM1").state == PROCESSING
+    now[0] = 31
+    assert dedup.claim("SM1") is None
+    assert dedup.stats()["leases_expired"] == 1
+    # Answered messages keep the full TTL
+    dedup.complete("SM1", {"message_sid": "out-1"})
+    now[0] = 500
+    assert dedup.claim("SM1").state == DONE
+
+    path = str(tmp_path / "seen.db")
+    clock = [1000.0]
+    store = lambda: SQLSeenStore(connect=lambda: sqlite3.connect(path), placeholder="?", lease_seconds=30, clock=lambda: clock[0])
+    crashed, retry_a, retry_b = store(), store(), store()
+    assert crashed.claim("SM2") is None
+    clock[0] += 31
+    assert retry_a.claim("SM2") is None
+    assert retry_b.claim("SM2").state == PROCESSING
+    retry_a.complete("SM2", {"message_sid": "out-2"})
+    clock[0] += 3600
+    assert retry_b.claim("SM2").state == DONE
+
+
+def test_shared_store_fails_open():
+    dedup = MessageDeduplicator(shared=SQLSeenStore(connect=lambda: None))
+    assert dedup.claim("SM1") is None
+
+
+def test_webhook_retry_is_not_reprocessed(monkeypatch):
+    processed, sent = [], []
+    monkeypatch.setattr(chat_routes, "message_deduplicator", MessageDeduplicator())
+    monkeypatch.setattr(chat_routes, "message_coalescer", MessageCoalescer(window=0, max_wait=0))
+    monkeypatch.setattr(chat_routes.chatbot, "process_message", lambda user, text: processed.append(text) or "reply")
+    monkeypatch.setattr(chat_routes, "send_whatsapp_message", lambda to, body: sent.append(body) or "SMout")
+
+    client = TestClient(chat_routes.app)
+    form = {"Body": "rooms in bedok", "From": "whatsapp:+6500000000", "MessageSid": "SMin"}
+    first = client.post("/webhook/", data=form).json()
+    retry = client.post("/webhook/", data=form).json()
+
+    assert first == retry == {"message": "Response sent successfully", "message_sid": "SMout"}
+    assert processed == ["rooms in bedok"] and sent == ["reply"]
+    assert chat_routes.message_deduplicator.duplicates_suppressed == 1
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.llm_gateway import LLMGateway, TokenBucket
+from app.core.llm_resilience import LLMUnavailable, deadline_scope
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _response(self, kwargs):
+        self.calls.append(kwargs)
+        content = f"echo: {kwargs['messages'][-1]['content']}"
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return self._response(kwargs)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self._response(kwargs)
+
+
+def fake_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_chat_returns_content_and_records_usage():
+    completions = FakeCompletions()
+    gateway = LLMGateway(client=fake_client(completions))
+    assert gateway.chat([{"role": "user", "content": "hi"}], model="gpt-4", max_tokens=50) == "echo: hi"
+    assert completions.calls[0]["max_tokens"] == 50
+
+    stats = gateway.stats.snapshot()["gpt-4"]
+    assert stats["calls"] == 1
+    assert stats["prompt_tokens"] == 10 and stats["completion_tokens"] == 5
+
+
+def test_async_chat():
+    gateway = LLMGateway(async_client=fake_client(FakeAsyncCompletions()))
+    reply = asyncio.run(gateway.achat([{"role": "user", "content": "hello"}], model="gpt-4"))
+    assert reply == "echo: hello"
+
+
+def test_concurrency_limit():
+    completions = FakeCompletions(delay=0.05)
+    gateway = LLMGateway(client=fake_client(completions), max_concurrency=2)
+    threads = [
+        threading.Thread(target=gateway.chat, args=([{"role": "user", "content": str(i)}],))
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert completions.max_active == 2
+
+
+def test_sync_and_async_calls_share_the_limit():
+    completions = FakeCompletions(delay=0.05)
+
+    class TrackedAsyncCompletions:
+        async def create(self, **kwargs):
+            with completions._lock:
+                completions.active += 1
+                completions.max_active = max(completions.max_active, completions.active)
+            await asyncio.sleep(0.05)
+            with completions._lock:
+                completions.active -= 1
+            return completions._response(kwargs)
+
+    gateway = LLMGateway(client=fake_client(completions), async_client=fake_client(TrackedAsyncCompletions()), max_concurrency=2)
+    gateway.hedging = False
+    threads = [threading.Thread(target=gateway.chat, args=([{"role": "user", "content": str(i)}],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+
+    async def run_async():
+        await asyncio.gather(*(gateway.achat([{"role": "user", "content": f"a{i}"}]) for i in range(4)))
+
+    asyncio.run(run_async())
+    for thread in threads:
+        thread.join()
+    assert completions.max_active == 2
+    assert len(completions.calls) == 8
+
+
+def test_token_bucket_reserve():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert 0.9 < bucket.reserve(1) <= 1.0
+    bucket.refund(5)
+    assert bucket.reserve(1) == 0
+
+
+def test_rate_limit_wait_is_bounded_by_the_deadline():
+    completions = FakeCompletions()
+    gateway = LLMGateway(client=fake_client(completions), requests_per_minute=2)
+    gateway.chat([{"role": "user", "content": "a"}])
+    gateway.chat([{"role": "user", "content": "b"}])
+
+    started = time.monotonic()
+    with deadline_scope(1.0), pytest.raises(LLMUnavailable):
+        # The next request slot is ~30s away
+        gateway.chat([{"role": "user", "content": "c"}])
+    assert time.monotonic() - started < 0.5
+    assert len(completions.calls) == 2
+    # The abandoned reservation was handed back
+    assert 25 < gateway.request_bucket.reserve(1) <= 30
+
+
+def test_hedge_left_waiting_does_not_send_after_the_caller_gave_up():
+    completions = FakeCompletions(delay=0.4)
+    gateway = LLMGateway(client=fake_client(completions), max_concurrency=1)
+    gateway.hedge_after = lambda model: 0.05
+
+    with deadline_scope(0.2), pytest.raises(LLMUnavailable):
+        gateway.chat([{"role": "user", "content": "a"}])
+    # The hedge was waiting for the only slot; once it frees up it must not send
+    time.sleep(1.0)
+    assert len(completions.calls) == 1
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core import intent_classifier
+from app.core.llm_gateway import LLMGateway
+from app.core.llm_resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    LLMUnavailable,
+    acall_with_hedge,
+    call_with_hedge,
+    deadline_scope,
+)
+from tests.test_llm_gateway import FakeCompletions, fake_client
+
+
+class FailingCompletions(FakeCompletions):
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        raise ConnectionError("upstream down")
+
+
+class SlowThenFastCompletions(FakeCompletions):
+    """First call hangs, later calls answer immediately."""
+
+    def create(self, **kwargs):
+        first = not self.calls
+        self.calls.append(kwargs)
+        if first:
+            time.sleep(1.0)
+        return self._response(kwargs)
+
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(min_calls=4, window=4, open_seconds=10, clock=lambda: now[0])
+    for _ in range(2):
+        breaker.record_success(0.1)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    now[0] = 11
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(min_calls=2, window=2, slow_call_seconds=1)
+    breaker.record_success(5)
+    breaker.record_success(5)
+    assert breaker.state == OPEN
+
+
+def test_hedge_wins_over_slow_primary():
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        started = time.monotonic()
+        assert call_with_hedge(executor, call, hedge_after=0.05, timeout=2) == "fast"
+        assert time.monotonic() - started < 0.5
+
+
+def test_hedge_timeout():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(TimeoutError):
+            call_with_hedge(executor, lambda: time.sleep(0.5), hedge_after=None, timeout=0.05)
+
+
+def test_async_hedge():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    assert asyncio.run(acall_with_hedge(call, hedge_after=0.05, timeout=2)) == "fast"
+
+
+def test_gateway_circuit_opens_on_failing_backend():
+    completions = FailingCompletions()
+    gateway = LLMGateway(client=fake_client(completions))
+    for _ in range(5):
+        with pytest.raises(LLMUnavailable):
+            gateway.chat([{"role": "user", "content": "hi"}], model="gpt-4")
+    calls_before = len(completions.calls)
+
+    with pytest.raises(LLMUnavailable, match="Circuit open"):
+        gateway.chat([{"role": "user", "content": "hi"}], model="gpt-4")
+    assert len(completions.calls) == calls_before
+
+
+def test_gateway_respects_message_deadline():
+    completions = SlowThenFastCompletions()
+    gateway = LLMGateway(client=fake_client(completions))
+    gateway.hedging = False
+    with deadline_scope(0.1):
+        started = time.monotonic()
+        with pytest.raises(LLMUnavailable):
+            gateway.chat([{"role": "user", "content": "hi"}], model="gpt-4")
+        assert time.monotonic() - started < 0.5
+        assert completions.calls[0]["timeout"] <= 0.1
+
+
+def test_gateway_hedges_after_p95():
+    completions = SlowThenFastCompletions()
+    gateway = LLMGateway(client=fake_client(completions))
+    for _ in range(20):
+        gateway.stats.record("gpt-4", 0.01)
+    started = time.monotonic()
+    assert gateway.chat([{"role": "user", "content": "hi"}], model="gpt-4") == "echo: hi"
+    assert time.monotonic() - started < 0.9
+
+
+def test_intent_falls_back_to_rules(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise LLMUnavailable("down")
+
+    monkeypatch.setattr(intent_classifier, "route", unavailable)
+    monkeypatch.setattr(intent_classifier, "resolve_locations", lambda text: [])
+    assert intent_classifier.classify_intent("rooms in tampines under 1500") == "DB Specific Query"
+    assert intent_classifier.classify_intent("How does the deposit work?") == "General Query"
+    assert intent_classifier.classify_intent("hello there") == "General Query"
@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.llm_gateway import LLMGateway
+from app.core.llm_resilience import LLMUnavailable
+from app.core.model_router import (
+    EXTRACTION,
+    INTENT,
+    GENERAL_RESPONSE,
+    ModelRouter,
+    TaskRoute,
+    default_routes,
+    validate_follow_up,
+    validate_intent,
+    validate_reply,
+    validate_requirements,
+)
+from tests.test_llm_gateway import fake_client
+
+
+class ScriptedCompletions:
+    """Answers per model from a script; a missing model raises."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.models = []
+
+    def create(self, **kwargs):
+        model = kwargs["model"]
+        self.models.append(model)
+        reply = self.replies[model]
+        if isinstance(reply, Exception):
+            raise reply
+        message = SimpleNamespace(content=reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def make_router(replies):
+    completions = ScriptedCompletions(replies)
+    gateway = LLMGateway(client=fake_client(completions))
+    gateway.hedging = False
+    routes = {task: TaskRoute(task, ["small", "large"], route.validate) for task, route in default_routes().items()}
+    return ModelRouter(gateway, routes), completions
+
+
+def prompt(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_cheap_model_answer_is_used_when_valid():
+    router, completions = make_router({"small": "General Query", "large": "DB Specific Query"})
+    assert router.run(INTENT, prompt("hi")) == "General Query"
+    assert completions.models == ["small"]
+
+    stats = router.stats.snapshot(router.routes)[INTENT]
+    assert stats["escalations"] == 0 and stats["served_by"] == {"small": 1}
+
+
+def test_invalid_output_escalates():
+    router, completions = make_router({"small": "Maybe a search?", "large": "DB Specific Query"})
+    assert router.run(INTENT, prompt("rooms")) == "DB Specific Query"
+    assert completions.models == ["small", "large"]
+    assert router.stats.snapshot(router.routes)[INTENT]["escalation_rate"] == 1.0
+
+
+def test_failed_call_escalates():
+    router, completions = make_router({"small": ConnectionError("down"), "large": '{"budget": 1500}'})
+    assert router.run(EXTRACTION, prompt("x"))["budget"] == 1500
+
+
+def test_low_confidence_escalates_and_keeps_fallback():
+    router, _ = make_router({"small": '{"budget": null}', "large": '{"budget": 2000}'})
+    accept = lambda info: info.get("budget") is not None
+    assert router.run(EXTRACTION, prompt("x"), accept=accept)["budget"] == 2000
+
+    router, _ = make_router({"small": '{"budget": null, "location": "Bedok"}', "large": ConnectionError("down")})
+    assert router.run(EXTRACTION, prompt("x"), accept=accept)["location"] == "Bedok"
+
+
+def test_no_valid_output_raises():
+    router, _ = make_router({"small": "  ", "large": "As an AI language model, I cannot help with that request."})
+    with pytest.raises(LLMUnavailable):
+        router.run(GENERAL_RESPONSE, prompt("x"))
+    assert router.stats.snapshot(router.routes)[GENERAL_RESPONSE]["failures"] == 1
+
+
+def test_validators():
+    assert validate_intent('"general query".') == "General Query"
+    with pytest.raises(ValueError):
+        validate_intent("Search")
+    assert validate_requirements('```json\n{"budget": "S$1,800", "furnished": true}\n```')["budget"] == 1800
+    with pytest.raises(ValueError):
+        validate_requirements('{"furnished": "maybe"}')
+    assert validate_follow_up('{"is_follow_up": false}') == {"is_follow_up": False}
+    with pytest.raises(ValueError):
+        validate_follow_up('{"is_follow_up": "yes"}')
+
+
+def test_short_and_apologetic_replies_are_valid():
+    assert validate_reply(" You're welcome! ") == "You're welcome!"
+    assert validate_reply("I'm sorry, that info isn't in the listing.") == "I'm sorry, that info isn't in the listing."
+    for bad in ("", "   ", "As an AI language model, I cannot view listings."):
+        with pytest.raises(ValueError):
+            validate_reply(bad)
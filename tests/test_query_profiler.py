@@ -0,0 +1,60 @@
+import sqlite3
+
+from app.core.query_profiler import QueryProfiler, normalize_query
+
+
+def test_normalize_folds_literals_and_in_lists():
+    a = normalize_query("SELECT * FROM rooms r WHERE r.rentmonth <= 1500.0 AND p.zone IN ('East', 'West') -- note")
+    b = normalize_query("select *  from rooms r\n WHERE r.rentmonth <= 900 AND p.zone IN (%s)")
+    assert a == b == "select * from rooms r where r.rentmonth <= ? and p.zone in (?)"
+    assert normalize_query("SELECT add1 FROM p LIMIT 5") == "select add1 from p limit ?"
+
+
+def test_top_shapes_and_percentiles():
+    profiler = QueryProfiler(threshold_ms=1000)
+    for ms in range(1, 101):
+        profiler.record(f"SELECT * FROM rooms WHERE rentmonth <= {ms}", None, ms / 1000, rows=2)
+    profiler.record("SELECT * FROM properties", None, 0.5)
+
+    top = profiler.top(5)
+    assert [report["shape"] for report in top] == ["select * from properties", "select * from rooms where rentmonth <= ?"]
+    rooms = top[1]
+    assert rooms["count"] == 100 and rooms["mean_rows"] == 2
+    assert rooms["p50_ms"] == 51 and rooms["p95_ms"] == 96 and rooms["max_ms"] == 100
+    assert profiler.stats()["slow_statements"] == 0
+
+
+def test_slow_statement_captures_plan_once(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    setup = sqlite3.connect(path)
+    setup.execute("CREATE TABLE rooms (roomid INTEGER PRIMARY KEY, rentmonth REAL)")
+    setup.commit()
+
+    connections = []
+
+    def connect():
+        connections.append(1)
+        return sqlite3.connect(path)
+
+    profiler = QueryProfiler(threshold_ms=10, connect=connect, explain_prefix="EXPLAIN QUERY PLAN ")
+    query = "SELECT * FROM rooms WHERE rentmonth <= ?"
+    profiler.record(query, (1000,), 0.05)
+    profiler.record(query, (2000,), 0.05)
+    profiler.record(query, (10,), 0.001)
+    profiler.flush()
+
+    report = profiler.top(1)[0]
+    assert report["slow_count"] == 2
+    assert "SCAN rooms" in str(report["explain"])
+    assert len(connections) == 1
+    assert profiler.stats()["explains_captured"] == 1
+
+
+def test_failed_explain_and_bounded_shapes():
+    profiler = QueryProfiler(threshold_ms=0, max_shapes=2, connect=lambda: None)
+    for table in ("a", "b", "c"):
+        profiler.record(f"SELECT * FROM {table}", None, 0.01)
+    profiler.flush()
+    assert {report["shape"] for report in profiler.top()} == {"select * from b", "select * from c"}
+    assert profiler.stats()["shapes"] == 2
+    assert profiler.stats()["explain_failures"] == 3
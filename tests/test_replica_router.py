@@ -0,0 +1,129 @@
+import sqlite3
+
+import pytest
+
+from app.core.replica_router import ROUND_ROBIN, ReplicaRouter, heartbeat_lag, read_session
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_db(path, name, heartbeat):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE source (name TEXT)")
+    connection.execute("INSERT INTO source VALUES (?)", (name,))
+    connection.execute("CREATE TABLE replica_heartbeat (ts REAL)")
+    connection.execute("INSERT INTO replica_heartbeat VALUES (?)", (heartbeat,))
+    connection.commit()
+    connection.close()
+    return lambda: sqlite3.connect(path)
+
+
+def set_heartbeat(connect, ts):
+    connection = connect()
+    connection.execute("UPDATE replica_heartbeat SET ts = ?", (ts,))
+    connection.commit()
+    connection.close()
+
+
+def served_by(connection):
+    try:
+        return connection.execute("SELECT name FROM source").fetchone()[0]
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def databases(tmp_path):
+    clock = Clock()
+    primary = make_db(str(tmp_path / "primary.sqlite"), "primary", clock.now)
+    replica = make_db(str(tmp_path / "replica.sqlite"), "replica", clock.now)
+    return clock, primary, replica
+
+
+def make_router(clock, primary, replicas, **kwargs):
+    return ReplicaRouter(primary, replicas, max_lag_seconds=5, check_interval=2,
+                         lag_probe=heartbeat_lag(clock=clock), clock=clock, **kwargs)
+
+
+def test_reads_go_to_healthy_replica(databases):
+    clock, primary, replica = databases
+    router = make_router(clock, primary, {"r1": replica})
+    assert served_by(router.read_connection()) == "primary"  # not checked yet
+    router.check()
+    assert served_by(router.read_connection()) == "replica"
+
+    connection = router.read_connection()
+    assert router.stats()["replicas"]["r1"]["in_flight"] == 1
+    connection.close()
+    connection.close()
+    assert router.stats()["replicas"]["r1"]["in_flight"] == 0
+
+
+def test_lagging_or_stale_replica_falls_back_to_primary(databases):
+    clock, primary, replica = databases
+    router = make_router(clock, primary, {"r1": replica})
+    clock.now += 10
+    router.check()
+    assert served_by(router.read_connection()) == "primary"
+    assert router.stats()["replicas"]["r1"]["lag_seconds"] == 10
+
+    set_heartbeat(replica, clock.now - 1)
+    router.check()
+    assert served_by(router.read_connection()) == "replica"
+
+    clock.now += 60  # health checker stopped running
+    assert served_by(router.read_connection()) == "primary"
+    assert router.stats()["fallbacks"]["no_replica"] == 2
+
+
+def test_session_reads_its_own_writes(databases):
+    clock, primary, replica = databases
+    router = make_router(clock, primary, {"r1": replica})
+    router.note_write("user-1")
+    clock.now += 1
+    set_heartbeat(replica, clock.now - 3)  # replica has not applied the write yet
+    router.check()
+
+    with read_session("user-1"):
+        assert served_by(router.read_connection()) == "primary"
+    assert served_by(router.read_connection()) == "replica"
+    assert router.stats()["fallbacks"]["sticky"] == 1
+
+    clock.now += 1
+    set_heartbeat(replica, clock.now)
+    router.check()
+    with read_session("user-1"):
+        assert served_by(router.read_connection()) == "replica"
+
+
+def test_unreachable_replica_is_skipped(databases):
+    clock, primary, replica = databases
+    state = {"up": True}
+
+    def flaky():
+        if not state["up"]:
+            raise sqlite3.OperationalError("connection refused")
+        return replica()
+
+    router = make_router(clock, primary, {"r1": flaky, "r2": replica}, strategy=ROUND_ROBIN)
+    router.check()
+    state["up"] = False
+    assert [served_by(router.read_connection()) for _ in range(4)] == ["replica"] * 4
+    stats = router.stats()
+    assert stats["replicas"]["r1"]["healthy"] is False and stats["fallbacks"]["connect_failed"] == 1
+    assert stats["replicas"]["r2"]["reads"] == 4
+
+
+def test_least_loaded_spreads_concurrent_reads(databases, tmp_path):
+    clock, primary, replica = databases
+    other = make_db(str(tmp_path / "other.sqlite"), "other", clock.now)
+    router = make_router(clock, primary, {"r1": replica, "r2": other})
+    router.check()
+    held = [router.read_connection() for _ in range(4)]
+    assert sorted(served_by(connection) for connection in held) == ["other", "other", "replica", "replica"]
@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.gazetteer import LocationGazetteer
+from app.core.geo import GeoIndex, load_transit_stops
+from app.core.requirement_extractor import extract_requirements, fields_needing_llm
+
+GAZETTEER = LocationGazetteer({
+    "zone": ["East", "Central"],
+    "nearestmrt": ["Tampines MRT", "Bishan MRT", "Raffles Place MRT"],
+    "add1": ["12 Tampines Street 81"],
+})
+GEO_INDEX = GeoIndex(load_transit_stops())
+
+
+def extract(text):
+    return extract_requirements(text, GAZETTEER, GEO_INDEX)
+
+
+@pytest.mark.parametrize("text,budget", [
+    ("budget S$1.2k", 1200),
+    ("under 2000", 2000),
+    ("around $1,500 per month", 1500),
+    ("1.5k max", 1500),
+    ("between 1200 and 1500", 1500),
+    ("2 bedroom near EW2", None),
+    ("within 10 mins of bishan", None),
+])
+def test_budget(text, budget):
+    fields, _, _ = extract(text)
+    assert fields["budget"] == budget
+
+
+def test_full_message():
+    fields, confidence, unexplained = extract("Looking for a fully furnished 2 bedroom condo in tampins under S$3k")
+    assert fields == {
+        "budget": 3000,
+        "location": "tampins",
+        "property_type": "condo",
+        "bedrooms": 2,
+        "furnished": True,
+    }
+    assert confidence["location"] < confidence["budget"]
+    assert not unexplained
+    assert fields_needing_llm(fields, confidence, unexplained) == []
+
+
+def test_proximity_location():
+    fields, _, _ = extract("master room within 10 minutes of raffles place")
+    assert fields["location"] == "within 800m of Raffles Place MRT"
+    assert fields["property_type"] == "master"
+
+
+def test_unknown_words_fall_back_for_missing_fields():
+    fields, confidence, unexplained = extract("somewhere by the marina waterfront pls, max 1800")
+    assert fields["location"] is None
+    assert unexplained
+    needed = fields_needing_llm(fields, confidence, unexplained)
+    assert "location" in needed and "budget" not in needed
@@ -0,0 +1,183 @@
+import sqlite3
+from types import SimpleNamespace
+
+from app.core import query_generator, room_search
+from app.core.gazetteer import LocationMatch, location_sql_condition
+from app.core.room_search import LEGACY_COLUMNS, ROOM_SEARCH_COLUMNS
+
+
+def make_db(tmp_path):
+    path = str(tmp_path / "listings.db")
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE properties (propertyid INTEGER PRIMARY KEY, zone TEXT, city TEXT, buildingname TEXT, add1 TEXT);
+        CREATE TABLE rooms (
+            roomid INTEGER PRIMARY KEY, propertyid INTEGER, rentmonth REAL, status TEXT,
+            roomtype TEXT, propertytype TEXT, nearestmrt TEXT,
+            airconditioned TEXT, wifi TEXT, tv TEXT, fridge TEXT, washer TEXT, gym TEXT, swimming TEXT
+        );
+        INSERT INTO properties VALUES (1, ' East ', 'Bedok', 'Parc Esta', '1 Bedok Rd'), (2, 'West', 'Jurong', 'Lakeside', '2 Jurong St');
+        INSERT INTO rooms VALUES
+            (10, 1, 1200, 'a', 'Common', 'Condo', 'Bedok', 'Y', 'Y', 'N', 'N', 'N', 'N', 'N'),
+            (11, 1, 0, 'a', 'Master', 'Condo', 'Bedok', 'N', 'N', 'N', 'N', 'N', 'N', 'N'),
+            (12, 2, 900, 'inactive', 'Common', 'HDB', 'Lakeside', 'N', 'Y', 'N', 'N', 'N', 'N', 'N'),
+            (13, 2, 950, 'a', 'Studio', 'HDB', 'Lakeside', 'N', 'N', 'N', 'N', 'N', 'Y', 'N');
+    """)
+    connection.commit()
+    return connection
+
+
+def rows(connection):
+    return connection.execute(
+        "SELECT roomid, is_active, rentmonth, zone_lc, airconditioned, gym FROM room_search ORDER BY roomid"
+    ).fetchall()
+
+
+def test_migrate_and_backfill_in_batches(tmp_path):
+    connection = make_db(tmp_path)
+    assert not room_search.table_exists(connection)
+    assert room_search.create_table(connection)
+    assert not room_search.create_table(connection)
+
+    batches = []
+    assert room_search.backfill(connection, batch_size=3, placeholder="?", progress=batches.append) == 4
+    assert batches == [3, 4]
+    assert rows(connection) == [
+        (10, 1, 1200, "east", 1, 0),
+        (11, 0, 0, "east", 0, 0),
+        (12, 0, 900, "west", 0, 0),
+        (13, 1, 950, "west", 0, 1),
+    ]
+    # Re-running is idempotent
+    room_search.backfill(connection, batch_size=3, placeholder="?")
+    assert len(rows(connection)) == 4
+
+
+def test_refresh_rows_follows_changes(tmp_path):
+    connection = make_db(tmp_path)
+    room_search.create_table(connection)
+    room_search.backfill(connection, placeholder="?")
+
+    connection.execute("UPDATE rooms SET status = 'a' WHERE roomid = 12")
+    connection.execute("UPDATE properties SET zone = 'North' WHERE propertyid = 1")
+    connection.execute("DELETE FROM rooms WHERE roomid = 13")
+    room_search.refresh_rows(connection, room_keys=[12], property_ids=[1], deleted_room_keys=[13], placeholder="?")
+
+    assert rows(connection) == [
+        (10, 1, 1200, "north", 1, 0),
+        (11, 0, 0, "north", 0, 0),
+        (12, 1, 900, "west", 0, 0),
+    ]
+
+
+def test_refresh_from_change_feed_events(tmp_path, monkeypatch):
+    connection = make_db(tmp_path)
+    room_search.create_table(connection)
+    room_search.backfill(connection, placeholder="?")
+    monkeypatch.setattr(room_search, "_available", True)
+
+    connection.execute("UPDATE rooms SET rentmonth = 700 WHERE roomid = 10")
+    connection.commit()
+    events = [
+        SimpleNamespace(table="rooms", kind="update", key=10),
+        SimpleNamespace(table="rooms", kind="delete", key=11),
+    ]
+    path = str(tmp_path / "listings.db")
+    room_search.refresh_from_events(events, connect=lambda: sqlite3.connect(path), placeholder="?")
+
+    assert [row[:3] for row in rows(connection)] == [(10, 1, 700), (12, 0, 900), (13, 1, 950)]
+
+
+def test_lowercase_location_condition():
+    matches = [LocationMatch("zone", " East", "east"), LocationMatch("nearestmrt", "Bedok", "bedok")]
+    condition, params = location_sql_condition(matches, ROOM_SEARCH_COLUMNS.location_columns, lowercase=True)
+    assert "s.zone_lc" in condition and "s.nearestmrt_lc" in condition
+    assert params == ["east", "bedok"]
+
+    condition, params = location_sql_condition(matches)
+    assert "p.zone" in condition and params == [" East", "Bedok"]
+
+
+def test_generated_query_targets_room_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_generator, "find_nearby_properties", lambda text: None)
+    monkeypatch.setattr(query_generator, "resolve_locations", lambda text: [LocationMatch("zone", "East", "east")])
+    requirements = {"budget": 1500, "location": "east", "property_type": "condo"}
+
+    sql = query_generator.generate_sql_query("condo in the east", requirements, ROOM_SEARCH_COLUMNS)
+    assert "FROM room_search s" in sql
+    assert "s.is_active = 1" in sql
+    assert "s.zone_lc IN ('east')" in sql
+    assert "s.rentmonth <= 1500.0" in sql
+    assert "LOWER(" not in sql and "NOT IN" not in sql
+
+    legacy = query_generator.generate_sql_query("condo in the east", requirements, LEGACY_COLUMNS)
+    assert "FROM rooms r" in legacy and "room_search" not in legacy
+
+    # Both shapes run and agree on the test data
+    connection = make_db(tmp_path)
+    connection.execute("UPDATE properties SET zone = 'East' WHERE propertyid = 1")
+    room_search.create_table(connection)
+    room_search.backfill(connection, placeholder="?")
+    for query in (sql, legacy):
+        assert [row[0] for row in connection.execute(query)] == [10]
+
+
+def test_amenity_flags_accept_stored_encodings(tmp_path):
+    connection = make_db(tmp_path)
+    stored = ["Y", "y", " Y ", "yes", "1", "N", "n", "0", "", None]
+    connection.executemany(
+        "INSERT INTO rooms (roomid, propertyid, rentmonth, status, wifi) VALUES (?, 1, 1000, 'a', ?)",
+        [(100 + index, value) for index, value in enumerate(stored)],
+    )
+    room_search.create_table(connection)
+    room_search.backfill(connection, placeholder="?")
+
+    flags = [row[0] for row in connection.execute("SELECT wifi FROM room_search WHERE roomid >= 100 ORDER BY roomid")]
+    assert flags == [1, 1, 1, 1, 1, 0, 0, 0, 0, 0]
+    assert [room_search.amenity_flag(value) for value in stored] == [bool(flag) for flag in flags]
+    assert room_search.amenity_flag(1) and not room_search.amenity_flag(0)
+
+
+def test_missing_table_is_checked_again(tmp_path, monkeypatch):
+    connection = make_db(tmp_path)
+    path = str(tmp_path / "listings.db")
+    clock = [0.0]
+    monkeypatch.setattr(room_search, "_available", None)
+    monkeypatch.setattr(room_search.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(room_search, "get_db_connection", lambda: sqlite3.connect(path))
+
+    assert not room_search.use_room_search()
+    room_search.create_table(connection)
+    clock[0] += 10
+    assert not room_search.use_room_search()
+    clock[0] += room_search.ROOM_SEARCH_RECHECK_SECONDS
+    assert room_search.use_room_search()
+
+
+def test_migration_while_running_refreshes_validator_schema(tmp_path, monkeypatch):
+    from app.core import sql_validator
+
+    connection = make_db(tmp_path)
+    path = str(tmp_path / "listings.db")
+
+    def sqlite_schema():
+        db = sqlite3.connect(path)
+        tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        schema = {table: [row[1] for row in db.execute(f"PRAGMA table_info({table})")] for table in tables}
+        db.close()
+        return schema
+
+    validator = sql_validator.SQLValidator(schema_loader=sqlite_schema)
+    clock = [0.0]
+    monkeypatch.setattr(sql_validator, "_validator", validator)
+    monkeypatch.setattr(room_search, "_available", None)
+    monkeypatch.setattr(room_search.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(room_search, "get_db_connection", lambda: sqlite3.connect(path))
+    query = "SELECT s.roomid FROM room_search s WHERE s.is_active = 1 LIMIT 5"
+
+    assert not room_search.use_room_search()
+    assert not validator.validate(query).ok
+    room_search.create_table(connection)
+    clock[0] += room_search.ROOM_SEARCH_RECHECK_SECONDS
+    assert room_search.use_room_search()
+    assert validator.validate(query).ok
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import sampling_profiler
+from app.core.sampling_profiler import (
+    SamplingProfiler,
+    finish_process_profile,
+    profile_scope,
+    request_profiles,
+    request_profiling,
+    start_process_profile,
+)
+from app.routes import admin_routes, chat_routes
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_scope_is_off_unless_requested_or_sampled():
+    before = len(request_profiles.summaries())
+    with profile_scope("process_message", sample_rate=0) as profiler:
+        assert profiler is None
+    assert len(request_profiles.summaries()) == before
+
+
+def test_requested_scope_profiles_only_its_thread():
+    other = threading.Thread(target=busy_loop, args=(0.2,), name="other-work")
+    other.start()
+    with request_profiling():
+        with profile_scope("process_message", sample_rate=0) as profiler:
+            busy_loop(0.15)
+    other.join()
+
+    profile = request_profiles.get(profiler.profile.id)
+    assert profile.reason == "requested" and profile.samples > 0
+    stacks = profile.collapsed().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert any("busy_loop (tests/test_sampling_profiler.py" in line for line in stacks)
+    assert not any("other-work" in line for line in stacks)
+
+
+def test_process_profile_is_exclusive_and_named_by_thread():
+    worker = threading.Thread(target=busy_loop, args=(0.2,), name="busy-worker")
+    profiler = start_process_profile(interval=0.005)
+    assert start_process_profile() is None
+    worker.start()
+    worker.join()
+    profile = finish_process_profile(profiler)
+
+    assert any(line.startswith("busy-worker;") for line in profile.collapsed().splitlines())
+    assert profile.top_frames(1)
+    finish_process_profile(start_process_profile())  # the lock was released
+
+
+def test_idle_threads_are_left_out():
+    event = threading.Event()
+    idle = threading.Thread(target=event.wait, name="parked")
+    idle.start()
+    profiler = SamplingProfiler()
+    profiler.sample()
+    event.set()
+    idle.join()
+    assert not any(stack[0] == "parked" for stack in profiler.profile.stacks)
+
+
+def test_admin_profile_endpoints(monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+    client = TestClient(chat_routes.app)
+    headers = {"X-Admin-Token": "secret"}
+    assert client.post("/admin/profile?seconds=0.1").status_code == 403
+    assert client.post("/admin/profile?seconds=600", headers=headers).status_code == 400
+
+    response = client.post("/admin/profile?seconds=0.1&interval_ms=5", headers=headers)
+    assert response.status_code == 200 and int(response.headers["X-Profile-Samples"]) > 0
+
+    with request_profiling():
+        with profile_scope("process_message", sample_rate=0):
+            busy_loop(0.05)
+    latest = client.get("/admin/profiles", headers=headers).json()["profiles"][0]
+    assert latest["label"] == "process_message"
+    assert "busy_loop" in client.get(f"/admin/profiles/{latest['id']}", headers=headers).text
+    assert client.get("/admin/profiles/0", headers=headers).status_code == 404
+
+
+def test_sampled_scope_uses_rate(monkeypatch):
+    monkeypatch.setattr(sampling_profiler.random, "random", lambda: 0.05)
+    with profile_scope("process_message", sample_rate=0.1) as profiler:
+        pass
+    assert profiler.profile.reason == "sampled"
@@ -0,0 +1,147 @@
+import random
+import time
+
+import pytest
+
+from app.core import query_generator
+from app.core.bulk_search import ACTIVE_LISTINGS_QUERY
+from app.core.room_search import AMENITY_COLUMNS, LEGACY_COLUMNS, ROOM_SEARCH_COLUMNS
+from app.core.sql_validator import SQLValidator, statement_shape, tokenize
+
+SCHEMA = {
+    "rooms": ["roomid", "propertyid", "rentmonth", "status", "roomtype", "propertytype", "nearestmrt",
+              "nearestbusstop", "updated_at", *AMENITY_COLUMNS],
+    "properties": ["propertyid", "propertyname", "add1", "add2", "city", "state", "zone", "district",
+                   "buildingname", "updated_at"],
+    "room_search": ["roomid", "propertyid", "is_active", "rentmonth", "roomtype_lc", "propertytype_lc", "zone_lc",
+                    "city_lc", "buildingname_lc", "nearestmrt_lc", "add1_lc", *AMENITY_COLUMNS],
+    "users": ["id", "password"],
+}
+
+
+@pytest.fixture
+def validator():
+    return SQLValidator(schema_loader=lambda: SCHEMA)
+
+
+def generated_queries(monkeypatch):
+    monkeypatch.setattr(query_generator, "find_nearby_properties", lambda text: None)
+    monkeypatch.setattr(query_generator, "resolve_locations", lambda text: [])
+    requirements = {"budget": 1500, "location": "near the east coast", "property_type": "condo"}
+    return [
+        query_generator.generate_sql_query("condo", requirements, columns)
+        for columns in (LEGACY_COLUMNS, ROOM_SEARCH_COLUMNS)
+    ] + [ACTIVE_LISTINGS_QUERY]
+
+
+VALID = [
+    "SELECT * FROM rooms WHERE updated_at > '2024-01-01' ORDER BY updated_at DESC LIMIT 5",
+    "select r.rentmonth price, p.zone AS area from rooms r join properties p on r.propertyid = p.propertyid",
+    "SELECT COUNT(*) total FROM rooms WHERE status NOT IN ('i', 'I') GROUP BY roomtype HAVING total > 2",
+    "SELECT p.* FROM properties p WHERE p.add1 LIKE '%; DROP TABLE rooms; --%'",
+    "SELECT TRIM(LEADING ' ' FROM p.zone) FROM properties p",
+    "SELECT * FROM rooms WHERE propertyid IN (SELECT propertyid FROM properties WHERE zone = %s);",
+    "SELECT x.rentmonth FROM (SELECT rentmonth FROM rooms) x",
+    "SELECT `roomid` FROM `rooms` -- trailing comment",
+]
+
+INVALID = {
+    "DELETE FROM rooms": "only SELECT",
+    "SELECT * FROM rooms; DROP TABLE rooms": "multiple statements",
+    "SELECT roomid FROM rooms; SELECT roomid FROM rooms": "multiple statements",
+    "SELECT * FROM users": "not readable",
+    "SELECT * FROM information_schema.tables": "schema-qualified",
+    "SELECT password FROM rooms": "unknown column password",
+    "SELECT r.password FROM rooms r": "unknown column r.password",
+    "SELECT q.rentmonth FROM rooms r": "unknown table or alias q",
+    "SELECT * FROM rooms INTO OUTFILE '/tmp/x'": "forbidden keyword INTO",
+    "SELECT * FROM rooms FOR UPDATE": "forbidden keyword UPDATE",
+    "SELECT SLEEP(10) FROM rooms": "forbidden function SLEEP",
+    "SELECT * FROM rooms /*!50000 UNION SELECT password FROM users */": "executable comment",
+    "SELECT * FROM rooms WHERE status = 'a": "unexpected character",
+    "SELECT * FROM rooms WHERE (status = 'a'": "unbalanced",
+    "SELECT @@version FROM rooms": "unexpected character",
+    "SELECT * FROM rooms UNION SELECT id FROM users": "not readable",
+    "": "empty",
+}
+
+
+def test_generated_queries_are_accepted(validator, monkeypatch):
+    for query in generated_queries(monkeypatch) + VALID:
+        verdict = validator.validate(query)
+        assert verdict.ok, (query, verdict.reason)
+
+
+@pytest.mark.parametrize("query,reason", INVALID.items())
+def test_rejections(validator, query, reason):
+    verdict = validator.validate(query)
+    assert not verdict.ok
+    assert reason in verdict.reason
+
+
+def test_verdicts_are_cached_by_shape(validator):
+    assert validator.validate("SELECT * FROM rooms WHERE rentmonth <= 1000 AND zone_lc IN ('a')").ok is False
+    assert validator.validate("SELECT * FROM rooms WHERE rentmonth <= 1000").ok
+    assert validator.validate("SELECT * FROM rooms WHERE rentmonth <= 2500.5").ok
+    assert validator.validate("SELECT * FROM rooms WHERE rentmonth <= 1000").ok
+    stats = validator.stats()
+    assert stats["shape_hits"] == 1 and stats["exact_hits"] == 1 and stats["cached_shapes"] == 2
+
+    a = statement_shape(tokenize("SELECT * FROM rooms WHERE roomid IN (1, 2, 3) AND status = 'x'"))
+    b = statement_shape(tokenize("select * from rooms where roomid in (%s) and status = %s"))
+    assert a == b
+
+
+def test_without_schema_only_tables_are_checked():
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return None if len(loads) == 1 else SCHEMA
+
+    validator = SQLValidator(schema_loader=loader, schema_retry_seconds=0)
+    assert validator.validate("SELECT password FROM rooms").ok
+    assert not validator.validate("SELECT * FROM users").ok
+    # The schema loads on the next call and the lenient verdict is dropped
+    assert not validator.validate("SELECT password FROM rooms").ok
+
+
+def test_fuzzed_statements_never_raise_and_injections_are_rejected(validator, monkeypatch):
+    rng = random.Random(1234)
+    bases = generated_queries(monkeypatch) + VALID
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789 ;'\"`()*,.=<>-#/!%@\\\n"
+    payloads = ["; DROP TABLE rooms", "; DELETE FROM rooms", " INTO OUTFILE '/tmp/x'", " UNION SELECT password FROM users",
+                " AND SLEEP(5)", "/*! ; DROP TABLE rooms */", "; SET GLOBAL x = 1"]
+    for _ in range(3000):
+        base = rng.choice(bases)
+        mode = rng.random()
+        if mode < 0.4:
+            position = rng.randrange(len(base) + 1)
+            query = base[:position] + "".join(rng.choice(alphabet) for _ in range(rng.randrange(1, 8))) + base[position:]
+            validator.validate(query)  # must not raise
+        elif mode < 0.8 and "--" not in base:  # a payload after a line comment is inert
+            query = base.rstrip().rstrip(";") + rng.choice(payloads)
+            assert not validator.validate(query).ok, query
+        else:
+            query = "".join(rng.choice(alphabet) for _ in range(rng.randrange(0, 80)))
+            validator.validate(query)
+
+
+def test_cached_validation_is_fast(validator, monkeypatch):
+    queries = generated_queries(monkeypatch)
+    uncached = SQLValidator(schema_loader=lambda: SCHEMA, exact_cache_size=0, shape_cache_size=0)
+
+    started = time.perf_counter()
+    for _ in range(200):
+        for query in queries:
+            uncached.validate(query)
+    full = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(200):
+        for query in queries:
+            validator.validate(query)
+    cached = time.perf_counter() - started
+
+    assert cached * 5 < full
+    assert validator.stats()["exact_hits"] == 200 * len(queries) - len(queries)
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+from app.core import startup
+from app.utils.prompts import LazyPromptTemplate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_CHECK = """
+import sys
+import app.routes.chat_routes
+print(",".join(name for name in ("langchain", "openai", "twilio") if name in sys.modules) or "-")
+"""
+
+
+def test_app_import_is_lazy_and_offline():
+    env = dict(os.environ, DATABASE_URL="mysql://u:p@127.0.0.1:1/db", PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-c", IMPORT_CHECK], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert "Database connection failed" not in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == "-"
+
+
+def test_lazy_prompt_template_formats_like_langchain():
+    prompt = LazyPromptTemplate(input_variables=["name"], template="Hello {name}")
+    assert prompt._prompt is None
+    assert prompt.format(name="Ann") == "Hello Ann"
+    assert prompt.format_prompt(name="Bo").to_string() == "Hello Bo"
+
+
+def test_warm_up_reports_failures_without_raising(monkeypatch):
+    def broken():
+        raise ConnectionError("mysql down")
+
+    monkeypatch.setattr(startup, "STARTUP_TASKS", [("db_pool", lambda: None), ("schema", broken), ("other", lambda: None)])
+    results = startup.warm_up_resources(parallel=True)
+    assert results["schema"] == "error: mysql down"
+    assert isinstance(results["db_pool"], float) and isinstance(results["other"], float)
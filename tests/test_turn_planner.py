@@ -0,0 +1,73 @@
+from app.core import llm_processor
+from app.core.llm_resilience import Deadline, deadline_scope
+from app.core.model_router import FOLLOW_UP_CLASSIFIER, FOLLOW_UP_RESPONSE, GENERAL_RESPONSE, INTENT
+from app.core.turn_planner import SIMILARITY, StageEstimator, TurnPlanner, current_plan, get_turn_planner, plan_scope
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_estimates_learn_from_recent_timings_and_expire():
+    clock = Clock()
+    estimator = StageEstimator({INTENT: 1.0}, ttl_seconds=60, clock=clock)
+    assert estimator.estimate(INTENT) == 1.0
+    for seconds in (0.2, 0.3, 0.3, 0.4, 3.0):
+        estimator.record(INTENT, seconds)
+    assert estimator.estimate(INTENT) == 3.0  # pessimistic: p90 of recent timings
+    for _ in range(20):
+        estimator.record(INTENT, 0.3)
+    assert estimator.estimate(INTENT) == 0.3
+    clock.now += 61
+    assert estimator.estimate(INTENT) == 1.0
+
+
+def test_plan_degrades_as_budget_drains():
+    planner = TurnPlanner(StageEstimator({INTENT: 1.0, SIMILARITY: 0.1}), reserve_seconds=0.2)
+    plan = planner.begin(Deadline(1.0))
+    assert not plan.allow(INTENT)
+    assert plan.allow(SIMILARITY)
+    plan.finish()
+
+    stats = planner.stats()
+    assert stats["turns"] == 1 and stats["degraded_turns"] == 1
+    assert stats["degradations"] == {INTENT: 1}
+    assert stats["recent_degraded_turns"][0]["degradations"] == [INTENT]
+
+
+def test_everything_allowed_without_deadline():
+    assert current_plan().allow(GENERAL_RESPONSE)
+    with plan_scope(TurnPlanner()) as plan:
+        assert plan.allow(GENERAL_RESPONSE) and not plan.degradations
+
+
+def test_short_budget_uses_rules_and_fallback_reply(monkeypatch):
+    def no_llm(*args, **kwargs):
+        raise AssertionError("LLM called with no budget left")
+
+    monkeypatch.setattr(llm_processor, "route", no_llm)
+    monkeypatch.setattr(llm_processor, "classify_intent", no_llm)
+    monkeypatch.setattr(llm_processor, "MESSAGE_LATENCY_BUDGET_SECONDS", 0.5)
+    before = dict(get_turn_planner().stats()["degradations"])
+
+    reply = llm_processor.PropertyChatbot().process_message("user-1", "hello there")
+
+    assert reply == llm_processor.GENERAL_FALLBACK_REPLY
+    after = get_turn_planner().stats()["degradations"]
+    for stage in (INTENT, GENERAL_RESPONSE):
+        assert after.get(stage, 0) == before.get(stage, 0) + 1
+
+
+def test_follow_up_answer_is_templated_when_short_of_time(monkeypatch):
+    monkeypatch.setattr(llm_processor, "route", lambda task, *args, **kwargs: {"is_follow_up": True, "aspect": "price"})
+    chatbot = llm_processor.PropertyChatbot()
+    planner = TurnPlanner(StageEstimator({FOLLOW_UP_CLASSIFIER: 0.1, FOLLOW_UP_RESPONSE: 5.0}))
+    with deadline_scope(2.0), plan_scope(planner) as plan:
+        reply = chatbot._handle_follow_up_question("how much is it?", {"add1": "Blk 1 Bishan St", "rentmonth": 1200})
+    assert reply.startswith("Here's what I have on the price for Blk 1 Bishan St")
+    assert "Rentmonth: 1200" in reply
+    assert plan.degradations == [FOLLOW_UP_RESPONSE]
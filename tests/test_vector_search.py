@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.core import vector_search
+from app.core.gazetteer import LocationGazetteer
+from app.core.vector_search import HashingVectorizer, VectorIndex, listing_text
+
+LISTINGS = [
+    {"roomid": 1, "propertyid": 10, "rentmonth": 1200, "status": "a", "roomtype": "Common Room", "propertytype": "HDB",
+     "zone": "East", "add1": "12 Bedok North Ave", "nearestmrt": "Bedok", "wifi": "Y"},
+    {"roomid": 2, "propertyid": 11, "rentmonth": 2400, "status": "a", "roomtype": "Master Room", "propertytype": "Condo",
+     "zone": "Central", "add1": "3 Orchard Rd", "nearestmrt": "Orchard", "swimming": "Y", "gym": "Y"},
+    {"roomid": 3, "propertyid": 12, "rentmonth": 1500, "status": "a", "roomtype": "Studio", "propertytype": "Condo",
+     "zone": "East", "add1": "8 Tampines St", "nearestmrt": "Tampines", "airconditioned": "Y", "swimming": "Y",
+     "description": "Quiet room with a big window facing the park"},
+    {"roomid": 4, "propertyid": 13, "rentmonth": 900, "status": "inactive", "roomtype": "Common Room",
+     "propertytype": "HDB", "zone": "West", "add1": "5 Jurong West St", "nearestmrt": "Boon Lay"},
+]
+
+
+def make_index(**kwargs):
+    index = VectorIndex(capacity=2, **kwargs)
+    index.apply(LISTINGS)
+    return index
+
+
+def test_vectorizer_is_normalized_and_deterministic():
+    vectorizer = HashingVectorizer(256)
+    a = vectorizer.transform("condo with swimming pool")
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert np.array_equal(a, HashingVectorizer(256).transform("condo with swimming pool"))
+    # Synonyms fold onto the listing vocabulary
+    assert vectorizer.transform("pool") @ vectorizer.transform("swimming") > 0.99
+    assert "swimming pool" in listing_text(LISTINGS[1])
+
+
+def test_search_ranks_by_text_and_skips_inactive():
+    index = make_index()
+    assert len(index) == 3
+    results = index.search("quiet room with a big window near a park", k=2)
+    assert [key for _, key in results][0] == 3
+    assert index.search("condo with gym and pool", k=1)[0][1] == 2
+    assert all(key != 4 for _, key in index.search("jurong west common room", k=5))
+
+
+def test_blocked_search_matches_single_block():
+    rng = np.random.default_rng(0)
+    index = VectorIndex(dim=64)
+    words = ["condo", "hdb", "studio", "pool", "gym", "bedok", "orchard", "tampines", "window", "park"]
+    for key in range(500):
+        index.upsert({"roomid": key, "rentmonth": 1000, "description": " ".join(rng.choice(words, 4))})
+    query = "studio near the park with a pool"
+    assert index.search(query, k=7, block_rows=16) == index.search(query, k=7)
+
+
+def test_incremental_updates_reuse_rows_and_grow():
+    index = make_index()
+    index.apply([dict(LISTINGS[0], status="inactive")])
+    assert len(index) == 2
+    index.upsert(dict(LISTINGS[3], status="a", roomid=5))
+    assert len(index) == 3 and index._rows[5] == 0  # freed row reused
+    for key in range(6, 20):
+        index.upsert(dict(LISTINGS[1], roomid=key))
+    assert len(index) == 17 and len(index._matrix) >= 17
+    index.remove(2)
+    assert all(key != 2 for _, key in index.search("orchard condo", k=20))
+
+
+def test_hybrid_ranking_prefers_requirements(tmp_path):
+    index = make_index(path=str(tmp_path / "listings"))
+    assert isinstance(index._matrix, np.memmap)
+    gazetteer = LocationGazetteer({"zone": ["East", "Central", "West"]})
+    query = "room with a pool"
+    assert index.search(query, k=1)[0][1] == 2
+
+    ranked = index.hybrid_search(query, {"budget": 2000, "location": "east"}, k=3, gazetteer=gazetteer)
+    assert [key for _, key in ranked] == [3, 1]
+    # Listings over budget or elsewhere are never offered
+    assert index.hybrid_search(query, {"budget": 1000, "location": "east"}, k=3, gazetteer=gazetteer) == []
+    assert [key for _, key in index.hybrid_search(query, {"budget": 3000}, k=3)] == [2, 3, 1]
+    index.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_change_feed_events_update_shared_index(monkeypatch):
+    index = make_index()
+    monkeypatch.setattr(vector_search, "_vector_index", index)
+    full_rows = {7: dict(LISTINGS[2], roomid=7)}
+    monkeypatch.setattr(vector_search, "fetch_listings_by_key", lambda keys: [full_rows[key] for key in keys])
+    feed_row = {key: LISTINGS[2][key] for key in ("roomid", "propertyid", "rentmonth", "status", "zone", "add1")}
+    vector_search.refresh_from_events([
+        SimpleNamespace(table="rooms", kind="delete", key=1, row=None),
+        SimpleNamespace(table="rooms", kind="insert", key=7, row=dict(feed_row, roomid=7)),
+    ])
+    assert sorted(index._rows) == [2, 3, 7]
+    # Embedded from the full listing, as at warm-up, not the feed's narrower row
+    assert np.array_equal(index._matrix[index._rows[7]], index._matrix[index._rows[3]])
+
+
+def test_empty_listing_load_is_not_retried_on_every_search(monkeypatch):
+    loads = []
+    clock = [100.0]
+    monkeypatch.setattr(vector_search, "_vector_index", None)
+    monkeypatch.setattr(vector_search, "_vector_index_failed_at", None)
+    monkeypatch.setattr(vector_search.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(vector_search, "fetch_active_listings", lambda: loads.append(clock[0]) or [])
+
+    assert len(vector_search.get_vector_index()) == 0
+    clock[0] += 10
+    assert len(vector_search.get_vector_index()) == 0
+    assert loads == [100.0]
+
+    monkeypatch.setattr(vector_search, "VECTOR_INDEX_DIR", None)
+    monkeypatch.setattr(vector_search, "fetch_active_listings", lambda: LISTINGS)
+    clock[0] += 30
+    assert len(vector_search.get_vector_index()) == 3
@@ -0,0 +1,184 @@
+import random
+import sqlite3
+import threading
+from datetime import datetime
+
+from app.core import llm_processor
+from app.core.viewing_scheduler import (
+    LOCAL_TZ,
+    Calendar,
+    ViewingScheduler,
+    ViewingStore,
+    agent_resource,
+    is_time_reply,
+    parse_viewing_time,
+)
+
+# Monday 19 Oct 2026, 08:00 in Singapore; viewing hours are 10:00-19:00
+MONDAY_8AM = datetime(2026, 10, 19, 8, 0, tzinfo=LOCAL_TZ).timestamp()
+HOUR = 3600
+
+
+def at(hour: float, day: int = 19) -> float:
+    return datetime(2026, 10, day, int(hour), int(hour % 1 * 60), tzinfo=LOCAL_TZ).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now: float = MONDAY_8AM):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_calendar_next_free_matches_brute_force():
+    rng = random.Random(5)
+    calendar = Calendar("agent:a", default_window=lambda t: (0.0, float("inf")))
+    calendar.set_windows([(0, 40), (50, 90), (85, 120)])
+    busy = set()
+    for slot in rng.sample(range(120), 60):
+        calendar.add(slot, slot, slot + 1)
+        busy.add(slot)
+
+    def brute(t, duration):
+        for start in range(t, 120):
+            inside = start + duration <= 40 or (start >= 50 and start + duration <= 120)
+            if inside and not any(slot in busy for slot in range(start, start + duration)):
+                return start
+        return None
+
+    for t in range(0, 120, 3):
+        for duration in (1, 2, 3):
+            assert calendar.next_free(t, duration, 120) == brute(t, duration)
+    assert calendar.conflicts(10.5, 12) == sorted(slot for slot in busy if 10 <= slot < 12)
+
+
+def test_hold_checks_property_and_agent_calendars():
+    scheduler = ViewingScheduler(clock=FakeClock())
+    scheduler.assign_agents("p1", ["alice"])
+    scheduler.assign_agents("p2", ["alice"])
+    scheduler.assign_agents("p3", ["alice", "bob"])
+
+    assert scheduler.next_slots("p1") == [at(10), at(10.5), at(11)]
+    first = scheduler.hold("u1", "p1", at(10))
+    assert (first.start, first.agent_id) == (at(10), "alice")
+    # Alice is out at p1, so p2 waits for her; p3 gets Bob
+    assert scheduler.hold("u2", "p2", at(10)).start == at(10.5)
+    assert scheduler.hold("u3", "p3", at(10)).agent_id == "bob"
+    # Past closing time the search moves to the next morning
+    assert scheduler.hold("u4", "p1", at(18.9)).start == at(10, day=20)
+
+    scheduler.set_availability(agent_resource("alice"), [(at(14), at(15))])
+    assert scheduler.next_slots("p2", count=5) == [at(14), at(14.5)]
+
+
+def test_lapsed_hold_is_released_and_cannot_be_confirmed():
+    clock = FakeClock()
+    scheduler = ViewingScheduler(clock=clock, hold_seconds=600)
+    held = scheduler.hold("u1", "p1", at(10))
+    assert scheduler.hold("u2", "p1", at(10)).start == at(10.5)
+
+    clock.now += 601
+    taken = scheduler.hold("u3", "p1", at(10))
+    assert taken.start == at(10)
+    assert not scheduler.confirm(held.id, "91234567")
+    assert scheduler.confirm(taken.id, "98765432")
+    assert scheduler.stats()["expired_holds"] >= 1
+
+
+def test_concurrent_holds_never_overlap():
+    scheduler = ViewingScheduler(clock=FakeClock(), default_agents=["alice", "bob"])
+    barrier = threading.Barrier(16)
+
+    def book(worker):
+        barrier.wait()
+        for attempt in range(25):
+            scheduler.hold(f"user-{worker}-{attempt}", f"p{attempt % 3}", at(10))
+
+    threads = [threading.Thread(target=book, args=(worker,)) for worker in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    bookings = list(scheduler._bookings.values())
+    assert len(bookings) == 400
+    for resource in {resource for booking in bookings for resource in booking.resources}:
+        intervals = sorted((b.start, b.end) for b in bookings if resource in b.resources)
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(intervals, intervals[1:]))
+
+
+def test_store_makes_holds_atomic_across_workers(tmp_path):
+    path = str(tmp_path / "viewings.db")
+    clock = FakeClock()
+
+    def worker():
+        scheduler = ViewingScheduler(ViewingStore(lambda: sqlite3.connect(path), placeholder="?"), clock=clock)
+        scheduler.load()
+        return scheduler
+
+    first, second = worker(), worker()
+    mine = first.hold("u1", "p1", at(10))
+    # The second worker has not seen the hold; the DB turns it away and it moves on
+    theirs = second.hold("u2", "p1", at(10))
+    assert (mine.start, theirs.start) == (at(10), at(10.5))
+    assert second.stats()["db_conflicts"] == 1
+    assert first.confirm(mine.id, "91234567")
+
+    # A lapsed hold's slot is taken over in the DB, and its owner can no longer confirm
+    clock.now += first.hold_seconds + 1
+    third = worker()
+    assert third.hold("u3", "p1", at(10)).start == at(10.5)
+    assert not second.confirm(theirs.id, "98765432")
+
+    restarted = worker()
+    assert sorted((b.start, b.status) for b in restarted._bookings.values()) == [(at(10), "confirmed"), (at(10.5), "held")]
+
+
+def test_parse_viewing_time():
+    assert parse_viewing_time("tomorrow at 3pm", MONDAY_8AM) == at(15, day=20)
+    assert parse_viewing_time("Saturday morning?", MONDAY_8AM) == at(10, day=24)
+    assert parse_viewing_time("how about 21 oct 11:30", MONDAY_8AM) == at(11.5, day=21)
+    assert parse_viewing_time("2pm", MONDAY_8AM) == at(14)
+    # "noon" inside "afternoon" is not midday
+    assert parse_viewing_time("sat afternoon", MONDAY_8AM) == at(14, day=24)
+    assert parse_viewing_time("tomorrow afternoon", MONDAY_8AM) == at(14, day=20)
+    assert parse_viewing_time("tomorrow noon", MONDAY_8AM) == at(12, day=20)
+    assert parse_viewing_time("is it near the MRT?", MONDAY_8AM) is None
+    assert parse_viewing_time("is it near the stmr building?", MONDAY_8AM) is None
+    assert parse_viewing_time("todays rent", MONDAY_8AM) is None
+
+
+def test_is_time_reply():
+    for reply in ("sat 3pm", "tomorrow at 11:30 then", "21st Oct 2pm", "2", "next tues afternoon ok"):
+        assert is_time_reply(reply), reply
+    for message in ("good morning, is wifi included?", "available from today?", "move in on 1/12",
+                    "2 rooms at 3 floors"):
+        assert not is_time_reply(message), message
+
+
+def test_booking_conversation(monkeypatch):
+    scheduler = ViewingScheduler(clock=FakeClock(), default_agents=["alice"])
+    monkeypatch.setattr(llm_processor, "get_viewing_scheduler", lambda: scheduler)
+    chatbot = llm_processor.PropertyChatbot()
+    user = "whatsapp:+6591234567"
+    chatbot._initialize_user_context(user)
+    chatbot.conversation_context[user]["last_properties_shown"] = [{"propertyid": 7, "add1": "Blk 1 Bishan St"}]
+
+    offer = chatbot.process_message(user, "Can I book a viewing?")
+    assert "1. Mon 19 Oct, 10:00 AM" in offer and "2. Mon 19 Oct, 10:30 AM" in offer
+
+    held = chatbot.process_message(user, "2")
+    assert held.startswith("I've held Mon 19 Oct, 10:30 AM for your viewing of Blk 1 Bishan St")
+
+    # Questions that merely mention a day or number leave the hold alone
+    hold_id = chatbot.conversation_context[user]["booking_hold"]
+    for question in ("good morning, is wifi included?", "available from today?", "move in on 1/12",
+                     "2 rooms at 3 floors"):
+        assert chatbot._handle_booking_request(user, question) is None
+        assert chatbot.conversation_context[user]["booking_hold"] == hold_id
+
+    confirmed = chatbot.process_message(user, "yes")
+    assert "confirmed for Mon 19 Oct, 10:30 AM" in confirmed and "+6591234567" in confirmed
+    assert chatbot.conversation_context[user]["booking_state"] == "confirmed"
+    assert scheduler.stats()["confirmations"] == 1
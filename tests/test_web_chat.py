@@ -0,0 +1,186 @@
+import re
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.llm_gateway import LLMGateway
+from app.core.model_router import GENERAL_RESPONSE, ModelRouter, TaskRoute, validate_reply
+from app.core.reply_stream import ReplyStream, current_stream, publish_listings, stream_scope
+from app.core.web_chat import WebChatConnection, WebChatHub
+from app.routes import chat_routes
+
+
+class RecordingStream(ReplyStream):
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def fake_turn(user_id, text):
+    publish_listings([{"roomid": 7, "rentmonth": "1200.00", "add1": "Blk 1 Bishan St", "status": "a"}])
+    stream = current_stream()
+    for token in ("Here ", "you ", "go"):
+        stream.token(token)
+    return f"Here you go ({user_id.split(':')[0]}): {text}"
+
+
+def receive_until(websocket, kind):
+    events = []
+    while True:
+        event = websocket.receive_json()
+        events.append(event)
+        if event["type"] == kind:
+            return events
+
+
+def test_web_chat_streams_listings_tokens_and_reply(monkeypatch):
+    monkeypatch.setattr(chat_routes.chatbot, "process_message", fake_turn)
+    client = TestClient(chat_routes.app)
+    with client.websocket_connect("/ws/chat") as websocket:
+        session = websocket.receive_json()
+        assert session["type"] == "session" and len(session["session"]) == 22
+
+        websocket.send_json({"type": "message", "text": "rooms in bishan", "id": "m1"})
+        events = receive_until(websocket, "reply")
+        kinds = [event["type"] for event in events]
+        assert kinds[0] == "listings" and kinds[-1] == "reply"
+        assert events[0]["items"] == [{"roomid": 7, "rentmonth": 1200.0, "add1": "Blk 1 Bishan St"}]
+        assert "".join(event["text"] for event in events if event["type"] == "token") == "Here you go"
+        assert events[-1] == {"type": "reply", "text": "Here you go (web): rooms in bishan", "reply_to": "m1"}
+
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json() == {"type": "pong"}
+        websocket.send_text("not json")
+        assert websocket.receive_json()["type"] == "error"
+
+    # Reconnecting with the issued id resumes the same chatbot session
+    with client.websocket_connect(f"/ws/chat?session={session['session']}") as websocket:
+        assert websocket.receive_json()["session"] == session["session"]
+    assert chat_routes.web_chat_hub.stats()["connections"] == 0
+
+
+def test_disallowed_origin_is_refused(monkeypatch):
+    monkeypatch.setattr(chat_routes.web_chat_hub, "allowed_origins", {"https://rooms.example"})
+    client = TestClient(chat_routes.app)
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/ws/chat", headers={"Origin": "https://evil.example"}) as websocket:
+            websocket.receive_json()
+    assert refused.value.code == 1008
+
+
+class StalledSocket:
+    """A client that never reads: every send blocks."""
+
+    def __init__(self):
+        self.closed_with = None
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+        await asyncio.sleep(3600)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_reader_gets_merged_tokens_then_is_dropped():
+    async def scenario():
+        hub = WebChatHub(max_pending_events=3, send_timeout=5)
+        socket = StalledSocket()
+        connection = WebChatConnection(socket, "s" * 22, hub)
+        connection.offer({"type": "status", "stage": "searching"})
+        await asyncio.sleep(0)  # the writer is now stuck sending it
+        for token in ("a", "b", "c"):
+            connection.offer({"type": "token", "text": token})
+        assert list(connection._pending) == [{"type": "token", "text": "abc"}]
+        assert hub.tokens_merged == 2
+
+        for index in range(3):
+            connection.offer({"type": "listings", "items": [index]})
+        await asyncio.sleep(0.01)
+        assert connection.closed and hub.slow_consumer_closes == 1
+        assert socket.closed_with == 1013
+
+    asyncio.run(scenario())
+
+
+def test_idle_connections_are_pinged_then_closed():
+    async def scenario():
+        hub = WebChatHub(heartbeat_seconds=10, idle_timeout_seconds=30)
+        quiet, gone = WebChatConnection(StalledSocket(), "q" * 22, hub), WebChatConnection(StalledSocket(), "g" * 22, hub)
+        hub.connections.update({quiet, gone})
+        quiet.last_seen -= 15
+        gone.last_seen -= 31
+        hub.sweep()
+        await asyncio.sleep(0.01)
+        assert quiet.websocket.sent == ['{"type": "ping"}']
+        assert gone.closed and hub.connections == {quiet}
+
+    asyncio.run(scenario())
+
+
+def test_released_sessions_expire_after_ttl_or_cap():
+    async def scenario():
+        expired = []
+        hub = WebChatHub(session_ttl_seconds=60, max_detached_sessions=2, on_session_expired=expired.append)
+        first, second, twin = (WebChatConnection(StalledSocket(), name * 22, hub) for name in "abb")
+        hub.connections.update({first, second, twin})
+        hub.release(first)
+        hub.release(second)
+        # The "b" session still has a socket open, so it is not waiting to expire
+        assert list(hub._detached) == ["a" * 22]
+
+        hub.expire_sessions(time.monotonic() + 61)
+        assert expired == ["web:" + "a" * 22]
+
+        for name in "cde":
+            hub.release(WebChatConnection(StalledSocket(), name * 22, hub))
+        assert expired[1:] == ["web:" + "c" * 22]
+        assert hub.stats()["detached_sessions"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_expired_web_session_drops_its_conversation(monkeypatch):
+    monkeypatch.setattr(chat_routes.chatbot, "process_message", fake_turn)
+    monkeypatch.setattr(chat_routes.web_chat_hub, "session_ttl_seconds", 0)
+    client = TestClient(chat_routes.app)
+    with client.websocket_connect("/ws/chat") as websocket:
+        user_id = "web:" + websocket.receive_json()["session"]
+        chat_routes.chatbot.conversation_context[user_id] = {"requirements": {}}
+    assert user_id not in chat_routes.chatbot.conversation_context
+
+
+class StreamingCompletions:
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        reply = self.replies.pop(0)
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))], usage=None)
+                  for part in re.findall(r"\S+\s*", reply)]
+        chunks.append(SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=12, completion_tokens=len(chunks))))
+        return iter(chunks)
+
+
+def test_reply_tasks_stream_and_reset_on_escalation():
+    completions = StreamingCompletions(["As an AI I can't say.", "Deposits are one month of rent for short leases."])
+    gateway = LLMGateway(client=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    router = ModelRouter(gateway, {GENERAL_RESPONSE: TaskRoute(GENERAL_RESPONSE, ["cheap", "strong"], validate_reply, True)})
+    stream = RecordingStream()
+    with stream_scope(stream):
+        reply = router.run(GENERAL_RESPONSE, [{"role": "user", "content": "deposit?"}])
+
+    assert reply == "Deposits are one month of rent for short leases."
+    kinds = [event["type"] for event in stream.events]
+    reset = kinds.index("reset")  # the cheap model's boilerplate is withdrawn
+    assert reset > 0 and set(kinds[:reset]) == {"token"}
+    assert "".join(event["text"] for event in stream.events[reset + 1:]) == reply
+    assert gateway.stats.snapshot()["strong"]["prompt_tokens"] == 12